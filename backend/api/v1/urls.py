@@ -7,6 +7,7 @@ from clients.client_api import ClientPortalSummaryView, ClientPortalPackagesView
 from warehouse.api import WarehouseViewSet, StorageLocationViewSet
 from receiving.api import WarehouseReceiptViewSet
 from receiving.repack_api import RepackOperationViewSet
+from receiving.scan_api import ScanLookupView
 from shipping.api import ShipmentViewSet
 from company.viewsets import AssociateCompanyViewSet, OfficeViewSet
 from consolidation.api import ConsolidationViewSet
@@ -33,6 +34,7 @@ urlpatterns = [
     path('', include('company.urls')),
     path('inventory/', include('inventory.urls')),
     path('repack/', include('receiving.urls')),
+    path('scan/<str:code>/', ScanLookupView.as_view(), name='scan-lookup'),
     path('billing/', include('billing.urls')),
     path('client/summary/', ClientPortalSummaryView.as_view(), name='client-portal-summary'),
     path('client/packages/', ClientPortalPackagesView.as_view(), name='client-portal-packages'),
@@ -1,7 +1,7 @@
 from datetime import timedelta
 
 from django.contrib.auth import authenticate, login, logout, get_user_model
-from django.db.models import Count, Sum
+from django.db.models import Count
 from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.views.decorators.csrf import ensure_csrf_cookie
@@ -124,7 +124,7 @@ def dashboard_stats(request):
     Scoped to the requesting user's active company.
     """
     from company.utils import get_active_company
-    from receiving.models import WarehouseReceipt, RepackOperation
+    from receiving.models import ConsumedBy, WarehouseReceipt, RepackOperation
     from consolidation.models import Consolidation, ConsolidationStatus, ShipType
     from clients.models import Client
     from core.models import WRStatus
@@ -134,7 +134,7 @@ def dashboard_stats(request):
     active_wr_count = (
         WarehouseReceipt.objects
         .filter(company=company, status=WRStatus.ACTIVE, is_repack=False)
-        .filter(shipment_items__isnull=True)
+        .exclude(consumed_by=ConsumedBy.SHIPMENT)
         .count()
     )
 
@@ -163,7 +163,7 @@ def dashboard_stats(request):
     company_name = company.name
     recent_wrs = []
     for wr in recent_qs:
-        total = wr.lines.aggregate(s=Sum("weight"))["s"] or 0
+        total = wr.total_weight or 0
         agency = wr.associate_company.name if wr.associate_company else company_name
         recent_wrs.append({
             "wr_number": wr.wr_number,
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class ClientsConfig(AppConfig):
     name = "clients"
+
+    def ready(self):
+        from company.versions import track_data_version
+        track_data_version(
+            self.get_model('Client'),
+        )
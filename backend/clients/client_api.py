@@ -4,7 +4,6 @@ Client-portal API views.
 These views are accessible to CLIENT-role users only (not company staff/admin).
 They return data scoped to the logged-in client's own records.
 """
-from decimal import Decimal
 from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -34,35 +33,16 @@ class IsClientUser(BasePermission):
 
 def _aggregate_wr_lines(wr):
     """
-    Roll up per-line data into a single header-shaped summary for the client portal.
-
-    Tracking numbers come from the WarehouseReceiptLineTracking table (source of
-    truth). Carrier/description are de-duplicated and joined. Weight is summed.
-    Caller should prefetch ``lines`` and ``lines__tracking_numbers``.
+    Header-shaped summary of a receipt's lines for the client portal, read
+    from the rollup columns kept on WarehouseReceipt (see
+    receiving.services_receipts.refresh_receipt_rollups), so no line table is
+    touched.
     """
-    trackings = []
-    carriers = []
-    descriptions = []
-    total_weight = Decimal('0')
-    has_weight = False
-
-    for line in wr.lines.all():
-        for t in line.tracking_numbers.all():
-            if t.tracking_number:
-                trackings.append(t.tracking_number)
-        if line.carrier and line.carrier not in carriers:
-            carriers.append(line.carrier)
-        if line.description and line.description not in descriptions:
-            descriptions.append(line.description)
-        if line.weight is not None:
-            total_weight += line.weight
-            has_weight = True
-
     return {
-        "tracking_number": ', '.join(trackings) if trackings else None,
-        "carrier": ', '.join(carriers) if carriers else None,
-        "description": ' | '.join(descriptions) if descriptions else None,
-        "weight": str(total_weight) if has_weight else None,
+        "tracking_number": wr.tracking_summary,
+        "carrier": wr.carrier_summary,
+        "description": wr.description_summary,
+        "weight": str(wr.total_weight) if wr.total_weight is not None else None,
     }
 
 
@@ -94,7 +74,6 @@ class ClientPortalPackagesView(APIView):
             WarehouseReceipt.objects
             .filter(client=client)
             .order_by('-received_at')
-            .prefetch_related('lines', 'lines__tracking_numbers')
         )
         if kind_filter == 'WR':
             wr_qs = wr_qs.filter(is_repack=False)
@@ -152,7 +131,6 @@ class ClientPortalSummaryView(APIView):
             WarehouseReceipt.objects
             .filter(client=client)
             .order_by('-received_at')
-            .prefetch_related('lines', 'lines__tracking_numbers')
         )
 
         wr_list = []
@@ -1,6 +1,15 @@
 from django.db import models
+from django.db.models import Max
 from django.conf import settings
 from core.models import TimeStampedModel
+from company.models import SequenceKind
+from company.sequences import reserve_sequence
+
+
+def _last_client_seq(company_id):
+    # Clients created before the sequence table were coded CL-<company>-<pk>,
+    # so the highest pk in the company bounds every code already in use.
+    return Client.objects.filter(company_id=company_id).aggregate(m=Max('id'))['m'] or 0
 
 
 class ClientType(models.TextChoices):
@@ -55,12 +64,12 @@ class Client(TimeStampedModel):
         return f"{self.client_code} - {self.name}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Auto-generate client_code after first insert if not provided
+        # Auto-generate client_code before the INSERT if not provided.
         if not self.client_code:
             company_id = self.company_id or 0
-            self.client_code = f"CL-{company_id}-{self.pk:06d}"
-            Client.objects.filter(pk=self.pk).update(client_code=self.client_code)
+            seq = reserve_sequence(company_id, SequenceKind.CLIENT, seed=lambda: _last_client_seq(company_id))
+            self.client_code = f"CL-{company_id}-{seq:06d}"
+        super().save(*args, **kwargs)
 
 
 class UserRole(models.TextChoices):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Company, CompanyMember, AssociateCompany, Office
+from .models import Company, CompanyMember, AssociateCompany, Office, CompanySequence
 
 
 @admin.register(Company)
@@ -43,3 +43,10 @@ class OfficeAdmin(admin.ModelAdmin):
             return f"[Associate] {obj.associate_company.name}"
         return "—"
     owner_display.short_description = 'Owner'
+
+
+@admin.register(CompanySequence)
+class CompanySequenceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'company', 'kind', 'last_value', 'updated_at')
+    list_filter = ('kind',)
+    search_fields = ('company__name',)
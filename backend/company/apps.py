@@ -6,3 +6,9 @@ class CompanyConfig(AppConfig):
 
     def ready(self):
         from . import signals  # noqa: F401
+        from .versions import track_data_version
+        track_data_version(
+            self.get_model('CompanyMember'),
+            self.get_model('AssociateCompany'),
+            self.get_model('Office'),
+        )
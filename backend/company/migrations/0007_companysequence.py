@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0006_company_subscription_queued_plan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanySequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('WR', 'Warehouse receipt'), ('REPACK', 'Repack output'), ('CLIENT', 'Client'), ('CONSOLIDATION', 'Consolidation')], max_length=20)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sequences', to='company.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'kind'), name='uniq_company_sequence_kind')],
+            },
+        ),
+    ]
@@ -103,3 +103,48 @@ class Office(models.Model):
     def __str__(self):
         owner = self.company.name if self.company else self.associate_company.name
         return f"{self.name} ({owner})"
+
+
+class SequenceKind(models.TextChoices):
+    WR = "WR", "Warehouse receipt"
+    REPACK = "REPACK", "Repack output"
+    CLIENT = "CLIENT", "Client"
+    CONSOLIDATION = "CONSOLIDATION", "Consolidation"
+
+
+class CompanySequence(models.Model):
+    """
+    Last number handed out for one kind of human-readable code in one company.
+
+    Rows are locked with select_for_update while a number (or a block of
+    numbers) is reserved, so concurrent writers never see the same value.
+    See company/sequences.py.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="sequences")
+    kind = models.CharField(max_length=20, choices=SequenceKind.choices)
+    last_value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'kind'], name='uniq_company_sequence_kind')
+        ]
+
+    def __str__(self):
+        return f"{self.company_id}/{self.kind} = {self.last_value}"
+
+
+class CompanyDataVersion(models.Model):
+    """
+    Counter bumped after every committed write to a company's data.
+
+    Company-scoped list and retrieve endpoints derive their ETag and
+    Last-Modified from it, so an unchanged poll is answered with 304 without
+    querying or serializing the resource. See company/versions.py.
+    """
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, related_name="data_version")
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.company_id} @ {self.version}"
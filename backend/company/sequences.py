@@ -0,0 +1,32 @@
+from django.db import transaction
+
+from .models import CompanySequence
+
+
+def reserve_sequence(company_id, kind, count=1, seed=None):
+    """
+    Atomically reserve ``count`` consecutive numbers of ``kind`` for a company
+    and return the first one.
+
+    The sequence row is locked for the rest of the surrounding transaction, so
+    two writers can never get the same number. ``seed`` is an optional callable
+    returning the last number already in use; it only runs the first time a
+    company allocates ``kind``, so numbering continues after existing codes.
+    Numbers reserved by a transaction that later rolls back are not reused.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1.")
+    with transaction.atomic():
+        sequence, _ = (
+            CompanySequence.objects
+            .select_for_update()
+            .get_or_create(
+                company_id=company_id,
+                kind=kind,
+                defaults={'last_value': seed if seed is not None else 0},
+            )
+        )
+        first = sequence.last_value + 1
+        sequence.last_value += count
+        sequence.save(update_fields=['last_value', 'updated_at'])
+    return first
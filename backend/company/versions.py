@@ -0,0 +1,78 @@
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import CompanyDataVersion
+
+
+# Connection attribute holding the company ids with a bump awaiting commit.
+_PENDING_ATTR = 'company_data_version_pending'
+
+
+def bump_data_version(company_id):
+    """
+    Advance ``company_id``'s data version once the current transaction commits.
+
+    Deferring to commit means a reader can never see the new version paired
+    with the old data. Repeated calls inside one transaction are collapsed
+    into a single UPDATE; a rolled-back transaction bumps nothing.
+    """
+    if company_id is None:
+        return
+    connection = transaction.get_connection()
+    pending = getattr(connection, _PENDING_ATTR, None)
+    if pending is None:
+        pending = set()
+        setattr(connection, _PENDING_ATTR, pending)
+    pending.add(company_id)
+    # Every call registers a callback, so one discarded with a rolled-back
+    # savepoint cannot cost the bump; the first to run takes the id and the
+    # rest find it gone.
+    transaction.on_commit(partial(_apply_pending_bump, pending, company_id))
+
+
+def _apply_pending_bump(pending, company_id):
+    if company_id in pending:
+        pending.discard(company_id)
+        _apply_bump(company_id)
+
+
+def _apply_bump(company_id):
+    now = timezone.now()
+    versions = CompanyDataVersion.objects.filter(company_id=company_id)
+    if versions.update(version=F('version') + 1, changed_at=now):
+        return
+    try:
+        with transaction.atomic():
+            CompanyDataVersion.objects.create(company_id=company_id, version=1, changed_at=now)
+    except IntegrityError:
+        # Created concurrently, or the company itself was just deleted.
+        versions.update(version=F('version') + 1, changed_at=now)
+
+
+def get_data_version(company_id):
+    """Return ``(version, changed_at)``; ``(0, None)`` before the first write."""
+    row = CompanyDataVersion.objects.filter(company_id=company_id).values_list('version', 'changed_at').first()
+    return row or (0, None)
+
+
+def _bump_for_instance(sender, instance, **kwargs):
+    bump_data_version(instance.company_id)
+
+
+def track_data_version(*models):
+    """
+    Bump the owning company's data version on every ORM save and delete of
+    ``models``, which must have a ``company`` foreign key.
+
+    Each app calls this from its ``AppConfig.ready`` for the models its API
+    payloads are built from. Bulk writes (``queryset.update``,
+    ``bulk_create``/``bulk_update``) send no signals; the services doing
+    them call ``bump_data_version`` themselves.
+    """
+    for model in models:
+        post_save.connect(_bump_for_instance, sender=model)
+        post_delete.connect(_bump_for_instance, sender=model)
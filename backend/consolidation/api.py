@@ -1,21 +1,125 @@
-from rest_framework import serializers, viewsets, filters
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework import serializers, status, viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from core.idempotency import idempotent
 from core.mixins import CompanyScopedViewSetMixin
-from .models import Consolidation
+from receiving.services_consumption import refresh_consumption
+from company.models import AssociateCompany, Office
+from .models import Consolidation, ShipType
 from .serializers import ConsolidationSerializer
 from .services import (
     add_item_to_consolidation,
+    add_items_to_consolidation,
     remove_item_from_consolidation,
+    remove_items_from_consolidation,
     close_consolidation,
+    create_consolidations,
 )
+from .services_load_plan import CONTAINER_PRESETS, consolidation_load_plan
+from .services_planner import plan_consolidations
+from .services_pricing import BILL_BY_VOLUME, BILL_BY_WEIGHT, consolidation_pricing
+
+
+# Largest warehouse_receipt_ids list add_items/remove_items accept.
+BULK_ITEMS_MAX = 5000
+
+# Most proposals POST /consolidations/plan/commit/ creates at once.
+PLAN_COMMIT_MAX_PROPOSALS = 1000
 
 
 class _ItemPayloadSerializer(serializers.Serializer):
     warehouse_receipt_id = serializers.IntegerField()
 
 
+class _ItemsPayloadSerializer(serializers.Serializer):
+    warehouse_receipt_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=BULK_ITEMS_MAX,
+    )
+    strict = serializers.BooleanField(required=False, default=False)
+
+
+class _PlanQuerySerializer(serializers.Serializer):
+    ship_type = serializers.ChoiceField(choices=ShipType.choices, required=False)
+    associate_company = serializers.IntegerField(required=False)
+    max_weight = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    max_volume_cf = serializers.DecimalField(max_digits=14, decimal_places=4, min_value=Decimal('0.0001'), required=False)
+
+
+class ConsolidationProposalSerializer(serializers.Serializer):
+    associate_company = serializers.IntegerField()
+    ship_type = serializers.CharField()
+    consolidation_type = serializers.CharField(allow_null=True)
+    warehouse_receipt_ids = serializers.ListField(child=serializers.IntegerField())
+    item_count = serializers.IntegerField()
+    total_weight = serializers.DecimalField(max_digits=16, decimal_places=2)
+    total_volume_cf = serializers.DecimalField(max_digits=18, decimal_places=4)
+    max_weight = serializers.DecimalField(max_digits=12, decimal_places=2)
+    max_volume_cf = serializers.DecimalField(max_digits=14, decimal_places=4)
+    oversized = serializers.BooleanField()
+
+
+class _CommitProposalSerializer(serializers.Serializer):
+    associate_company = serializers.PrimaryKeyRelatedField(queryset=AssociateCompany.objects.all())
+    ship_type = serializers.ChoiceField(choices=ShipType.choices)
+    consolidation_type = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    warehouse_receipt_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    receiving_office = serializers.PrimaryKeyRelatedField(queryset=Office.objects.all(), required=False, allow_null=True)
+
+
+class _CommitPlanSerializer(serializers.Serializer):
+    sending_office = serializers.PrimaryKeyRelatedField(queryset=Office.objects.all())
+    receiving_office = serializers.PrimaryKeyRelatedField(queryset=Office.objects.all())
+    proposals = _CommitProposalSerializer(many=True, allow_empty=False, max_length=PLAN_COMMIT_MAX_PROPOSALS)
+
+
+class _LoadPlanQuerySerializer(serializers.Serializer):
+    container = serializers.ChoiceField(choices=sorted(CONTAINER_PRESETS), required=False)
+
+
+class _PricingItemSerializer(serializers.Serializer):
+    warehouse_receipt_id = serializers.IntegerField()
+    wr_number = serializers.CharField()
+    is_repack = serializers.BooleanField()
+    line_count = serializers.IntegerField()
+    actual_weight = serializers.DecimalField(max_digits=14, decimal_places=2)
+    volumetric_weight = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+    chargeable_weight = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+    billed_by = serializers.CharField(allow_null=True)
+    billed_weight = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+
+
+class ConsolidationPricingSerializer(serializers.Serializer):
+    consolidation_id = serializers.IntegerField()
+    ship_type = serializers.CharField()
+    pricing_available = serializers.BooleanField()
+    pvol_divisor = serializers.DecimalField(max_digits=8, decimal_places=0, allow_null=True)
+    item_count = serializers.IntegerField()
+    total_actual_weight = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_volumetric_weight = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+    chargeable_weight = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+    billed_weight = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+    items = _PricingItemSerializer(many=True)
+
+
+def _parse_bill_by(raw):
+    # "12:volume,15:weight" -> {12: "volume", 15: "weight"}
+    choices = {}
+    for part in filter(None, (p.strip() for p in (raw or '').split(','))):
+        wr_id, _, basis = part.partition(':')
+        if not wr_id.strip().isdigit() or basis.strip() not in (BILL_BY_WEIGHT, BILL_BY_VOLUME):
+            raise serializers.ValidationError(
+                {"bill_by": f"Expected <warehouse_receipt_id>:{BILL_BY_WEIGHT}|{BILL_BY_VOLUME}, got '{part}'."}
+            )
+        choices[int(wr_id)] = basis.strip()
+    return choices
+
+
 class ConsolidationViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
     """
     CRUD for Consolidations.
@@ -39,6 +143,13 @@ class ConsolidationViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'status', 'ship_type', 'reference_code']
     ordering = ['-created_at']
 
+    def perform_destroy(self, instance):
+        # Deleting cascades the receipt links; release the receipts they held.
+        with transaction.atomic():
+            wr_ids = list(instance.receipt_links.values_list('warehouse_receipt_id', flat=True))
+            instance.delete()
+            refresh_consumption(wr_ids)
+
     def _serialize(self, consolidation, request):
         return ConsolidationSerializer(consolidation, context={'request': request}).data
 
@@ -64,6 +175,134 @@ class ConsolidationViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
         )
         return Response(self._serialize(updated, request))
 
+    def _bulk_response(self, request, wr_ids, consolidation, result, done):
+        # One outcome per requested id, in request order.
+        rejected = {r['warehouse_receipt_id']: r for r in result['rejected']}
+        outcomes = {wr_id: done for wr_id in result[done]}
+        outcomes.update({wr_id: 'skipped' for wr_id in result.get('skipped', [])})
+        results = []
+        for wr_id in dict.fromkeys(wr_ids):
+            if wr_id in rejected:
+                results.append({'status': 'rejected', **rejected[wr_id]})
+            else:
+                results.append({'warehouse_receipt_id': wr_id, 'status': outcomes[wr_id]})
+
+        if rejected and not result[done]:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif rejected:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({
+            done: len(result[done]),
+            'skipped': len(result.get('skipped', [])),
+            'rejected': len(rejected),
+            'results': results,
+            'consolidation': self._serialize(consolidation, request),
+        }, status=response_status)
+
+    @action(detail=True, methods=['post'], url_path='add_items')
+    @idempotent
+    def add_items(self, request, pk=None):
+        payload = _ItemsPayloadSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        wr_ids = payload.validated_data['warehouse_receipt_ids']
+        consolidation, result = add_items_to_consolidation(
+            consolidation_id=pk,
+            warehouse_receipt_ids=wr_ids,
+            company=self.get_company(),
+            strict=payload.validated_data['strict'],
+        )
+        return self._bulk_response(request, wr_ids, consolidation, result, 'added')
+
+    @action(detail=True, methods=['post'], url_path='remove_items')
+    @idempotent
+    def remove_items(self, request, pk=None):
+        payload = _ItemsPayloadSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        wr_ids = payload.validated_data['warehouse_receipt_ids']
+        consolidation, result = remove_items_from_consolidation(
+            consolidation_id=pk,
+            warehouse_receipt_ids=wr_ids,
+            company=self.get_company(),
+            strict=payload.validated_data['strict'],
+        )
+        return self._bulk_response(request, wr_ids, consolidation, result, 'removed')
+
+    @action(detail=False, methods=['get'], url_path='plan')
+    def plan(self, request):
+        query = _PlanQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        proposals = plan_consolidations(self.get_company(), **query.validated_data)
+        return Response({
+            'proposal_count': len(proposals),
+            'receipt_count': sum(proposal['item_count'] for proposal in proposals),
+            'proposals': ConsolidationProposalSerializer(proposals, many=True).data,
+        })
+
+    @action(detail=False, methods=['post'], url_path='plan/commit', url_name='plan-commit')
+    @idempotent
+    def plan_commit(self, request):
+        payload = _CommitPlanSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        data = payload.validated_data
+        company = self.get_company()
+
+        # The office and agency rules of a single create, checked once per
+        # distinct agency and receiving office rather than per proposal.
+        pairs = {
+            (proposal['associate_company'].id, (proposal.get('receiving_office') or data['receiving_office']).id)
+            for proposal in data['proposals']
+        }
+        for associate_company_id, receiving_office_id in sorted(pairs):
+            check = ConsolidationSerializer(data={
+                'associate_company': associate_company_id,
+                'ship_type': ShipType.AIR,
+                'sending_office': data['sending_office'].id,
+                'receiving_office': receiving_office_id,
+            }, context={'request': request})
+            check.is_valid(raise_exception=True)
+
+        consolidations = create_consolidations(
+            company,
+            data['proposals'],
+            sending_office=data['sending_office'],
+            receiving_office=data['receiving_office'],
+        )
+        return Response({
+            'created': len(consolidations),
+            'consolidations': [
+                {
+                    'id': consolidation.id,
+                    'reference_code': consolidation.reference_code,
+                    'associate_company': consolidation.associate_company_id,
+                    'ship_type': consolidation.ship_type,
+                    'consolidation_type': consolidation.consolidation_type,
+                    'warehouse_receipt_ids': proposal['warehouse_receipt_ids'],
+                }
+                for consolidation, proposal in zip(consolidations, data['proposals'])
+            ],
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], url_path='pricing')
+    def pricing(self, request, pk=None):
+        consolidation = self.get_object()
+        bill_by = _parse_bill_by(request.query_params.get('bill_by'))
+        summary = consolidation_pricing(consolidation, bill_by=bill_by)
+        return Response(ConsolidationPricingSerializer(summary).data)
+
+    @action(detail=True, methods=['get'], url_path='load-plan', url_name='load-plan')
+    def load_plan(self, request, pk=None):
+        consolidation = self.get_object()
+        query = _LoadPlanQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        if consolidation.ship_type != ShipType.SEA:
+            raise serializers.ValidationError({"detail": "Load planning is only available for SEA consolidations."})
+        plan = consolidation_load_plan(consolidation, container=query.validated_data.get('container'))
+        # The plan is plain JSON data straight from the cache; running a
+        # serializer over thousands of placements would cost more than the plan.
+        return Response(plan)
+
     @action(detail=True, methods=['post'], url_path='close')
     def close(self, request, pk=None):
         updated = close_consolidation(
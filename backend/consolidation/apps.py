@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class ConsolidationConfig(AppConfig):
     name = "consolidation"
+
+    def ready(self):
+        from company.versions import track_data_version
+        track_data_version(
+            self.get_model('Consolidation'),
+            self.get_model('ConsolidationReceipt'),
+        )
@@ -1,5 +1,7 @@
 from django.db import models
 from core.models import TimeStampedModel
+from company.models import SequenceKind
+from company.sequences import reserve_sequence
 
 
 class ShipType(models.TextChoices):
@@ -44,7 +46,7 @@ class Consolidation(TimeStampedModel):
         choices=ConsolidationStatus.choices,
         default=ConsolidationStatus.DRAFT,
     )
-    # Human-friendly reference, set on first save from pk
+    # Human-friendly reference C-<company>-<seq>, set on first save
     reference_code = models.CharField(max_length=20, unique=True, blank=True, editable=False)
 
     class Meta:
@@ -58,11 +60,11 @@ class Consolidation(TimeStampedModel):
         return f"{self.reference_code or f'CON-{self.pk}'} ({self.get_status_display()})"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Generate reference_code from pk after first insert
+        # Generate reference_code from the company's sequence before the INSERT
         if not self.reference_code:
-            self.reference_code = f"C-{self.pk:06d}"
-            Consolidation.objects.filter(pk=self.pk).update(reference_code=self.reference_code)
+            seq = reserve_sequence(self.company_id, SequenceKind.CONSOLIDATION)
+            self.reference_code = f"C-{self.company_id}-{seq:06d}"
+        super().save(*args, **kwargs)
 
 
 class ConsolidationReceipt(TimeStampedModel):
@@ -1,6 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
 from company.models import AssociateCompany, Office
 from company.utils import get_company_from_serializer_context
+from receiving.services_consumption import refresh_consumption
 from .models import Consolidation
 
 
@@ -153,6 +155,7 @@ class ConsolidationSerializer(serializers.ModelSerializer):
     def get_warehouse_receipt_ids(self, obj):
         return list(obj.receipt_links.values_list('warehouse_receipt_id', flat=True))
 
+    @transaction.atomic
     def create(self, validated_data):
         warehouse_receipt_ids = validated_data.pop('warehouse_receipts', None)
         consolidation = super().create(validated_data)
@@ -167,9 +170,11 @@ class ConsolidationSerializer(serializers.ModelSerializer):
                 ) for wr_id in warehouse_receipt_ids
             ]
             ConsolidationReceipt.objects.bulk_create(links)
+            refresh_consumption(warehouse_receipt_ids)
             
         return consolidation
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         warehouse_receipt_ids = validated_data.pop('warehouse_receipts', None)
         consolidation = super().update(instance, validated_data)
@@ -177,6 +182,7 @@ class ConsolidationSerializer(serializers.ModelSerializer):
         if warehouse_receipt_ids is not None:
             from consolidation.models import ConsolidationReceipt
             # Delete old links
+            previous_ids = list(instance.receipt_links.values_list('warehouse_receipt_id', flat=True))
             instance.receipt_links.all().delete()
             
             # Create new links
@@ -188,5 +194,6 @@ class ConsolidationSerializer(serializers.ModelSerializer):
                 ) for wr_id in warehouse_receipt_ids
             ]
             ConsolidationReceipt.objects.bulk_create(links)
+            refresh_consumption(previous_ids + list(warehouse_receipt_ids))
             
         return consolidation
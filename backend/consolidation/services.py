@@ -1,117 +1,306 @@
 from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError as DRFValidationError
 
+from company.models import SequenceKind
+from company.sequences import reserve_sequence
+from company.versions import bump_data_version
 from core.models import WRStatus
-from receiving.models import WarehouseReceipt
+from receiving.models import ConsumedBy, RepackLink, WarehouseReceipt
+from receiving.services_consumption import refresh_consumption
+from shipping.models import ShipmentItem
 from .models import Consolidation, ConsolidationReceipt, ConsolidationStatus
 
 
+# Rejection codes for the bulk add/remove services.
+REJECT_NOT_FOUND = "not_found"
+REJECT_NOT_ACTIVE = "not_active"
+REJECT_AGENCY_MISMATCH = "agency_mismatch"
+REJECT_SHIP_TYPE_MISMATCH = "ship_type_mismatch"
+REJECT_TYPE_MISMATCH = "type_mismatch"
+REJECT_REPACKED = "repacked"
+REJECT_SHIPPED = "shipped"
+REJECT_OTHER_CONSOLIDATION = "other_consolidation"
+REJECT_NOT_IN_CONSOLIDATION = "not_in_consolidation"
+REJECT_DUPLICATE = "duplicate"
+
+
 def _err(message):
     # Wrap as {"detail": "..."} so the frontend ApiError surfaces a clean string
     # via the existing `detail` unwrap in api/client.ts.
     return DRFValidationError({"detail": message})
 
 
-def add_item_to_consolidation(consolidation_id, warehouse_receipt_id, company):
+def _lock_consolidation(consolidation_id, company):
+    try:
+        consolidation = (
+            Consolidation.objects
+            .select_for_update()
+            .get(pk=consolidation_id, company=company)
+        )
+    except Consolidation.DoesNotExist:
+        raise _err("Consolidation not found.")
+
+    if consolidation.status == ConsolidationStatus.CLOSED:
+        raise _err("Cannot modify a closed consolidation.")
+    return consolidation
+
+
+def _lock_receipts(company, warehouse_receipt_ids, consolidation=None):
+    """
+    ``{id: receipt}`` for the company's receipts among the ids, locked in id
+    order and annotated with what ``_ineligibility`` checks, in one query.
+    With ``consolidation``, links to it are flagged ``in_this`` instead of
+    counting as another consolidation's.
+    """
+    links = ConsolidationReceipt.objects.filter(warehouse_receipt=OuterRef('pk'))
+    other_links = links.filter(company=company)
+    annotations = {
+        'is_repacked': Exists(RepackLink.objects.filter(input_wr=OuterRef('pk'))),
+        'is_shipped': Exists(ShipmentItem.objects.filter(wr=OuterRef('pk'))),
+    }
+    if consolidation is not None:
+        annotations['in_this'] = Exists(links.filter(consolidation=consolidation))
+        other_links = other_links.exclude(consolidation=consolidation)
+    annotations['other_reference'] = Subquery(
+        other_links.order_by('id').values('consolidation__reference_code')[:1]
+    )
+    wrs = (
+        WarehouseReceipt.objects
+        .select_for_update()
+        .filter(company=company, id__in=warehouse_receipt_ids)
+        .order_by('id')
+        .only('id', 'status', 'associate_company_id', 'shipping_method', 'receipt_type')
+        .annotate(**annotations)
+    )
+    return {wr.id: wr for wr in wrs}
+
+
+def _ineligibility(wr, consolidation):
+    """``(code, detail)`` when a receipt from ``_lock_receipts`` cannot join ``consolidation``, else None."""
+    # Mirror the eligibility rules in WarehouseReceiptViewSet.get_queryset
+    # for eligible_for=consolidation. Keep these in sync.
+    if wr is None:
+        return REJECT_NOT_FOUND, "Warehouse receipt not found."
+    if wr.status != WRStatus.ACTIVE:
+        return REJECT_NOT_ACTIVE, "Warehouse receipt is not active."
+    if wr.associate_company_id != consolidation.associate_company_id:
+        return REJECT_AGENCY_MISMATCH, "Warehouse receipt agency does not match the consolidation."
+    if (wr.shipping_method or "").lower() != consolidation.ship_type.lower():
+        return REJECT_SHIP_TYPE_MISMATCH, "Warehouse receipt shipping method does not match the consolidation."
+    if (wr.receipt_type or "") != (consolidation.consolidation_type or ""):
+        return REJECT_TYPE_MISMATCH, "Warehouse receipt type does not match the consolidation."
+    if wr.is_repacked:
+        return REJECT_REPACKED, "Warehouse receipt has already been repacked."
+    if wr.is_shipped:
+        return REJECT_SHIPPED, "Warehouse receipt has already been shipped."
+    if wr.other_reference:
+        return (
+            REJECT_OTHER_CONSOLIDATION,
+            f"Warehouse receipt is already linked to consolidation {wr.other_reference}.",
+        )
+    return None
+
+
+def add_items_to_consolidation(consolidation_id, warehouse_receipt_ids, company, strict=False):
+    """
+    Link many receipts to a consolidation.
+
+    The eligibility rules are evaluated for all receipts in one query, which
+    also locks them in id order so overlapping batches cannot deadlock. The
+    links are written with one ``bulk_create`` and the receipts flagged with
+    one UPDATE, so the cost does not grow with the batch. Receipts already
+    in this consolidation are skipped.
+
+    Ineligible receipts are rejected and the rest are added; with
+    ``strict=True`` any rejection raises a ValidationError listing all of
+    them (``{"rejected": [...]}``) and nothing is added.
+
+    Returns ``(consolidation, {"added": [wr_id, ...], "skipped": [wr_id, ...],
+    "rejected": [{"warehouse_receipt_id": id, "code": ..., "detail": ...}, ...]})``.
+    """
+    warehouse_receipt_ids = list(dict.fromkeys(warehouse_receipt_ids))
+    added, skipped, rejected = [], [], []
+
+    def reject(wr_id, code, detail):
+        rejected.append({"warehouse_receipt_id": wr_id, "code": code, "detail": detail})
+
     with transaction.atomic():
-        try:
-            consolidation = (
-                Consolidation.objects
-                .select_for_update()
-                .get(pk=consolidation_id, company=company)
-            )
-        except Consolidation.DoesNotExist:
-            raise _err("Consolidation not found.")
+        consolidation = _lock_consolidation(consolidation_id, company)
 
-        if consolidation.status == ConsolidationStatus.CLOSED:
-            raise _err("Cannot modify a closed consolidation.")
+        wr_by_id = _lock_receipts(company, warehouse_receipt_ids, consolidation)
+        for wr_id in warehouse_receipt_ids:
+            wr = wr_by_id.get(wr_id)
+            if wr is not None and wr.in_this:
+                skipped.append(wr_id)
+                continue
+            problem = _ineligibility(wr, consolidation)
+            if problem:
+                reject(wr_id, *problem)
+            else:
+                added.append(wr_id)
 
-        try:
-            wr = (
-                WarehouseReceipt.objects
-                .select_for_update()
-                .get(pk=warehouse_receipt_id, company=company)
+        if rejected and strict:
+            raise DRFValidationError({"rejected": rejected})
+
+        if added:
+            ConsolidationReceipt.objects.bulk_create(
+                [
+                    ConsolidationReceipt(company=company, consolidation=consolidation, warehouse_receipt_id=wr_id)
+                    for wr_id in added
+                ],
+                batch_size=1000,
             )
-        except WarehouseReceipt.DoesNotExist:
-            raise _err("Warehouse receipt not found.")
-
-        # Mirror the eligibility rules in WarehouseReceiptViewSet.get_queryset
-        # for eligible_for=consolidation. Keep these in sync.
-        if wr.status != WRStatus.ACTIVE:
-            raise _err("Warehouse receipt is not active.")
-        if wr.associate_company_id != consolidation.associate_company_id:
-            raise _err("Warehouse receipt agency does not match the consolidation.")
-        if (wr.shipping_method or "").lower() != consolidation.ship_type.lower():
-            raise _err("Warehouse receipt shipping method does not match the consolidation.")
-        if (wr.receipt_type or "") != (consolidation.consolidation_type or ""):
-            raise _err("Warehouse receipt type does not match the consolidation.")
-        if wr.repack_as_input.exists():
-            raise _err("Warehouse receipt has already been repacked.")
-        if wr.shipment_items.exists():
-            raise _err("Warehouse receipt has already been shipped.")
-
-        other_link = (
-            ConsolidationReceipt.objects
-            .filter(warehouse_receipt_id=warehouse_receipt_id, company=company)
-            .exclude(consolidation_id=consolidation.id)
-            .select_related('consolidation')
-            .first()
-        )
-        if other_link:
-            raise _err(
-                f"Warehouse receipt is already linked to consolidation "
-                f"{other_link.consolidation.reference_code}."
+            WarehouseReceipt.objects.filter(id__in=added).update(
+                consumed_by=ConsumedBy.CONSOLIDATION,
+                consolidation=consolidation,
+                updated_at=timezone.now(),
             )
+            if consolidation.status == ConsolidationStatus.DRAFT:
+                consolidation.status = ConsolidationStatus.OPEN
+                consolidation.save(update_fields=['status', 'updated_at'])
+            bump_data_version(company.id)
 
-        if ConsolidationReceipt.objects.filter(
-            consolidation=consolidation, warehouse_receipt_id=warehouse_receipt_id
-        ).exists():
-            raise _err("Warehouse receipt is already in this consolidation.")
+    return consolidation, {"added": added, "skipped": skipped, "rejected": rejected}
 
-        ConsolidationReceipt.objects.create(
-            company=company,
-            consolidation=consolidation,
-            warehouse_receipt_id=warehouse_receipt_id,
+
+def remove_items_from_consolidation(consolidation_id, warehouse_receipt_ids, company, strict=False):
+    """
+    Unlink many receipts from a consolidation with one DELETE, then
+    recompute their consumption state in bulk. Receipts not in the
+    consolidation are rejected; with ``strict=True`` that raises and
+    nothing is removed.
+
+    Returns ``(consolidation, {"removed": [wr_id, ...], "rejected": [...]})``.
+    """
+    warehouse_receipt_ids = list(dict.fromkeys(warehouse_receipt_ids))
+    removed, rejected = [], []
+
+    with transaction.atomic():
+        consolidation = _lock_consolidation(consolidation_id, company)
+
+        links = dict(
+            ConsolidationReceipt.objects
+            .filter(consolidation=consolidation, warehouse_receipt_id__in=warehouse_receipt_ids)
+            .values_list('warehouse_receipt_id', 'id')
         )
+        for wr_id in warehouse_receipt_ids:
+            if wr_id in links:
+                removed.append(wr_id)
+            else:
+                rejected.append({
+                    "warehouse_receipt_id": wr_id,
+                    "code": REJECT_NOT_IN_CONSOLIDATION,
+                    "detail": "Warehouse receipt is not in this consolidation.",
+                })
 
-        if consolidation.status == ConsolidationStatus.DRAFT:
-            consolidation.status = ConsolidationStatus.OPEN
-            consolidation.save(update_fields=['status', 'updated_at'])
+        if rejected and strict:
+            raise DRFValidationError({"rejected": rejected})
 
-        return consolidation
+        if removed:
+            ConsolidationReceipt.objects.filter(id__in=[links[wr_id] for wr_id in removed]).delete()
+            refresh_consumption(removed)
+
+            if (
+                consolidation.status == ConsolidationStatus.OPEN
+                and not ConsolidationReceipt.objects.filter(consolidation=consolidation).exists()
+            ):
+                consolidation.status = ConsolidationStatus.DRAFT
+                consolidation.save(update_fields=['status', 'updated_at'])
+            bump_data_version(company.id)
+
+    return consolidation, {"removed": removed, "rejected": rejected}
+
+
+def add_item_to_consolidation(consolidation_id, warehouse_receipt_id, company):
+    consolidation, result = add_items_to_consolidation(consolidation_id, [warehouse_receipt_id], company)
+    if result["rejected"]:
+        raise _err(result["rejected"][0]["detail"])
+    if result["skipped"]:
+        raise _err("Warehouse receipt is already in this consolidation.")
+    return consolidation
 
 
 def remove_item_from_consolidation(consolidation_id, warehouse_receipt_id, company):
-    with transaction.atomic():
-        try:
-            consolidation = (
-                Consolidation.objects
-                .select_for_update()
-                .get(pk=consolidation_id, company=company)
-            )
-        except Consolidation.DoesNotExist:
-            raise _err("Consolidation not found.")
+    consolidation, result = remove_items_from_consolidation(consolidation_id, [warehouse_receipt_id], company)
+    if result["rejected"]:
+        raise _err(result["rejected"][0]["detail"])
+    return consolidation
 
-        if consolidation.status == ConsolidationStatus.CLOSED:
-            raise _err("Cannot modify a closed consolidation.")
 
-        link = ConsolidationReceipt.objects.filter(
-            consolidation=consolidation,
-            warehouse_receipt_id=warehouse_receipt_id,
-        ).first()
-        if not link:
-            raise _err("Warehouse receipt is not in this consolidation.")
+def create_consolidations(company, proposals, sending_office, receiving_office):
+    """
+    Create consolidations with their receipts in one transaction, e.g. the
+    proposals from ``services_planner.plan_consolidations`` the user kept.
 
-        link.delete()
+    ``proposals`` is a list of dicts with ``associate_company``,
+    ``ship_type``, ``consolidation_type``, ``warehouse_receipt_ids`` and an
+    optional ``receiving_office`` overriding the shared one. Every receipt
+    is checked against its proposal with the ``add_item`` rules in one
+    locking query; a plan that went stale (a receipt consumed since, or
+    listed twice) raises ``{"rejected": [...]}`` with the proposal index of
+    each rejection and nothing is created. Reference codes are reserved as
+    one block and the consolidations, links and receipt flags are written in
+    bulk.
 
-        if (
-            consolidation.status == ConsolidationStatus.OPEN
-            and not ConsolidationReceipt.objects.filter(consolidation=consolidation).exists()
-        ):
-            consolidation.status = ConsolidationStatus.DRAFT
-            consolidation.save(update_fields=['status', 'updated_at'])
+    Returns the created consolidations, OPEN, in proposal order.
+    """
+    consolidations = [
+        Consolidation(
+            company=company,
+            associate_company=proposal['associate_company'],
+            ship_type=proposal['ship_type'],
+            consolidation_type=proposal.get('consolidation_type') or None,
+            sending_office=sending_office,
+            receiving_office=proposal.get('receiving_office') or receiving_office,
+            status=ConsolidationStatus.OPEN,
+        )
+        for proposal in proposals
+    ]
 
-        return consolidation
+    with transaction.atomic():
+        all_ids = [wr_id for proposal in proposals for wr_id in proposal['warehouse_receipt_ids']]
+        wr_by_id = _lock_receipts(company, set(all_ids))
+
+        rejected = []
+        seen = set()
+        for index, (proposal, consolidation) in enumerate(zip(proposals, consolidations)):
+            for wr_id in proposal['warehouse_receipt_ids']:
+                if wr_id in seen:
+                    problem = REJECT_DUPLICATE, "Warehouse receipt is listed more than once."
+                else:
+                    problem = _ineligibility(wr_by_id.get(wr_id), consolidation)
+                seen.add(wr_id)
+                if problem:
+                    code, detail = problem
+                    rejected.append({"proposal": index, "warehouse_receipt_id": wr_id, "code": code, "detail": detail})
+        if rejected:
+            raise DRFValidationError({"rejected": rejected})
+
+        first = reserve_sequence(company.id, SequenceKind.CONSOLIDATION, count=len(consolidations))
+        for offset, consolidation in enumerate(consolidations):
+            consolidation.reference_code = f"C-{company.id}-{first + offset:06d}"
+        Consolidation.objects.bulk_create(consolidations)
+
+        links = []
+        now = timezone.now()
+        for proposal, consolidation in zip(proposals, consolidations):
+            for wr_id in proposal['warehouse_receipt_ids']:
+                links.append(ConsolidationReceipt(
+                    company=company, consolidation=consolidation, warehouse_receipt_id=wr_id,
+                ))
+                wr = wr_by_id[wr_id]
+                wr.consumed_by = ConsumedBy.CONSOLIDATION
+                wr.consolidation = consolidation
+                wr.updated_at = now
+        ConsolidationReceipt.objects.bulk_create(links, batch_size=1000)
+        WarehouseReceipt.objects.bulk_update(
+            list(wr_by_id.values()), ['consumed_by', 'consolidation', 'updated_at'], batch_size=1000,
+        )
+        bump_data_version(company.id)
+
+    return consolidations
 
 
 def close_consolidation(consolidation_id, company):
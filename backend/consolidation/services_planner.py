@@ -0,0 +1,152 @@
+"""
+Automatic consolidation planning.
+
+Eligible receipts (ACTIVE, not consumed by a repack, shipment or
+consolidation, with an agency and a shipping method) are grouped by
+``(associate_company, shipping_method, receipt_type)``: the fields a
+receipt must share with its consolidation. Each group is packed into
+proposals under a weight and a volume limit with first-fit decreasing.
+
+Packing works on integers (hundredths of a pound, ten-thousandths of a cubic
+foot, the precision of the receipt rollups) so the limits are exact. First
+fit is answered by a max-segment tree over the bins' remaining capacity,
+which finds the leftmost bin with room in about log(bins) steps instead of
+scanning every open bin; 50k receipts plan in a few seconds.
+
+Planning writes nothing. ``consolidation.services.create_consolidations``
+commits the proposals the user keeps.
+"""
+from decimal import Decimal
+
+from core.models import WRStatus
+from receiving.models import ConsumedBy, ShippingMethod, WarehouseReceipt
+from .models import ShipType
+
+
+# Default limits per ship type: (max weight in lb, max volume in cf).
+DEFAULT_PLAN_LIMITS = {
+    ShipType.AIR: (Decimal('3500'), Decimal('150')),     # LD3 unit load device
+    ShipType.SEA: (Decimal('58000'), Decimal('2390')),   # 40' dry container
+    ShipType.GROUND: (Decimal('45000'), Decimal('3800')),  # 53' trailer
+}
+
+_WEIGHT_SCALE = 100      # total_weight has 2 decimal places
+_VOLUME_SCALE = 10000    # total_volume_cf has 4
+
+
+def _first_fit_decreasing(items, max_weight, max_volume):
+    """
+    Pack ``items`` (``(key, weight, volume)`` integer tuples, each within the
+    limits) into bins. Returns a list of bins, each a list of keys.
+
+    Items go in decreasing order of their larger share of either limit, each
+    into the first bin with room for both its weight and its volume.
+    """
+    items = sorted(
+        items,
+        key=lambda item: max(item[1] / max_weight, item[2] / max_volume),
+        reverse=True,
+    )
+    # Leaves are bins in opening order; a leaf nobody used yet has the full
+    # capacity, so the leftmost fit is either an open bin or the next new one.
+    size = 1
+    while size < len(items):
+        size *= 2
+    room_weight = [max_weight] * (2 * size)
+    room_volume = [max_volume] * (2 * size)
+    bins = []
+
+    def find(node, weight, volume):
+        if room_weight[node] < weight or room_volume[node] < volume:
+            return -1
+        if node >= size:
+            return node - size
+        found = find(2 * node, weight, volume)
+        return found if found >= 0 else find(2 * node + 1, weight, volume)
+
+    for key, weight, volume in items:
+        index = find(1, weight, volume)
+        if index == len(bins):
+            bins.append([])
+        bins[index].append(key)
+        node = index + size
+        room_weight[node] -= weight
+        room_volume[node] -= volume
+        node //= 2
+        while node:
+            room_weight[node] = max(room_weight[2 * node], room_weight[2 * node + 1])
+            room_volume[node] = max(room_volume[2 * node], room_volume[2 * node + 1])
+            node //= 2
+    return bins
+
+
+def plan_consolidations(company, ship_type=None, associate_company=None, max_weight=None, max_volume_cf=None):
+    """
+    Proposed consolidations for ``company``'s eligible receipts.
+
+    ``ship_type`` and ``associate_company`` (an id) narrow the candidates.
+    ``max_weight``/``max_volume_cf`` override ``DEFAULT_PLAN_LIMITS`` for
+    every ship type planned. Receipts without rollups count as zero.
+
+    Returns a list of dicts with ``associate_company``, ``ship_type``,
+    ``consolidation_type``, ``warehouse_receipt_ids``, ``item_count``,
+    ``total_weight``, ``total_volume_cf``, the limits used and ``oversized``
+    (a single receipt over a limit, proposed alone). Ordered by group, then
+    fullest first.
+    """
+    receipts = WarehouseReceipt.objects.filter(
+        company=company,
+        status=WRStatus.ACTIVE,
+        consumed_by=ConsumedBy.NONE,
+        associate_company__isnull=False,
+        shipping_method__in=ShippingMethod.values,
+    )
+    if ship_type:
+        receipts = receipts.filter(shipping_method=ship_type.lower())
+    if associate_company:
+        receipts = receipts.filter(associate_company_id=associate_company)
+
+    groups = {}
+    rows = receipts.order_by().values_list(
+        'id', 'associate_company_id', 'shipping_method', 'receipt_type', 'total_weight', 'total_volume_cf',
+    )
+    for wr_id, agency_id, method, receipt_type, weight, volume in rows.iterator(chunk_size=10000):
+        groups.setdefault((agency_id, method, receipt_type or ""), []).append((
+            wr_id,
+            int((weight or 0) * _WEIGHT_SCALE),
+            int((volume or 0) * _VOLUME_SCALE),
+        ))
+
+    proposals = []
+    for (agency_id, method, receipt_type), items in sorted(groups.items()):
+        group_ship_type = ShipType(method.upper())
+        default_weight, default_volume = DEFAULT_PLAN_LIMITS[group_ship_type]
+        limit_weight = max_weight or default_weight
+        limit_volume = max_volume_cf or default_volume
+        weight_cap = int(limit_weight * _WEIGHT_SCALE)
+        volume_cap = int(limit_volume * _VOLUME_SCALE)
+
+        sizes = {wr_id: (weight, volume) for wr_id, weight, volume in items}
+        fitting = [item for item in items if item[1] <= weight_cap and item[2] <= volume_cap]
+        bins = _first_fit_decreasing(fitting, weight_cap, volume_cap)
+        bins += [[wr_id] for wr_id, weight, volume in items if weight > weight_cap or volume > volume_cap]
+
+        group = []
+        for wr_ids in bins:
+            weight = sum(sizes[wr_id][0] for wr_id in wr_ids)
+            volume = sum(sizes[wr_id][1] for wr_id in wr_ids)
+            group.append({
+                'associate_company': agency_id,
+                'ship_type': group_ship_type.value,
+                'consolidation_type': receipt_type or None,
+                'warehouse_receipt_ids': sorted(wr_ids),
+                'item_count': len(wr_ids),
+                'total_weight': Decimal(weight) / _WEIGHT_SCALE,
+                'total_volume_cf': Decimal(volume) / _VOLUME_SCALE,
+                'max_weight': limit_weight,
+                'max_volume_cf': limit_volume,
+                'oversized': weight > weight_cap or volume > volume_cap,
+            })
+        group.sort(key=lambda p: max(p['total_weight'] / limit_weight, p['total_volume_cf'] / limit_volume), reverse=True)
+        proposals.extend(group)
+    return proposals
@@ -0,0 +1,145 @@
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+
+from receiving.models import WarehouseReceipt
+from .models import ConsolidationReceipt, ShipType
+
+
+# Volumetric (Pvol) divisors: inches³ per pound of dimensional weight.
+PVOL_DIVISORS = {
+    ShipType.AIR: Decimal('166'),
+    ShipType.SEA: Decimal('1728'),
+}
+
+PRICING_CACHE_TIMEOUT = 60 * 60
+
+BILL_BY_WEIGHT = 'weight'
+BILL_BY_VOLUME = 'volume'
+
+_TWO_PLACES = Decimal('0.01')
+
+
+def _round(value):
+    if value is None:
+        return None
+    return Decimal(value).quantize(_TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def membership_hash(consolidation):
+    """
+    Hash that changes whenever an item is added or removed, or a member
+    receipt is edited (receipt saves bump its updated_at), so figures cached
+    under it never outlive the data they were computed from. One indexed
+    query.
+    """
+    state = ConsolidationReceipt.objects.filter(consolidation=consolidation).aggregate(
+        count=Count('id'),
+        last_link=Max('id'),
+        receipt_sum=Sum('warehouse_receipt_id'),
+        touched=Max('warehouse_receipt__updated_at'),
+    )
+    raw = f"{consolidation.ship_type}|{state['count']}|{state['last_link']}|{state['receipt_sum']}|{state['touched']}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _membership_key(consolidation):
+    return f"consolidation-pricing:{consolidation.id}:{membership_hash(consolidation)}"
+
+
+def _item_rows(consolidation):
+    # One aggregate over ConsolidationReceipt -> WarehouseReceipt -> lines.
+    # Lines missing a dimension drop out of the cubic sum, like the old
+    # browser-side calculation did; pieces are not multiplied in.
+    cubic = ExpressionWrapper(
+        F('lines__length') * F('lines__width') * F('lines__height'),
+        output_field=DecimalField(max_digits=30, decimal_places=6),
+    )
+    return list(
+        WarehouseReceipt.objects
+        .filter(consolidation_links__consolidation=consolidation)
+        .values('id', 'wr_number', 'is_repack')
+        .annotate(actual=Sum('lines__weight'), cubic=Sum(cubic), line_count=Count('lines'))
+        .order_by('id')
+    )
+
+
+def _compute_items(consolidation):
+    divisor = PVOL_DIVISORS.get(consolidation.ship_type)
+    items = []
+    for row in _item_rows(consolidation):
+        actual = Decimal(str(row['actual'] or 0))
+        volumetric = (Decimal(str(row['cubic'] or 0)) / divisor) if divisor else None
+        items.append({
+            'warehouse_receipt_id': row['id'],
+            'wr_number': row['wr_number'],
+            'is_repack': row['is_repack'],
+            'line_count': row['line_count'],
+            'actual_weight': actual,
+            'volumetric_weight': volumetric,
+        })
+    return items
+
+
+def consolidation_pricing(consolidation, bill_by=None):
+    """
+    Volumetric, actual and chargeable weight for a consolidation, with a
+    per-item breakdown.
+
+    Per-item figures are cached until membership changes. ``bill_by`` maps a
+    warehouse_receipt_id to ``'weight'`` or ``'volume'`` to override the
+    default per-item choice (whichever is larger); overrides are applied on top
+    of the cached figures.
+    """
+    bill_by = bill_by or {}
+    divisor = PVOL_DIVISORS.get(consolidation.ship_type)
+
+    key = _membership_key(consolidation)
+    items = cache.get(key)
+    if items is None:
+        items = _compute_items(consolidation)
+        cache.set(key, items, PRICING_CACHE_TIMEOUT)
+
+    total_actual = sum((item['actual_weight'] for item in items), Decimal('0'))
+    total_volumetric = None
+    billed_total = None
+    breakdown = []
+    if divisor is not None:
+        total_volumetric = sum((item['volumetric_weight'] for item in items), Decimal('0'))
+        billed_total = Decimal('0')
+
+    for item in items:
+        row = {
+            **item,
+            'actual_weight': _round(item['actual_weight']),
+            'volumetric_weight': _round(item['volumetric_weight']),
+            'chargeable_weight': None,
+            'billed_by': None,
+            'billed_weight': None,
+        }
+        if divisor is not None:
+            best = BILL_BY_VOLUME if item['volumetric_weight'] > item['actual_weight'] else BILL_BY_WEIGHT
+            choice = bill_by.get(item['warehouse_receipt_id'], best)
+            billed = item['volumetric_weight'] if choice == BILL_BY_VOLUME else item['actual_weight']
+            billed_total += billed
+            row.update({
+                'chargeable_weight': _round(max(item['actual_weight'], item['volumetric_weight'])),
+                'billed_by': choice,
+                'billed_weight': _round(billed),
+            })
+        breakdown.append(row)
+
+    return {
+        'consolidation_id': consolidation.id,
+        'ship_type': consolidation.ship_type,
+        'pricing_available': divisor is not None,
+        'pvol_divisor': divisor,
+        'item_count': len(items),
+        'total_actual_weight': _round(total_actual),
+        'total_volumetric_weight': _round(total_volumetric),
+        'chargeable_weight': _round(max(total_actual, total_volumetric)) if divisor is not None else None,
+        'billed_weight': _round(billed_total),
+        'items': breakdown,
+    }
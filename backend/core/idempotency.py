@@ -0,0 +1,125 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from company.utils import get_active_company
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# How long a completed response is replayed for.
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# A request still "in flight" after this long is assumed to have died with its
+# worker; a retry may take the key over.
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(minutes=2)
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed. Retry shortly.'
+    default_code = 'idempotency_key_in_use'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'), cls=JSONEncoder)
+    raw = f"{request.method} {request.path}\n{request.user.pk}\n{body}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _claim(company, user, key, fingerprint):
+    """
+    Return ``(record, None)`` when this request owns the key and should run,
+    or ``(None, response)`` with the stored response to replay.
+    """
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(company=company, key=key).first()
+
+    if record is not None and record.expires_at <= now:
+        record.delete()
+        record = None
+
+    if record is not None:
+        if record.fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        if record.status_code is not None:
+            return None, Response(
+                record.response_body, status=record.status_code, headers={REPLAYED_HEADER: 'true'},
+            )
+        # Take over an abandoned claim; the conditional UPDATE makes sure only
+        # one retry wins it.
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, status_code__isnull=True, created_at__lt=now - IDEMPOTENCY_LOCK_TIMEOUT,
+        ).update(created_at=now)
+        if not taken:
+            raise IdempotencyKeyInUse()
+        return record, None
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                company=company, key=key, user=user, fingerprint=fingerprint,
+                expires_at=now + IDEMPOTENCY_TTL,
+            )
+    except IntegrityError:
+        # A concurrent retry claimed it between our read and insert.
+        raise IdempotencyKeyInUse()
+    return record, None
+
+
+def idempotent(view_method):
+    """
+    Make a mutating view method safe to retry with an ``Idempotency-Key``.
+
+    The first request with a key claims it, runs, and stores a 2xx response.
+    Retries with the same key and payload get that response back, flagged
+    with ``Idempotent-Replayed: true``, without running the operation again.
+    Errors are not stored, so the key can be retried after a failure. Requests
+    without the header are unaffected. Keys are scoped to the active company.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise ValidationError({IDEMPOTENCY_HEADER: 'Must be at most 255 characters.'})
+
+        company = get_active_company(request.user)
+        record, replay = _claim(company, request.user, key, request_fingerprint(request))
+        if replay is not None:
+            return replay
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        if not status.is_success(response.status_code):
+            record.delete()
+            return response
+
+        record.status_code = response.status_code
+        record.response_body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+        record.save(update_fields=['status_code', 'response_body'])
+        return response
+
+    return wrapper
@@ -0,0 +1,21 @@
+"""
+Management command: purge_idempotency_keys
+
+Deletes stored Idempotency-Key responses past their expiry. Lookups already
+ignore expired rows; this keeps the table small. Schedule it daily.
+
+Usage:
+    python manage.py purge_idempotency_keys
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key records."
+
+    def handle(self, *args, **options):
+        from core.models import IdempotencyKey
+
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
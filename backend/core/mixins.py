@@ -1,7 +1,170 @@
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import BaseSerializer
+
 from company.permissions import CompanyObjectPermission
+from company.versions import get_data_version
+
+
+def _split_param(raw):
+    return [name.strip() for name in raw.split(',') if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    ``?fields=`` / ``?expand=`` on list and retrieve.
+
+    - Neither parameter: every serializer field, as before.
+    - ``?fields=id,wr_number``: only those fields.
+    - ``?expand=lines``: every plain field plus the named nested-serializer
+      fields (``?expand=`` alone gives the slim row). Combines with
+      ``?fields=``.
+
+    ``field_dependencies`` maps a serializer field to what it needs from the
+    queryset: ``only`` (model fields), ``select_related``,
+    ``prefetch_related`` and ``queryset`` (a callable, e.g. to annotate).
+    Viewsets that declare it keep their base queryset lean: relations are
+    applied per requested field, and ``only()`` restricts the columns.
+    Without it the output is still trimmed but the queryset is left alone.
+    """
+    field_dependencies = None
+    sparse_actions = ('list', 'retrieve')
+
+    def _serializer_fields(self):
+        if not hasattr(self, '_available_fields'):
+            serializer = self.get_serializer_class()(context=self.get_serializer_context())
+            self._available_fields = serializer.fields
+        return self._available_fields
+
+    def get_selected_fields(self):
+        """Set of serializer field names to render, or None for all of them."""
+        if hasattr(self, '_selected_fields'):
+            return self._selected_fields
+        self._selected_fields = None
+        params = self.request.query_params if getattr(self, 'request', None) else {}
+        if getattr(self, 'action', None) not in self.sparse_actions:
+            return None
+        if 'fields' not in params and 'expand' not in params:
+            return None
+
+        available = self._serializer_fields()
+        requested = _split_param(params.get('fields', ''))
+        expand = _split_param(params.get('expand', ''))
+        errors = {}
+        unknown = [name for name in requested if name not in available]
+        if unknown:
+            errors['fields'] = f"Unknown field(s): {', '.join(unknown)}."
+        unknown = [name for name in expand if name not in available]
+        if unknown:
+            errors['expand'] = f"Unknown field(s): {', '.join(unknown)}."
+        if errors:
+            raise ValidationError(errors)
+
+        if 'fields' in params:
+            selected = set(requested)
+        else:
+            selected = {name for name, field in available.items() if not isinstance(field, BaseSerializer)}
+        self._selected_fields = selected | set(expand)
+        return self._selected_fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selected = self.get_selected_fields()
+        if selected is not None:
+            fields = getattr(serializer, 'child', serializer).fields
+            for name in list(fields):
+                if name not in selected:
+                    fields.pop(name)
+        return serializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.field_dependencies is None:
+            return queryset
+        selected = self.get_selected_fields()
+        names = self.field_dependencies if selected is None else selected
+        for name in names:
+            spec = self.field_dependencies.get(name, {})
+            if spec.get('select_related'):
+                queryset = queryset.select_related(*spec['select_related'])
+            if spec.get('prefetch_related'):
+                queryset = queryset.prefetch_related(*spec['prefetch_related'])
+            if spec.get('queryset'):
+                queryset = spec['queryset'](queryset)
+        if selected is not None:
+            columns = self._columns_for(queryset.model, selected)
+            if columns is not None:
+                queryset = queryset.only(*columns)
+        return queryset
+
+    def _columns_for(self, model, selected):
+        """Model fields backing ``selected``, or None when they cannot be worked out."""
+        fields = self._serializer_fields()
+        columns = {'pk'}
+        for name in selected:
+            spec = self.field_dependencies.get(name)
+            if spec is not None:
+                columns.update(spec.get('only', ()))
+                columns.update(spec.get('select_related', ()))
+                continue
+            source = fields[name].source
+            try:
+                field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+            columns.add(source)
+        return columns
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified on list and retrieve, answered with 304 before the
+    queryset is touched.
+
+    The validators come from the company's data version (company/versions.py),
+    which advances after every committed write, so checking them costs one
+    indexed lookup. The ETag also covers the user and the full path with its
+    query string, so each filter, page and ``?fields=`` selection validates
+    separately. Any write in the company changes every ETag; that is coarse,
+    but an idle dashboard polls for free.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_validators(self, request):
+        company = self.get_company()
+        version, changed_at = get_data_version(company.id)
+        raw = f"{company.id}:{version}:{request.user.pk}:{request.get_full_path()}"
+        etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+        last_modified = int(changed_at.timestamp()) if changed_at else None
+        return etag, last_modified
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+    def _conditional(self, request, handler, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Cache per user, but revalidate on every poll.
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 
-class CompanyScopedViewSetMixin:
+class CompanyScopedViewSetMixin(ConditionalGetMixin, SparseFieldsetMixin):
     """
     Mixin for ViewSets to automatically scope queries and creations to the
     active company, and enforce company-wide RBAC via CompanyObjectPermission.
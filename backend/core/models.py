@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 class TimeStampedModel(models.Model):
@@ -16,6 +17,8 @@ class WRStatus(models.TextChoices):
 class ShipmentStatus(models.TextChoices):
     PLANNED = "PLANNED", "Planned"
     PACKED = "PACKED", "Packed"
+    # An asynchronous ship run is moving the items out (see ShipmentShipRun).
+    SHIPPING = "SHIPPING", "Shipping"
     SHIPPED = "SHIPPED", "Shipped"
     DELIVERED = "DELIVERED", "Delivered"
     CANCELLED = "CANCELLED", "Cancelled"
@@ -29,3 +32,35 @@ class TxnType(models.TextChoices):
     SHIP = "SHIP", "Ship"
     ADJUST = "ADJUST", "Adjust"
 
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a mutating request sent with an ``Idempotency-Key`` header.
+
+    A retry with the same key is answered from ``response_body`` instead of
+    running the operation again. ``status_code`` stays NULL while the first
+    request is in flight. Rows expire after ``expires_at`` and are removed
+    lazily or by ``manage.py purge_idempotency_keys``. See core/idempotency.py.
+    """
+    company = models.ForeignKey('company.Company', on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    # sha256 of method, path, user and body; a reused key with a different
+    # request is rejected rather than replayed.
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'key'], name='uniq_company_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id}/{self.key} ({self.status_code or 'pending'})"
@@ -0,0 +1,249 @@
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+
+
+def _encode_value(value):
+    # isoformat keeps microseconds, which the keyset comparison needs exactly.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _is_nullable(model, path):
+    """True if the ``__``-separated field path can yield NULL (nullable field or relation)."""
+    opts = model._meta
+    for name in path.split('__'):
+        field = opts.pk if name == 'pk' else opts.get_field(name)
+        if field.null:
+            return True
+        if field.is_relation:
+            opts = field.related_model._meta
+    return False
+
+
+def _target_field(model, path):
+    """The model field a ``__``-separated path ends on."""
+    opts = model._meta
+    field = None
+    for name in path.split('__'):
+        field = opts.pk if name == 'pk' else opts.get_field(name)
+        if field.is_relation:
+            opts = field.related_model._meta
+    return field.target_field if field.is_relation else field
+
+
+def estimated_count(queryset):
+    """
+    Planner row estimate on PostgreSQL (no table scan); exact COUNT(*) on
+    other backends, which have no cheap equivalent.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode.
+
+    Without ``cursor`` in the query string this is the global
+    PageNumberPagination, so existing clients are unaffected. ``?cursor=``
+    (empty for the first page) switches to keyset pagination on the effective
+    ordering (``?ordering=`` or the view default) plus ``id`` as tie-breaker:
+    each page is a ``WHERE (ordering columns) after (last row)`` range read,
+    with no OFFSET and no COUNT(*). Follow ``next`` / ``previous``.
+
+    The total is skipped in cursor mode unless asked for:
+    ``?count=exact`` runs COUNT(*), ``?count=estimate`` uses the planner
+    estimate on PostgreSQL.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.keys = self._keys(queryset)
+        position, reverse = self._decode_cursor(request, queryset.model)
+        self.position = position
+
+        self.count = None
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == COUNT_EXACT:
+            self.count = queryset.count()
+        elif count_mode == COUNT_ESTIMATE:
+            self.count = estimated_count(queryset)
+
+        queryset = queryset.annotate(**{
+            alias: F(path) for alias, path, _, _ in self.keys
+        })
+        if position is not None:
+            queryset = queryset.filter(self._seek(position, before=reverse))
+        queryset = queryset.order_by(*self._order_by(reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page_rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self._link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if not self.page_rows:
+            # Ran past the end: step back from the cursor we were given.
+            return self._link_values(self.position, reverse=True)
+        return self._link(self.page_rows[0], reverse=True)
+
+    # -- keyset internals ------------------------------------------------
+
+    def _keys(self, queryset):
+        """[(alias, path, descending, nullable)] for the ordering plus the id tie-breaker."""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        keys = []
+        for position, term in enumerate(ordering):
+            if not isinstance(term, str) or term == '?':
+                raise ImproperlyConfigured(
+                    f"{type(self).__name__} only supports orderings on field names, got {term!r}."
+                )
+            path = term.lstrip('-')
+            try:
+                nullable = _is_nullable(queryset.model, path)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(f"Cannot keyset-paginate on ordering {term!r}.")
+            keys.append((f'_cursor_{position}', path, term.startswith('-'), nullable))
+            if path in ('id', 'pk'):
+                return keys
+        descending = keys[-1][2] if keys else False
+        keys.append((f'_cursor_{len(keys)}', 'pk', descending, False))
+        return keys
+
+    def _order_by(self, reverse):
+        # Nulls sort last going forward on every backend, so the seek
+        # predicate below stays the same across PostgreSQL and SQLite.
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        terms = []
+        for _, path, descending, nullable in self.keys:
+            descending = descending != reverse
+            if nullable:
+                terms.append(F(path).desc(**nulls) if descending else F(path).asc(**nulls))
+            else:
+                terms.append(f"-{path}" if descending else path)
+        return terms
+
+    def _seek(self, position, before):
+        """Rows strictly after (or, for ``before``, strictly before) ``position``."""
+        clauses = []
+        equal_prefix = Q()
+        for (_, path, descending, nullable), value in zip(self.keys, position):
+            if value is None:
+                # Nulls sort last: everything non-null precedes them, nothing follows.
+                if before:
+                    clauses.append(equal_prefix & Q(**{f'{path}__isnull': False}))
+                equal_prefix &= Q(**{f'{path}__isnull': True})
+                continue
+            lookup = 'lt' if descending != before else 'gt'
+            step = Q(**{f'{path}__{lookup}': value})
+            if nullable and not before:
+                step |= Q(**{f'{path}__isnull': True})
+            clauses.append(equal_prefix & step)
+            equal_prefix &= Q(**{path: value})
+        if not clauses:
+            return Q(pk__in=[])
+
+        seek = Q()
+        for clause in clauses:
+            seek |= clause
+        # Bound the leading column as well so the range is an index seek.
+        _, path, descending, nullable = self.keys[0]
+        if position[0] is not None and not nullable:
+            lookup = 'lte' if descending != before else 'gte'
+            seek &= Q(**{f'{path}__{lookup}': position[0]})
+        return seek
+
+    def _link(self, row, reverse):
+        return self._link_values(
+            [_encode_value(getattr(row, alias)) for alias, _, _, _ in self.keys], reverse,
+        )
+
+    def _link_values(self, values, reverse):
+        payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode()).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def _decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode())
+            values, reverse = payload['v'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            # Cursor from a different ordering.
+            raise NotFound(self.invalid_cursor_message)
+        # Each value must fit its column, or the seek would fail in the ORM.
+        try:
+            values = [
+                None if value is None else _target_field(model, path).to_python(value)
+                for value, (_, path, _, _) in zip(values, self.keys)
+            ]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
@@ -1,7 +1,15 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import serializers, viewsets, filters
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from clients.models import Client
 from core.mixins import CompanyScopedViewSetMixin
+from core.pagination import KeysetCursorPagination
 from .models import InventoryBalance
+from .services_history import balances_as_of
 from clients.api import ClientMinimalSerializer
 from warehouse.models import Warehouse, StorageLocation
 from receiving.models import WarehouseReceipt
@@ -35,11 +43,39 @@ class InventoryBalanceSerializer(serializers.ModelSerializer):
             'client_details', 'warehouse_details', 'location_details', 'wr_details'
         ]
 
+class HistoricalBalanceSerializer(InventoryBalanceSerializer):
+    """A reconstructed ``?as_of=`` row: no id, timestamps or reservations."""
+    class Meta(InventoryBalanceSerializer.Meta):
+        fields = [
+            'client', 'warehouse', 'location', 'wr', 'on_hand_qty',
+            'client_details', 'warehouse_details', 'location_details', 'wr_details',
+        ]
+
+
+def _parse_as_of(raw):
+    # A bare date means the end of that day.
+    value = parse_datetime(raw)
+    if value is None:
+        day = parse_date(raw)
+        if day is None:
+            raise serializers.ValidationError(
+                {"as_of": "Expected an ISO 8601 date or datetime, e.g. 2025-01-31 or 2025-01-31T18:00:00Z."}
+            )
+        value = datetime.combine(day, time.max)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
 class InventoryBalanceViewSet(CompanyScopedViewSetMixin, viewsets.ReadOnlyModelViewSet):
-    queryset = InventoryBalance.objects.select_related(
-        'client', 'warehouse', 'location', 'wr'
-    ).all()
+    queryset = InventoryBalance.objects.all()
     serializer_class = InventoryBalanceSerializer
+    field_dependencies = {
+        'client_details': {'select_related': ['client']},
+        'warehouse_details': {'select_related': ['warehouse']},
+        'location_details': {'select_related': ['location']},
+        'wr_details': {'select_related': ['wr']},
+    }
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['client', 'warehouse', 'location', 'wr']
     search_fields = [
@@ -53,3 +89,58 @@ class InventoryBalanceViewSet(CompanyScopedViewSetMixin, viewsets.ReadOnlyModelV
         'location__code', 'wr__wr_number'
     ]
     ordering = ['location__code', 'wr__wr_number']
+    pagination_class = KeysetCursorPagination
+    as_of_query_param = 'as_of'
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.as_of_query_param in self.request.query_params:
+            return HistoricalBalanceSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        if self.as_of_query_param not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self._conditional(request, self._list_as_of)
+
+    def _list_as_of(self, request):
+        """
+        ``?as_of=<timestamp>``: the balances as they stood at that time,
+        rebuilt from the latest inventory snapshot before it plus the ledger
+        since (inventory/services_history.py). Rows are ordered by WR and
+        filter on ``client``, ``warehouse``, ``location`` and ``wr``.
+        """
+        params = request.query_params
+        if self.paginator is not None and self.paginator.cursor_query_param in params:
+            raise serializers.ValidationError({"cursor": "Not supported together with as_of."})
+        as_of = _parse_as_of(params[self.as_of_query_param])
+        filters_ = {}
+        for name in self.filterset_fields:
+            raw = params.get(name)
+            if raw in (None, ''):
+                continue
+            if not raw.isdigit():
+                raise serializers.ValidationError({name: "Expected an id."})
+            filters_[name] = int(raw)
+
+        rows = balances_as_of(self.get_company(), as_of, **filters_)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            rows = page
+
+        related = {
+            'client': Client.objects.in_bulk({row['client'] for row in rows}),
+            'warehouse': Warehouse.objects.in_bulk({row['warehouse'] for row in rows}),
+            'location': StorageLocation.objects.in_bulk({row['location'] for row in rows} - {None}),
+            'wr': WarehouseReceipt.objects.in_bulk({row['wr'] for row in rows}),
+        }
+        balances = [
+            InventoryBalance(
+                on_hand_qty=row['on_hand_qty'],
+                **{name: objects.get(row[name]) for name, objects in related.items()},
+            )
+            for row in rows
+        ]
+        serializer = self.get_serializer(balances, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class InventoryConfig(AppConfig):
     name = "inventory"
+
+    def ready(self):
+        from company.versions import track_data_version
+        track_data_version(
+            self.get_model('InventoryBalance'),
+            self.get_model('InventoryTransaction'),
+            self.get_model('InventoryTransactionLine'),
+        )
@@ -0,0 +1,33 @@
+"""
+Management command: rebuild_location_occupancy
+
+Recomputes LocationOccupancy (WR count, volume and weight per location) from
+the current InventoryBalance rows. The inventory services keep it current
+incrementally; run this after editing balances outside them (admin, raw SQL).
+reconcile_inventory --repair rebuilds the locations it touches itself.
+
+Usage:
+    python manage.py rebuild_location_occupancy
+    python manage.py rebuild_location_occupancy --company 1
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Recompute location occupancy from inventory balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Only rebuild locations of this company ID.',
+        )
+
+    def handle(self, *args, **options):
+        from inventory.services_occupancy import rebuild_location_occupancy
+
+        with transaction.atomic():
+            rebuilt = rebuild_location_occupancy(company_id=options['company'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt occupancy for {rebuilt} locations."))
@@ -0,0 +1,125 @@
+"""
+Management command: reconcile_inventory
+
+Checks InventoryBalance against the InventoryTransaction ledger and reports
+drift: balances missing for WRs the ledger says are on hand, orphaned
+balances for WRs it says shipped or were consumed, balances at the wrong
+location, duplicates, and balances with no ledger history. ``--repair``
+fixes everything but the last kind.
+
+Work is split into one partition per company and received warehouse. Each
+partition is two streamed queries (see inventory/services_reconcile.py) and
+runs in its own process and transaction when ``--workers`` is above 1.
+
+Usage:
+    python manage.py reconcile_inventory
+    python manage.py reconcile_inventory --company 1 --workers 8
+    python manage.py reconcile_inventory --json > drift.json
+    python manage.py reconcile_inventory --repair
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database sockets; spawned
+    # ones start without Django configured.
+    import django
+    from django.db import connections
+    django.setup()
+    connections.close_all()
+
+
+def _run_partition(args):
+    from inventory.services_reconcile import reconcile_partition
+    return reconcile_partition(*args)
+
+
+class Command(BaseCommand):
+    help = "Reconcile inventory balances with the transaction ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Only reconcile this company ID.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(8, os.cpu_count() or 1),
+            help='Partitions reconciled in parallel (default: CPU count, at most 8).',
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Fix missing, orphaned, misplaced and duplicate balances.',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print a machine-readable summary instead of text.',
+        )
+        parser.add_argument(
+            '--max-details',
+            type=int,
+            default=100,
+            help='Drift entries listed per partition (default: 100).',
+        )
+
+    def handle(self, *args, **options):
+        from django.db import connections
+        from receiving.models import WarehouseReceipt
+        from inventory.services_reconcile import DRIFT_KINDS
+
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        receipts = WarehouseReceipt.objects.all()
+        if options['company'] is not None:
+            receipts = receipts.filter(company_id=options['company'])
+        partitions = list(
+            receipts.order_by('company_id', 'received_warehouse_id')
+            .values_list('company_id', 'received_warehouse_id').distinct()
+        )
+        jobs = [
+            (company_id, warehouse_id, options['repair'], options['max_details'])
+            for company_id, warehouse_id in partitions
+        ]
+
+        if options['workers'] == 1 or len(jobs) <= 1:
+            results = [_run_partition(job) for job in jobs]
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                results = list(pool.map(_run_partition, jobs))
+
+        totals = {kind: sum(result['counts'][kind] for result in results) for kind in DRIFT_KINDS}
+        summary = {
+            'partitions': len(results),
+            'checked': sum(result['checked'] for result in results),
+            'drift': totals,
+            'clean': not any(totals.values()),
+            'repair': options['repair'],
+            'repaired': sum(result['repaired'] for result in results),
+            'results': [result for result in results if any(result['counts'].values())],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        for result in summary['results']:
+            counts = ", ".join(f"{kind}={count}" for kind, count in result['counts'].items() if count)
+            self.stdout.write(f"  company {result['company']} / warehouse {result['warehouse']}: {counts}")
+        message = (
+            f"Checked {summary['checked']} receipts in {summary['partitions']} partitions: "
+            + ", ".join(f"{kind}={count}" for kind, count in totals.items())
+        )
+        if options['repair']:
+            message += f". Repaired {summary['repaired']} balances."
+        self.stdout.write(self.style.SUCCESS(message) if summary['clean'] else self.style.WARNING(message))
@@ -0,0 +1,76 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0008_client_associate_company'),
+        ('company', '0008_companydataversion'),
+        ('inventory', '0004_alter_inventorybalance_location'),
+        ('receiving', '0015_keyset_indexes'),
+        ('warehouse', '0004_backfill_default_warehouses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('balance_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InventorySnapshotBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_hand_qty', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['company', 'performed_at'], name='inventory_i_company_ddc52b_idx'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshot',
+            name='company',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='company.company'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshotbalance',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clients.client'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshotbalance',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='warehouse.storagelocation'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshotbalance',
+            name='snapshot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='inventory.inventorysnapshot'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshotbalance',
+            name='warehouse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='warehouse.warehouse'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshotbalance',
+            name='wr',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='receiving.warehousereceipt'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorysnapshot',
+            index=models.Index(fields=['company', 'taken_at'], name='inventory_i_company_816d91_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorysnapshotbalance',
+            index=models.Index(fields=['snapshot', 'wr'], name='inventory_i_snapsho_8651b9_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill_location_occupancy(apps, schema_editor):
+    InventoryBalance = apps.get_model("inventory", "InventoryBalance")
+    LocationOccupancy = apps.get_model("warehouse", "LocationOccupancy")
+
+    rows = (
+        InventoryBalance.objects
+        .filter(location__isnull=False)
+        .values("location_id", "location__company_id")
+        .annotate(
+            wr_count=Count("id"),
+            total_volume_cf=Sum("wr__total_volume_cf"),
+            total_weight=Sum("wr__total_weight"),
+        )
+    )
+    LocationOccupancy.objects.bulk_create(
+        [
+            LocationOccupancy(
+                location_id=row["location_id"],
+                company_id=row["location__company_id"],
+                wr_count=row["wr_count"],
+                total_volume_cf=row["total_volume_cf"] or Decimal("0"),
+                total_weight=row["total_weight"] or Decimal("0"),
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+def reverse_noop(apps, schema_editor):
+    # The table is dropped with warehouse 0005 if that is reversed too.
+    pass
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0005_inventory_snapshots"),
+        ("warehouse", "0005_location_capacity"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_location_occupancy, reverse_noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SOURCE_LINKS = (
+    # (reference_type, link field, source model)
+    ("SHIPMENT", "shipment", ("shipping", "Shipment")),
+    ("REPACK_OP", "repack_operation", ("receiving", "RepackOperation")),
+)
+
+
+def backfill_source_links(apps, schema_editor):
+    InventoryTransaction = apps.get_model("inventory", "InventoryTransaction")
+    for reference_type, field, (app_label, model_name) in SOURCE_LINKS:
+        source_ids = set(apps.get_model(app_label, model_name).objects.values_list("id", flat=True))
+        batch = []
+        txns = InventoryTransaction.objects.filter(reference_type=reference_type).only("id", "reference_id")
+        for txn in txns.iterator(chunk_size=2000):
+            source_id = int(txn.reference_id) if (txn.reference_id or "").isdigit() else None
+            if source_id in source_ids:
+                setattr(txn, f"{field}_id", source_id)
+                batch.append(txn)
+            if len(batch) >= 2000:
+                InventoryTransaction.objects.bulk_update(batch, [field])
+                batch = []
+        if batch:
+            InventoryTransaction.objects.bulk_update(batch, [field])
+
+
+def reverse_noop(apps, schema_editor):
+    # The columns are dropped by reversing the AddField operations.
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_backfill_location_occupancy'),
+        ('receiving', '0015_keyset_indexes'),
+        ('shipping', '0005_shipment_ship_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='repack_operation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_transactions', to='receiving.repackoperation'),
+        ),
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='shipment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_transactions', to='shipping.shipment'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['reference_type', 'reference_id'], name='inventory_i_referen_ace22e_idx'),
+        ),
+        migrations.RunPython(backfill_source_links, reverse_noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_transaction_source_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorysnapshot',
+            name='covered_line_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
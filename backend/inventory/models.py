@@ -41,6 +41,12 @@ class InventoryTransaction(TimeStampedModel):
     txn_type = models.CharField(max_length=20, choices=TxnType.choices)
     reference_type = models.CharField(max_length=50, blank=True, null=True)
     reference_id = models.CharField(max_length=50, blank=True, null=True)
+    # Typed links to the source document, set alongside reference_type and
+    # reference_id so trace and audit queries can join on an indexed key
+    # instead of matching strings. Deleting the source keeps the ledger
+    # row (and its reference_id) and clears the link.
+    shipment = models.ForeignKey('shipping.Shipment', on_delete=models.SET_NULL, null=True, blank=True, related_name="inventory_transactions")
+    repack_operation = models.ForeignKey('receiving.RepackOperation', on_delete=models.SET_NULL, null=True, blank=True, related_name="inventory_transactions")
     performed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="inventory_transactions")
     performed_at = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True)
@@ -48,7 +54,9 @@ class InventoryTransaction(TimeStampedModel):
     class Meta:
         indexes = [
             models.Index(fields=['client', 'performed_at']),
+            models.Index(fields=['company', 'performed_at']),
             models.Index(fields=['txn_type']),
+            models.Index(fields=['reference_type', 'reference_id']),
         ]
 
     def __str__(self):
@@ -71,3 +79,42 @@ class InventoryTransactionLine(TimeStampedModel):
 
     def __str__(self):
         return f"Line {self.id} (Txn {self.transaction.id}): {self.qty} of {self.wr.wr_number}"
+
+
+class InventorySnapshot(models.Model):
+    """
+    Checkpoint of a company's InventoryBalance rows at ``taken_at``, written
+    by the ``snapshot_inventory`` command. As-of queries start from the
+    latest snapshot before the requested time and replay the ledger from
+    ``SNAPSHOT_REPLAY_MARGIN`` before it, skipping ``covered_line_ids``: the
+    ledger lines in that margin already reflected in the balances.
+    """
+    company = models.ForeignKey('company.Company', on_delete=models.CASCADE, related_name="inventory_snapshots")
+    taken_at = models.DateTimeField(default=timezone.now)
+    balance_count = models.PositiveIntegerField(default=0)
+    covered_line_ids = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'taken_at']),
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.id} @ {self.taken_at:%Y-%m-%d %H:%M}"
+
+
+class InventorySnapshotBalance(models.Model):
+    snapshot = models.ForeignKey(InventorySnapshot, on_delete=models.CASCADE, related_name="balances")
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="+")
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name="+")
+    location = models.ForeignKey(StorageLocation, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    wr = models.ForeignKey(WarehouseReceipt, on_delete=models.CASCADE, related_name="+")
+    on_hand_qty = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['snapshot', 'wr']),
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.snapshot_id}: WR {self.wr_id} @ {self.location_id}"
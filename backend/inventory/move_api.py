@@ -1,9 +1,16 @@
 from rest_framework import serializers, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from company.utils import get_active_company
+from core.idempotency import idempotent
 from receiving.models import WarehouseReceipt
 from warehouse.models import StorageLocation
-from .services import move_wr
+from .services import move_wr, move_wrs
+
+
+# Largest batch POST /inventory/move/bulk/ accepts; a full truck is ~500.
+BULK_MOVE_MAX_ITEMS = 2000
+
 
 class MoveRequestSerializer(serializers.Serializer):
     wr = serializers.PrimaryKeyRelatedField(queryset=WarehouseReceipt.objects.all())
@@ -12,6 +19,7 @@ class MoveRequestSerializer(serializers.Serializer):
     notes = serializers.CharField(required=False, allow_blank=True)
 
 class MoveWRAPIView(APIView):
+    @idempotent
     def post(self, request, *args, **kwargs):
         serializer = MoveRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -37,3 +45,115 @@ class MoveWRAPIView(APIView):
             "to_location": to_location.id,
             "balance_id": balance.id
         }, status=status.HTTP_200_OK)
+
+
+class BulkMoveItemSerializer(serializers.Serializer):
+    """
+    One move in a POST /inventory/move/bulk/ payload. Ids are resolved
+    against the company-scoped maps in ``context['lookups']``, loaded once
+    for the whole batch.
+    """
+    wr = serializers.IntegerField()
+    to_location = serializers.IntegerField()
+    from_location = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate(self, data):
+        lookups = self.context['lookups']
+        errors = {}
+        for field, lookup in [('wr', 'wrs'), ('to_location', 'locations'), ('from_location', 'locations')]:
+            pk = data.get(field)
+            if pk is None:
+                continue
+            obj = lookups[lookup].get(pk)
+            if obj is None:
+                errors[field] = f"Invalid pk \"{pk}\" - object does not exist."
+            else:
+                data[field] = obj
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+
+class BulkMoveRequestSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=BULK_MOVE_MAX_ITEMS,
+    )
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    strict = serializers.BooleanField(required=False, default=False)
+
+
+def _ids(items, field):
+    ids = set()
+    for item in items:
+        try:
+            if item.get(field) not in (None, ""):
+                ids.add(int(item[field]))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+class BulkMoveWRAPIView(APIView):
+    """
+    POST /api/v1/inventory/move/bulk/
+
+    Move or put away many receipts in one request and one database
+    transaction. Items that fail validation are reported per index and do
+    not block the rest, unless ``strict`` is set, in which case any failure
+    rejects the whole batch.
+    """
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        payload = BulkMoveRequestSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        items = payload.validated_data['items']
+        strict = payload.validated_data['strict']
+
+        company = get_active_company(request.user)
+        context = {'lookups': {
+            'wrs': WarehouseReceipt.objects.filter(company=company).in_bulk(_ids(items, 'wr')),
+            'locations': StorageLocation.objects.filter(company=company).in_bulk(
+                _ids(items, 'to_location') | _ids(items, 'from_location')
+            ),
+        }}
+
+        errors = {}
+        moves = []
+        for index, item in enumerate(items):
+            serializer = BulkMoveItemSerializer(data=item, context=context)
+            if serializer.is_valid():
+                data = serializer.validated_data
+                moves.append((index, data['wr'], data['to_location'], data.get('from_location')))
+            else:
+                errors[index] = serializer.errors
+        if strict and errors:
+            return Response({"items": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        outcomes = move_wrs(
+            moves,
+            performed_by=request.user,
+            company=company,
+            notes=payload.validated_data['notes'],
+            strict=strict,
+        )
+
+        results = []
+        for index in range(len(items)):
+            outcome = errors.get(index) or outcomes.get(index)
+            if isinstance(outcome, dict) and "balance_id" in outcome:
+                results.append({"index": index, "status": "moved", **outcome})
+            else:
+                detail = outcome if isinstance(outcome, dict) else {"detail": outcome}
+                results.append({"index": index, "status": "error", "errors": detail})
+
+        moved = sum(1 for result in results if result["status"] == "moved")
+        if moved == len(items):
+            response_status = status.HTTP_200_OK
+        elif moved == 0:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response(
+            {"moved": moved, "failed": len(items) - moved, "results": results},
+            status=response_status,
+        )
@@ -1,7 +1,12 @@
+from collections import defaultdict
+
 from django.db import transaction
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError as DRFValidationError
+from company.versions import bump_data_version
 from receiving.models import WRStatus
 from inventory.models import InventoryBalance, InventoryTransaction, InventoryTransactionLine, TxnType
+from inventory.services_occupancy import adjust_location_occupancy
 
 
 def move_wr(wr, to_location, from_location=None, performed_by=None, notes="", company=None):
@@ -75,5 +80,143 @@ def move_wr(wr, to_location, from_location=None, performed_by=None, notes="", co
                 on_hand_qty=1,
                 reserved_qty=0
             )
+        adjust_location_occupancy(company.id, [
+            (actual_from_location.id if actual_from_location else None, wr.id, -1),
+            (to_location.id, wr.id, 1),
+        ])
 
         return txn, balance, actual_from_location
+
+
+def move_wrs(moves, performed_by=None, company=None, notes="", strict=False):
+    """
+    Move (or put away) many receipts in one database transaction.
+
+    ``moves`` is a list of ``(key, wr, to_location, from_location)`` with
+    ``from_location`` optional (None). Each move is checked with the same
+    rules as ``move_wr``. All balances are locked with one
+    ``select_for_update`` in id order, so two overlapping batches cannot
+    deadlock. The writes are set-based: one InventoryTransaction per client
+    in the batch, all lines in one ``bulk_create``, and balances updated or
+    created in bulk. The query count does not grow with the batch.
+
+    A move that fails its checks is reported and skipped. With
+    ``strict=True`` any failure raises instead, and nothing is written.
+
+    Returns ``{key: result | error}``: ``result`` is a dict with ``wr``,
+    ``from_location``, ``to_location``, ``transaction_id`` and ``balance_id``;
+    ``error`` is a message string.
+    """
+    if not performed_by:
+        raise DRFValidationError("User tracking is missing. performed_by is required.")
+
+    results = {}
+    pending = []
+    seen = set()
+    for key, wr, to_location, from_location in moves:
+        if company is None:
+            company = wr.company
+        if wr.id in seen:
+            results[key] = "Warehouse receipt appears more than once in the batch."
+        elif wr.status != WRStatus.ACTIVE:
+            results[key] = "Warehouse receipt must be ACTIVE to move."
+        else:
+            seen.add(wr.id)
+            pending.append((key, wr, to_location, from_location))
+
+    with transaction.atomic():
+        balances_by_wr = defaultdict(list)
+        locked = (
+            InventoryBalance.objects
+            .select_for_update()
+            .filter(wr_id__in=[wr.id for _, wr, _, _ in pending])
+            .order_by('id')
+        )
+        for balance in locked:
+            balances_by_wr[balance.wr_id].append(balance)
+
+        ready = []
+        for key, wr, to_location, from_location in pending:
+            balances = balances_by_wr.get(wr.id, [])
+            current = balances[0] if balances else None
+            if len(balances) > 1:
+                results[key] = "Data integrity error: WR has multiple active balances."
+            elif current and from_location and current.location_id != from_location.id:
+                results[key] = "Provided from_location does not match current WR location."
+            elif not current and from_location:
+                results[key] = "from_location provided but WR has no current balance."
+            elif current and current.location_id == to_location.id:
+                results[key] = "WR is already at the destination location."
+            else:
+                ready.append((key, wr, to_location, current))
+
+        if strict and results:
+            raise DRFValidationError({"items": results})
+        if not ready:
+            return results
+
+        client_ids = list(dict.fromkeys(wr.client_id for _, wr, _, _ in ready))
+        txns = InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(
+                company=company,
+                client_id=client_id,
+                txn_type=TxnType.MOVE,
+                reference_type="WR_MOVE_BULK",
+                performed_by=performed_by,
+                notes=notes,
+            )
+            for client_id in client_ids
+        ])
+        txn_by_client = dict(zip(client_ids, txns))
+
+        now = timezone.now()
+        lines = []
+        to_update = []
+        to_create = []
+        for key, wr, to_location, current in ready:
+            lines.append(InventoryTransactionLine(
+                company=company,
+                transaction=txn_by_client[wr.client_id],
+                wr=wr,
+                from_location_id=current.location_id if current else None,
+                to_location=to_location,
+                qty=1,
+            ))
+            if current:
+                results[key] = {"from_location": current.location_id}
+                current.location = to_location
+                current.warehouse_id = to_location.warehouse_id
+                current.updated_at = now
+                to_update.append(current)
+            else:
+                results[key] = {"from_location": None}
+                to_create.append(InventoryBalance(
+                    company=company,
+                    client_id=wr.client_id,
+                    warehouse_id=to_location.warehouse_id,
+                    location=to_location,
+                    wr=wr,
+                    on_hand_qty=1,
+                    reserved_qty=0,
+                ))
+        InventoryTransactionLine.objects.bulk_create(lines)
+        if to_update:
+            InventoryBalance.objects.bulk_update(to_update, ['location', 'warehouse', 'updated_at'])
+        if to_create:
+            InventoryBalance.objects.bulk_create(to_create)
+        adjust_location_occupancy(company.id, [
+            change
+            for key, wr, to_location, _ in ready
+            for change in ((results[key]["from_location"], wr.id, -1), (to_location.id, wr.id, 1))
+        ])
+        bump_data_version(company.id)
+
+        balance_by_wr = {balance.wr_id: balance for balance in to_update + to_create}
+        for key, wr, to_location, _ in ready:
+            results[key].update({
+                "wr": wr.id,
+                "to_location": to_location.id,
+                "transaction_id": txn_by_client[wr.client_id].id,
+                "balance_id": balance_by_wr[wr.id].id,
+            })
+    return results
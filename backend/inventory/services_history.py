@@ -0,0 +1,152 @@
+"""
+Point-in-time inventory, reconstructed from the transaction ledger.
+
+InventoryBalance only holds current state: rows are deleted when a WR ships
+or is consumed by a repack. Every change is also written to
+InventoryTransactionLine, so the state at any past moment is the state at
+an earlier checkpoint plus the ledger lines since. Checkpoints are
+InventorySnapshot rows written by the ``snapshot_inventory`` command; an
+as-of query loads the latest one before the requested time and replays only
+the lines after it.
+
+A ledger line's ``performed_at`` is stamped before its transaction commits,
+so a line can become visible after a snapshot taken later than its
+``performed_at``. Replay therefore starts ``SNAPSHOT_REPLAY_MARGIN`` before
+the snapshot and skips the lines the snapshot recorded as already covered.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.models import (
+    InventoryBalance,
+    InventorySnapshot,
+    InventorySnapshotBalance,
+    InventoryTransactionLine,
+    TxnType,
+)
+
+
+# Ledger lines that take a WR out of stock. Every other line type leaves the
+# WR on hand at the line's ``to_location``.
+REMOVING_TXN_TYPES = (TxnType.SHIP, TxnType.REPACK_CONSUME)
+
+# Longest a ledger write may take between stamping ``performed_at`` and
+# committing. Lines committed later than this after their ``performed_at``
+# can be missing from as-of results served from a snapshot.
+SNAPSHOT_REPLAY_MARGIN = timedelta(minutes=15)
+
+
+def take_inventory_snapshot(company, batch_size=5000):
+    """
+    Copy ``company``'s current balances into a new InventorySnapshot.
+
+    The ledger lines of the last ``SNAPSHOT_REPLAY_MARGIN`` are read before
+    the balances, so every line recorded as covered is reflected in the
+    copy; ``taken_at`` is stamped after, so no covered line is later than
+    it. Balances are streamed and inserted ``batch_size`` rows at a time.
+    """
+    with transaction.atomic():
+        snapshot = InventorySnapshot.objects.create(company=company)
+        snapshot.covered_line_ids = list(
+            InventoryTransactionLine.objects.filter(
+                company=company,
+                transaction__performed_at__gt=timezone.now() - SNAPSHOT_REPLAY_MARGIN,
+            ).order_by('id').values_list('id', flat=True)
+        )
+        rows = InventoryBalance.objects.filter(company=company).values_list(
+            'client_id', 'warehouse_id', 'location_id', 'wr_id', 'on_hand_qty',
+        )
+        batch = []
+        for client_id, warehouse_id, location_id, wr_id, qty in rows.iterator(chunk_size=batch_size):
+            batch.append(InventorySnapshotBalance(
+                snapshot=snapshot, client_id=client_id, warehouse_id=warehouse_id,
+                location_id=location_id, wr_id=wr_id, on_hand_qty=qty,
+            ))
+            if len(batch) == batch_size:
+                InventorySnapshotBalance.objects.bulk_create(batch)
+                snapshot.balance_count += len(batch)
+                batch = []
+        if batch:
+            InventorySnapshotBalance.objects.bulk_create(batch)
+            snapshot.balance_count += len(batch)
+        snapshot.taken_at = timezone.now()
+        snapshot.save(update_fields=['taken_at', 'balance_count', 'covered_line_ids'])
+    return snapshot
+
+
+def balances_as_of(company, as_of, client=None, warehouse=None, location=None, wr=None):
+    """
+    Inventory of ``company`` as it stood at ``as_of``.
+
+    Returns a list of dicts with ``client``, ``warehouse``, ``location``,
+    ``wr`` (ids) and ``on_hand_qty``, one per WR on hand, ordered by WR id.
+    The optional arguments are ids to filter on; ``client`` and ``wr`` are
+    pushed into the snapshot and ledger queries, so they also shorten the
+    replay.
+
+    Cost is one snapshot load plus the ledger lines between that snapshot
+    (less ``SNAPSHOT_REPLAY_MARGIN``) and ``as_of``. Without an earlier
+    snapshot the ledger is replayed from the start.
+    """
+    snapshot = (
+        InventorySnapshot.objects
+        .filter(company=company, taken_at__lte=as_of)
+        .order_by('-taken_at', '-id')
+        .first()
+    )
+
+    state = {}
+    if snapshot is not None:
+        rows = InventorySnapshotBalance.objects.filter(snapshot=snapshot)
+        if client is not None:
+            rows = rows.filter(client_id=client)
+        if wr is not None:
+            rows = rows.filter(wr_id=wr)
+        for row in rows.values('client_id', 'warehouse_id', 'location_id', 'wr_id', 'on_hand_qty'):
+            state[row['wr_id']] = {
+                'client': row['client_id'],
+                'warehouse': row['warehouse_id'],
+                'location': row['location_id'],
+                'wr': row['wr_id'],
+                'on_hand_qty': row['on_hand_qty'],
+            }
+
+    lines = InventoryTransactionLine.objects.filter(
+        company=company, transaction__performed_at__lte=as_of,
+    )
+    if snapshot is not None:
+        lines = lines.filter(transaction__performed_at__gt=snapshot.taken_at - SNAPSHOT_REPLAY_MARGIN)
+        if snapshot.covered_line_ids:
+            lines = lines.exclude(id__in=snapshot.covered_line_ids)
+    if client is not None:
+        lines = lines.filter(transaction__client_id=client)
+    if wr is not None:
+        lines = lines.filter(wr_id=wr)
+    lines = lines.order_by('transaction__performed_at', 'transaction_id', 'id').values_list(
+        'wr_id', 'qty', 'to_location_id', 'to_location__warehouse_id',
+        'transaction__txn_type', 'transaction__client_id', 'wr__received_warehouse_id',
+    )
+
+    for wr_id, qty, to_location_id, to_warehouse_id, txn_type, client_id, received_warehouse_id in lines.iterator():
+        if txn_type in REMOVING_TXN_TYPES:
+            state.pop(wr_id, None)
+            continue
+        previous = state.get(wr_id)
+        # A line without a location (e.g. a repack output left unplaced) keeps
+        # the WR in the warehouse it was already in.
+        warehouse_id = to_warehouse_id or (previous and previous['warehouse']) or received_warehouse_id
+        state[wr_id] = {
+            'client': client_id,
+            'warehouse': warehouse_id,
+            'location': to_location_id,
+            'wr': wr_id,
+            'on_hand_qty': qty,
+        }
+
+    return [
+        row for _, row in sorted(state.items())
+        if (warehouse is None or row['warehouse'] == warehouse)
+        and (location is None or row['location'] == location)
+    ]
@@ -0,0 +1,178 @@
+"""
+Location occupancy and capacity-aware putaway suggestions.
+
+LocationOccupancy holds, per location, the number of WRs with a balance
+there and their summed volume and weight. Every service that writes
+balances (move, putaway, repack, ship) passes its changes to
+``adjust_location_occupancy``, which applies them as increments in one
+UPDATE. ``rebuild_location_occupancy`` recomputes rows from the balances for
+backfill and repair, and when a stored WR's rollups change.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory.models import InventoryBalance
+from receiving.models import WarehouseReceipt
+from warehouse.models import LocationOccupancy, LocationType, StorageLocation
+
+
+ZERO = Decimal('0')
+
+
+def _case(deltas, index, output_field):
+    return Case(
+        *[When(location_id=location_id, then=Value(delta[index])) for location_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def adjust_location_occupancy(company_id, changes):
+    """
+    Apply balance changes to the occupancy rows.
+
+    ``changes`` is an iterable of ``(location_id, wr_id, sign)``: ``+1`` when
+    the WR's balance arrives at the location, ``-1`` when it leaves. Entries
+    without a location are ignored. Costs one read of the WR rollups, one
+    insert for locations without a row yet and one UPDATE, whatever the
+    number of changes.
+    """
+    changes = [(location_id, wr_id, sign) for location_id, wr_id, sign in changes if location_id is not None]
+    if not changes:
+        return
+    rollups = {
+        wr_id: (volume or ZERO, weight or ZERO)
+        for wr_id, volume, weight in WarehouseReceipt.objects.filter(
+            id__in={wr_id for _, wr_id, _ in changes},
+        ).values_list('id', 'total_volume_cf', 'total_weight')
+    }
+    deltas = defaultdict(lambda: [0, ZERO, ZERO])
+    for location_id, wr_id, sign in changes:
+        volume, weight = rollups.get(wr_id, (ZERO, ZERO))
+        delta = deltas[location_id]
+        delta[0] += sign
+        delta[1] += sign * volume
+        delta[2] += sign * weight
+    deltas = {location_id: delta for location_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    LocationOccupancy.objects.bulk_create(
+        [LocationOccupancy(location_id=location_id, company_id=company_id) for location_id in deltas],
+        ignore_conflicts=True,
+    )
+    LocationOccupancy.objects.filter(location_id__in=deltas).update(
+        wr_count=F('wr_count') + _case(deltas, 0, IntegerField()),
+        total_volume_cf=F('total_volume_cf') + _case(deltas, 1, DecimalField(max_digits=16, decimal_places=4)),
+        total_weight=F('total_weight') + _case(deltas, 2, DecimalField(max_digits=14, decimal_places=2)),
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild_location_occupancy(location_ids=None, company_id=None):
+    """
+    Recompute occupancy rows from InventoryBalance for the given locations
+    (or every location of ``company_id``, or every location). Returns the
+    number of rows written.
+    """
+    locations = StorageLocation.objects.all()
+    if location_ids is not None:
+        locations = locations.filter(id__in=location_ids)
+    if company_id is not None:
+        locations = locations.filter(company_id=company_id)
+
+    totals = {
+        row['location_id']: row
+        for row in InventoryBalance.objects
+        .filter(location__in=locations.values('id'))
+        .values('location_id')
+        .annotate(
+            wr_count=Count('id'),
+            total_volume_cf=Sum('wr__total_volume_cf'),
+            total_weight=Sum('wr__total_weight'),
+        )
+    }
+    rows = [
+        LocationOccupancy(
+            location_id=location_id,
+            company_id=location_company_id,
+            wr_count=totals.get(location_id, {}).get('wr_count') or 0,
+            total_volume_cf=totals.get(location_id, {}).get('total_volume_cf') or ZERO,
+            total_weight=totals.get(location_id, {}).get('total_weight') or ZERO,
+        )
+        for location_id, location_company_id in locations.values_list('id', 'company_id').iterator()
+    ]
+    LocationOccupancy.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['location'],
+        update_fields=['wr_count', 'total_volume_cf', 'total_weight', 'updated_at'],
+    )
+    return len(rows)
+
+
+def refresh_occupancy_for_wrs(wr_ids):
+    """Recompute the locations currently holding ``wr_ids`` (after their rollups changed)."""
+    location_ids = set(
+        InventoryBalance.objects
+        .filter(wr_id__in=wr_ids, location__isnull=False)
+        .values_list('location_id', flat=True)
+    )
+    if location_ids:
+        rebuild_location_occupancy(location_ids)
+
+
+def suggest_locations(wr, warehouse=None, location_type=LocationType.STORAGE, limit=10):
+    """
+    Active locations that can take ``wr``, best fit first.
+
+    Candidates are the locations of ``warehouse`` (default: where the WR is
+    now, else where it was received) of ``location_type`` with room for one
+    more WR, its volume and its weight; NULL limits are unlimited. They are
+    ranked best-fit: least volume left after placing the WR, then least
+    weight, then fewest free slots, so tight spots fill before empty ones.
+    Unlimited locations come last. The WR's current location is excluded.
+    """
+    balance = InventoryBalance.objects.filter(wr=wr).only('location_id', 'warehouse_id').first()
+    if warehouse is None:
+        warehouse = balance.warehouse_id if balance else wr.received_warehouse_id
+    volume = wr.total_volume_cf or ZERO
+    weight = wr.total_weight or ZERO
+
+    volume_field = DecimalField(max_digits=16, decimal_places=4)
+    weight_field = DecimalField(max_digits=14, decimal_places=2)
+    candidates = (
+        StorageLocation.objects
+        .filter(company_id=wr.company_id, warehouse_id=warehouse, is_active=True)
+        .annotate(
+            occupied_count=Coalesce(F('occupancy__wr_count'), 0),
+            occupied_volume_cf=Coalesce(F('occupancy__total_volume_cf'), Value(ZERO), output_field=volume_field),
+            occupied_weight=Coalesce(F('occupancy__total_weight'), Value(ZERO), output_field=weight_field),
+        )
+        .annotate(
+            remaining_count=F('max_wr_count') - F('occupied_count') - 1,
+            remaining_volume_cf=F('max_volume_cf') - F('occupied_volume_cf') - Value(volume, output_field=volume_field),
+            remaining_weight=F('max_weight') - F('occupied_weight') - Value(weight, output_field=weight_field),
+        )
+        .filter(
+            Q(max_wr_count__isnull=True) | Q(remaining_count__gte=0),
+            Q(max_volume_cf__isnull=True) | Q(remaining_volume_cf__gte=0),
+            Q(max_weight__isnull=True) | Q(remaining_weight__gte=0),
+        )
+        .order_by(
+            F('remaining_volume_cf').asc(nulls_last=True),
+            F('remaining_weight').asc(nulls_last=True),
+            F('remaining_count').asc(nulls_last=True),
+            'code',
+        )
+    )
+    if location_type:
+        candidates = candidates.filter(location_type=location_type)
+    if balance and balance.location_id:
+        candidates = candidates.exclude(id=balance.location_id)
+    return list(candidates[:limit])
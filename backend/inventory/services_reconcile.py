@@ -0,0 +1,170 @@
+"""
+Ledger-vs-balance reconciliation.
+
+Every balance change made by the services (move, putaway, repack, ship) is
+also written to InventoryTransactionLine. A WR's expected state is therefore
+its latest ledger line: a SHIP or REPACK_CONSUME line means it should have
+no balance, any other line means one balance at that line's
+``to_location``. ``reconcile_partition`` checks this for one company and
+received warehouse with two streamed queries: the latest line per WR
+(a ROW_NUMBER window) and the partition's balances. The
+``reconcile_inventory`` command fans the partitions out over a process pool.
+"""
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from company.versions import bump_data_version
+from inventory.models import InventoryBalance, InventoryTransactionLine
+from inventory.services_history import REMOVING_TXN_TYPES
+from inventory.services_occupancy import rebuild_location_occupancy
+
+
+# Drift kinds.
+MISSING = 'missing'               # ledger says on hand, no balance
+ORPHANED = 'orphaned'             # balance for a WR the ledger removed
+WRONG_LOCATION = 'wrong_location'  # balance not at the last to_location
+DUPLICATE = 'duplicate'           # more than one balance for the WR
+UNLEDGERED = 'unledgered'         # balance with no ledger history at all
+DRIFT_KINDS = (MISSING, ORPHANED, WRONG_LOCATION, DUPLICATE, UNLEDGERED)
+
+
+def expected_balances(company_id, warehouse_id):
+    """
+    ``{wr_id: expected}`` from the latest ledger line of every WR received
+    into ``warehouse_id``. ``expected`` is None when the WR should be out of
+    stock, else a dict with ``client``, ``warehouse``, ``location`` and
+    ``on_hand_qty``.
+    """
+    latest = (
+        InventoryTransactionLine.objects
+        .filter(company_id=company_id, wr__received_warehouse_id=warehouse_id)
+        .annotate(position=Window(
+            expression=RowNumber(),
+            partition_by=[F('wr_id')],
+            order_by=[F('transaction__performed_at').desc(), F('transaction_id').desc(), F('id').desc()],
+        ))
+        .filter(position=1)
+        .values_list(
+            'wr_id', 'qty', 'to_location_id', 'to_location__warehouse_id',
+            'transaction__txn_type', 'transaction__client_id',
+        )
+    )
+    expected = {}
+    for wr_id, qty, location_id, location_warehouse_id, txn_type, client_id in latest.iterator(chunk_size=10000):
+        if txn_type in REMOVING_TXN_TYPES:
+            expected[wr_id] = None
+        else:
+            expected[wr_id] = {
+                'client': client_id,
+                'warehouse': location_warehouse_id or warehouse_id,
+                'location': location_id,
+                'on_hand_qty': qty,
+            }
+    return expected
+
+
+def reconcile_partition(company_id, warehouse_id, repair=False, max_details=100):
+    """
+    Compare the balances of WRs received into ``warehouse_id`` with the
+    ledger and optionally repair the drift.
+
+    Returns a summary dict: ``company``, ``warehouse``, ``checked`` (WRs
+    looked at), ``counts`` per drift kind, ``repaired`` (rows changed) and
+    ``details`` (up to ``max_details`` drift entries).
+
+    With ``repair=True`` the partition's balances are locked for the
+    duration, so a concurrent move cannot interleave with the fix.
+    """
+    counts = {kind: 0 for kind in DRIFT_KINDS}
+    details = []
+
+    def report(kind, wr_id, balance_id=None, expected_location=None, actual_location=None):
+        counts[kind] += 1
+        if len(details) < max_details:
+            details.append({
+                'kind': kind,
+                'wr': wr_id,
+                'balance': balance_id,
+                'expected_location': expected_location,
+                'actual_location': actual_location,
+            })
+
+    with transaction.atomic():
+        expected = expected_balances(company_id, warehouse_id)
+        balances = InventoryBalance.objects.filter(
+            company_id=company_id, wr__received_warehouse_id=warehouse_id,
+        ).order_by('id')
+        if repair:
+            balances = balances.select_for_update()
+        actual = {}
+        for balance in balances.only('id', 'wr_id', 'location_id', 'warehouse_id', 'client_id').iterator(chunk_size=10000):
+            actual.setdefault(balance.wr_id, []).append(balance)
+
+        now = timezone.now()
+        to_create, to_update, to_delete = [], [], []
+        touched_locations = set()
+        for wr_id in sorted(expected.keys() | actual.keys()):
+            want = expected.get(wr_id)
+            have = actual.get(wr_id, [])
+            if wr_id not in expected:
+                # Predates the ledger (imports, seed data): nothing to repair
+                # it against, so it is only reported.
+                for balance in have:
+                    report(UNLEDGERED, wr_id, balance.id, actual_location=balance.location_id)
+                continue
+            if want is None:
+                for balance in have:
+                    report(ORPHANED, wr_id, balance.id, actual_location=balance.location_id)
+                    to_delete.append(balance.id)
+                    touched_locations.add(balance.location_id)
+                continue
+            if not have:
+                report(MISSING, wr_id, expected_location=want['location'])
+                if want['warehouse'] is None:
+                    # Nowhere to put it: no location and no received warehouse.
+                    continue
+                to_create.append(InventoryBalance(
+                    company_id=company_id, client_id=want['client'], warehouse_id=want['warehouse'],
+                    location_id=want['location'], wr_id=wr_id, on_hand_qty=want['on_hand_qty'],
+                ))
+                touched_locations.add(want['location'])
+                continue
+            # Keep the balance already at the expected location, else the oldest.
+            keep = next((b for b in have if b.location_id == want['location']), have[0])
+            for balance in have:
+                if balance is not keep:
+                    report(DUPLICATE, wr_id, balance.id, want['location'], balance.location_id)
+                    to_delete.append(balance.id)
+                    touched_locations.add(balance.location_id)
+            if keep.location_id != want['location']:
+                report(WRONG_LOCATION, wr_id, keep.id, want['location'], keep.location_id)
+                touched_locations |= {keep.location_id, want['location']}
+                keep.location_id = want['location']
+                keep.warehouse_id = want['warehouse'] or keep.warehouse_id
+                keep.updated_at = now
+                to_update.append(keep)
+
+        repaired = 0
+        if repair and (to_create or to_update or to_delete):
+            # Deletes first: a duplicate may hold the (location, wr) slot.
+            if to_delete:
+                repaired += InventoryBalance.objects.filter(id__in=to_delete).delete()[0]
+            if to_update:
+                repaired += InventoryBalance.objects.bulk_update(
+                    to_update, ['location', 'warehouse', 'updated_at'], batch_size=1000,
+                )
+            if to_create:
+                repaired += len(InventoryBalance.objects.bulk_create(to_create, batch_size=1000))
+            rebuild_location_occupancy(touched_locations - {None})
+            bump_data_version(company_id)
+
+    return {
+        'company': company_id,
+        'warehouse': warehouse_id,
+        'checked': len(expected.keys() | actual.keys()),
+        'counts': counts,
+        'repaired': repaired,
+        'details': details,
+    }
@@ -1,11 +1,12 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .api import InventoryBalanceViewSet
-from .move_api import MoveWRAPIView
+from .move_api import BulkMoveWRAPIView, MoveWRAPIView
 
 router = DefaultRouter()
 router.register(r'balances', InventoryBalanceViewSet, basename='inventory-balance')
 
 urlpatterns = [
     path('move/', MoveWRAPIView.as_view(), name='inventory-move'),
+    path('move/bulk/', BulkMoveWRAPIView.as_view(), name='inventory-move-bulk'),
 ] + router.urls
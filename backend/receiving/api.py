@@ -1,20 +1,137 @@
-from rest_framework import serializers, viewsets, filters
+from rest_framework import serializers, viewsets, filters, status
+from core.idempotency import idempotent
 from core.mixins import CompanyScopedViewSetMixin
+from core.pagination import KeysetCursorPagination
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
 from core.models import WRStatus
-from .models import WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking
+from django.db.models import OuterRef, Q, Subquery
+from .models import ConsumedBy, WarehouseReceipt
 from clients.api import ClientSerializer, ClientMinimalSerializer
 from company.models import AssociateCompany
 from warehouse.api import WarehouseMinimalSerializer
 from inventory.models import InventoryBalance, InventoryTransactionLine
+from inventory.services_occupancy import refresh_occupancy_for_wrs
 from shipping.models import ShipmentItem
 from .trace_serializers import (
     TraceBalanceSerializer, TraceInventoryTransactionLineSerializer,
     TraceWRMinimalSerializer, TraceRepackSummarySerializer, TraceShipmentSummarySerializer
 )
 from receiving.models import RepackLink
+from .services_receipts import (
+    BULK_CHUNK_SIZE, build_receipt_lines, bulk_create_receipts,
+    ROLLUP_FIELDS, default_received_warehouse, reconcile_receipt_lines, refresh_receipt_rollups,
+    save_receipt_lines,
+)
+from .services_tracking import index_receipt_tracking
+from .services_lineage import build_lineage
+from .importers import DEFAULT_CHUNK_SIZE, FORMATS, ReceiptImporter, detect_format
+from .serializers import WarehouseReceiptBulkItemSerializer, WarehouseReceiptLineSerializer
+
+
+# Upper bound on receipts accepted by one POST /wrs/bulk/ request.
+BULK_MAX_ITEMS = 5000
+
+# Rejected rows echoed back by POST /wrs/import/; the rest are only counted.
+IMPORT_MAX_REJECTS = 1000
+
+
+def _collect_ids(items, field):
+    ids = set()
+    for item in items:
+        value = item.get(field) if isinstance(item, dict) else None
+        try:
+            if value not in (None, ""):
+                ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def _bulk_lookups(company, items):
+    """Load every object a bulk payload references with one query per model."""
+    from clients.models import Client
+    from warehouse.models import Warehouse
+    return {
+        'clients': Client.objects.filter(company=company).in_bulk(_collect_ids(items, 'client')),
+        'warehouses': Warehouse.objects.filter(company=company).in_bulk(_collect_ids(items, 'received_warehouse')),
+        'associate_companies': AssociateCompany.objects.filter(company=company).in_bulk(_collect_ids(items, 'associate_company')),
+        'parent_wrs': WarehouseReceipt.objects.filter(company=company).in_bulk(_collect_ids(items, 'parent_wr')),
+    }
+
+
+def _shipment_reference_subquery():
+    return Subquery(
+        ShipmentItem.objects
+        .filter(wr_id=OuterRef('pk'))
+        .order_by('id')
+        .values('shipment__shipment_number')[:1]
+    )
+
+
+def _repack_reference_subquery():
+    return Subquery(
+        RepackLink.objects
+        .filter(input_wr_id=OuterRef('pk'))
+        .order_by('id')
+        .values('output_wr__wr_number')[:1]
+    )
+
+
+def with_status_references(queryset):
+    """
+    Annotate the references shown by ``wr_status_display`` (shipment number,
+    repack output wr_number) so serializing a page costs no per-row queries.
+    """
+    return queryset.annotate(
+        shipment_reference=_shipment_reference_subquery(),
+        repack_reference=_repack_reference_subquery(),
+    )
+
+
+def _status_reference(obj, attr):
+    if hasattr(obj, attr):
+        return getattr(obj, attr)
+    # Instances that did not come through with_status_references().
+    return with_status_references(WarehouseReceipt.objects.filter(pk=obj.pk)).values_list(attr, flat=True).first()
+
+
+def _serialize_lineage(lineage):
+    """Render build_lineage() output for GET /wrs/{id}/trace/?depth=all."""
+    node_ids = {node.id for node in lineage["nodes"]}
+    edges = [
+        {
+            "input_wr": link.input_wr_id,
+            "output_wr": link.output_wr_id,
+            "operation": TraceRepackSummarySerializer(link).data,
+        }
+        for link in lineage["links"]
+    ]
+    linked = {(link.input_wr_id, link.output_wr_id) for link in lineage["links"]}
+    for node in lineage["nodes"]:
+        if node.parent_wr_id in node_ids and (node.id, node.parent_wr_id) not in linked:
+            edges.append({"input_wr": node.id, "output_wr": node.parent_wr_id, "operation": None})
+
+    nodes = []
+    for node in lineage["nodes"]:
+        balance = lineage["balances"].get(node.id)
+        shipment_item = lineage["shipment_items"].get(node.id)
+        nodes.append({
+            **TraceWRMinimalSerializer(node).data,
+            "relation": node.lineage_relation,
+            "depth": node.lineage_depth,
+            "is_repack": node.is_repack,
+            "current_balance": TraceBalanceSerializer(balance).data if balance else None,
+            "shipment_linkage": TraceShipmentSummarySerializer(shipment_item.shipment).data if shipment_item else None,
+            "inventory_history": [
+                TraceInventoryTransactionLineSerializer(line).data
+                for line in lineage["ledger_lines"].get(node.id, [])
+            ],
+        })
+    return {"nodes": nodes, "edges": edges}
+
 
 class AssociateCompanyMinimalSerializer(serializers.ModelSerializer):
     class Meta:
@@ -28,60 +145,6 @@ class WRParentMinimalSerializer(serializers.ModelSerializer):
         fields = ['id', 'wr_number', 'tracking_number']
 
 
-class WarehouseReceiptLineTrackingSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = WarehouseReceiptLineTracking
-        fields = ['id', 'tracking_number', 'order']
-        read_only_fields = ['id']
-
-
-class WarehouseReceiptLineSerializer(serializers.ModelSerializer):
-    tracking_numbers = WarehouseReceiptLineTrackingSerializer(many=True, read_only=True)
-
-    def to_internal_value(self, data):
-        # Extract tracking_numbers from the raw input before DRF processes the rest.
-        # DRF does not reliably pass writable nested data for reverse FK relations
-        # through validated_data, so we handle it manually here.
-        raw_tracking = data.get('tracking_numbers', [])
-        ret = super().to_internal_value(data)
-        ret['tracking_numbers'] = [
-            t for t in raw_tracking
-            if isinstance(t, dict) and str(t.get('tracking_number', '')).strip()
-        ]
-        return ret
-
-    def validate_volume_cf(self, value):
-        if value is not None:
-            from decimal import Decimal, ROUND_HALF_UP
-            value = value.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-        return value
-
-    class Meta:
-        model = WarehouseReceiptLine
-        fields = [
-            'id',
-            'date',
-            'carrier',
-            'package_type',
-            'tracking_number',
-            'tracking_numbers',
-            'description',
-            'declared_value',
-            'length',
-            'width',
-            'height',
-            'weight',
-            'pieces',
-            'volume_cf',
-            'repackable',
-            'bill_invoice',
-            'notes',
-            'created_at',
-            'updated_at',
-        ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
-
-
 class WarehouseReceiptSerializer(serializers.ModelSerializer):
     client_details = ClientMinimalSerializer(source='client', read_only=True)
     warehouse_details = WarehouseMinimalSerializer(source='received_warehouse', read_only=True)
@@ -90,14 +153,17 @@ class WarehouseReceiptSerializer(serializers.ModelSerializer):
     wr_status_display = serializers.SerializerMethodField()
 
     def get_wr_status_display(self, obj):
-        # Check if this WR is part of a shipment
-        shipment_item = obj.shipment_items.first()
-        if shipment_item:
-            return {'type': 'processed', 'reference': shipment_item.shipment.shipment_number}
-        # Check if this WR was used as input in a repack
-        repack_link = obj.repack_as_input.first()
-        if repack_link:
-            return {'type': 'repacked', 'reference': repack_link.output_wr.wr_number}
+        # consumed_by says which relation holds the reference; receipts that
+        # are not shipped or repacked never touch the link tables. Querysets
+        # built with with_status_references() carry the reference already.
+        if obj.consumed_by == ConsumedBy.SHIPMENT:
+            reference = _status_reference(obj, 'shipment_reference')
+            if reference:
+                return {'type': 'processed', 'reference': reference}
+        if obj.consumed_by == ConsumedBy.REPACK:
+            reference = _status_reference(obj, 'repack_reference')
+            if reference:
+                return {'type': 'repacked', 'reference': reference}
         return {'type': 'not_processed', 'reference': None}
 
     # Nested package lines — readable and writable
@@ -138,13 +204,26 @@ class WarehouseReceiptSerializer(serializers.ModelSerializer):
             'recipient_address',
             'allow_repacking',
             'is_repack',
+            'consumed_by',
+            'consolidation',
+            # Line rollups
+            'total_weight',
+            'total_volume_cf',
+            'total_pieces',
+            'line_count',
+            'tracking_summary',
+            'carrier_summary',
+            'description_summary',
             # Nested lines
             'lines',
             'wr_status_display',
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ['id', 'wr_number', 'company', 'is_repack', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'wr_number', 'company', 'is_repack', 'consumed_by', 'consolidation',
+            *ROLLUP_FIELDS, 'created_at', 'updated_at',
+        ]
 
     def validate(self, data):
         # Validate dimensions and weights (legacy single-WR fields)
@@ -159,27 +238,12 @@ class WarehouseReceiptSerializer(serializers.ModelSerializer):
         if not validated_data.get('received_warehouse'):
             company = validated_data.get('company')
             if company is not None:
-                from warehouse.models import Warehouse
-                active_warehouses = list(Warehouse.objects.filter(company=company, is_active=True)[:2])
-                if len(active_warehouses) == 1:
-                    validated_data['received_warehouse'] = active_warehouses[0]
+                validated_data['received_warehouse'] = default_received_warehouse(company)
         receipt = WarehouseReceipt.objects.create(**validated_data)
-        for line_data in lines_data:
-            tracking_data = line_data.pop('tracking_numbers', [])
-            line = WarehouseReceiptLine.objects.create(
-                receipt=receipt,
-                company=receipt.company,
-                **line_data,
-            )
-            for t in tracking_data:
-                WarehouseReceiptLineTracking.objects.create(
-                    line=line,
-                    company=receipt.company,
-                    **t,
-                )
-            if tracking_data:
-                line.tracking_number = ", ".join(t['tracking_number'] for t in tracking_data)
-                line.save(update_fields=['tracking_number'])
+        save_receipt_lines(build_receipt_lines(receipt, lines_data))
+        refresh_receipt_rollups([receipt.id])
+        index_receipt_tracking([receipt.id])
+        receipt.refresh_from_db(fields=ROLLUP_FIELDS)
         return receipt
 
     def update(self, instance, validated_data):
@@ -188,41 +252,35 @@ class WarehouseReceiptSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
-        # If lines were provided, replace them (delete + recreate)
+        # If lines were provided, reconcile them by id: changed lines are
+        # updated, new ones inserted and missing ones deleted.
         if lines_data is not None:
-            instance.lines.all().delete()
-            for line_data in lines_data:
-                tracking_data = line_data.pop('tracking_numbers', [])
-                line = WarehouseReceiptLine.objects.create(
-                    receipt=instance,
-                    company=instance.company,
-                    **line_data,
-                )
-                for t in tracking_data:
-                    WarehouseReceiptLineTracking.objects.create(
-                        line=line,
-                        company=instance.company,
-                        **t,
-                    )
-                if tracking_data:
-                    line.tracking_number = ", ".join(t['tracking_number'] for t in tracking_data)
-                    line.save(update_fields=['tracking_number'])
+            reconcile_receipt_lines(instance, lines_data)
+            refresh_receipt_rollups([instance.id])
+            # Volume and weight changed: re-sum the location holding it.
+            refresh_occupancy_for_wrs([instance.id])
+        index_receipt_tracking([instance.id])
         return instance
 
 
 class WarehouseReceiptViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
-    queryset = WarehouseReceipt.objects.prefetch_related(
-        'lines',
-        'lines__tracking_numbers',
-        'shipment_items__shipment',
-        'repack_as_input__output_wr',
-    ).all()
+    queryset = WarehouseReceipt.objects.all()
     serializer_class = WarehouseReceiptSerializer
+    # Applied per requested field; see SparseFieldsetMixin.
+    field_dependencies = {
+        'client_details': {'select_related': ['client']},
+        'warehouse_details': {'select_related': ['received_warehouse']},
+        'parent_wr_details': {'select_related': ['parent_wr']},
+        'associate_company_details': {'select_related': ['associate_company']},
+        'lines': {'prefetch_related': ['lines', 'lines__tracking_numbers']},
+        'wr_status_display': {'only': ['consumed_by'], 'queryset': with_status_references},
+    }
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['client', 'status', 'received_warehouse', 'is_repack']
     search_fields = ['wr_number', 'tracking_number']
     ordering_fields = ['received_at', 'wr_number', 'created_at']
     ordering = ['-received_at']
+    pagination_class = KeysetCursorPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -230,16 +288,11 @@ class WarehouseReceiptViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
 
         # Repack picker: active, un-consumed, repack-allowed, non-repack WRs only.
         if params.get('eligible_for') == 'repack':
-            return (
-                qs.filter(
-                    status=WRStatus.ACTIVE,
-                    is_repack=False,
-                    allow_repacking=True,
-                )
-                .exclude(repack_as_input__isnull=False)
-                .exclude(shipment_items__isnull=False)
-                .exclude(consolidation_links__isnull=False)
-                .distinct()
+            return qs.filter(
+                status=WRStatus.ACTIVE,
+                consumed_by=ConsumedBy.NONE,
+                is_repack=False,
+                allow_repacking=True,
             )
 
         # Consolidation picker: active WRs and repack outputs that match the
@@ -252,7 +305,7 @@ class WarehouseReceiptViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
             if not consolidation_id:
                 return qs.none()
 
-            from consolidation.models import Consolidation, ConsolidationReceipt
+            from consolidation.models import Consolidation
             company = self.get_company()
             try:
                 consolidation = Consolidation.objects.get(
@@ -261,24 +314,13 @@ class WarehouseReceiptViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
             except Consolidation.DoesNotExist:
                 return qs.none()
 
-            other_consolidation_wr_ids = (
-                ConsolidationReceipt.objects
-                .filter(company=company)
-                .exclude(consolidation_id=consolidation_id)
-                .values('warehouse_receipt_id')
-            )
-
-            return (
-                qs.filter(
-                    status=WRStatus.ACTIVE,
-                    associate_company_id=consolidation.associate_company_id,
-                    shipping_method=consolidation.ship_type.lower(),
-                    receipt_type=consolidation.consolidation_type,
-                )
-                .exclude(repack_as_input__isnull=False)
-                .exclude(shipment_items__isnull=False)
-                .exclude(id__in=other_consolidation_wr_ids)
-                .distinct()
+            return qs.filter(
+                Q(consumed_by=ConsumedBy.NONE)
+                | Q(consumed_by=ConsumedBy.CONSOLIDATION, consolidation_id=consolidation.id),
+                status=WRStatus.ACTIVE,
+                associate_company_id=consolidation.associate_company_id,
+                shipping_method=consolidation.ship_type.lower(),
+                receipt_type=consolidation.consolidation_type,
             )
 
         # Default list views hide repack outputs unless the caller asks for them
@@ -287,68 +329,213 @@ class WarehouseReceiptViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
             qs = qs.filter(is_repack=False)
         return qs
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        # Re-read through the prefetching queryset so the response renders the
+        # reconciled lines without one tracking query per line.
+        instance = self.get_queryset().get(pk=instance.pk)
+        return Response(self.get_serializer(instance).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    @idempotent
+    def bulk(self, request):
+        """
+        POST /api/v1/wrs/bulk/
+
+        Create many receipts (with nested lines and tracking numbers) in one
+        request. The whole batch is validated up front, then valid receipts are
+        inserted with bulk_create in chunked transactions. Invalid receipts are
+        reported per item and do not block the valid ones.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Expected a non-empty list of receipts."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > BULK_MAX_ITEMS:
+            return Response(
+                {"detail": f"A bulk request may contain at most {BULK_MAX_ITEMS} receipts."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        company = self.get_company()
+        context = {'request': request, 'lookups': _bulk_lookups(company, items)}
+
+        errors = {}
+        valid = []
+        for index, item in enumerate(items):
+            serializer = WarehouseReceiptBulkItemSerializer(data=item, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+
+        # (client, tracking_number) must be unique: check the batch against
+        # itself and against the database with a single query.
+        pairs = {}
+        for index, data in valid:
+            if data.get('tracking_number'):
+                key = (data['client'].id, data['tracking_number'])
+                if key in pairs:
+                    errors[index] = {"tracking_number": ["Duplicate tracking number for this client in the batch."]}
+                else:
+                    pairs[key] = index
+        if pairs:
+            taken = set(
+                WarehouseReceipt.objects
+                .filter(
+                    client_id__in={client_id for client_id, _ in pairs},
+                    tracking_number__in={tracking for _, tracking in pairs},
+                )
+                .values_list('client_id', 'tracking_number')
+            )
+            for key in taken & pairs.keys():
+                errors[pairs[key]] = {"tracking_number": ["A receipt with this tracking number already exists for this client."]}
+        valid = [(index, data) for index, data in valid if index not in errors]
+
+        created = bulk_create_receipts(company, valid, chunk_size=BULK_CHUNK_SIZE)
+
+        results = []
+        for index in range(len(items)):
+            outcome = created.get(index)
+            if isinstance(outcome, WarehouseReceipt):
+                results.append({"index": index, "status": "created", "id": outcome.id, "wr_number": outcome.wr_number})
+            else:
+                results.append({"index": index, "status": "error", "errors": errors.get(index) or {api_settings.NON_FIELD_ERRORS_KEY: [outcome]}})
+
+        created_count = sum(1 for r in results if r["status"] == "created")
+        if created_count == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif created_count == 0:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response(
+            {"created": created_count, "failed": len(items) - created_count, "results": results},
+            status=response_status,
+        )
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_file(self, request):
+        """
+        POST /api/v1/wrs/import/  (multipart: file, format?, chunk_size?)
+
+        Upload counterpart of ``manage.py import_receipts``. The file is
+        streamed from the upload and committed in chunks; rejected rows are
+        returned in the response (capped at IMPORT_MAX_REJECTS).
+        """
+        import io
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "A 'file' upload is required."}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format') or detect_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({"detail": f"format must be one of {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunk_size = int(request.data.get('chunk_size') or DEFAULT_CHUNK_SIZE)
+        except (TypeError, ValueError):
+            chunk_size = 0
+        if chunk_size < 1:
+            return Response({"detail": "chunk_size must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rejects = []
+
+        def collect(row_number, row, error):
+            if len(rejects) < IMPORT_MAX_REJECTS:
+                rejects.append({"row": row_number, "error": error, "data": row})
+
+        importer = ReceiptImporter(self.get_company(), chunk_size=chunk_size, on_reject=collect)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        stats = importer.run(stream, fmt)
+        return Response({
+            **stats,
+            "rejects": rejects,
+            "rejects_truncated": stats['rows_rejected'] > len(rejects),
+        })
+
     @action(detail=True, methods=['get'], url_path='trace')
     def trace(self, request, pk=None):
         wr = self.get_object()
 
-        # Aggregate tracking numbers from the line tracking table (source of truth).
-        wr_trackings = []
-        for line in wr.lines.all():
-            for t in line.tracking_numbers.all():
-                if t.tracking_number:
-                    wr_trackings.append(t.tracking_number)
-        tracking_str = ', '.join(wr_trackings) if wr_trackings else None
-
         core_data = {
             "id": wr.id,
             "wr_number": wr.wr_number,
-            "tracking_number": tracking_str,
+            "tracking_number": wr.tracking_summary,
             "status": wr.status,
             "client_details": ClientSerializer(wr.client).data,
             "received_warehouse_details": WarehouseMinimalSerializer(wr.received_warehouse).data if wr.received_warehouse else None,
             "received_at": wr.received_at
         }
 
+        # ?depth=all: walk the whole repack DAG in one recursive query and
+        # batch-load balances, shipments and ledger lines for every node.
+        if request.query_params.get('depth') == 'all':
+            lineage = build_lineage(wr)
+            core_data.update(self._trace_sections(
+                wr,
+                balance=lineage["balances"].get(wr.id),
+                input_links=[link for link in lineage["links"] if link.output_wr_id == wr.id],
+                output_links=[link for link in lineage["links"] if link.input_wr_id == wr.id],
+                shipment_item=lineage["shipment_items"].get(wr.id),
+                ledger_lines=lineage["ledger_lines"].get(wr.id, []),
+                nodes_by_id={node.id: node for node in lineage["nodes"]},
+            ))
+            core_data["lineage"] = _serialize_lineage(lineage)
+            return Response(core_data)
+
         # 2) Current Balance
         balance = InventoryBalance.objects.select_related('warehouse', 'location').filter(wr=wr).first()
-        core_data["current_balance"] = TraceBalanceSerializer(balance).data if balance else None
-
-        # 3) Repack Lineage
-        repack_lineage = {}
 
-        # Is it an OUTPUT? (Find inputs pointing to this wr)
-        input_links = (
-            RepackLink.objects
-            .filter(output_wr=wr)
-            .select_related('input_wr')
-            .prefetch_related('input_wr__lines', 'input_wr__lines__tracking_numbers')
+        # 3) Repack Lineage: inputs pointing to this wr, and the output it flows to
+        input_links = list(RepackLink.objects.filter(output_wr=wr).select_related('input_wr'))
+        output_links = list(
+            RepackLink.objects.filter(input_wr=wr).select_related('output_wr', 'repack_operation')
         )
-        if input_links.exists():
-            repack_lineage["consolidated_from"] = [TraceWRMinimalSerializer(link.input_wr).data for link in input_links]
-
-        # Is it an INPUT? (Find output it flows to)
-        output_links = (
-            RepackLink.objects
-            .filter(input_wr=wr)
-            .select_related('output_wr', 'repack_operation')
-            .prefetch_related('output_wr__lines', 'output_wr__lines__tracking_numbers')
-        )
-        if output_links.exists():
-            link = output_links.first()
-            repack_lineage["consolidated_into"] = TraceWRMinimalSerializer(link.output_wr).data
-            repack_lineage["operation"] = TraceRepackSummarySerializer(link).data
-
-        core_data["repack_lineage"] = repack_lineage if repack_lineage else None
 
         # 4) Shipment Linkage
         shipment_item = ShipmentItem.objects.select_related('shipment').filter(wr=wr).order_by('-created_at').first()
-        core_data["shipment_linkage"] = TraceShipmentSummarySerializer(shipment_item.shipment).data if shipment_item else None
 
         # 5) Inventory History
         lines = InventoryTransactionLine.objects.select_related(
             'transaction', 'transaction__performed_by', 'from_location', 'to_location'
         ).filter(wr=wr).order_by('-transaction__performed_at')
 
-        core_data["inventory_history"] = [TraceInventoryTransactionLineSerializer(line).data for line in lines]
-
+        core_data.update(self._trace_sections(
+            wr, balance=balance, input_links=input_links, output_links=output_links,
+            shipment_item=shipment_item, ledger_lines=lines,
+        ))
         return Response(core_data)
+
+    def _trace_sections(self, wr, balance, input_links, output_links, shipment_item, ledger_lines, nodes_by_id=None):
+        # Prefer the receipts build_lineage already loaded over the copies
+        # select_related onto the links.
+        nodes_by_id = nodes_by_id or {}
+        repack_lineage = {}
+        if input_links:
+            repack_lineage["consolidated_from"] = [
+                TraceWRMinimalSerializer(nodes_by_id.get(link.input_wr_id) or link.input_wr).data
+                for link in input_links
+            ]
+        if output_links:
+            link = output_links[0]
+            repack_lineage["consolidated_into"] = TraceWRMinimalSerializer(
+                nodes_by_id.get(link.output_wr_id) or link.output_wr
+            ).data
+            repack_lineage["operation"] = TraceRepackSummarySerializer(link).data
+
+        return {
+            "current_balance": TraceBalanceSerializer(balance).data if balance else None,
+            "repack_lineage": repack_lineage if repack_lineage else None,
+            "shipment_linkage": TraceShipmentSummarySerializer(shipment_item.shipment).data if shipment_item else None,
+            "inventory_history": [TraceInventoryTransactionLineSerializer(line).data for line in ledger_lines],
+        }
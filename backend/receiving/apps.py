@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class ReceivingConfig(AppConfig):
     name = "receiving"
+
+    def ready(self):
+        from company.versions import track_data_version
+        track_data_version(
+            self.get_model('WarehouseReceipt'),
+            self.get_model('WarehouseReceiptLine'),
+            self.get_model('WarehouseReceiptLineTracking'),
+            self.get_model('RepackOperation'),
+            self.get_model('RepackLink'),
+            self.get_model('TrackingCode'),
+        )
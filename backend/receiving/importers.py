@@ -0,0 +1,343 @@
+"""
+Streaming warehouse-receipt import for carrier manifests and legacy exports.
+
+Files are read row by row (CSV or NDJSON) and never loaded whole. Codes in the
+file are resolved through lookup maps built once per import, rows are
+validated with the same serializer as POST /wrs/bulk/, and valid receipts are
+committed in chunks through ``bulk_create_receipts``. Memory use depends on the
+chunk size, not on the file size.
+
+Row layout (CSV columns or NDJSON keys):
+
+- ``client_code`` (required), ``warehouse_code``, ``associate_company`` (name)
+- Receipt header: ``tracking_number``, ``carrier``, ``received_at``,
+  ``shipping_method``, ``receipt_type``, ``description``, ``notes``,
+  ``location_note``, ``recipient_name``, ``recipient_address``
+- One optional package line per row: ``line_carrier``, ``line_package_type``,
+  ``line_description``, ``line_declared_value``, ``line_length``,
+  ``line_width``, ``line_height``, ``line_weight``, ``line_pieces``,
+  ``line_volume_cf`` and ``line_tracking_numbers`` (``;`` separated)
+- ``receipt_ref``: consecutive rows sharing a ref become one receipt with one
+  line per row; header columns are taken from the first row of the group.
+"""
+import csv
+import json
+import time
+
+from clients.models import Client
+from company.models import AssociateCompany
+from receiving.models import WarehouseReceipt
+from warehouse.models import Warehouse
+from .serializers import WarehouseReceiptBulkItemSerializer
+from .services_receipts import bulk_create_receipts
+
+
+FORMATS = ('csv', 'ndjson')
+
+# Receipts committed per transaction when no chunk size is given.
+DEFAULT_CHUNK_SIZE = 1000
+
+HEADER_FIELDS = [
+    'tracking_number',
+    'carrier',
+    'received_at',
+    'shipping_method',
+    'receipt_type',
+    'description',
+    'notes',
+    'location_note',
+    'recipient_name',
+    'recipient_address',
+]
+
+LINE_FIELDS = {
+    'line_carrier': 'carrier',
+    'line_package_type': 'package_type',
+    'line_description': 'description',
+    'line_declared_value': 'declared_value',
+    'line_length': 'length',
+    'line_width': 'width',
+    'line_height': 'height',
+    'line_weight': 'weight',
+    'line_pieces': 'pieces',
+    'line_volume_cf': 'volume_cf',
+}
+
+
+def detect_format(filename):
+    """Guess the file format from its extension; defaults to csv."""
+    name = (filename or '').lower()
+    if name.endswith('.ndjson') or name.endswith('.jsonl'):
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_rows(stream, fmt, on_columns=None):
+    """
+    Yield ``(row_number, row, error)`` for every record in a text stream.
+
+    ``row`` is a dict of stripped, non-empty values. ``error`` is set (and
+    ``row`` holds whatever could be recovered) when the record itself cannot
+    be parsed, so one malformed line does not abort the import.
+    ``on_columns(fieldnames)`` is called with a CSV file's header before the
+    first row.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if on_columns:
+            on_columns([name.strip() for name in reader.fieldnames or [] if name])
+        # Row numbers match the file's line numbers; line 1 is the header.
+        for number, row in enumerate(reader, start=2):
+            yield number, _clean(row), None
+        return
+
+    for number, raw in enumerate(stream, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as exc:
+            yield number, {'raw': raw}, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield number, {'raw': raw}, "Expected a JSON object."
+            continue
+        yield number, _clean(row), None
+
+
+def _clean(row):
+    cleaned = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            continue
+        cleaned[key.strip()] = value
+    return cleaned
+
+
+def _group_rows(rows):
+    """
+    Merge consecutive rows that share a ``receipt_ref`` into one group.
+
+    Yields ``[(row_number, row, error), ...]``. Only the current group is held
+    in memory, so refs must be contiguous in the file.
+    """
+    group = []
+    group_ref = None
+    for number, row, error in rows:
+        ref = row.get('receipt_ref') if error is None else None
+        if group and ref is not None and ref == group_ref:
+            group.append((number, row, error))
+            continue
+        if group:
+            yield group
+        group = [(number, row, error)]
+        group_ref = ref
+    if group:
+        yield group
+
+
+def _format_errors(errors, prefix=''):
+    if isinstance(errors, dict):
+        parts = [_format_errors(value, f"{prefix}{key}.") for key, value in errors.items()]
+    elif isinstance(errors, list):
+        if all(isinstance(e, str) for e in errors):
+            return f"{prefix.rstrip('.')}: {' '.join(errors)}" if prefix else ' '.join(errors)
+        parts = [_format_errors(value, f"{prefix}{i}.") for i, value in enumerate(errors) if value]
+    else:
+        return f"{prefix.rstrip('.')}: {errors}" if prefix else str(errors)
+    return '; '.join(p for p in parts if p)
+
+
+class RejectWriter:
+    """
+    Write rejected rows to a CSV or NDJSON file as the import runs.
+
+    A CSV reject file repeats the input's columns, so it can be corrected
+    and imported again: pass ``set_columns`` as the importer's
+    ``on_columns``. Columns a rejected row has beyond those are appended to
+    the header only until the first row is written.
+    """
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self.columns = []
+        self._csv_writer = None
+
+    def set_columns(self, columns):
+        self.columns = [name for name in columns if name not in ('row', 'error')]
+
+    def write(self, row_number, row, error):
+        if self.fmt == 'ndjson':
+            self.stream.write(json.dumps({'row': row_number, 'error': error, 'data': row}, default=str) + '\n')
+            return
+        if self._csv_writer is None:
+            fieldnames = ['row', 'error'] + self.columns
+            fieldnames += [k for k in row if k not in fieldnames]
+            self._csv_writer = csv.DictWriter(self.stream, fieldnames=fieldnames, extrasaction='ignore')
+            self._csv_writer.writeheader()
+        self._csv_writer.writerow({**row, 'row': row_number, 'error': error})
+
+
+class ReceiptImporter:
+    """
+    Import receipts for one company from a stream of rows.
+
+    ``on_reject(row_number, row, error)`` is called for every rejected row,
+    ``on_progress(stats)`` after every committed chunk and
+    ``on_columns(fieldnames)`` with a CSV file's header.
+    """
+
+    def __init__(self, company, chunk_size=DEFAULT_CHUNK_SIZE, on_reject=None, on_progress=None, on_columns=None):
+        self.company = company
+        self.chunk_size = max(1, int(chunk_size))
+        self.on_reject = on_reject
+        self.on_progress = on_progress
+        self.on_columns = on_columns
+        self.stats = {'rows': 0, 'receipts_created': 0, 'rows_rejected': 0, 'elapsed_seconds': 0.0, 'rows_per_sec': 0.0}
+        self._build_lookups()
+
+    def _build_lookups(self):
+        # Built once per import; the file never triggers a per-row lookup.
+        clients = list(Client.objects.filter(company=self.company))
+        warehouses = list(Warehouse.objects.filter(company=self.company))
+        associates = list(AssociateCompany.objects.filter(company=self.company))
+        self.client_ids = {c.client_code: c.id for c in clients}
+        self.warehouse_ids = {w.code: w.id for w in warehouses}
+        self.associate_ids = {a.name.lower(): a.id for a in associates}
+        self.serializer_context = {'lookups': {
+            'clients': {c.id: c for c in clients},
+            'warehouses': {w.id: w for w in warehouses},
+            'associate_companies': {a.id: a for a in associates},
+            'parent_wrs': {},
+        }}
+
+    def run(self, stream, fmt):
+        started = time.monotonic()
+        pending = []
+        for group in _group_rows(iter_rows(stream, fmt, on_columns=self.on_columns)):
+            self.stats['rows'] += len(group)
+            parse_error = next((error for _, _, error in group if error), None)
+            if parse_error:
+                self._reject(group, parse_error)
+                continue
+            try:
+                payload = self._to_payload([row for _, row, _ in group])
+            except ValueError as exc:
+                self._reject(group, str(exc))
+                continue
+            serializer = WarehouseReceiptBulkItemSerializer(data=payload, context=self.serializer_context)
+            if not serializer.is_valid():
+                self._reject(group, _format_errors(serializer.errors))
+                continue
+            pending.append((group, serializer.validated_data))
+            if len(pending) >= self.chunk_size:
+                self._flush(pending, started)
+                pending = []
+        if pending:
+            self._flush(pending, started)
+        self._update_rate(started)
+        return self.stats
+
+    def _to_payload(self, rows):
+        first = rows[0]
+        code = first.get('client_code')
+        if not code:
+            raise ValueError("client_code is required.")
+        if code not in self.client_ids:
+            raise ValueError(f"Unknown client_code '{code}'.")
+        payload = {'client': self.client_ids[code]}
+
+        warehouse_code = first.get('warehouse_code')
+        if warehouse_code:
+            if warehouse_code not in self.warehouse_ids:
+                raise ValueError(f"Unknown warehouse_code '{warehouse_code}'.")
+            payload['received_warehouse'] = self.warehouse_ids[warehouse_code]
+
+        associate = first.get('associate_company')
+        if associate:
+            key = str(associate).lower()
+            if key not in self.associate_ids:
+                raise ValueError(f"Unknown associate_company '{associate}'.")
+            payload['associate_company'] = self.associate_ids[key]
+
+        for field in HEADER_FIELDS:
+            if field in first:
+                payload[field] = first[field]
+        if 'shipping_method' in payload:
+            payload['shipping_method'] = str(payload['shipping_method']).lower()
+
+        lines = []
+        for row in rows:
+            line = {target: row[source] for source, target in LINE_FIELDS.items() if source in row}
+            trackings = [t.strip() for t in str(row.get('line_tracking_numbers', '')).split(';') if t.strip()]
+            if trackings:
+                line['tracking_numbers'] = [{'tracking_number': t, 'order': i} for i, t in enumerate(trackings)]
+            if line:
+                lines.append(line)
+        if lines:
+            payload['lines'] = lines
+        return payload
+
+    def _flush(self, pending, started):
+        # (client, tracking_number) is unique: check the chunk against itself
+        # and against everything already committed with a single query.
+        seen = {}
+        accepted = []
+        for group, data in pending:
+            tracking = data.get('tracking_number')
+            if tracking:
+                key = (data['client'].id, tracking)
+                if key in seen:
+                    self._reject(group, "Duplicate tracking number for this client in the file.")
+                    continue
+                seen[key] = group
+            accepted.append((group, data))
+        if seen:
+            taken = set(
+                WarehouseReceipt.objects
+                .filter(
+                    client_id__in={client_id for client_id, _ in seen},
+                    tracking_number__in={tracking for _, tracking in seen},
+                )
+                .values_list('client_id', 'tracking_number')
+            )
+            if taken:
+                rejected = {id(seen[key]) for key in taken & seen.keys()}
+                for group, _ in accepted:
+                    if id(group) in rejected:
+                        self._reject(group, "A receipt with this tracking number already exists for this client.")
+                accepted = [(group, data) for group, data in accepted if id(group) not in rejected]
+
+        if accepted:
+            results = bulk_create_receipts(
+                self.company,
+                [(i, data) for i, (_, data) in enumerate(accepted)],
+                chunk_size=len(accepted),
+            )
+            for i, (group, _) in enumerate(accepted):
+                outcome = results.get(i)
+                if isinstance(outcome, WarehouseReceipt):
+                    self.stats['receipts_created'] += 1
+                else:
+                    self._reject(group, outcome or "Receipt was not created.")
+
+        self._update_rate(started)
+        if self.on_progress:
+            self.on_progress(self.stats)
+
+    def _reject(self, group, error):
+        self.stats['rows_rejected'] += len(group)
+        if self.on_reject:
+            for number, row, _ in group:
+                self.on_reject(number, row, error)
+
+    def _update_rate(self, started):
+        elapsed = time.monotonic() - started
+        self.stats['elapsed_seconds'] = round(elapsed, 3)
+        self.stats['rows_per_sec'] = round(self.stats['rows'] / elapsed, 1) if elapsed > 0 else 0.0
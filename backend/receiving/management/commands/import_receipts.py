@@ -0,0 +1,97 @@
+"""
+Management command: import_receipts
+
+Streams warehouse receipts from a CSV or NDJSON file (carrier manifests,
+legacy exports) into one company. Rows are committed in chunks and rejected
+rows are written to a reject file next to the input. See
+receiving/importers.py for the accepted columns.
+
+Usage:
+    python manage.py import_receipts manifest.csv --company 1
+    python manage.py import_receipts legacy.ndjson --company 1 --chunk-size 5000
+    python manage.py import_receipts manifest.csv --company 1 --reject-file bad.csv
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Stream-import warehouse receipts from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import.')
+        parser.add_argument(
+            '--company',
+            type=int,
+            required=True,
+            help='Company ID the receipts belong to.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            default=None,
+            help='File format. Defaults to a guess from the file extension.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Receipts committed per transaction (default: 1000).',
+        )
+        parser.add_argument(
+            '--reject-file',
+            default=None,
+            help='Where to write rejected rows. Defaults to <path>.rejects.<ext>.',
+        )
+
+    def handle(self, *args, **options):
+        from company.models import Company
+        from receiving.importers import (
+            DEFAULT_CHUNK_SIZE, ReceiptImporter, RejectWriter, detect_format,
+        )
+
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company id={options['company']} not found.")
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        chunk_size = options['chunk_size'] or DEFAULT_CHUNK_SIZE
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        reject_path = options['reject_file'] or f"{path}.rejects.{fmt}"
+
+        def report(stats):
+            self.stdout.write(
+                f"  {stats['rows']} rows read, {stats['receipts_created']} receipts created, "
+                f"{stats['rows_rejected']} rejected ({stats['rows_per_sec']} rows/sec)"
+            )
+
+        try:
+            source = open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+
+        with source, open(reject_path, 'w', newline='', encoding='utf-8') as reject_stream:
+            rejects = RejectWriter(reject_stream, fmt)
+            importer = ReceiptImporter(
+                company,
+                chunk_size=chunk_size,
+                on_reject=rejects.write,
+                on_progress=report,
+                on_columns=rejects.set_columns,
+            )
+            self.stdout.write(self.style.NOTICE(f"Importing {path} ({fmt}) into {company.name} (id={company.pk})"))
+            stats = importer.run(source, fmt)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['rows']} rows, {stats['receipts_created']} receipts created, "
+            f"{stats['rows_rejected']} rows rejected in {stats['elapsed_seconds']}s "
+            f"({stats['rows_per_sec']} rows/sec)."
+        ))
+        if stats['rows_rejected']:
+            self.stdout.write(self.style.WARNING(f"Rejected rows written to {reject_path}"))
+        else:
+            os.remove(reject_path)
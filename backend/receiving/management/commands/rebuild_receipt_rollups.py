@@ -0,0 +1,65 @@
+"""
+Management command: rebuild_receipt_rollups
+
+Recomputes the stored line rollups on WarehouseReceipt (total weight, volume,
+pieces, line count, joined tracking numbers, carriers, descriptions) from the
+line tables. Run once after deploying the rollup columns, or to repair rows
+edited outside the API (admin, raw SQL).
+
+Usage:
+    python manage.py rebuild_receipt_rollups
+    python manage.py rebuild_receipt_rollups --company 1 --batch-size 5000
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored line rollups on warehouse receipts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Only rebuild receipts of this company ID.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Receipts recomputed per transaction (default: 1000).',
+        )
+
+    def handle(self, *args, **options):
+        from receiving.models import WarehouseReceipt
+        from company.versions import bump_data_version
+        from receiving.services_receipts import refresh_receipt_rollups
+        from inventory.services_occupancy import refresh_occupancy_for_wrs
+
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        qs = WarehouseReceipt.objects.order_by('id')
+        if options['company'] is not None:
+            qs = qs.filter(company_id=options['company'])
+
+        # Keyset pagination on id keeps every batch an index range scan.
+        rebuilt = 0
+        last_id = 0
+        while True:
+            rows = list(qs.filter(id__gt=last_id).values_list('id', 'company_id')[:batch_size])
+            if not rows:
+                break
+            ids = [wr_id for wr_id, _ in rows]
+            with transaction.atomic():
+                refresh_receipt_rollups(ids)
+                refresh_occupancy_for_wrs(ids)
+                for company_id in {company_id for _, company_id in rows}:
+                    bump_data_version(company_id)
+            rebuilt += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"  {rebuilt} receipts rebuilt...")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {rebuilt} receipts."))
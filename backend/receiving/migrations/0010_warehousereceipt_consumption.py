@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consolidation', '0002_consolidationreceipt'),
+        ('receiving', '0009_backfill_repack_outputs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='consolidation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='warehouse_receipts', to='consolidation.consolidation'),
+        ),
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='consumed_by',
+            field=models.CharField(choices=[('NONE', 'Not consumed'), ('REPACK', 'Repack'), ('SHIPMENT', 'Shipment'), ('CONSOLIDATION', 'Consolidation')], default='NONE', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='warehousereceipt',
+            index=models.Index(fields=['company', 'status', 'consumed_by'], name='receiving_w_company_98fdfa_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def backfill_consumption(apps, schema_editor):
+    WarehouseReceipt = apps.get_model('receiving', 'WarehouseReceipt')
+    RepackLink = apps.get_model('receiving', 'RepackLink')
+    ShipmentItem = apps.get_model('shipping', 'ShipmentItem')
+    ConsolidationReceipt = apps.get_model('consolidation', 'ConsolidationReceipt')
+
+    # Consolidation first so repack and shipment, which win, overwrite it.
+    # The FK keeps the newest link when a receipt was linked more than once.
+    for wr_id, consolidation_id in (
+        ConsolidationReceipt.objects.order_by('id').values_list('warehouse_receipt_id', 'consolidation_id')
+    ):
+        WarehouseReceipt.objects.filter(id=wr_id).update(
+            consumed_by='CONSOLIDATION', consolidation_id=consolidation_id,
+        )
+    WarehouseReceipt.objects.filter(
+        id__in=RepackLink.objects.values('input_wr_id')
+    ).update(consumed_by='REPACK')
+    WarehouseReceipt.objects.filter(
+        id__in=ShipmentItem.objects.values('wr_id')
+    ).update(consumed_by='SHIPMENT')
+
+
+def reset_consumption(apps, schema_editor):
+    WarehouseReceipt = apps.get_model('receiving', 'WarehouseReceipt')
+    WarehouseReceipt.objects.update(consumed_by='NONE', consolidation=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receiving', '0010_warehousereceipt_consumption'),
+        ('shipping', '0003_alter_shipment_company_alter_shipmentitem_company'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_consumption, reset_consumption),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0007_companysequence'),
+        ('receiving', '0011_backfill_consumption'),
+        ('shipping', '0003_alter_shipment_company_alter_shipmentitem_company'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=100)),
+                ('raw', models.CharField(max_length=100)),
+                ('source', models.CharField(choices=[('RECEIPT', 'Receipt'), ('LINE', 'Receipt line'), ('SHIPMENT', 'Shipment')], max_length=20)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='tracking_codes', to='company.company')),
+                ('line', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tracking_codes', to='receiving.warehousereceiptline')),
+                ('receipt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tracking_codes', to='receiving.warehousereceipt')),
+                ('shipment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tracking_codes', to='shipping.shipment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'code'], name='receiving_t_company_13c5f0_idx')],
+            },
+        ),
+    ]
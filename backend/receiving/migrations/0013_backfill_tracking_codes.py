@@ -0,0 +1,70 @@
+from django.db import migrations
+
+from receiving.tracking import MAX_CODE_LENGTH, normalize_tracking, split_tracking
+
+BATCH_SIZE = 2000
+
+
+def _rows(TrackingCode, numbers, **fields):
+    seen = set()
+    for number in numbers:
+        code = normalize_tracking(number)
+        if code and code not in seen:
+            seen.add(code)
+            yield TrackingCode(code=code, raw=str(number).strip()[:MAX_CODE_LENGTH], **fields)
+
+
+def backfill_tracking_codes(apps, schema_editor):
+    TrackingCode = apps.get_model('receiving', 'TrackingCode')
+    WarehouseReceipt = apps.get_model('receiving', 'WarehouseReceipt')
+    WarehouseReceiptLine = apps.get_model('receiving', 'WarehouseReceiptLine')
+    WarehouseReceiptLineTracking = apps.get_model('receiving', 'WarehouseReceiptLineTracking')
+    Shipment = apps.get_model('shipping', 'Shipment')
+
+    rows = []
+
+    def flush(force=False):
+        if rows and (force or len(rows) >= BATCH_SIZE):
+            TrackingCode.objects.bulk_create(rows)
+            rows.clear()
+
+    for receipt_id, company_id, number in (
+        WarehouseReceipt.objects.exclude(tracking_number__isnull=True).exclude(tracking_number='')
+        .values_list('id', 'company_id', 'tracking_number').iterator()
+    ):
+        rows.extend(_rows(TrackingCode, [number], company_id=company_id, source='RECEIPT', receipt_id=receipt_id))
+        flush()
+
+    numbers_by_line = {}
+    for line_id, number in WarehouseReceiptLineTracking.objects.values_list('line_id', 'tracking_number').iterator():
+        numbers_by_line.setdefault(line_id, []).append(number)
+    for line_id, receipt_id, company_id, summary in (
+        WarehouseReceiptLine.objects.values_list('id', 'receipt_id', 'company_id', 'tracking_number').iterator()
+    ):
+        rows.extend(_rows(
+            TrackingCode, numbers_by_line.get(line_id, []) + split_tracking(summary),
+            company_id=company_id, source='LINE', receipt_id=receipt_id, line_id=line_id,
+        ))
+        flush()
+
+    for shipment_id, company_id, number in (
+        Shipment.objects.exclude(tracking_number='').values_list('id', 'company_id', 'tracking_number').iterator()
+    ):
+        rows.extend(_rows(TrackingCode, [number], company_id=company_id, source='SHIPMENT', shipment_id=shipment_id))
+        flush()
+    flush(force=True)
+
+
+def clear_tracking_codes(apps, schema_editor):
+    apps.get_model('receiving', 'TrackingCode').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receiving', '0012_trackingcode'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_tracking_codes, clear_tracking_codes),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receiving', '0013_backfill_tracking_codes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='carrier_summary',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='description_summary',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='total_pieces',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='total_volume_cf',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='total_weight',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='warehousereceipt',
+            name='tracking_summary',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receiving', '0014_warehousereceipt_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repackoperation',
+            index=models.Index(fields=['company', '-created_at', '-id'], name='receiving_r_company_1fc74d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='warehousereceipt',
+            index=models.Index(fields=['company', '-received_at', '-id'], name='receiving_w_company_1eb994_idx'),
+        ),
+    ]
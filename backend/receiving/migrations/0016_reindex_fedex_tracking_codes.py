@@ -0,0 +1,48 @@
+from django.db import migrations
+
+from receiving.tracking import tracking_codes
+
+BATCH_SIZE = 2000
+
+
+def reindex_34_digit_codes(apps, schema_editor):
+    """
+    Rows indexed before only FedEx barcodes were cut to their last 12 digits:
+    restore the full code, and keep the short one only for real FedEx barcodes.
+    """
+    TrackingCode = apps.get_model('receiving', 'TrackingCode')
+    rows = []
+    stale = []
+
+    def flush(force=False):
+        if stale and (force or len(stale) >= BATCH_SIZE):
+            TrackingCode.objects.filter(id__in=stale).delete()
+            TrackingCode.objects.bulk_create(rows)
+            rows.clear()
+            stale.clear()
+
+    for row in TrackingCode.objects.filter(code__regex=r'^[0-9]{12}$').iterator():
+        codes = tracking_codes(row.raw)
+        if codes == [row.code]:
+            continue
+        stale.append(row.id)
+        rows.extend(
+            TrackingCode(
+                company_id=row.company_id, code=code, raw=row.raw, source=row.source,
+                receipt_id=row.receipt_id, line_id=row.line_id, shipment_id=row.shipment_id,
+            )
+            for code in codes
+        )
+        flush()
+    flush(force=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receiving', '0015_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex_34_digit_codes, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models import Max
 from django.conf import settings
 from django.utils import timezone
 from core.models import TimeStampedModel, WRStatus
 from clients.models import Client
 from warehouse.models import Warehouse
+from company.models import SequenceKind
+from company.sequences import reserve_sequence
 
 
 class WeightUnit(models.TextChoices):
@@ -22,6 +25,48 @@ class ShippingMethod(models.TextChoices):
     GROUND = "ground", "Ground"
 
 
+class ConsumedBy(models.TextChoices):
+    NONE = "NONE", "Not consumed"
+    REPACK = "REPACK", "Repack"
+    SHIPMENT = "SHIPMENT", "Shipment"
+    CONSOLIDATION = "CONSOLIDATION", "Consolidation"
+
+
+def _last_wr_seq(company_id):
+    # Receipts created before the sequence table were numbered WR-<company>-<pk>,
+    # so the highest pk in the company bounds every number already in use.
+    return WarehouseReceipt.objects.filter(company_id=company_id).aggregate(m=Max('id'))['m'] or 0
+
+
+def _last_repack_seq(company_id):
+    last = 0
+    prefix = f"REPACK-{company_id}-"
+    numbers = (
+        WarehouseReceipt.objects
+        .filter(company_id=company_id, is_repack=True, wr_number__startswith=prefix)
+        .values_list('wr_number', flat=True)
+    )
+    for number in numbers:
+        try:
+            last = max(last, int(number.rsplit('-', 1)[-1]))
+        except ValueError:
+            continue
+    return last
+
+
+def allocate_wr_numbers(company_id, count=1, is_repack=False):
+    """
+    Reserve ``count`` consecutive wr_numbers for a company in one round trip.
+    Bulk paths use this to number a whole chunk before a single bulk INSERT.
+    """
+    if is_repack:
+        kind, prefix, seed = SequenceKind.REPACK, "REPACK", _last_repack_seq
+    else:
+        kind, prefix, seed = SequenceKind.WR, "WR", _last_wr_seq
+    first = reserve_sequence(company_id, kind, count, seed=lambda: seed(company_id))
+    return [f"{prefix}-{company_id}-{n:06d}" for n in range(first, first + count)]
+
+
 class WarehouseReceipt(TimeStampedModel):
     company = models.ForeignKey('company.Company', on_delete=models.PROTECT, related_name="warehouse_receipts")
     id = models.BigAutoField(primary_key=True)
@@ -69,10 +114,37 @@ class WarehouseReceipt(TimeStampedModel):
     allow_repacking = models.BooleanField(default=False)
     is_repack = models.BooleanField(default=False, db_index=True)
 
+    # Consumption state, denormalized from RepackLink / ShipmentItem /
+    # ConsolidationReceipt so the pickers filter on an index instead of
+    # anti-joining three tables. Maintained by the repack, shipping and
+    # consolidation services; see receiving.services_consumption.
+    consumed_by = models.CharField(max_length=20, choices=ConsumedBy.choices, default=ConsumedBy.NONE)
+    consolidation = models.ForeignKey(
+        'consolidation.Consolidation',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="warehouse_receipts",
+    )
+
+    # Line rollups, recomputed by receiving.services_receipts.refresh_receipt_rollups
+    # whenever lines are written so reads never aggregate the line tables.
+    # Backfill with `manage.py rebuild_receipt_rollups`.
+    total_weight = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    total_volume_cf = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    total_pieces = models.PositiveIntegerField(default=0)
+    line_count = models.PositiveIntegerField(default=0)
+    tracking_summary = models.TextField(null=True, blank=True)
+    carrier_summary = models.TextField(null=True, blank=True)
+    description_summary = models.TextField(null=True, blank=True)
+
     class Meta:
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['received_at']),
+            models.Index(fields=['company', 'status', 'consumed_by']),
+            # Keyset pagination of the receipt list (default ordering + id).
+            models.Index(fields=['company', '-received_at', '-id']),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -83,29 +155,12 @@ class WarehouseReceipt(TimeStampedModel):
         ]
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Auto-generate wr_number after first insert if not provided.
+        # Number the receipt before the INSERT so creating it is a single write.
         # Repack outputs get their own per-company sequence: REPACK-<company>-<seq>.
-        # Regular receipts use the shared PK as the sequence: WR-<company>-<pk>.
+        # Regular receipts use WR-<company>-<seq>.
         if not self.wr_number:
-            company_id = self.company_id or 0
-            if self.is_repack:
-                last = (
-                    WarehouseReceipt.objects
-                    .filter(company_id=self.company_id, is_repack=True)
-                    .exclude(pk=self.pk)
-                    .order_by('-pk')
-                    .values_list('wr_number', flat=True)
-                    .first()
-                )
-                try:
-                    seq = (int(last.rsplit('-', 1)[-1]) + 1) if last else 1
-                except (ValueError, AttributeError, TypeError):
-                    seq = 1
-                self.wr_number = f"REPACK-{company_id}-{seq:06d}"
-            else:
-                self.wr_number = f"WR-{company_id}-{self.pk:06d}"
-            WarehouseReceipt.objects.filter(pk=self.pk).update(wr_number=self.wr_number)
+            self.wr_number = allocate_wr_numbers(self.company_id, is_repack=self.is_repack)[0]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.wr_number} ({self.client.client_code})"
@@ -196,6 +251,7 @@ class RepackOperation(TimeStampedModel):
     class Meta:
         indexes = [
             models.Index(fields=['performed_at']),
+            models.Index(fields=['company', '-created_at', '-id']),
         ]
 
     def __str__(self):
@@ -227,3 +283,40 @@ class RepackLink(TimeStampedModel):
 
     def __str__(self):
         return f"Link {self.id}: {self.input_wr.wr_number} -> {self.output_wr.wr_number}"
+
+
+class TrackingSource(models.TextChoices):
+    RECEIPT = "RECEIPT", "Receipt"
+    LINE = "LINE", "Receipt line"
+    SHIPMENT = "SHIPMENT", "Shipment"
+
+
+class TrackingCode(models.Model):
+    """
+    Scan index: one row per normalized tracking number per document, so a
+    scanned barcode resolves with a single lookup on (company, code).
+
+    Rebuilt from the source columns by receiving.services_tracking whenever a
+    receipt, its lines or a shipment is written; rows cascade with their source.
+    """
+    company = models.ForeignKey('company.Company', on_delete=models.PROTECT, related_name="tracking_codes")
+    code = models.CharField(max_length=100)
+    raw = models.CharField(max_length=100)
+    source = models.CharField(max_length=20, choices=TrackingSource.choices)
+    receipt = models.ForeignKey(
+        WarehouseReceipt, on_delete=models.CASCADE, null=True, blank=True, related_name="tracking_codes",
+    )
+    line = models.ForeignKey(
+        WarehouseReceiptLine, on_delete=models.CASCADE, null=True, blank=True, related_name="tracking_codes",
+    )
+    shipment = models.ForeignKey(
+        'shipping.Shipment', on_delete=models.CASCADE, null=True, blank=True, related_name="tracking_codes",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'code']),
+        ]
+
+    def __str__(self):
+        return f"{self.code} ({self.source})"
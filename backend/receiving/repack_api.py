@@ -3,10 +3,18 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from clients.models import Client
+from company.permissions import IsCompanyMember
+from company.utils import get_active_company
+from core.idempotency import idempotent
 from core.mixins import CompanyScopedViewSetMixin
+from core.pagination import KeysetCursorPagination
 from receiving.models import WarehouseReceipt, RepackOperation
 from warehouse.models import StorageLocation
-from .services_repack import consolidate_wrs
+from .services_repack import consolidate_wrs, consolidate_wrs_batch
+
+
+# Most consolidations one POST /repack/consolidate/batch/ may carry.
+CONSOLIDATE_BATCH_MAX = 1000
 
 class OutputLineSerializer(serializers.Serializer):
     date = serializers.DateField(required=False, allow_null=True)
@@ -41,6 +49,7 @@ class ConsolidateRequestSerializer(serializers.Serializer):
     notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
 
 class ConsolidateWRAPIView(APIView):
+    @idempotent
     def post(self, request, *args, **kwargs):
         serializer = ConsolidateRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -60,16 +69,85 @@ class ConsolidateWRAPIView(APIView):
             notes=notes
         )
 
+        return Response(
+            _consolidated_payload(result, [wr.id for wr in input_wrs], to_location.id if to_location else None),
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class BatchConsolidationSerializer(serializers.Serializer):
+    # Plain ids: the service resolves them for the whole batch at once.
+    client = serializers.IntegerField()
+    input_wrs = serializers.ListField(child=serializers.IntegerField())
+    to_location = serializers.IntegerField(required=False, allow_null=True)
+    output = OutputWRSerializer(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class ConsolidateBatchRequestSerializer(serializers.Serializer):
+    consolidations = BatchConsolidationSerializer(many=True, allow_empty=False, max_length=CONSOLIDATE_BATCH_MAX)
+    strict = serializers.BooleanField(default=False)
+
+
+class ConsolidateWRBatchAPIView(APIView):
+    """
+    POST /api/v1/repack/consolidate/batch/
+
+    Many independent consolidations (typically one per client, e.g. a
+    month-end repack run) in one request and one transaction. Each entry is
+    checked on its own: rejected entries are reported and the rest are
+    applied, or nothing is with ``strict``. 201 when every entry was
+    consolidated, 207 when some were rejected, 400 when none went through.
+    """
+    permission_classes = [IsCompanyMember]
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = ConsolidateBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        consolidations = serializer.validated_data['consolidations']
+
+        results = consolidate_wrs_batch(
+            get_active_company(request.user),
+            consolidations,
+            performed_by=request.user,
+            strict=serializer.validated_data['strict'],
+        )
+
+        payload = []
+        for index, (entry, result) in enumerate(zip(consolidations, results)):
+            if result['status'] == 'consolidated':
+                payload.append({
+                    "index": index,
+                    **_consolidated_payload(result, list(dict.fromkeys(entry['input_wrs'])), entry.get('to_location')),
+                })
+            else:
+                payload.append({"index": index, "status": result['status'], "detail": result['detail']})
+        consolidated = sum(1 for result in results if result['status'] == 'consolidated')
+        if consolidated == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif consolidated:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
         return Response({
-            "status": "consolidated",
-            "repack_operation_id": result['repack_operation'].id,
-            "output_wr_id": result['output_wr'].id,
-            "output_wr_number": result['output_wr'].wr_number,
-            "input_wr_ids": [wr.id for wr in input_wrs],
-            "consume_transaction_id": result['consume_txn'].id,
-            "produce_transaction_id": result['produce_txn'].id,
-            "to_location": to_location.id if to_location else None
-        }, status=status.HTTP_201_CREATED)
+            "consolidated": consolidated,
+            "rejected": sum(1 for result in results if result['status'] == 'rejected'),
+            "results": payload,
+        }, status=response_status)
+
+
+def _consolidated_payload(result, input_wr_ids, to_location_id):
+    return {
+        "status": "consolidated",
+        "repack_operation_id": result['repack_operation'].id,
+        "output_wr_id": result['output_wr'].id,
+        "output_wr_number": result['output_wr'].wr_number,
+        "input_wr_ids": input_wr_ids,
+        "consume_transaction_id": result['consume_txn'].id,
+        "produce_transaction_id": result['produce_txn'].id,
+        "to_location": to_location_id,
+    }
 
 
 class RepackOperationListSerializer(serializers.ModelSerializer):
@@ -130,13 +208,21 @@ class RepackOperationViewSet(CompanyScopedViewSetMixin, viewsets.ReadOnlyModelVi
     Scoped by company. Creation is handled by ConsolidateWRAPIView at
     POST /api/v1/repack/consolidate/.
     """
-    queryset = RepackOperation.objects.select_related('client').prefetch_related(
-        'links__input_wr',
-        'links__output_wr',
-    ).all()
+    queryset = RepackOperation.objects.all()
     serializer_class = RepackOperationListSerializer
+    field_dependencies = {
+        'client_name': {'select_related': ['client']},
+        'client_code': {'select_related': ['client']},
+        'operation_type_display': {'only': ['operation_type']},
+        'input_wr_count': {'prefetch_related': ['links']},
+        'input_wr_numbers': {'prefetch_related': ['links__input_wr']},
+        'output_wr_id': {'prefetch_related': ['links']},
+        'output_wr_number': {'prefetch_related': ['links__output_wr']},
+        'output_tracking_number': {'prefetch_related': ['links__output_wr']},
+    }
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['operation_type', 'client']
     search_fields = ['notes', 'client__name', 'client__client_code']
     ordering_fields = ['created_at', 'performed_at']
     ordering = ['-created_at']
+    pagination_class = KeysetCursorPagination
@@ -0,0 +1,62 @@
+from rest_framework import serializers, status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from company.permissions import IsCompanyMember
+from company.utils import get_active_company
+from shipping.models import Shipment
+from .models import TrackingCode, WarehouseReceipt
+from .services_tracking import lookup_tracking
+from .tracking import normalize_tracking
+
+
+class ScanReceiptSerializer(serializers.ModelSerializer):
+    client_code = serializers.CharField(source='client.client_code', read_only=True)
+
+    class Meta:
+        model = WarehouseReceipt
+        fields = ['id', 'wr_number', 'status', 'consumed_by', 'client', 'client_code']
+
+
+class ScanShipmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Shipment
+        fields = ['id', 'shipment_number', 'status']
+
+
+class ScanMatchSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source='source', read_only=True)
+    tracking_number = serializers.CharField(source='raw', read_only=True)
+    receipt = ScanReceiptSerializer(read_only=True)
+    line = serializers.IntegerField(source='line_id', read_only=True)
+    shipment = ScanShipmentSerializer(read_only=True)
+
+    class Meta:
+        model = TrackingCode
+        fields = ['type', 'tracking_number', 'receipt', 'line', 'shipment']
+
+
+class ScanLookupView(APIView):
+    """
+    GET /api/v1/scan/<code>/
+
+    Resolve a scanned barcode to the receipts, receipt lines and shipments that
+    carry it, through a single indexed lookup on the normalized code.
+    """
+    permission_classes = [IsCompanyMember]
+
+    def get(self, request, code, *args, **kwargs):
+        normalized = normalize_tracking(code)
+        if not normalized:
+            return Response({"detail": "Scanned code is empty."}, status=status.HTTP_400_BAD_REQUEST)
+
+        matches = lookup_tracking(get_active_company(request.user), code)
+        if not matches:
+            return Response(
+                {"detail": "No receipt or shipment matches this code.", "code": code, "normalized": normalized},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({
+            "code": code,
+            "normalized": normalized,
+            "matches": ScanMatchSerializer(matches, many=True).data,
+        })
@@ -0,0 +1,134 @@
+from rest_framework import serializers
+from .models import WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking
+
+
+class WarehouseReceiptLineTrackingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WarehouseReceiptLineTracking
+        fields = ['id', 'tracking_number', 'order']
+        read_only_fields = ['id']
+
+
+class WarehouseReceiptLineSerializer(serializers.ModelSerializer):
+    tracking_numbers = WarehouseReceiptLineTrackingSerializer(many=True, read_only=True)
+
+    def to_internal_value(self, data):
+        # Extract tracking_numbers from the raw input before DRF processes the rest.
+        # DRF does not reliably pass writable nested data for reverse FK relations
+        # through validated_data, so we handle it manually here.
+        raw_tracking = data.get('tracking_numbers', [])
+        raw_id = data.get('id')
+        ret = super().to_internal_value(data)
+        ret['tracking_numbers'] = [
+            t for t in raw_tracking
+            if isinstance(t, dict) and str(t.get('tracking_number', '')).strip()
+        ]
+        # ``id`` is read-only for output, but on update it identifies which
+        # existing line an entry refers to (see reconcile_receipt_lines).
+        if raw_id not in (None, ''):
+            try:
+                ret['id'] = int(raw_id)
+            except (TypeError, ValueError):
+                raise serializers.ValidationError({'id': ['A valid integer is required.']})
+        return ret
+
+    def validate_volume_cf(self, value):
+        if value is not None:
+            from decimal import Decimal, ROUND_HALF_UP
+            value = value.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+        return value
+
+    class Meta:
+        model = WarehouseReceiptLine
+        fields = [
+            'id',
+            'date',
+            'carrier',
+            'package_type',
+            'tracking_number',
+            'tracking_numbers',
+            'description',
+            'declared_value',
+            'length',
+            'width',
+            'height',
+            'weight',
+            'pieces',
+            'volume_cf',
+            'repackable',
+            'bill_invoice',
+            'notes',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class WarehouseReceiptBulkItemSerializer(serializers.ModelSerializer):
+    """
+    One receipt in a POST /wrs/bulk/ payload.
+
+    Foreign keys arrive as raw ids and are resolved against the company-scoped
+    lookup maps in ``context['lookups']``, which the view loads once for the
+    whole batch, so validating N receipts does not cost N queries.
+    """
+    client = serializers.IntegerField()
+    received_warehouse = serializers.IntegerField(required=False, allow_null=True)
+    associate_company = serializers.IntegerField(required=False, allow_null=True)
+    parent_wr = serializers.IntegerField(required=False, allow_null=True)
+    lines = WarehouseReceiptLineSerializer(many=True, required=False)
+
+    class Meta:
+        model = WarehouseReceipt
+        fields = [
+            'client',
+            'received_warehouse',
+            'tracking_number',
+            'carrier',
+            'status',
+            'received_at',
+            'weight_value',
+            'weight_unit',
+            'length',
+            'width',
+            'height',
+            'dimension_unit',
+            'parent_wr',
+            'description',
+            'notes',
+            'associate_company',
+            'shipping_method',
+            'receipt_type',
+            'location_note',
+            'recipient_name',
+            'recipient_address',
+            'allow_repacking',
+            'lines',
+        ]
+        # The (client, tracking_number) uniqueness check runs once per batch
+        # in WarehouseReceiptViewSet.bulk instead of once per item.
+        validators = []
+
+    def validate(self, data):
+        lookups = self.context['lookups']
+        errors = {}
+        for field in ['weight_value', 'length', 'width', 'height']:
+            if data.get(field) is not None and data[field] < 0:
+                errors[field] = [f"{field} cannot be negative."]
+        for field, lookup in [
+            ('client', 'clients'),
+            ('received_warehouse', 'warehouses'),
+            ('associate_company', 'associate_companies'),
+            ('parent_wr', 'parent_wrs'),
+        ]:
+            pk = data.get(field)
+            if pk is None:
+                continue
+            obj = lookups[lookup].get(pk)
+            if obj is None:
+                errors[field] = [f"Invalid pk \"{pk}\" - object does not exist."]
+            else:
+                data[field] = obj
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
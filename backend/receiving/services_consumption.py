@@ -0,0 +1,51 @@
+from collections import defaultdict
+
+from receiving.models import ConsumedBy, RepackLink, WarehouseReceipt
+
+
+def refresh_consumption(wr_ids):
+    """
+    Recompute ``consumed_by`` and ``consolidation`` for the given receipts from
+    the link tables.
+
+    Forward transitions (repacked, added to a shipment or a consolidation) are
+    written directly by the service that creates the link. This is for paths
+    that remove links, where the previous state has to be worked out again:
+    a shipment wins over a repack, a repack over a consolidation. The FK keeps
+    the newest consolidation link even when a repack or shipment wins.
+
+    Costs three reads plus one UPDATE per distinct resulting state.
+    """
+    from consolidation.models import ConsolidationReceipt
+    from shipping.models import ShipmentItem
+
+    wr_ids = {wr_id for wr_id in wr_ids if wr_id is not None}
+    if not wr_ids:
+        return
+
+    shipped = set(ShipmentItem.objects.filter(wr_id__in=wr_ids).values_list('wr_id', flat=True))
+    repacked = set(RepackLink.objects.filter(input_wr_id__in=wr_ids).values_list('input_wr_id', flat=True))
+    consolidation_by_wr = dict(
+        ConsolidationReceipt.objects
+        .filter(warehouse_receipt_id__in=wr_ids)
+        .order_by('id')
+        .values_list('warehouse_receipt_id', 'consolidation_id')
+    )
+
+    groups = defaultdict(list)
+    for wr_id in wr_ids:
+        consolidation_id = consolidation_by_wr.get(wr_id)
+        if wr_id in shipped:
+            state = ConsumedBy.SHIPMENT
+        elif wr_id in repacked:
+            state = ConsumedBy.REPACK
+        elif consolidation_id is not None:
+            state = ConsumedBy.CONSOLIDATION
+        else:
+            state = ConsumedBy.NONE
+        groups[(state, consolidation_id)].append(wr_id)
+
+    for (state, consolidation_id), ids in groups.items():
+        WarehouseReceipt.objects.filter(id__in=ids).update(
+            consumed_by=state, consolidation_id=consolidation_id,
+        )
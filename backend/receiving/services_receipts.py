@@ -0,0 +1,332 @@
+import logging
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from receiving.models import (
+    WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking, allocate_wr_numbers,
+)
+from company.versions import bump_data_version
+from warehouse.models import Warehouse
+from .services_tracking import index_receipt_tracking
+
+
+# Receipts per transaction in bulk_create_receipts. Each chunk costs a fixed
+# number of queries (wr_number block, receipts, lines, tracking rows, rollups,
+# scan index), so larger chunks mean fewer round trips at the price of longer-held
+# locks.
+BULK_CHUNK_SIZE = 200
+
+BULK_RECEIPT_ERROR = "The receipt could not be saved."
+
+logger = logging.getLogger(__name__)
+
+
+def default_received_warehouse(company):
+    """
+    Return the company's only active warehouse, or None when it has zero or
+    several. Mirrors the fallback WarehouseReceiptSerializer.create applies
+    when no received_warehouse is given.
+    """
+    active_warehouses = list(Warehouse.objects.filter(company=company, is_active=True)[:2])
+    if len(active_warehouses) == 1:
+        return active_warehouses[0]
+    return None
+
+
+def _tracking_order(raw):
+    try:
+        return int(raw.get('order') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def build_receipt_lines(receipt, lines_data):
+    """
+    Build unsaved WarehouseReceiptLine rows for ``receipt`` from validated line
+    data, together with the tracking rows that belong to each line.
+
+    The comma-joined ``tracking_number`` summary is filled in up front so the
+    line is written once instead of INSERT + UPDATE. Returns a list of
+    ``(line, [tracking, ...])`` pairs; the tracking rows get their ``line``
+    attached by ``save_receipt_lines`` once the line has a pk.
+    """
+    built = []
+    for line_data in lines_data:
+        line_data = dict(line_data)
+        line_data.pop('id', None)
+        tracking_data = line_data.pop('tracking_numbers', [])
+        trackings = [
+            WarehouseReceiptLineTracking(
+                company_id=receipt.company_id,
+                tracking_number=str(t['tracking_number']).strip(),
+                order=_tracking_order(t),
+            )
+            for t in tracking_data
+        ]
+        if trackings:
+            line_data['tracking_number'] = ", ".join(t.tracking_number for t in trackings)
+        line = WarehouseReceiptLine(receipt=receipt, company_id=receipt.company_id, **line_data)
+        built.append((line, trackings))
+    return built
+
+
+def save_receipt_lines(built):
+    """
+    Insert the output of ``build_receipt_lines`` (for one or many receipts)
+    with one bulk INSERT for lines and one for tracking rows.
+    """
+    lines = [line for line, _ in built]
+    if not lines:
+        return []
+    WarehouseReceiptLine.objects.bulk_create(lines)
+    trackings = []
+    for line, line_trackings in built:
+        for t in line_trackings:
+            t.line = line
+            trackings.append(t)
+    if trackings:
+        WarehouseReceiptLineTracking.objects.bulk_create(trackings)
+    return lines
+
+
+def bulk_create_receipts(company, receipts, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Insert already-validated receipts, with nested lines and tracking numbers,
+    using set-based writes.
+
+    ``receipts`` is a list of ``(key, validated_data)`` pairs where
+    ``validated_data`` has model instances for its foreign keys and an optional
+    ``lines`` list. Each chunk runs in its own transaction and costs the same
+    number of queries whatever its size. A chunk that fails at the database
+    level is rolled back and retried in halves, so only the receipts that
+    cannot be written fail; the others still commit.
+
+    Returns ``{key: WarehouseReceipt | str}`` where a string is the error for
+    a receipt that could not be saved.
+    """
+    results = {}
+    fallback_warehouse = None
+    if any(not data.get('received_warehouse') for _, data in receipts):
+        fallback_warehouse = default_received_warehouse(company)
+
+    for start in range(0, len(receipts), chunk_size):
+        _insert_receipt_chunk(company, receipts[start:start + chunk_size], fallback_warehouse, results)
+    return results
+
+
+def _insert_receipt_chunk(company, chunk, fallback_warehouse, results):
+    try:
+        with transaction.atomic():
+            created = _create_receipt_chunk(company, chunk, fallback_warehouse)
+    except DatabaseError:
+        if len(chunk) == 1:
+            logger.warning("Bulk receipt insert failed for company %s", company.id, exc_info=True)
+            results[chunk[0][0]] = BULK_RECEIPT_ERROR
+            return
+        middle = len(chunk) // 2
+        _insert_receipt_chunk(company, chunk[:middle], fallback_warehouse, results)
+        _insert_receipt_chunk(company, chunk[middle:], fallback_warehouse, results)
+        return
+    for (key, _), receipt in zip(chunk, created):
+        results[key] = receipt
+
+
+def _create_receipt_chunk(company, chunk, fallback_warehouse):
+    # Reserve the whole chunk's wr_numbers at once so every row is inserted
+    # fully numbered by a single bulk INSERT.
+    wr_numbers = allocate_wr_numbers(company.id, count=len(chunk))
+    receipts = []
+    lines_by_receipt = []
+    for (_, data), wr_number in zip(chunk, wr_numbers):
+        data = dict(data)
+        lines_data = data.pop('lines', [])
+        if not data.get('received_warehouse'):
+            data['received_warehouse'] = fallback_warehouse
+        receipt = WarehouseReceipt(company=company, wr_number=wr_number, **data)
+        receipts.append(receipt)
+        lines_by_receipt.append(lines_data)
+
+    WarehouseReceipt.objects.bulk_create(receipts)
+
+    built = []
+    for receipt, lines_data in zip(receipts, lines_by_receipt):
+        built.extend(build_receipt_lines(receipt, lines_data))
+    save_receipt_lines(built)
+    receipt_ids = [receipt.id for receipt in receipts]
+    refresh_receipt_rollups(receipt_ids)
+    index_receipt_tracking(receipt_ids)
+    bump_data_version(company.id)
+    return receipts
+
+
+# Line fields a client may write through WarehouseReceiptLineSerializer. A
+# field missing from the payload falls back to its model default, exactly as
+# if the line had been recreated.
+LINE_WRITABLE_FIELDS = [
+    'date', 'carrier', 'package_type', 'tracking_number', 'description',
+    'declared_value', 'length', 'width', 'height', 'weight', 'pieces',
+    'volume_cf', 'repackable', 'bill_invoice', 'notes',
+]
+
+
+def reconcile_receipt_lines(receipt, lines_data):
+    """
+    Bring ``receipt``'s lines in line with ``lines_data`` by id instead of
+    deleting and recreating them all.
+
+    Entries carrying the ``id`` of one of this receipt's lines update it in
+    place (only when something changed), entries without a known id become new
+    lines, and lines missing from the payload are deleted. Tracking numbers are
+    diffed per line by value. The end state is the same as a full replace, but
+    untouched lines keep their ids and ``created_at``, and the number of
+    queries does not grow with the number of lines.
+    """
+    existing = {
+        line.id: line
+        for line in receipt.lines.prefetch_related('tracking_numbers')
+    }
+    field_defaults = {
+        name: WarehouseReceiptLine._meta.get_field(name).get_default()
+        for name in LINE_WRITABLE_FIELDS
+    }
+    now = timezone.now()
+
+    to_create = []
+    to_update = []
+    changed_fields = set()
+    tracking_to_create = []
+    tracking_to_update = []
+    tracking_to_delete = []
+    kept_ids = set()
+
+    for line_data in lines_data:
+        line_data = dict(line_data)
+        line_id = line_data.pop('id', None)
+        line = existing.get(line_id) if line_id not in kept_ids else None
+        if line is None:
+            to_create.append(line_data)
+            continue
+        kept_ids.add(line.id)
+
+        tracking_data = line_data.pop('tracking_numbers', [])
+        wanted = [
+            (str(t['tracking_number']).strip(), _tracking_order(t))
+            for t in tracking_data
+        ]
+        if wanted:
+            line_data['tracking_number'] = ", ".join(number for number, _ in wanted)
+
+        dirty = False
+        for name in LINE_WRITABLE_FIELDS:
+            value = line_data.get(name, field_defaults[name])
+            if getattr(line, name) != value:
+                setattr(line, name, value)
+                changed_fields.add(name)
+                dirty = True
+
+        current = {}
+        for t in line.tracking_numbers.all():
+            current.setdefault(t.tracking_number, []).append(t)
+        for number, order in wanted:
+            matches = current.get(number)
+            if matches:
+                t = matches.pop(0)
+                if t.order != order:
+                    t.order = order
+                    t.updated_at = now
+                    tracking_to_update.append(t)
+            else:
+                tracking_to_create.append(WarehouseReceiptLineTracking(
+                    line=line, company_id=receipt.company_id,
+                    tracking_number=number, order=order,
+                ))
+        for leftovers in current.values():
+            tracking_to_delete.extend(t.id for t in leftovers)
+
+        if dirty:
+            line.updated_at = now
+            to_update.append(line)
+
+    removed_ids = [line_id for line_id in existing if line_id not in kept_ids]
+    if removed_ids:
+        WarehouseReceiptLine.objects.filter(id__in=removed_ids).delete()
+    if to_update:
+        WarehouseReceiptLine.objects.bulk_update(to_update, sorted(changed_fields) + ['updated_at'])
+    if tracking_to_delete:
+        WarehouseReceiptLineTracking.objects.filter(id__in=tracking_to_delete).delete()
+    if tracking_to_update:
+        WarehouseReceiptLineTracking.objects.bulk_update(tracking_to_update, ['order', 'updated_at'])
+    if tracking_to_create:
+        WarehouseReceiptLineTracking.objects.bulk_create(tracking_to_create)
+    save_receipt_lines(build_receipt_lines(receipt, to_create))
+
+
+ROLLUP_FIELDS = [
+    'total_weight', 'total_volume_cf', 'total_pieces', 'line_count',
+    'tracking_summary', 'carrier_summary', 'description_summary',
+]
+
+
+def refresh_receipt_rollups(receipt_ids):
+    """
+    Recompute the stored line rollups (``ROLLUP_FIELDS``) for the given
+    receipts from their lines and tracking rows.
+
+    Weight and volume stay NULL when no line carries a value. Tracking numbers
+    are joined in line order; carriers and descriptions are de-duplicated.
+    Costs two reads and one bulk UPDATE however many receipts are passed.
+    """
+    receipt_ids = {receipt_id for receipt_id in receipt_ids if receipt_id is not None}
+    if not receipt_ids:
+        return
+
+    rollups = {
+        receipt_id: {
+            'total_weight': None, 'total_volume_cf': None, 'total_pieces': 0, 'line_count': 0,
+            'trackings': [], 'carriers': [], 'descriptions': [],
+        }
+        for receipt_id in receipt_ids
+    }
+    receipt_by_line = {}
+    for line_id, receipt_id, weight, volume_cf, pieces, carrier, description in (
+        WarehouseReceiptLine.objects
+        .filter(receipt_id__in=receipt_ids)
+        .order_by('receipt_id', 'id')
+        .values_list('id', 'receipt_id', 'weight', 'volume_cf', 'pieces', 'carrier', 'description')
+    ):
+        receipt_by_line[line_id] = receipt_id
+        rollup = rollups[receipt_id]
+        rollup['line_count'] += 1
+        rollup['total_pieces'] += pieces or 0
+        if weight is not None:
+            rollup['total_weight'] = (rollup['total_weight'] or 0) + weight
+        if volume_cf is not None:
+            rollup['total_volume_cf'] = (rollup['total_volume_cf'] or 0) + volume_cf
+        if carrier and carrier not in rollup['carriers']:
+            rollup['carriers'].append(carrier)
+        if description and description not in rollup['descriptions']:
+            rollup['descriptions'].append(description)
+
+    if receipt_by_line:
+        for line_id, number in (
+            WarehouseReceiptLineTracking.objects
+            .filter(line_id__in=list(receipt_by_line))
+            .order_by('line_id', 'order', 'id')
+            .values_list('line_id', 'tracking_number')
+        ):
+            if number:
+                rollups[receipt_by_line[line_id]]['trackings'].append(number)
+
+    receipts = []
+    for receipt_id, rollup in rollups.items():
+        receipts.append(WarehouseReceipt(
+            id=receipt_id,
+            total_weight=rollup['total_weight'],
+            total_volume_cf=rollup['total_volume_cf'],
+            total_pieces=rollup['total_pieces'],
+            line_count=rollup['line_count'],
+            tracking_summary=', '.join(rollup['trackings']) or None,
+            carrier_summary=', '.join(rollup['carriers']) or None,
+            description_summary=' | '.join(rollup['descriptions']) or None,
+        ))
+    WarehouseReceipt.objects.bulk_update(receipts, ROLLUP_FIELDS)
@@ -1,16 +1,26 @@
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from receiving.models import (
     WarehouseReceipt,
     WarehouseReceiptLine,
     WRStatus,
+    ConsumedBy,
     RepackOperation,
     OperationType,
     RepackLink,
+    allocate_wr_numbers,
 )
+from clients.models import Client
+from company.versions import bump_data_version
+from receiving.services_receipts import refresh_receipt_rollups
+from receiving.services_tracking import index_receipt_tracking
 from inventory.models import InventoryBalance, InventoryTransaction, InventoryTransactionLine, TxnType
+from inventory.services_occupancy import adjust_location_occupancy
+from shipping.models import ShipmentItem
+from warehouse.models import StorageLocation
 
 
 def _to_decimal(value):
@@ -32,191 +42,362 @@ def _compute_volume_cf(length, width, height):
         return None
 
 
-def consolidate_wrs(client, input_wrs, to_location, output_data, performed_by=None, notes="", company=None):
-    if not performed_by:
-        raise DRFValidationError("User tracking is missing. performed_by is required.")
+def _lock_inputs(wr_ids):
+    """
+    ``{id: receipt}`` for the input receipts, locked in id order and annotated
+    with ``is_repacked`` and ``is_shipped``, in one query.
+    """
+    wrs = (
+        WarehouseReceipt.objects
+        .select_for_update()
+        .filter(id__in=wr_ids)
+        .order_by('id')
+        .annotate(
+            is_repacked=Exists(RepackLink.objects.filter(input_wr=OuterRef('pk'))),
+            is_shipped=Exists(ShipmentItem.objects.filter(wr=OuterRef('pk'))),
+        )
+    )
+    return {wr.id: wr for wr in wrs}
 
-    if len(input_wrs) < 2:
-        raise DRFValidationError("Consolidation requires at least 2 input warehouse receipts.")
 
-    # Derive company from client if not provided
-    if company is None:
-        company = client.company
+def _plan_consolidation(job, wrs_by_id, balance_by_wr, claimed):
+    """
+    Check one consolidation against the locked inputs and balances. Returns
+    ``(plan, None)`` or ``(None, error)``; ``claimed`` holds the inputs
+    already taken by earlier consolidations of the same batch.
+    """
+    client = job['client']
+    to_location = job.get('to_location')
+    wr_ids = list(dict.fromkeys(job['wr_ids']))
+    if len(wr_ids) < 2:
+        return None, "Consolidation requires at least 2 input warehouse receipts."
 
-    # 1. Input Validation
     # Ensure all are ACTIVE, belong to same client, and not already consumed by a repack or shipment
-    for wr in input_wrs:
+    input_wrs = []
+    for wr_id in wr_ids:
+        wr = wrs_by_id.get(wr_id)
+        if wr is None:
+            return None, f"Input WR {wr_id} does not exist."
         if wr.status != WRStatus.ACTIVE:
-            raise DRFValidationError(f"Input WR {wr.wr_number} is not available (status: {wr.status}).")
+            return None, f"Input WR {wr.wr_number} is not available (status: {wr.status})."
         if wr.client_id != client.id:
-            raise DRFValidationError(f"Input WR {wr.wr_number} does not belong to the specified client.")
-        if wr.repack_as_input.exists():
-            raise DRFValidationError(f"Input WR {wr.wr_number} is already part of another repack.")
-        if wr.shipment_items.exists():
-            raise DRFValidationError(f"Input WR {wr.wr_number} is already in a shipment.")
+            return None, f"Input WR {wr.wr_number} does not belong to the specified client."
+        if wr.is_repacked:
+            return None, f"Input WR {wr.wr_number} is already part of another repack."
+        if wr.is_shipped:
+            return None, f"Input WR {wr.wr_number} is already in a shipment."
+        if wr_id in claimed:
+            return None, f"Input WR {wr.wr_number} is already part of another consolidation in this batch."
+        input_wrs.append(wr)
 
-    with transaction.atomic():
-        wr_ids = [wr.id for wr in input_wrs]
-
-        # Balances may or may not exist — putaway is optional. Lock whatever is there.
-        existing_balances = list(InventoryBalance.objects.select_for_update().filter(wr_id__in=wr_ids))
-        balance_by_wr = {b.wr_id: b for b in existing_balances}
-
-        def wr_warehouse_id(wr):
-            b = balance_by_wr.get(wr.id)
-            return b.warehouse_id if b else wr.received_warehouse_id
-
-        def wr_warehouse(wr):
-            b = balance_by_wr.get(wr.id)
-            return b.warehouse if b else wr.received_warehouse
-
-        # Destination warehouse: use to_location.warehouse if provided,
-        # otherwise derive from the inputs (which must all share one warehouse).
-        if to_location is not None:
-            destination_warehouse = to_location.warehouse
-            destination_warehouse_id = to_location.warehouse_id
-            for wr in input_wrs:
-                wh_id = wr_warehouse_id(wr)
-                if wh_id is None:
-                    raise DRFValidationError(f"WR {wr.wr_number} has no warehouse assigned.")
-                if wh_id != destination_warehouse_id:
-                    raise DRFValidationError(f"WR {wr.wr_number} is in warehouse {wh_id} but destination is {destination_warehouse_id}.")
-        else:
-            input_warehouse_ids = {wr_warehouse_id(wr) for wr in input_wrs}
-            if None in input_warehouse_ids:
-                raise DRFValidationError("All input WRs must have a warehouse assigned.")
-            if len(input_warehouse_ids) != 1:
-                raise DRFValidationError("All input WRs must be in the same warehouse when no destination location is specified.")
-            destination_warehouse = wr_warehouse(input_wrs[0])
-            destination_warehouse_id = destination_warehouse.id
-
-        # 2. Create RepackOperation
-        operation = RepackOperation.objects.create(
+    # Balances may or may not exist — putaway is optional.
+    def wr_warehouse_id(wr):
+        b = balance_by_wr.get(wr.id)
+        return b.warehouse_id if b else wr.received_warehouse_id
+
+    # Destination warehouse: use to_location.warehouse if provided,
+    # otherwise derive from the inputs (which must all share one warehouse).
+    if to_location is not None:
+        destination_warehouse_id = to_location.warehouse_id
+        for wr in input_wrs:
+            wh_id = wr_warehouse_id(wr)
+            if wh_id is None:
+                return None, f"WR {wr.wr_number} has no warehouse assigned."
+            if wh_id != destination_warehouse_id:
+                return None, f"WR {wr.wr_number} is in warehouse {wh_id} but destination is {destination_warehouse_id}."
+    else:
+        input_warehouse_ids = {wr_warehouse_id(wr) for wr in input_wrs}
+        if None in input_warehouse_ids:
+            return None, "All input WRs must have a warehouse assigned."
+        if len(input_warehouse_ids) != 1:
+            return None, "All input WRs must be in the same warehouse when no destination location is specified."
+        destination_warehouse_id = input_warehouse_ids.pop()
+
+    claimed.update(wr_ids)
+    return {
+        **job,
+        'input_wrs': input_wrs,
+        'balances': [balance_by_wr[wr.id] for wr in input_wrs if wr.id in balance_by_wr],
+        'destination_warehouse_id': destination_warehouse_id,
+    }, None
+
+
+def _plan_consolidations(jobs):
+    """
+    Lock the inputs and balances of every job (one query each) and check
+    them. Returns a list with a plan or an error string per job.
+    """
+    wr_ids = {wr_id for job in jobs for wr_id in job['wr_ids']}
+    wrs_by_id = _lock_inputs(wr_ids)
+    # Balances may or may not exist — putaway is optional. Lock whatever is there.
+    balance_by_wr = {
+        b.wr_id: b
+        for b in InventoryBalance.objects.select_for_update().filter(wr_id__in=wr_ids).order_by('id')
+    }
+    claimed = set()
+    outcomes = []
+    for job in jobs:
+        plan, error = _plan_consolidation(job, wrs_by_id, balance_by_wr, claimed)
+        outcomes.append(plan if plan is not None else error)
+    return outcomes
+
+
+def _output_line(output_wr, raw):
+    length = _to_decimal(raw.get('length'))
+    width = _to_decimal(raw.get('width'))
+    height = _to_decimal(raw.get('height'))
+    volume_cf = _to_decimal(raw.get('volume_cf'))
+    if volume_cf is None:
+        volume_cf = _compute_volume_cf(length, width, height)
+    return WarehouseReceiptLine(
+        receipt=output_wr,
+        company_id=output_wr.company_id,
+        date=raw.get('date') or None,
+        carrier=raw.get('carrier') or None,
+        package_type=raw.get('package_type') or None,
+        tracking_number=raw.get('tracking_number') or None,
+        description=raw.get('description') or None,
+        declared_value=_to_decimal(raw.get('declared_value')),
+        length=length,
+        width=width,
+        height=height,
+        weight=_to_decimal(raw.get('weight')),
+        pieces=raw.get('pieces') or 1,
+        volume_cf=volume_cf,
+    )
+
+
+def _execute_consolidations(company, plans, performed_by):
+    """
+    Write the planned consolidations. Every kind of row is inserted with one
+    bulk INSERT for all plans, so the query count does not depend on how many
+    consolidations or inputs there are.
+    """
+    # 1. RepackOperations
+    operations = RepackOperation.objects.bulk_create([
+        RepackOperation(
             company=company,
-            client=client,
+            client=plan['client'],
             performed_by=performed_by,
             operation_type=OperationType.CONSOLIDATE,
-            notes=notes
+            notes=plan.get('notes') or "",
         )
+        for plan in plans
+    ])
 
-        # 3. Create the Output WR. Repack outputs always get server-generated
-        # REPACK-<company>-<seq> numbering; any client-provided wr_number is ignored.
-        output_wr = WarehouseReceipt.objects.create(
+    # 2. Output WRs. Repack outputs always get server-generated
+    # REPACK-<company>-<seq> numbering, reserved here as one block; any
+    # client-provided wr_number is ignored.
+    wr_numbers = allocate_wr_numbers(company.id, count=len(plans), is_repack=True)
+    output_wrs = []
+    for plan, wr_number in zip(plans, wr_numbers):
+        output_data = plan.get('output_data') or {}
+        output_wrs.append(WarehouseReceipt(
             company=company,
-            client=client,
+            client=plan['client'],
+            wr_number=wr_number,
             is_repack=True,
-            received_warehouse=destination_warehouse,
+            received_warehouse_id=plan['destination_warehouse_id'],
             tracking_number=output_data.get('tracking_number'),
             carrier=output_data.get('carrier'),
             description=output_data.get('description'),
             location_note=output_data.get('location_note'),
             notes=output_data.get('notes'),
-            status=WRStatus.ACTIVE
-        )
+            status=WRStatus.ACTIVE,
+        ))
+    WarehouseReceipt.objects.bulk_create(output_wrs)
 
-        # 3b. Persist any package lines the user entered on the repack form.
-        output_lines = output_data.get('lines') or []
-        for raw in output_lines:
-            length = _to_decimal(raw.get('length'))
-            width = _to_decimal(raw.get('width'))
-            height = _to_decimal(raw.get('height'))
-            volume_cf = _to_decimal(raw.get('volume_cf'))
-            if volume_cf is None:
-                volume_cf = _compute_volume_cf(length, width, height)
-            WarehouseReceiptLine.objects.create(
-                receipt=output_wr,
-                company=company,
-                date=raw.get('date') or None,
-                carrier=raw.get('carrier') or None,
-                package_type=raw.get('package_type') or None,
-                tracking_number=raw.get('tracking_number') or None,
-                description=raw.get('description') or None,
-                declared_value=_to_decimal(raw.get('declared_value')),
-                length=length,
-                width=width,
-                height=height,
-                weight=_to_decimal(raw.get('weight')),
-                pieces=raw.get('pieces') or 1,
-                volume_cf=volume_cf,
-            )
-
-        # 4. Create RepackLinks and Update Input WRs
-        links_to_create = []
-        for wr in input_wrs:
-            links_to_create.append(
-                RepackLink(company=company, repack_operation=operation, input_wr=wr, output_wr=output_wr)
-            )
+    # 2b. Persist any package lines the user entered on the repack form.
+    WarehouseReceiptLine.objects.bulk_create([
+        _output_line(output_wr, raw)
+        for plan, output_wr in zip(plans, output_wrs)
+        for raw in (plan.get('output_data') or {}).get('lines') or []
+    ])
+    output_ids = [output_wr.id for output_wr in output_wrs]
+    refresh_receipt_rollups(output_ids)
+    index_receipt_tracking(output_ids)
+
+    # 3. RepackLinks and input WRs
+    links = []
+    input_wrs = []
+    for plan, operation, output_wr in zip(plans, operations, output_wrs):
+        for wr in plan['input_wrs']:
+            links.append(RepackLink(company=company, repack_operation=operation, input_wr=wr, output_wr=output_wr))
             wr.status = WRStatus.INACTIVE
             wr.parent_wr = output_wr
+            wr.consumed_by = ConsumedBy.REPACK
+            input_wrs.append(wr)
+    RepackLink.objects.bulk_create(links)
+    WarehouseReceipt.objects.bulk_update(input_wrs, ['status', 'parent_wr', 'consumed_by'])
 
-        RepackLink.objects.bulk_create(links_to_create)
-        WarehouseReceipt.objects.bulk_update(input_wrs, ['status', 'parent_wr'])
-
-        # 5. Inventory Transactions
-        # CONSUME transaction for all inputs
-        consume_txn = InventoryTransaction.objects.create(
-            company=company,
-            client=client,
-            txn_type=TxnType.REPACK_CONSUME,
-            reference_type="REPACK_OP",
-            reference_id=str(operation.id),
-            performed_by=performed_by,
-            notes=f"Consumed for consolidation {operation.id}"
-        )
-
-        consume_lines = []
-        for wr in input_wrs:
-            balance = balance_by_wr.get(wr.id)
-            consume_lines.append(
-                InventoryTransactionLine(
-                    company=company,
-                    transaction=consume_txn,
-                    wr=wr,
-                    from_location=balance.location if balance else None,
-                    to_location=None,
-                    qty=1
-                )
-            )
-        InventoryTransactionLine.objects.bulk_create(consume_lines)
-
-        # Execute consume (delete any existing balances for the inputs)
-        if existing_balances:
-            InventoryBalance.objects.filter(id__in=[b.id for b in existing_balances]).delete()
-
-        # PRODUCE transaction for output
-        produce_txn = InventoryTransaction.objects.create(
-            company=company,
-            client=client,
-            txn_type=TxnType.REPACK_PRODUCE,
-            reference_type="REPACK_OP",
-            reference_id=str(operation.id),
-            performed_by=performed_by,
-            notes=f"Produced from consolidation {operation.id}"
-        )
+    # 4. Inventory transactions: a CONSUME for the inputs and a PRODUCE for
+    # the output of each operation.
+    txns = []
+    for plan, operation in zip(plans, operations):
+        for txn_type, notes in (
+            (TxnType.REPACK_CONSUME, f"Consumed for consolidation {operation.id}"),
+            (TxnType.REPACK_PRODUCE, f"Produced from consolidation {operation.id}"),
+        ):
+            txns.append(InventoryTransaction(
+                company=company,
+                client=plan['client'],
+                txn_type=txn_type,
+                reference_type="REPACK_OP",
+                reference_id=str(operation.id),
+                repack_operation=operation,
+                performed_by=performed_by,
+                notes=notes,
+            ))
+    InventoryTransaction.objects.bulk_create(txns)
+    consume_txns, produce_txns = txns[0::2], txns[1::2]
 
-        InventoryTransactionLine.objects.create(
+    txn_lines = []
+    for plan, output_wr, consume_txn, produce_txn in zip(plans, output_wrs, consume_txns, produce_txns):
+        location_by_wr = {b.wr_id: b.location_id for b in plan['balances']}
+        for wr in plan['input_wrs']:
+            txn_lines.append(InventoryTransactionLine(
+                company=company,
+                transaction=consume_txn,
+                wr=wr,
+                from_location_id=location_by_wr.get(wr.id),
+                to_location=None,
+                qty=1,
+            ))
+        txn_lines.append(InventoryTransactionLine(
             company=company,
             transaction=produce_txn,
             wr=output_wr,
             from_location=None,
-            to_location=to_location,
-            qty=1
-        )
+            to_location=plan.get('to_location'),
+            qty=1,
+        ))
+    InventoryTransactionLine.objects.bulk_create(txn_lines)
 
-        # 6. Create Output Balance (location may be null if none was specified)
-        InventoryBalance.objects.create(
+    # 5. Consume the input balances and create the output balances (location
+    # may be null if none was specified).
+    consumed = [b for plan in plans for b in plan['balances']]
+    if consumed:
+        InventoryBalance.objects.filter(id__in=[b.id for b in consumed]).delete()
+    InventoryBalance.objects.bulk_create([
+        InventoryBalance(
             company=company,
-            client=client,
-            warehouse=destination_warehouse,
-            location=to_location,
+            client=plan['client'],
+            warehouse_id=plan['destination_warehouse_id'],
+            location=plan.get('to_location'),
             wr=output_wr,
             on_hand_qty=1,
-            reserved_qty=0
+            reserved_qty=0,
         )
+        for plan, output_wr in zip(plans, output_wrs)
+    ])
+    adjust_location_occupancy(company.id, [
+        *((b.location_id, b.wr_id, -1) for b in consumed),
+        *(
+            (plan['to_location'].id if plan.get('to_location') else None, output_wr.id, 1)
+            for plan, output_wr in zip(plans, output_wrs)
+        ),
+    ])
+    bump_data_version(company.id)
 
-        return {
+    return [
+        {
             "repack_operation": operation,
             "output_wr": output_wr,
             "consume_txn": consume_txn,
-            "produce_txn": produce_txn
+            "produce_txn": produce_txn,
         }
+        for operation, output_wr, consume_txn, produce_txn in zip(operations, output_wrs, consume_txns, produce_txns)
+    ]
+
+
+def consolidate_wrs(client, input_wrs, to_location, output_data, performed_by=None, notes="", company=None):
+    """
+    Consolidate ``input_wrs`` into one new repack receipt for ``client``.
+
+    The inputs are locked and checked in one annotated query and every row is
+    written in bulk, so the cost does not grow with the number of inputs.
+    Raises ``DRFValidationError`` when an input is not eligible.
+    """
+    if not performed_by:
+        raise DRFValidationError("User tracking is missing. performed_by is required.")
+
+    if len(input_wrs) < 2:
+        raise DRFValidationError("Consolidation requires at least 2 input warehouse receipts.")
+
+    # Derive company from client if not provided
+    if company is None:
+        company = client.company
+
+    job = {
+        'client': client,
+        'wr_ids': [wr.id for wr in input_wrs],
+        'to_location': to_location,
+        'output_data': output_data,
+        'notes': notes,
+    }
+    with transaction.atomic():
+        [outcome] = _plan_consolidations([job])
+        if isinstance(outcome, str):
+            raise DRFValidationError(outcome)
+        [result] = _execute_consolidations(company, [outcome], performed_by)
+        return result
+
+
+def consolidate_wrs_batch(company, consolidations, performed_by, strict=False):
+    """
+    Run many independent consolidations (typically one per client) for
+    ``company`` in one transaction.
+
+    ``consolidations`` is a list of dicts with ``client`` and ``to_location``
+    (ids; ``to_location`` optional), ``input_wrs`` (ids) and optional
+    ``output`` and ``notes``, as for ``consolidate_wrs``. Clients and
+    locations are resolved in one query each, every input and balance of the
+    batch is locked in one query each, and the writes are shared, so a
+    month-end run for hundreds of clients costs a fixed number of queries.
+
+    Returns a list with one dict per consolidation, in order: ``status``
+    ``consolidated`` with what ``consolidate_wrs`` returns, or ``rejected``
+    with a ``detail``. The rejected ones are left alone and the rest go
+    through; with ``strict`` any rejection leaves the whole batch untouched.
+    """
+    if not performed_by:
+        raise DRFValidationError("User tracking is missing. performed_by is required.")
+
+    clients = Client.objects.in_bulk({c['client'] for c in consolidations})
+    locations = StorageLocation.objects.in_bulk({c['to_location'] for c in consolidations if c.get('to_location')})
+
+    with transaction.atomic():
+        jobs = []
+        results = [None] * len(consolidations)
+        for index, raw in enumerate(consolidations):
+            client = clients.get(raw['client'])
+            location_id = raw.get('to_location')
+            location = locations.get(location_id) if location_id else None
+            if client is None or client.company_id != company.id:
+                results[index] = {"status": "rejected", "detail": f"Client {raw['client']} does not exist."}
+            elif location_id and (location is None or location.company_id != company.id):
+                results[index] = {"status": "rejected", "detail": f"Location {location_id} does not exist."}
+            else:
+                jobs.append((index, {
+                    'client': client,
+                    'wr_ids': raw['input_wrs'],
+                    'to_location': location,
+                    'output_data': raw.get('output') or {},
+                    'notes': raw.get('notes') or "",
+                }))
+
+        plans = []
+        for (index, _), outcome in zip(jobs, _plan_consolidations([job for _, job in jobs])):
+            if isinstance(outcome, str):
+                results[index] = {"status": "rejected", "detail": outcome}
+            else:
+                plans.append((index, outcome))
+
+        if plans and not (strict and len(plans) < len(consolidations)):
+            executed = _execute_consolidations(company, [plan for _, plan in plans], performed_by)
+            for (index, _), result in zip(plans, executed):
+                results[index] = {"status": "consolidated", **result}
+        else:
+            for index, plan in plans:
+                results[index] = {"status": "not_applied", "detail": "Not applied: another consolidation in the batch was rejected."}
+        return results
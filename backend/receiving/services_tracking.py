@@ -0,0 +1,105 @@
+from django.db.models import Case, IntegerField, Value, When
+
+from receiving.models import (
+    TrackingCode, TrackingSource, WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking,
+)
+from receiving.tracking import MAX_CODE_LENGTH, split_tracking, tracking_codes
+
+
+def _code_rows(numbers, **fields):
+    rows = []
+    seen = set()
+    for number in numbers:
+        for code in tracking_codes(number):
+            if code in seen:
+                continue
+            seen.add(code)
+            rows.append(TrackingCode(code=code, raw=str(number).strip()[:MAX_CODE_LENGTH], **fields))
+    return rows
+
+
+def index_receipt_tracking(receipt_ids):
+    """
+    Rebuild the scan index for the given receipts: the header tracking number
+    plus every line's numbers (its tracking rows and its joined summary).
+
+    Set-based: a fixed number of queries however many receipts are passed, so
+    bulk paths call it once per chunk.
+    """
+    receipt_ids = {receipt_id for receipt_id in receipt_ids if receipt_id is not None}
+    if not receipt_ids:
+        return
+    TrackingCode.objects.filter(receipt_id__in=receipt_ids).delete()
+
+    rows = []
+    for receipt_id, company_id, tracking_number in (
+        WarehouseReceipt.objects.filter(id__in=receipt_ids).values_list('id', 'company_id', 'tracking_number')
+    ):
+        rows.extend(_code_rows(
+            [tracking_number] if tracking_number else [],
+            company_id=company_id, source=TrackingSource.RECEIPT, receipt_id=receipt_id,
+        ))
+
+    numbers_by_line = {}
+    for line_id, number in (
+        WarehouseReceiptLineTracking.objects
+        .filter(line__receipt_id__in=receipt_ids)
+        .values_list('line_id', 'tracking_number')
+    ):
+        numbers_by_line.setdefault(line_id, []).append(number)
+    for line_id, receipt_id, company_id, summary in (
+        WarehouseReceiptLine.objects
+        .filter(receipt_id__in=receipt_ids)
+        .values_list('id', 'receipt_id', 'company_id', 'tracking_number')
+    ):
+        rows.extend(_code_rows(
+            numbers_by_line.get(line_id, []) + split_tracking(summary),
+            company_id=company_id, source=TrackingSource.LINE, receipt_id=receipt_id, line_id=line_id,
+        ))
+
+    if rows:
+        TrackingCode.objects.bulk_create(rows)
+
+
+def index_shipment_tracking(shipments):
+    """Rebuild the scan index rows for the given shipments' tracking numbers."""
+    shipments = [shipment for shipment in shipments if shipment.pk]
+    if not shipments:
+        return
+    TrackingCode.objects.filter(shipment_id__in=[shipment.pk for shipment in shipments]).delete()
+    rows = []
+    for shipment in shipments:
+        rows.extend(_code_rows(
+            [shipment.tracking_number] if shipment.tracking_number else [],
+            company_id=shipment.company_id, source=TrackingSource.SHIPMENT, shipment_id=shipment.pk,
+        ))
+    if rows:
+        TrackingCode.objects.bulk_create(rows)
+
+
+_SOURCE_RANK = {TrackingSource.RECEIPT: 0, TrackingSource.LINE: 1, TrackingSource.SHIPMENT: 2}
+
+
+def lookup_tracking(company, raw, limit=50):
+    """
+    Resolve a scanned code to its index rows with one query on (company, code).
+    Rows carrying the code exactly as scanned come first (a full FedEx barcode
+    before its 12-digit tracking number); within each, receipt headers, then
+    lines, then shipments.
+    """
+    codes = tracking_codes(raw)
+    if not codes:
+        return []
+    matches = list(
+        TrackingCode.objects
+        .filter(company=company, code__in=codes)
+        .annotate(inexact=Case(When(code=codes[0], then=Value(0)), default=Value(1), output_field=IntegerField()))
+        .order_by('inexact', 'id')
+        .select_related('receipt', 'receipt__client', 'shipment')[:limit]
+    )
+    matches.sort(key=lambda match: (match.inexact, _SOURCE_RANK.get(match.source, 3), match.id))
+    # A barcode indexed under both its codes is reported once, by its best match.
+    unique = {}
+    for match in matches:
+        unique.setdefault((match.source, match.receipt_id, match.line_id, match.shipment_id), match)
+    return list(unique.values())
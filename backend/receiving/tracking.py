@@ -0,0 +1,66 @@
+"""
+Tracking-number normalization shared by the scan index and scan lookups.
+
+Both the stored codes and the scanned input go through ``tracking_codes``,
+so a barcode matches whatever was typed on the receipt regardless of case,
+spacing, dashes or the carrier framing printed around the number.
+"""
+import re
+
+# AIM symbology identifier some scanners prepend, e.g. "]C1" for GS1-128.
+_AIM_PREFIX = re.compile(r'^\][A-Za-z][0-9A-Za-z]')
+_NON_ALNUM = re.compile(r'[^A-Z0-9]')
+# USPS IMpb labels prefix the tracking number with the GS1 "420" application
+# identifier and the destination ZIP (5 or 9 digits).
+_USPS_IMPB = re.compile(r'^420(?:\d{9}|\d{5})(9\d{19,25})$')
+# FedEx 1D labels encode 34 digits; the tracking number is the last 12, and
+# its final digit checks the other 11 (weights 3, 1, 7, sum mod 11, mod 10).
+_FEDEX_BARCODE_LENGTH = 34
+_FEDEX_CHECK_WEIGHTS = (3, 1, 7) * 4
+
+MAX_CODE_LENGTH = 100
+
+
+def _fedex_tracking(value):
+    """The tracking number inside a FedEx 1D barcode, or None when ``value`` is not one."""
+    if len(value) != _FEDEX_BARCODE_LENGTH or not value.isdigit():
+        return None
+    tracking = value[-12:]
+    total = sum(int(digit) * weight for digit, weight in zip(tracking[:11], _FEDEX_CHECK_WEIGHTS))
+    if total % 11 % 10 != int(tracking[11]):
+        return None
+    return tracking
+
+
+def tracking_codes(raw):
+    """
+    Every normalized code ``raw`` is indexed and looked up under, exact form
+    first. A FedEx barcode also yields its 12-digit tracking number, so the
+    scan matches a receipt that only has the number typed on it.
+    """
+    if raw is None:
+        return []
+    value = _AIM_PREFIX.sub('', str(raw).strip())
+    value = _NON_ALNUM.sub('', value.upper())
+    if not value:
+        return []
+    match = _USPS_IMPB.match(value)
+    if match:
+        return [match.group(1)]
+    fedex = _fedex_tracking(value)
+    if fedex:
+        return [value, fedex]
+    return [value[:MAX_CODE_LENGTH]]
+
+
+def normalize_tracking(raw):
+    """Return the canonical form of a tracking number, or '' when empty."""
+    codes = tracking_codes(raw)
+    return codes[-1] if codes else ''
+
+
+def split_tracking(value):
+    """Split a comma/semicolon joined tracking summary into its numbers."""
+    if not value:
+        return []
+    return [part.strip() for part in re.split(r'[;,]', str(value)) if part.strip()]
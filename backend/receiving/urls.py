@@ -1,6 +1,7 @@
 from django.urls import path
-from .repack_api import ConsolidateWRAPIView
+from .repack_api import ConsolidateWRAPIView, ConsolidateWRBatchAPIView
 
 urlpatterns = [
     path('consolidate/', ConsolidateWRAPIView.as_view(), name='repack-consolidate'),
+    path('consolidate/batch/', ConsolidateWRBatchAPIView.as_view(), name='repack-consolidate-batch'),
 ]
@@ -1,16 +1,32 @@
+from django.db import transaction
+from django.db.models import Count, Q, prefetch_related_objects
 from rest_framework import serializers, viewsets, status
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from core.idempotency import idempotent
 from core.mixins import CompanyScopedViewSetMixin
+from core.pagination import KeysetCursorPagination
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
-from shipping.models import Shipment, ShipmentItem
+from core.models import ShipmentStatus
+from shipping.models import Shipment, ShipmentItem, ShipmentShipRun, ShipRunStatus
 from clients.api import ClientSerializer
 from warehouse.api import WarehouseMinimalSerializer
 from receiving.trace_serializers import TraceWRMinimalSerializer
 from inventory.models import InventoryTransaction
-from .services import add_items_to_shipment, ship_shipment
+from receiving.services_consumption import refresh_consumption
+from receiving.services_tracking import index_shipment_tracking
+from .services import bulk_add_items_to_shipment, ship_shipment
+from .services_ship_runs import DEFAULT_SHIP_CHUNK_SIZE, cancel_ship_run, drop_ship_run_items, start_ship_run
+
+
+# Largest wr_ids list POST /shipments/{id}/items/ accepts (a full ocean container).
+ADD_ITEMS_MAX_WRS = 20000
+
+# Largest shipment_ids list POST /shipments/trace/ accepts.
+TRACE_BATCH_MAX_SHIPMENTS = 1000
 
 class ShipmentSerializer(serializers.ModelSerializer):
     client_details = ClientSerializer(source='client', read_only=True)
@@ -21,10 +37,28 @@ class ShipmentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['company']
 
+    def validate_status(self, value):
+        # Shipping moves stock, so only the ship endpoints may set these.
+        current = self.instance.status if self.instance else None
+        if value in (ShipmentStatus.SHIPPING, ShipmentStatus.SHIPPED) and value != current:
+            raise serializers.ValidationError(
+                f"Use POST /shipments/{{id}}/ship/ to move a shipment to {value}."
+            )
+        return value
+
 class AddItemsSerializer(serializers.Serializer):
     wr_ids = serializers.ListField(
         child=serializers.IntegerField(),
-        allow_empty=False
+        allow_empty=False,
+        max_length=ADD_ITEMS_MAX_WRS,
+    )
+    partial = serializers.BooleanField(required=False, default=False)
+
+class DropItemsSerializer(serializers.Serializer):
+    wr_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=ADD_ITEMS_MAX_WRS,
     )
 
 class ShipRequestSerializer(serializers.Serializer):
@@ -32,17 +66,145 @@ class ShipRequestSerializer(serializers.Serializer):
     tracking_number = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     shipped_at = serializers.DateTimeField(required=False, allow_null=True)
     notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    # Ship in the background, in chunks; see shipping/services_ship_runs.py.
+    async_ = serializers.BooleanField(required=False, default=False)
+    chunk_size = serializers.IntegerField(required=False, default=DEFAULT_SHIP_CHUNK_SIZE, min_value=1, max_value=5000)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # "async" is a keyword, so the field is declared as async_.
+        fields['async'] = fields.pop('async_')
+        return fields
+
+class ShipRunSerializer(serializers.ModelSerializer):
+    percent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShipmentShipRun
+        fields = [
+            'shipment', 'status', 'total_items', 'processed_items', 'percent', 'chunk_size',
+            'error', 'started_at', 'heartbeat_at', 'finished_at',
+        ]
+
+    def get_percent(self, obj):
+        if not obj.total_items:
+            return 100
+        return round(100 * obj.processed_items / obj.total_items, 1)
+
+class TraceBatchSerializer(serializers.Serializer):
+    shipment_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=TRACE_BATCH_MAX_SHIPMENTS,
+    )
+
+def _shipment_traces(shipments):
+    """
+    Trace payloads for ``shipments``, in their order, with a fixed number of
+    queries however many there are: the clients and warehouses (unless
+    already joined), the items with their WRs, and the ledger transactions
+    with a line count each.
+    """
+    shipments = list(shipments)
+    if not shipments:
+        return []
+    prefetch_related_objects(shipments, 'client__associate_company', 'from_warehouse')
+    shipment_ids = [shipment.id for shipment in shipments]
+
+    items = {}
+    for item in ShipmentItem.objects.filter(shipment_id__in=shipment_ids).select_related('wr').order_by('id'):
+        items.setdefault(item.shipment_id, []).append(item)
+
+    # A chunked (async) ship writes one SHIP transaction per chunk; the
+    # first one is reported, with the lines of all of them counted. Rows
+    # written without the typed link (imports, older writers) are matched
+    # on the indexed reference pair instead.
+    linkage = {}
+    txns = (
+        InventoryTransaction.objects
+        .filter(
+            Q(shipment_id__in=shipment_ids)
+            | Q(shipment__isnull=True, reference_type="SHIPMENT", reference_id__in=[str(i) for i in shipment_ids])
+        )
+        .select_related('performed_by')
+        .annotate(line_count=Count('lines'))
+        .order_by('performed_at', 'id')
+    )
+    for txn in txns:
+        shipment_id = txn.shipment_id or int(txn.reference_id)
+        link = linkage.get(shipment_id)
+        if link is None:
+            linkage[shipment_id] = {
+                "transaction_id": txn.id,
+                "performed_at": txn.performed_at,
+                "performed_by": txn.performed_by.username if txn.performed_by else None,
+                "line_count": txn.line_count,
+            }
+        else:
+            link["line_count"] += txn.line_count
+
+    return [
+        {
+            "id": shipment.id,
+            "shipment_number": shipment.shipment_number,
+            "status": shipment.status,
+            "client_details": ClientSerializer(shipment.client).data,
+            "from_warehouse_details": WarehouseMinimalSerializer(shipment.from_warehouse).data if shipment.from_warehouse else None,
+            "carrier": shipment.carrier,
+            "tracking_number": shipment.tracking_number,
+            "shipped_at": shipment.shipped_at,
+            "notes": shipment.notes,
+            "items": [TraceWRMinimalSerializer(item.wr).data for item in items.get(shipment.id, [])],
+            "transaction_linkage": linkage.get(shipment.id),
+        }
+        for shipment in shipments
+    ]
 
 class ShipmentViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
-    queryset = Shipment.objects.select_related('client', 'from_warehouse').all()
+    queryset = Shipment.objects.all()
     serializer_class = ShipmentSerializer
+    field_dependencies = {
+        'client_details': {'select_related': ['client']},
+        'from_warehouse_details': {'select_related': ['from_warehouse']},
+    }
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['client', 'status', 'from_warehouse']
     search_fields = ['shipment_number', 'tracking_number', 'client__client_code', 'client__name']
     ordering_fields = ['created_at', 'shipped_at', 'shipment_number']
     ordering = ['-created_at']
+    pagination_class = KeysetCursorPagination
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        index_shipment_tracking([serializer.instance])
+
+    def _lock_idle(self, shipment):
+        # Lock the shipment the way start_ship_run does, so a run cannot
+        # start between the check and the write. The fresh status is kept on
+        # the instance because an update saves every field.
+        shipment.status = Shipment.objects.select_for_update().values_list('status', flat=True).get(id=shipment.id)
+        active_run = ShipmentShipRun.objects.filter(
+            shipment=shipment, status__in=[ShipRunStatus.PENDING, ShipRunStatus.RUNNING],
+        ).exists()
+        if shipment.status == ShipmentStatus.SHIPPING or active_run:
+            raise DRFValidationError("Shipment is being shipped; finish or cancel its ship run first.")
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            self._lock_idle(serializer.instance)
+            super().perform_update(serializer)
+            index_shipment_tracking([serializer.instance])
+
+    def perform_destroy(self, instance):
+        # Deleting cascades the shipment items; release the receipts they held.
+        with transaction.atomic():
+            self._lock_idle(instance)
+            wr_ids = list(instance.items.values_list('wr_id', flat=True))
+            instance.delete()
+            refresh_consumption(wr_ids)
 
     @action(detail=True, methods=['post'], url_path='items')
+    @idempotent
     def add_items(self, request, pk=None):
         shipment = self.get_object()
         serializer = AddItemsSerializer(data=request.data)
@@ -50,20 +212,45 @@ class ShipmentViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
         
         wr_ids = serializer.validated_data['wr_ids']
         
-        added_count = add_items_to_shipment(
+        result = bulk_add_items_to_shipment(
             shipment=shipment,
             wr_ids=wr_ids,
-            performed_by=request.user
+            performed_by=request.user,
+            partial=serializer.validated_data['partial'],
         )
-        
-        return Response({"status": "items_added", "count": added_count}, status=status.HTTP_200_OK)
+
+        if result["rejected"] and not result["added"]:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif result["rejected"]:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({
+            "status": "items_added",
+            "count": len(result["added"]),
+            "skipped": len(result["skipped"]),
+            "rejected": result["rejected"],
+        }, status=response_status)
 
     @action(detail=True, methods=['post'], url_path='ship')
+    @idempotent
     def ship(self, request, pk=None):
         shipment = self.get_object()
         serializer = ShipRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        if serializer.validated_data['async']:
+            run = start_ship_run(
+                shipment=shipment,
+                performed_by=request.user,
+                carrier=serializer.validated_data.get('carrier'),
+                tracking_number=serializer.validated_data.get('tracking_number'),
+                shipped_at=serializer.validated_data.get('shipped_at'),
+                notes=serializer.validated_data.get('notes'),
+                chunk_size=serializer.validated_data['chunk_size'],
+            )
+            return Response(ShipRunSerializer(run).data, status=status.HTTP_202_ACCEPTED)
+
         ship_shipment(
             shipment=shipment,
             performed_by=request.user,
@@ -76,36 +263,53 @@ class ShipmentViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
         # Return updated shipment
         shipment.refresh_from_db()
         return Response(ShipmentSerializer(shipment).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='ship-progress')
+    def ship_progress(self, request, pk=None):
+        """Progress of the shipment's asynchronous ship run."""
+        shipment = self.get_object()
+        run = ShipmentShipRun.objects.filter(shipment=shipment).first()
+        if run is None:
+            return Response({"detail": "This shipment has no asynchronous ship run."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ShipRunSerializer(run).data)
+
+    @action(detail=True, methods=['post'], url_path='ship-cancel')
+    @idempotent
+    def ship_cancel(self, request, pk=None):
+        """Cancel a pending or failed ship run before anything shipped."""
+        shipment = cancel_ship_run(self.get_object())
+        return Response(ShipmentSerializer(shipment).data)
+
+    @action(detail=True, methods=['post'], url_path='ship-drop-items')
+    @idempotent
+    def ship_drop_items(self, request, pk=None):
+        """Drop unshipped items from a pending or failed ship run so it can finish."""
+        shipment = self.get_object()
+        serializer = DropItemsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        run = drop_ship_run_items(shipment, serializer.validated_data['wr_ids'])
+        return Response(ShipRunSerializer(run).data)
+
     @action(detail=True, methods=['get'], url_path='trace')
     def trace(self, request, pk=None):
         shipment = self.get_object()
-        
-        core_data = {
-            "id": shipment.id,
-            "shipment_number": shipment.shipment_number,
-            "status": shipment.status,
-            "client_details": ClientSerializer(shipment.client).data,
-            "from_warehouse_details": WarehouseMinimalSerializer(shipment.from_warehouse).data if shipment.from_warehouse else None,
-            "carrier": shipment.carrier,
-            "tracking_number": shipment.tracking_number,
-            "shipped_at": shipment.shipped_at,
-            "notes": shipment.notes
-        }
+        return Response(_shipment_traces([shipment])[0])
 
-        # Items
-        items = shipment.items.select_related('wr').all()
-        core_data["items"] = [TraceWRMinimalSerializer(item.wr).data for item in items]
-        
-        # Transaction Linkage
-        txn = InventoryTransaction.objects.select_related('performed_by').prefetch_related('lines').filter(reference_type="SHIPMENT", reference_id=str(shipment.id)).first()
-        if txn:
-            core_data["transaction_linkage"] = {
-                "transaction_id": txn.id,
-                "performed_at": txn.performed_at,
-                "performed_by": txn.performed_by.username if txn.performed_by else None,
-                "line_count": txn.lines.count()
-            }
-        else:
-            core_data["transaction_linkage"] = None
-            
-        return Response(core_data)
+    @action(detail=False, methods=['post'], url_path='trace', url_name='trace-batch')
+    def trace_batch(self, request):
+        serializer = TraceBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        shipment_ids = list(dict.fromkeys(serializer.validated_data['shipment_ids']))
+
+        shipments = (
+            self.get_queryset()
+            .filter(id__in=shipment_ids)
+            .select_related('client__associate_company', 'from_warehouse')
+            .order_by('id')
+        )
+        traces = _shipment_traces(shipments)
+        found = {trace['id'] for trace in traces}
+        return Response({
+            "results": traces,
+            "missing": [shipment_id for shipment_id in shipment_ids if shipment_id not in found],
+        })
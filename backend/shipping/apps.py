@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class ShippingConfig(AppConfig):
     name = "shipping"
+
+    def ready(self):
+        from company.versions import track_data_version
+        track_data_version(
+            self.get_model('Shipment'),
+            self.get_model('ShipmentItem'),
+            self.get_model('ShipmentShipRun'),
+        )
@@ -0,0 +1,59 @@
+"""
+Management command: process_ship_runs
+
+Works through asynchronous ship runs (POST /shipments/{id}/ship/ with
+"async": true): pending runs, and RUNNING runs whose worker stopped sending
+heartbeats. Each run is shipped chunk by chunk until its shipment is
+SHIPPED. Run it from cron, or keep one running with --loop.
+
+Usage:
+    python manage.py process_ship_runs
+    python manage.py process_ship_runs --loop --interval 5
+    python manage.py process_ship_runs --retry-failed
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Process pending asynchronous shipment ship runs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new runs instead of exiting when idle.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds between polls with --loop (default: 5).',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also resume runs that stopped on a validation error.',
+        )
+
+    def handle(self, *args, **options):
+        from shipping.models import ShipRunStatus
+        from shipping.services_ship_runs import process_ship_run, runnable_ship_runs
+
+        while True:
+            run_ids = list(runnable_ship_runs(retry_failed=options['retry_failed']).values_list('id', flat=True))
+            for run_id in run_ids:
+                run = process_ship_run(run_id)
+                message = f"  shipment {run.shipment_id}: {run.processed_items}/{run.total_items} items, {run.status}"
+                if run.status == ShipRunStatus.FAILED:
+                    self.stdout.write(self.style.ERROR(f"{message}: {run.error}"))
+                else:
+                    self.stdout.write(message)
+            if not options['loop']:
+                break
+            # Failed runs are retried once per invocation, not on every poll.
+            options['retry_failed'] = False
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS("Done."))
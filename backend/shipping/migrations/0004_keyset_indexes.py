@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0003_alter_shipment_company_alter_shipmentitem_company'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['company', '-created_at', '-id'], name='shipping_sh_company_43d1c3_idx'),
+        ),
+    ]
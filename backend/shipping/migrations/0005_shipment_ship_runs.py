@@ -0,0 +1,50 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0008_companydataversion'),
+        ('shipping', '0004_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shipment',
+            name='status',
+            field=models.CharField(choices=[('PLANNED', 'Planned'), ('PACKED', 'Packed'), ('SHIPPING', 'Shipping'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], default='PLANNED', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ShipmentShipRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('FAILED', 'Failed'), ('DONE', 'Done')], default='PENDING', max_length=20)),
+                ('carrier', models.CharField(blank=True, max_length=100, null=True)),
+                ('tracking_number', models.CharField(blank=True, max_length=100, null=True)),
+                ('shipped_at', models.DateTimeField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('chunk_size', models.PositiveIntegerField(default=500)),
+                ('total_items', models.PositiveIntegerField(default=0)),
+                ('processed_items', models.PositiveIntegerField(default=0)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='shipment_ship_runs', to='company.company')),
+                ('performed_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='shipment_ship_runs', to=settings.AUTH_USER_MODEL)),
+                ('shipment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ship_run', to='shipping.shipment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'heartbeat_at'], name='shipping_sh_status_63c44f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0005_shipment_ship_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipmentshiprun',
+            name='previous_status',
+            field=models.CharField(choices=[('PLANNED', 'Planned'), ('PACKED', 'Packed'), ('SHIPPING', 'Shipping'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], default='PLANNED', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='shipmentshiprun',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('FAILED', 'Failed'), ('DONE', 'Done'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=20),
+        ),
+    ]
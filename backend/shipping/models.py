@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from core.models import TimeStampedModel, ShipmentStatus
 from clients.models import Client
 from warehouse.models import Warehouse
@@ -30,6 +32,7 @@ class Shipment(TimeStampedModel):
             models.Index(fields=['status']),
             models.Index(fields=['shipment_number']),
             models.Index(fields=['shipped_at']),
+            models.Index(fields=['company', '-created_at', '-id']),
         ]
 
     def __str__(self):
@@ -51,3 +54,52 @@ class ShipmentItem(TimeStampedModel):
 
     def __str__(self):
         return f"Item {self.id}: {self.wr.wr_number} in {self.shipment.shipment_number}"
+
+
+class ShipRunStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    RUNNING = "RUNNING", "Running"
+    FAILED = "FAILED", "Failed"
+    DONE = "DONE", "Done"
+    CANCELLED = "CANCELLED", "Cancelled"
+
+
+class ShipmentShipRun(TimeStampedModel):
+    """
+    Progress of an asynchronous ship (``POST /shipments/{id}/ship/`` with
+    ``"async": true``). Items are shipped in chunks of ``chunk_size`` in
+    ShipmentItem id order; ``cursor`` is the last item id shipped and moves
+    in the same transaction as the chunk, so a crashed run resumes where it
+    stopped. The ship parameters are kept here for the final status flip.
+    A run that failed or has not started can be cancelled, or have the items
+    it cannot ship dropped, through ``services_ship_runs``.
+    """
+    company = models.ForeignKey('company.Company', on_delete=models.PROTECT, related_name="shipment_ship_runs")
+    shipment = models.OneToOneField(Shipment, on_delete=models.CASCADE, related_name="ship_run")
+    status = models.CharField(max_length=20, choices=ShipRunStatus.choices, default=ShipRunStatus.PENDING)
+    performed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="shipment_ship_runs")
+    # The shipment's status before the run, restored when the run is cancelled.
+    previous_status = models.CharField(max_length=20, choices=ShipmentStatus.choices, default=ShipmentStatus.PLANNED)
+
+    carrier = models.CharField(max_length=100, null=True, blank=True)
+    tracking_number = models.CharField(max_length=100, null=True, blank=True)
+    shipped_at = models.DateTimeField(null=True, blank=True)
+    notes = models.TextField(null=True, blank=True)
+
+    chunk_size = models.PositiveIntegerField(default=500)
+    total_items = models.PositiveIntegerField(default=0)
+    processed_items = models.PositiveIntegerField(default=0)
+    cursor = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    started_at = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'heartbeat_at']),
+        ]
+
+    def __str__(self):
+        return f"Ship run {self.shipment_id}: {self.processed_items}/{self.total_items} ({self.status})"
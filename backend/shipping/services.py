@@ -2,12 +2,39 @@ from django.utils import timezone
 from django.db import transaction
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from shipping.models import Shipment, ShipmentItem
-from receiving.models import WRStatus
+from receiving.models import ConsumedBy, WarehouseReceipt, WRStatus
 from core.models import ShipmentStatus
+from company.versions import bump_data_version
+from receiving.services_tracking import index_shipment_tracking
 from inventory.models import InventoryBalance, InventoryTransaction, InventoryTransactionLine, TxnType
+from inventory.services_occupancy import adjust_location_occupancy
 
 
-def add_items_to_shipment(shipment, wr_ids, performed_by=None, company=None):
+# Rejection codes for bulk_add_items_to_shipment.
+REJECT_NO_BALANCE = "no_balance"
+REJECT_NOT_ACTIVE = "not_active"
+REJECT_CLIENT_MISMATCH = "client_mismatch"
+REJECT_WAREHOUSE_MISMATCH = "warehouse_mismatch"
+
+
+def bulk_add_items_to_shipment(shipment, wr_ids, performed_by=None, company=None, partial=False):
+    """
+    Add receipts to a PLANNED or PACKED shipment.
+
+    Balances and their receipts are read and locked in one joined query, and
+    every check is a dict lookup, so the cost is a fixed handful of queries
+    however many receipts are passed. WRs already on the shipment are
+    skipped.
+
+    A WR is rejected when it has no balance in the company, is not ACTIVE,
+    belongs to another client or sits in another warehouse than the
+    shipment ships from. By default any rejection raises a ValidationError
+    listing all of them (``{"rejected": [...]}``) and nothing is added; with
+    ``partial=True`` the valid WRs are added and the rejections returned.
+
+    Returns ``{"added": [wr_id, ...], "skipped": [wr_id, ...],
+    "rejected": [{"wr": id, "code": ..., "detail": ...}, ...]}``.
+    """
     if not performed_by:
         raise DRFValidationError("User tracking is missing. performed_by is required.")
 
@@ -17,39 +44,149 @@ def add_items_to_shipment(shipment, wr_ids, performed_by=None, company=None):
     if shipment.status not in [ShipmentStatus.PLANNED, ShipmentStatus.PACKED]:
         raise DRFValidationError("Cannot add items unless shipment is PLANNED or PACKED.")
 
-    items_to_create = []
+    wr_ids = list(dict.fromkeys(wr_ids))
+    added, skipped, rejected = [], [], []
+
+    def reject(wr_id, code, detail):
+        rejected.append({"wr": wr_id, "code": code, "detail": detail})
 
     with transaction.atomic():
         # Prevent adding duplicates that already exist on this shipment
-        existing_wr_ids = set(ShipmentItem.objects.filter(shipment=shipment).values_list('wr_id', flat=True))
+        existing_wr_ids = set(
+            ShipmentItem.objects.filter(shipment=shipment, wr_id__in=wr_ids).values_list('wr_id', flat=True)
+        )
 
-        # We need to lock the balances to ensure they are available
-        balances = list(InventoryBalance.objects.select_for_update().filter(wr_id__in=wr_ids))
-        balance_wr_ids = {b.wr_id for b in balances}
+        # Lock the balances (and their receipts) so they stay available.
+        balance_by_wr = {
+            balance.wr_id: balance
+            for balance in InventoryBalance.objects.select_for_update()
+            .select_related('wr')
+            .filter(company=company, wr_id__in=[wr_id for wr_id in wr_ids if wr_id not in existing_wr_ids])
+            .only('id', 'wr_id', 'warehouse_id', 'wr__id', 'wr__status', 'wr__client_id')
+        }
 
-        for wr_id in set(wr_ids):
+        for wr_id in wr_ids:
             if wr_id in existing_wr_ids:
-                continue  # Safely ignore duplicates
-
-            if wr_id not in balance_wr_ids:
-                 raise DRFValidationError(f"WR {wr_id} does not have an active inventory balance.")
+                skipped.append(wr_id)  # Safely ignore duplicates
+                continue
+            balance = balance_by_wr.get(wr_id)
+            if balance is None:
+                reject(wr_id, REJECT_NO_BALANCE, f"WR {wr_id} does not have an active inventory balance.")
+            elif balance.wr.status != WRStatus.ACTIVE:
+                reject(wr_id, REJECT_NOT_ACTIVE, f"WR {wr_id} is not ACTIVE.")
+            elif balance.wr.client_id != shipment.client_id:
+                reject(wr_id, REJECT_CLIENT_MISMATCH, f"WR {wr_id} does not belong to the shipment's client.")
+            elif shipment.from_warehouse_id and balance.warehouse_id != shipment.from_warehouse_id:
+                reject(
+                    wr_id, REJECT_WAREHOUSE_MISMATCH,
+                    f"WR {wr_id} is in warehouse {balance.warehouse_id} but shipment is from {shipment.from_warehouse_id}.",
+                )
+            else:
+                added.append(wr_id)
 
-            balance = next(b for b in balances if b.wr_id == wr_id)
+        if rejected and not partial:
+            raise DRFValidationError({"rejected": rejected})
 
-            if balance.wr.status != WRStatus.ACTIVE:
-                raise DRFValidationError(f"WR {wr_id} is not ACTIVE.")
+        if added:
+            ShipmentItem.objects.bulk_create(
+                [ShipmentItem(company=company, shipment=shipment, wr_id=wr_id) for wr_id in added],
+                batch_size=1000,
+            )
+            WarehouseReceipt.objects.filter(id__in=added).update(consumed_by=ConsumedBy.SHIPMENT)
+            bump_data_version(company.id)
 
-            if balance.wr.client_id != shipment.client_id:
-                raise DRFValidationError(f"WR {wr_id} does not belong to the shipment's client.")
-            if shipment.from_warehouse_id and balance.warehouse_id != shipment.from_warehouse_id:
-                raise DRFValidationError(f"WR {wr_id} is in warehouse {balance.warehouse_id} but shipment is from {shipment.from_warehouse_id}.")
+    return {"added": added, "skipped": skipped, "rejected": rejected}
 
-            items_to_create.append(ShipmentItem(company=company, shipment=shipment, wr_id=wr_id))
 
-        if items_to_create:
-            ShipmentItem.objects.bulk_create(items_to_create)
+def add_items_to_shipment(shipment, wr_ids, performed_by=None, company=None):
+    """All-or-nothing ``bulk_add_items_to_shipment``; returns the number of WRs added."""
+    result = bulk_add_items_to_shipment(shipment, wr_ids, performed_by=performed_by, company=company)
+    return len(result["added"])
+
+
+def lock_ship_balances(company, items):
+    """Lock and return ``{wr_id: balance}`` for the items, after checking each can ship."""
+    # Lock balances for all items
+    balances = InventoryBalance.objects.select_for_update().filter(
+        company=company, wr_id__in=[item.wr_id for item in items],
+    ).only('id', 'wr_id', 'location_id')
+    balance_map = {b.wr_id: b for b in balances}
+
+    for item in items:
+        wr = item.wr
+        if wr.status != WRStatus.ACTIVE:
+            raise DRFValidationError(f"WR {wr.wr_number} is not ACTIVE.")
+        if wr.client_id != item.shipment.client_id:
+             raise DRFValidationError(f"WR {wr.wr_number} client mismatch.")
+        if wr.id not in balance_map:
+            raise DRFValidationError(f"WR {wr.wr_number} is missing from inventory.")
+    return balance_map
+
+
+def ship_items(shipment, items, balance_map, performed_by, notes=None, company=None):
+    """
+    Move ``items`` out of inventory: one SHIP transaction with a line per WR,
+    WRs marked SHIPPED, balances deleted. ``balance_map`` comes from
+    ``lock_ship_balances``. Used for the whole shipment by
+    ``ship_shipment`` and per chunk by the asynchronous ship run.
+    """
+    if company is None:
+        company = shipment.company
 
-    return len(items_to_create)
+    txn = InventoryTransaction.objects.create(
+        company=company,
+        client_id=shipment.client_id,
+        txn_type=TxnType.SHIP,
+        reference_type="SHIPMENT",
+        reference_id=str(shipment.id),
+        shipment=shipment,
+        performed_by=performed_by,
+        notes=notes if notes else f"Shipped via {shipment.shipment_number}"
+    )
+
+    txn_lines = []
+    wrs_to_update = []
+    for item in items:
+        wr = item.wr
+        balance = balance_map[wr.id]
+        txn_lines.append(
+            InventoryTransactionLine(
+                company=company,
+                transaction=txn,
+                wr=wr,
+                from_location_id=balance.location_id,
+                to_location=None,
+                qty=1
+            )
+        )
+        wr.status = WRStatus.SHIPPED
+        wr.consumed_by = ConsumedBy.SHIPMENT
+        wrs_to_update.append(wr)
+
+    InventoryTransactionLine.objects.bulk_create(txn_lines, batch_size=1000)
+    WarehouseReceipt.objects.bulk_update(wrs_to_update, ['status', 'consumed_by'], batch_size=1000)
+
+    # Delete balances - they left the warehouse
+    balances = [balance_map[item.wr_id] for item in items]
+    InventoryBalance.objects.filter(id__in=[b.id for b in balances]).delete()
+    adjust_location_occupancy(company.id, [(b.location_id, b.wr_id, -1) for b in balances])
+    return txn
+
+
+def mark_shipped(shipment, carrier=None, tracking_number=None, shipped_at=None, notes=None):
+    """Flip a (locked) shipment to SHIPPED and apply the ship parameters."""
+    shipment.status = ShipmentStatus.SHIPPED
+    shipment.shipped_at = shipped_at or timezone.now()
+    if carrier is not None:
+         shipment.carrier = carrier
+    if tracking_number is not None:
+         shipment.tracking_number = tracking_number
+    if notes:
+         shipment.notes = f"{shipment.notes}\n{notes}" if shipment.notes else notes
+
+    shipment.save()
+    index_shipment_tracking([shipment])
+    return shipment
 
 
 def ship_shipment(shipment, performed_by=None, carrier=None, tracking_number=None, shipped_at=None, notes=None, company=None):
@@ -68,74 +205,11 @@ def ship_shipment(shipment, performed_by=None, carrier=None, tracking_number=Non
         items = list(shipment.items.select_related('wr').all())
         if not items:
             raise DRFValidationError("Cannot ship an empty shipment.")
-
-        wr_ids = [item.wr_id for item in items]
-
-        # Lock balances for all items
-        balances = list(InventoryBalance.objects.select_for_update().filter(wr_id__in=wr_ids))
-        balance_map = {b.wr_id: b for b in balances}
-
-        # 1) Validation
         for item in items:
-            wr = item.wr
-            if wr.status != WRStatus.ACTIVE:
-                raise DRFValidationError(f"WR {wr.wr_number} is not ACTIVE.")
-            if wr.client_id != shipment.client_id:
-                 raise DRFValidationError(f"WR {wr.wr_number} client mismatch.")
-            if wr.id not in balance_map:
-                raise DRFValidationError(f"WR {wr.wr_number} is missing from inventory.")
-
-        # 2) Create Transaction
-        txn = InventoryTransaction.objects.create(
-            company=company,
-            client=shipment.client,
-            txn_type=TxnType.SHIP,
-            reference_type="SHIPMENT",
-            reference_id=str(shipment.id),
-            performed_by=performed_by,
-            notes=notes if notes else f"Shipped via {shipment.shipment_number}"
-        )
-
-        txn_lines = []
-        wrs_to_update = []
-
-        # 3) Process each WR
-        for item in items:
-            wr = item.wr
-            balance = balance_map[wr.id]
-
-            txn_lines.append(
-                InventoryTransactionLine(
-                    company=company,
-                    transaction=txn,
-                    wr=wr,
-                    from_location=balance.location,
-                    to_location=None,
-                    qty=1
-                )
-            )
-
-            wr.status = WRStatus.SHIPPED
-            wrs_to_update.append(wr)
-
-        # 4) Bulk updates
-        InventoryTransactionLine.objects.bulk_create(txn_lines)
-        from receiving.models import WarehouseReceipt
-        WarehouseReceipt.objects.bulk_update(wrs_to_update, ['status'])
-
-        # Delete balances - they left the warehouse
-        InventoryBalance.objects.filter(id__in=[b.id for b in balances]).delete()
-
-        # 5) Update Shipment record
-        shipment.status = ShipmentStatus.SHIPPED
-        shipment.shipped_at = shipped_at or timezone.now()
-        if carrier is not None:
-             shipment.carrier = carrier
-        if tracking_number is not None:
-             shipment.tracking_number = tracking_number
-        if notes:
-             shipment.notes = f"{shipment.notes}\n{notes}" if shipment.notes else notes
+            item.shipment = shipment
 
-        shipment.save()
+        balance_map = lock_ship_balances(company, items)
+        ship_items(shipment, items, balance_map, performed_by, notes=notes, company=company)
+        mark_shipped(shipment, carrier=carrier, tracking_number=tracking_number, shipped_at=shipped_at, notes=notes)
 
     return shipment
@@ -0,0 +1,237 @@
+"""
+Asynchronous, chunked shipping for very large shipments.
+
+``ship_shipment`` ships everything in one transaction, holding locks on the
+shipment and every balance until it commits. For a container that blocks
+the warehouse for a long time. ``start_ship_run`` instead checks the
+shipment up front, flips it to SHIPPING and records a ShipmentShipRun. A
+worker (``python manage.py process_ship_runs``) then ships the items in
+chunks, each in its own short transaction that also advances the run's
+cursor, so a crash loses at most the chunk in flight and the run resumes
+from the cursor. The last step flips the shipment to SHIPPED atomically.
+
+While SHIPPING, items cannot be added (``add_items_to_shipment`` requires
+PLANNED or PACKED), ``ship_shipment`` refuses the shipment and the shipment
+cannot be edited or deleted. A run that stopped on a validation error is
+resolved with ``drop_ship_run_items`` (remove the items that cannot ship and
+let the run finish with the rest) or, before anything shipped,
+``cancel_ship_run`` (back to the status the shipment had).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError as DRFValidationError
+
+from company.versions import bump_data_version
+from core.models import ShipmentStatus
+from inventory.models import InventoryBalance
+from receiving.models import WRStatus
+from receiving.services_consumption import refresh_consumption
+from shipping.models import Shipment, ShipmentItem, ShipmentShipRun, ShipRunStatus
+from shipping.services import lock_ship_balances, mark_shipped, ship_items
+
+
+DEFAULT_SHIP_CHUNK_SIZE = 500
+# A RUNNING run whose heartbeat is older than this is assumed to have died
+# with its worker and is picked up again.
+SHIP_RUN_STALE_AFTER = timedelta(minutes=5)
+
+
+def start_ship_run(shipment, performed_by=None, carrier=None, tracking_number=None, shipped_at=None,
+                   notes=None, chunk_size=DEFAULT_SHIP_CHUNK_SIZE, company=None):
+    """
+    Validate ``shipment`` for shipping, put it in SHIPPING and create its
+    ShipmentShipRun. Nothing leaves inventory yet; see ``process_ship_run``.
+
+    The up-front check is the same as ``ship_shipment``'s, done with one
+    read, so a run normally cannot fail half way. Raises ValidationError
+    when the shipment cannot ship.
+    """
+    if not performed_by:
+        raise DRFValidationError("User tracking is missing. performed_by is required.")
+
+    if company is None:
+        company = shipment.company
+
+    with transaction.atomic():
+        shipment = Shipment.objects.select_for_update().get(id=shipment.id)
+        if shipment.status not in [ShipmentStatus.PLANNED, ShipmentStatus.PACKED]:
+            raise DRFValidationError("Shipment must be in PLANNED or PACKED status to ship.")
+
+        items = list(
+            shipment.items.select_related('wr').only('id', 'wr_id', 'wr__id', 'wr__wr_number', 'wr__status', 'wr__client_id')
+        )
+        if not items:
+            raise DRFValidationError("Cannot ship an empty shipment.")
+        stored = set(
+            InventoryBalance.objects.filter(company=company, wr_id__in=[item.wr_id for item in items])
+            .values_list('wr_id', flat=True)
+        )
+        for item in items:
+            wr = item.wr
+            if wr.status != WRStatus.ACTIVE:
+                raise DRFValidationError(f"WR {wr.wr_number} is not ACTIVE.")
+            if wr.client_id != shipment.client_id:
+                raise DRFValidationError(f"WR {wr.wr_number} client mismatch.")
+            if wr.id not in stored:
+                raise DRFValidationError(f"WR {wr.wr_number} is missing from inventory.")
+
+        # A run left over from an earlier, reverted attempt is replaced.
+        ShipmentShipRun.objects.filter(shipment=shipment).delete()
+        run = ShipmentShipRun.objects.create(
+            company=company,
+            shipment=shipment,
+            performed_by=performed_by,
+            carrier=carrier,
+            tracking_number=tracking_number,
+            shipped_at=shipped_at,
+            notes=notes,
+            chunk_size=chunk_size,
+            total_items=len(items),
+            previous_status=shipment.status,
+        )
+        shipment.status = ShipmentStatus.SHIPPING
+        shipment.save(update_fields=['status', 'updated_at'])
+    return run
+
+
+def process_ship_chunk(run_id):
+    """
+    Ship the next chunk of a run in one transaction, or finish the run when
+    no items are left. Returns the updated run.
+
+    The run row is locked for the duration, so two workers never ship the
+    same chunk. A chunk that fails validation (e.g. a WR consumed since the
+    run started) rolls back, and the run is marked FAILED with the error;
+    fix the cause and re-run the worker with ``--retry-failed``, or drop the
+    offending items with ``drop_ship_run_items``.
+    """
+    try:
+        with transaction.atomic():
+            run = (
+                ShipmentShipRun.objects.select_for_update()
+                .select_related('shipment', 'shipment__company', 'performed_by')
+                .get(id=run_id)
+            )
+            if run.status in (ShipRunStatus.DONE, ShipRunStatus.CANCELLED):
+                return run
+            shipment = run.shipment
+            items = list(
+                shipment.items.select_related('wr').filter(id__gt=run.cursor).order_by('id')[:run.chunk_size]
+            )
+            now = timezone.now()
+            if not items:
+                mark_shipped(
+                    shipment, carrier=run.carrier, tracking_number=run.tracking_number,
+                    shipped_at=run.shipped_at, notes=run.notes,
+                )
+                run.status = ShipRunStatus.DONE
+                run.finished_at = now
+            else:
+                for item in items:
+                    item.shipment = shipment
+                balance_map = lock_ship_balances(run.company_id, items)
+                ship_items(shipment, items, balance_map, run.performed_by, notes=run.notes, company=shipment.company)
+                bump_data_version(run.company_id)
+                run.status = ShipRunStatus.RUNNING
+                run.cursor = items[-1].id
+                run.processed_items += len(items)
+            run.heartbeat_at = now
+            run.error = ''
+            run.save()
+            return run
+    except DRFValidationError as exc:
+        detail = exc.detail if isinstance(exc.detail, list) else [exc.detail]
+        ShipmentShipRun.objects.filter(id=run_id).update(
+            status=ShipRunStatus.FAILED, error="; ".join(str(message) for message in detail),
+            heartbeat_at=timezone.now(),
+        )
+        return ShipmentShipRun.objects.get(id=run_id)
+
+
+def process_ship_run(run_id):
+    """Run chunks until the run is DONE, FAILED or CANCELLED. Returns the final run."""
+    while True:
+        run = process_ship_chunk(run_id)
+        if run.status in (ShipRunStatus.DONE, ShipRunStatus.FAILED, ShipRunStatus.CANCELLED):
+            return run
+
+
+def _lock_stopped_run(shipment):
+    """
+    Lock ``shipment``'s run, then the shipment (the order the worker takes
+    them in), and check the run is not being worked on. Returns ``(run,
+    shipment)``.
+    """
+    run = ShipmentShipRun.objects.select_for_update().filter(shipment_id=shipment.id).first()
+    shipment = Shipment.objects.select_for_update().get(id=shipment.id)
+    if run is None or shipment.status != ShipmentStatus.SHIPPING:
+        raise DRFValidationError("Shipment has no ship run in progress.")
+    if run.status not in (ShipRunStatus.PENDING, ShipRunStatus.FAILED):
+        raise DRFValidationError("Only a pending or failed ship run can be changed.")
+    return run, shipment
+
+
+def cancel_ship_run(shipment):
+    """
+    Cancel ``shipment``'s pending or failed run and put the shipment back in
+    the status it had before (PLANNED or PACKED). Only possible while
+    nothing has shipped; once a chunk has, use ``drop_ship_run_items`` so
+    the shipment ends up SHIPPED with exactly what left inventory. Returns
+    the shipment.
+    """
+    with transaction.atomic():
+        run, shipment = _lock_stopped_run(shipment)
+        if run.processed_items:
+            raise DRFValidationError(
+                f"{run.processed_items} items have already shipped; drop the items that cannot ship instead."
+            )
+        run.status = ShipRunStatus.CANCELLED
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at', 'updated_at'])
+        shipment.status = run.previous_status
+        shipment.save(update_fields=['status', 'updated_at'])
+        bump_data_version(shipment.company_id)
+    return shipment
+
+
+def drop_ship_run_items(shipment, wr_ids):
+    """
+    Remove the receipts ``wr_ids`` from ``shipment`` while its run is
+    pending or failed, e.g. the WR a chunk failed on. Only items the run has
+    not shipped yet can be dropped; the receipts are released. A failed run
+    goes back to PENDING so the next worker finishes it with the remaining
+    items. Returns the run.
+    """
+    wr_ids = list(dict.fromkeys(wr_ids))
+    with transaction.atomic():
+        run, shipment = _lock_stopped_run(shipment)
+        items = {item.wr_id: item for item in shipment.items.filter(wr_id__in=wr_ids).select_related('wr')}
+        missing = [wr_id for wr_id in wr_ids if wr_id not in items]
+        if missing:
+            raise DRFValidationError(f"WRs {missing} are not in this shipment.")
+        shipped = [item.wr.wr_number for item in items.values() if item.id <= run.cursor]
+        if shipped:
+            raise DRFValidationError(f"WRs {shipped} have already shipped and cannot be dropped.")
+        if not run.processed_items and len(items) == run.total_items:
+            raise DRFValidationError("This would leave the shipment empty; cancel the ship run instead.")
+
+        ShipmentItem.objects.filter(id__in=[item.id for item in items.values()]).delete()
+        refresh_consumption(wr_ids)
+        run.total_items -= len(items)
+        run.status = ShipRunStatus.PENDING
+        run.error = ''
+        run.save(update_fields=['total_items', 'status', 'error', 'updated_at'])
+        bump_data_version(shipment.company_id)
+    return run
+
+
+def runnable_ship_runs(retry_failed=False):
+    """Runs a worker should pick up: pending, stalled (stale heartbeat) and optionally failed ones."""
+    stale = timezone.now() - SHIP_RUN_STALE_AFTER
+    condition = Q(status=ShipRunStatus.PENDING) | Q(status=ShipRunStatus.RUNNING, heartbeat_at__lt=stale)
+    if retry_failed:
+        condition |= Q(status=ShipRunStatus.FAILED)
+    return ShipmentShipRun.objects.filter(condition).order_by('started_at', 'id')
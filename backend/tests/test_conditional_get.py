@@ -0,0 +1,153 @@
+"""
+Tests for ETag / Last-Modified handling on company-scoped list and retrieve.
+"""
+import pytest
+from django.utils import timezone
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from billing.models import Invoice
+from clients.models import Client
+from company.models import Company, CompanyMember
+from company.versions import bump_data_version, get_data_version
+from core.models import IdempotencyKey
+from receiving.models import WarehouseReceipt
+from shipping.models import Shipment
+from shipping.services import add_items_to_shipment
+from inventory.models import InventoryBalance
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+# The version is bumped on commit, so these tests need real transactions.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="ETag Co")
+
+
+@pytest.fixture
+def user(company):
+    user = User.objects.create_user(username="etag_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    return user
+
+
+@pytest.fixture
+def auth_client(user):
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def receipt(company):
+    client = Client.objects.create(company=company, name="ETag Client", client_code="ET-1")
+    return WarehouseReceipt.objects.create(company=company, client=client)
+
+
+def test_unchanged_list_returns_304_without_querying_receipts(auth_client, receipt):
+    first = auth_client.get('/api/v1/wrs/')
+    assert first.status_code == 200
+    etag = first['ETag']
+    assert first['Last-Modified']
+    assert 'no-cache' in first['Cache-Control']
+
+    with CaptureQueriesContext(connection) as ctx:
+        again = auth_client.get('/api/v1/wrs/', HTTP_IF_NONE_MATCH=etag)
+    assert again.status_code == 304
+    assert again['ETag'] == etag
+    assert not [q for q in ctx.captured_queries if 'receiving_warehousereceipt' in q['sql']]
+
+    # Different query strings validate separately.
+    filtered = auth_client.get('/api/v1/wrs/', {'status': 'ACTIVE'}, HTTP_IF_NONE_MATCH=etag)
+    assert filtered.status_code == 200
+
+
+def test_writes_change_the_etag(auth_client, receipt):
+    etag = auth_client.get(f'/api/v1/wrs/{receipt.id}/')['ETag']
+
+    resp = auth_client.patch(f'/api/v1/wrs/{receipt.id}/', {"notes": "moved"}, format='json')
+    assert resp.status_code == 200
+
+    resp = auth_client.get(f'/api/v1/wrs/{receipt.id}/', HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp.data["notes"] == "moved"
+    assert resp['ETag'] != etag
+
+
+def test_bulk_service_writes_change_the_etag(auth_client, user, company, receipt):
+    warehouse = Warehouse.objects.create(company=company, code="WH-ET", name="ETag Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="ET-LOC")
+    shipment = Shipment.objects.create(company=company, client=receipt.client, shipment_number="SHP-ET-1")
+    InventoryBalance.objects.create(
+        company=company, client=receipt.client, warehouse=warehouse, location=location, wr=receipt, on_hand_qty=1,
+    )
+    etag = auth_client.get('/api/v1/wrs/')['ETag']
+
+    with CaptureQueriesContext(connection) as ctx:
+        add_items_to_shipment(shipment, [receipt.id], performed_by=user)
+    # ShipmentItem rows and the consumed_by flag are bulk writes: no signals.
+    assert sum('company_companydataversion' in q['sql'] for q in ctx.captured_queries) == 1
+
+    resp = auth_client.get('/api/v1/wrs/', HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+
+
+def test_rolled_back_writes_keep_the_etag(auth_client, receipt):
+    etag = auth_client.get('/api/v1/wrs/')['ETag']
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            receipt.notes = "never committed"
+            receipt.save()
+            raise RuntimeError
+    assert auth_client.get('/api/v1/wrs/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+def test_only_tracked_models_bump_the_version(company, receipt):
+    before = get_data_version(company.id)[0]
+    # Only models an app registers are tracked: not users, idempotency keys or billing.
+    User.objects.create_user(username="etag_other", password="password")
+    IdempotencyKey.objects.create(company=company, key="k-1", fingerprint="f", expires_at=timezone.now())
+    Invoice.objects.create(
+        company=company, stripe_invoice_id="in_1", amount_paid=0, currency="usd", status="paid",
+        created_at=timezone.now(),
+    )
+    assert get_data_version(company.id)[0] == before
+
+    receipt.notes = "changed"
+    receipt.save()
+    assert get_data_version(company.id)[0] == before + 1
+
+
+def test_bumps_in_one_transaction_collapse_into_one_update(company):
+    before = get_data_version(company.id)[0]
+    with CaptureQueriesContext(connection) as ctx:
+        with transaction.atomic():
+            for _ in range(3):
+                bump_data_version(company.id)
+    updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "company_companydataversion"')]
+    assert len(updates) == 1
+    assert get_data_version(company.id)[0] == before + 1
+
+
+def test_bump_survives_a_rolled_back_savepoint(company):
+    before = get_data_version(company.id)[0]
+    with transaction.atomic():
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                bump_data_version(company.id)
+                raise RuntimeError
+        assert get_data_version(company.id)[0] == before
+        bump_data_version(company.id)
+    assert get_data_version(company.id)[0] == before + 1
+
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            bump_data_version(company.id)
+            raise RuntimeError
+    bump_data_version(company.id)
+    assert get_data_version(company.id)[0] == before + 2
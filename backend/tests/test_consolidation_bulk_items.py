@@ -0,0 +1,174 @@
+"""
+Tests for POST /consolidations/{id}/add_items/ and /remove_items/.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanyMember, Office
+from consolidation.models import Consolidation, ConsolidationReceipt, ConsolidationStatus
+from consolidation.services import (
+    REJECT_NOT_ACTIVE,
+    REJECT_NOT_FOUND,
+    REJECT_NOT_IN_CONSOLIDATION,
+    REJECT_OTHER_CONSOLIDATION,
+    REJECT_SHIP_TYPE_MISMATCH,
+)
+from receiving.models import ConsumedBy, WarehouseReceipt, WRStatus
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Bulk Consolidation Co")
+    client = Client.objects.create(company=company, client_code="BC-1", name="Bulk Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-BC", name="Bulk Warehouse")
+    agency = AssociateCompany.objects.create(company=company, name="Agency")
+    office_a = Office.objects.create(company=company, name="Office A")
+    office_b = Office.objects.create(company=company, name="Office B")
+
+    def receipts(count, **fields):
+        values = {"status": WRStatus.ACTIVE, "associate_company": agency, "shipping_method": "sea", **fields}
+        return [
+            WarehouseReceipt.objects.create(company=company, client=client, received_warehouse=warehouse, **values)
+            for _ in range(count)
+        ]
+
+    def consolidation():
+        return Consolidation.objects.create(
+            company=company, associate_company=agency, ship_type="SEA",
+            sending_office=office_a, receiving_office=office_b,
+        )
+
+    user = User.objects.create_user(username="bulk_consolidation_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {"company": company, "receipts": receipts, "consolidation": consolidation, "api": api}
+
+
+def _add(setup_data, consolidation, ids, **extra):
+    return setup_data["api"].post(
+        f'/api/v1/consolidations/{consolidation.id}/add_items/',
+        {"warehouse_receipt_ids": ids, **extra}, format='json',
+    )
+
+
+def _remove(setup_data, consolidation, ids, **extra):
+    return setup_data["api"].post(
+        f'/api/v1/consolidations/{consolidation.id}/remove_items/',
+        {"warehouse_receipt_ids": ids, **extra}, format='json',
+    )
+
+
+@pytest.mark.django_db
+def test_add_items(setup_data):
+    wrs = setup_data["receipts"](3)
+    consolidation = setup_data["consolidation"]()
+
+    resp = _add(setup_data, consolidation, [wr.id for wr in wrs])
+
+    assert resp.status_code == 200, resp.data
+    assert resp.data["added"] == 3
+    assert [r["status"] for r in resp.data["results"]] == ["added"] * 3
+    assert resp.data["consolidation"]["status"] == ConsolidationStatus.OPEN
+    assert set(resp.data["consolidation"]["warehouse_receipt_ids"]) == {wr.id for wr in wrs}
+    for wr in wrs:
+        wr.refresh_from_db()
+        assert wr.consumed_by == ConsumedBy.CONSOLIDATION
+        assert wr.consolidation_id == consolidation.id
+
+
+@pytest.mark.django_db
+def test_add_items_reports_per_id_outcomes(setup_data):
+    ok, linked = setup_data["receipts"](2)
+    inactive = setup_data["receipts"](1, status=WRStatus.INACTIVE)[0]
+    air = setup_data["receipts"](1, shipping_method="air")[0]
+    other = setup_data["consolidation"]()
+    _add(setup_data, other, [linked.id])
+    consolidation = setup_data["consolidation"]()
+    _add(setup_data, consolidation, [ok.id])
+
+    resp = _add(setup_data, consolidation, [ok.id, linked.id, inactive.id, air.id, 999999])
+
+    assert resp.status_code == 400
+    outcomes = {r["warehouse_receipt_id"]: (r["status"], r.get("code")) for r in resp.data["results"]}
+    assert outcomes == {
+        ok.id: ("skipped", None),
+        linked.id: ("rejected", REJECT_OTHER_CONSOLIDATION),
+        inactive.id: ("rejected", REJECT_NOT_ACTIVE),
+        air.id: ("rejected", REJECT_SHIP_TYPE_MISMATCH),
+        999999: ("rejected", REJECT_NOT_FOUND),
+    }
+    assert other.reference_code in next(r["detail"] for r in resp.data["results"] if r.get("code") == REJECT_OTHER_CONSOLIDATION)
+
+
+@pytest.mark.django_db
+def test_add_items_partial_and_strict(setup_data):
+    ok = setup_data["receipts"](1)[0]
+    air = setup_data["receipts"](1, shipping_method="air")[0]
+    consolidation = setup_data["consolidation"]()
+
+    resp = _add(setup_data, consolidation, [ok.id, air.id], strict=True)
+    assert resp.status_code == 400
+    assert not ConsolidationReceipt.objects.filter(consolidation=consolidation).exists()
+
+    resp = _add(setup_data, consolidation, [ok.id, air.id])
+    assert resp.status_code == 207
+    assert resp.data["added"] == 1 and resp.data["rejected"] == 1
+    assert list(ConsolidationReceipt.objects.filter(consolidation=consolidation).values_list(
+        'warehouse_receipt_id', flat=True)) == [ok.id]
+
+
+@pytest.mark.django_db
+def test_add_items_rejects_closed_consolidation(setup_data):
+    wr = setup_data["receipts"](1)[0]
+    consolidation = setup_data["consolidation"]()
+    Consolidation.objects.filter(id=consolidation.id).update(status=ConsolidationStatus.CLOSED)
+
+    resp = _add(setup_data, consolidation, [wr.id])
+
+    assert resp.status_code == 400
+    assert resp.data["detail"] == "Cannot modify a closed consolidation."
+
+
+@pytest.mark.django_db
+def test_remove_items(setup_data):
+    wrs = setup_data["receipts"](3)
+    consolidation = setup_data["consolidation"]()
+    _add(setup_data, consolidation, [wr.id for wr in wrs])
+    stranger = setup_data["receipts"](1)[0]
+
+    resp = _remove(setup_data, consolidation, [wrs[0].id, wrs[1].id, stranger.id])
+
+    assert resp.status_code == 207
+    outcomes = {r["warehouse_receipt_id"]: (r["status"], r.get("code")) for r in resp.data["results"]}
+    assert outcomes == {
+        wrs[0].id: ("removed", None),
+        wrs[1].id: ("removed", None),
+        stranger.id: ("rejected", REJECT_NOT_IN_CONSOLIDATION),
+    }
+    wrs[0].refresh_from_db()
+    assert wrs[0].consumed_by == ConsumedBy.NONE
+    assert wrs[0].consolidation_id is None
+
+    resp = _remove(setup_data, consolidation, [wrs[2].id])
+    assert resp.status_code == 200
+    assert resp.data["consolidation"]["status"] == ConsolidationStatus.DRAFT
+
+
+@pytest.mark.django_db
+def test_add_items_query_count_is_fixed(setup_data):
+    def count(n):
+        wrs = setup_data["receipts"](n)
+        consolidation = setup_data["consolidation"]()
+        with CaptureQueriesContext(connection) as ctx:
+            resp = _add(setup_data, consolidation, [wr.id for wr in wrs])
+        assert resp.status_code == 200
+        return len([q for q in ctx.captured_queries if not q['sql'].startswith('INSERT')])
+
+    assert count(3) == count(60)
@@ -0,0 +1,195 @@
+"""
+Tests for GET /api/v1/consolidations/{id}/load-plan/ (container load
+planning for SEA consolidations).
+"""
+import itertools
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanyMember, Office
+from consolidation.models import Consolidation, ConsolidationReceipt
+from consolidation.services_load_plan import (
+    CONTAINER_PRESETS,
+    UNPLACED_NO_DIMENSIONS,
+    UNPLACED_NO_SPACE,
+    UNPLACED_TOO_LARGE,
+    _pack,
+    consolidation_load_plan,
+)
+from receiving.models import WarehouseReceipt, WarehouseReceiptLine, WRStatus
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Load Plan Co")
+    client = Client.objects.create(company=company, client_code="LP-1", name="Load Plan Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-LP", name="Load Plan Warehouse")
+    agency = AssociateCompany.objects.create(company=company, name="Agency")
+    office_a = Office.objects.create(company=company, name="Office A")
+    office_b = Office.objects.create(company=company, name="Office B")
+
+    def consolidation(ship_type="SEA"):
+        return Consolidation.objects.create(
+            company=company, associate_company=agency, ship_type=ship_type,
+            sending_office=office_a, receiving_office=office_b,
+        )
+
+    def receipt(consolidation, *lines):
+        wr = WarehouseReceipt.objects.create(
+            company=company, client=client, received_warehouse=warehouse,
+            status=WRStatus.ACTIVE, associate_company=agency, shipping_method="sea",
+        )
+        for dims, weight, pieces in lines:
+            length, width, height = dims if dims else (None, None, None)
+            WarehouseReceiptLine.objects.create(
+                receipt=wr, company=company, weight=Decimal(weight), pieces=pieces,
+                length=length, width=width, height=height,
+            )
+        ConsolidationReceipt.objects.create(company=company, consolidation=consolidation, warehouse_receipt=wr)
+        return wr
+
+    user = User.objects.create_user(username="load_plan_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {"consolidation": consolidation, "receipt": receipt, "api": api}
+
+
+def _overlap(a, b):
+    return all(
+        a[axis] < b[axis] + b[size] - 1e-6 and b[axis] < a[axis] + a[size] - 1e-6
+        for axis, size in (('x', 'length'), ('y', 'width'), ('z', 'height'))
+    )
+
+
+def test_pack_keeps_boxes_inside_and_apart():
+    container = CONTAINER_PRESETS['20GP']
+    groups = [
+        {'wr': n, 'line': n, 'dims': dims, 'weight': 30.0, 'count': count}
+        for n, (dims, count) in enumerate([
+            ((48.0, 40.0, 36.0), 12), ((24.0, 18.0, 18.0), 40), ((30.0, 20.0, 12.0), 25), ((12.0, 12.0, 12.0), 60),
+        ])
+    ]
+
+    placements, unplaced = _pack(groups, container)
+
+    assert len(placements) == 137 and unplaced == []
+    for p in placements:
+        assert p['x'] + p['length'] <= container['length'] + 1e-6
+        assert p['y'] + p['width'] <= container['width'] + 1e-6
+        assert p['z'] + p['height'] <= container['height'] + 1e-6
+    assert not any(_overlap(a, b) for a, b in itertools.combinations(placements, 2))
+
+
+def test_pack_reports_too_large_and_no_space():
+    container = CONTAINER_PRESETS['20GP']
+    groups = [
+        {'wr': 1, 'line': 1, 'dims': (300.0, 100.0, 100.0), 'weight': 10.0, 'count': 1},
+        {'wr': 2, 'line': 2, 'dims': (90.0, 90.0, 90.0), 'weight': 10.0, 'count': 5},
+    ]
+
+    placements, unplaced = _pack(groups, container)
+
+    assert len(placements) == 2
+    reasons = {(group['line'], count, reason) for group, _, count, reason in unplaced}
+    assert reasons == {(1, 1, UNPLACED_TOO_LARGE), (2, 3, UNPLACED_NO_SPACE)}
+
+
+@pytest.mark.django_db
+def test_load_plan_endpoint(setup_data):
+    consolidation = setup_data["consolidation"]()
+    setup_data["receipt"](consolidation, ((48, 40, 40), "400.00", 4), ((20, 20, 20), "50.00", 10))
+    setup_data["receipt"](consolidation, (None, "5.00", 1))
+
+    resp = setup_data["api"].get(f'/api/v1/consolidations/{consolidation.id}/load-plan/', {"container": "40HC"})
+
+    assert resp.status_code == 200, resp.data
+    plan = resp.data
+    assert plan["container"] == "40HC"
+    assert plan["piece_count"] == 15
+    assert plan["placed_count"] == 14
+    assert plan["fits"] is True
+    assert [u["reason"] for u in plan["unplaced"]] == [UNPLACED_NO_DIMENSIONS]
+    assert plan["placed_weight"] == pytest.approx(450.0)
+    assert 0 < plan["volume_utilization"] < 100
+    assert {p["piece"] for p in plan["placements"] if p["weight"] == 100.0} == {1, 2, 3, 4}
+
+
+@pytest.mark.django_db
+def test_load_plan_picks_smallest_container(setup_data):
+    small = setup_data["consolidation"]()
+    setup_data["receipt"](small, ((40, 40, 40), "100.00", 20))
+    large = setup_data["consolidation"]()
+    setup_data["receipt"](large, ((60, 45, 45), "100.00", 24))
+
+    assert consolidation_load_plan(small)["container"] == "20GP"
+    plan = consolidation_load_plan(large)
+    assert plan["container"] == "40GP"
+    assert plan["fits"] is True
+
+
+@pytest.mark.django_db
+def test_load_plan_is_cached_until_membership_changes(setup_data):
+    consolidation = setup_data["consolidation"]()
+    setup_data["receipt"](consolidation, ((40, 40, 40), "100.00", 2))
+    url = f'/api/v1/consolidations/{consolidation.id}/load-plan/'
+    assert setup_data["api"].get(url, {"container": "20GP"}).data["placed_count"] == 2
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = setup_data["api"].get(url, {"container": "20GP"})
+    assert resp.status_code == 200
+    assert not any('receiving_warehousereceiptline' in q['sql'] for q in ctx.captured_queries)
+
+    setup_data["receipt"](consolidation, ((40, 40, 40), "100.00", 3))
+    assert setup_data["api"].get(url, {"container": "20GP"}).data["placed_count"] == 5
+
+
+@pytest.mark.django_db
+def test_load_plan_rejects_non_sea_and_unknown_container(setup_data):
+    air = setup_data["consolidation"]("AIR")
+    resp = setup_data["api"].get(f'/api/v1/consolidations/{air.id}/load-plan/')
+    assert resp.status_code == 400
+
+    sea = setup_data["consolidation"]()
+    resp = setup_data["api"].get(f'/api/v1/consolidations/{sea.id}/load-plan/', {"container": "45XL"})
+    assert resp.status_code == 400
+
+
+def test_pack_places_thousands_of_pieces():
+    container = CONTAINER_PRESETS['40HC']
+    groups = [
+        {'wr': n, 'line': n, 'dims': (8.0 + n % 5 * 3, 6.0 + n % 4 * 2, 5.0 + n % 3 * 2), 'weight': 15.0, 'count': 1 + n % 6}
+        for n in range(800)
+    ]
+
+    placements, unplaced = _pack(groups, container)
+
+    assert unplaced == []
+    assert len(placements) == sum(g['count'] for g in groups) > 2000
+    for p in placements:
+        assert p['x'] + p['length'] <= container['length'] + 1e-6
+        assert p['y'] + p['width'] <= container['width'] + 1e-6
+        assert p['z'] + p['height'] <= container['height'] + 1e-6
+    # Sweep along the length: only boxes that start before one ends can overlap it.
+    placements.sort(key=lambda p: p['x'])
+    for index, a in enumerate(placements):
+        for b in placements[index + 1:]:
+            if b['x'] >= a['x'] + a['length']:
+                break
+            assert not _overlap(a, b)
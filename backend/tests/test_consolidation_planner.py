@@ -0,0 +1,227 @@
+"""
+Tests for the consolidation planner: GET /consolidations/plan/ and
+POST /consolidations/plan/commit/.
+"""
+import random
+from decimal import Decimal
+from itertools import count
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanyMember, Office
+from consolidation.models import Consolidation, ConsolidationReceipt, ConsolidationStatus
+from consolidation.services_planner import _first_fit_decreasing, plan_consolidations
+from receiving.models import ConsumedBy, WarehouseReceipt, WRStatus
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Planner Co")
+    client = Client.objects.create(company=company, client_code="PL-1", name="Planner Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-PL", name="Planner Warehouse")
+    agency = AssociateCompany.objects.create(company=company, name="Agency")
+    other_agency = AssociateCompany.objects.create(company=company, name="Other Agency")
+    office_a = Office.objects.create(company=company, name="Office A")
+    office_b = Office.objects.create(company=company, name="Office B")
+    numbers = count(1)
+
+    def receipt(weight, volume, agency=agency, method="sea", receipt_type=None, status=WRStatus.ACTIVE, **fields):
+        return WarehouseReceipt.objects.create(
+            company=company, client=client, received_warehouse=warehouse, status=status,
+            wr_number=f"WR-PL-{next(numbers)}", associate_company=agency, shipping_method=method,
+            receipt_type=receipt_type, total_weight=Decimal(weight), total_volume_cf=Decimal(volume), **fields,
+        )
+
+    user = User.objects.create_user(username="planner_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {
+        "company": company, "agency": agency, "other_agency": other_agency, "receipt": receipt,
+        "office_a": office_a, "office_b": office_b, "api": api,
+    }
+
+
+def test_first_fit_decreasing_respects_both_limits():
+    random.seed(7)
+    items = [(n, random.randint(1, 400), random.randint(1, 900)) for n in range(2000)]
+    sizes = {key: (weight, volume) for key, weight, volume in items}
+
+    bins = _first_fit_decreasing(items, 1000, 2000)
+
+    assert sorted(key for keys in bins for key in keys) == list(range(2000))
+    for keys in bins:
+        assert sum(sizes[key][0] for key in keys) <= 1000
+        assert sum(sizes[key][1] for key in keys) <= 2000
+    # FFD stays close to the lower bound on the number of bins.
+    lower = max(sum(w for _, w, _ in items) / 1000, sum(v for _, _, v in items) / 2000)
+    assert len(bins) <= lower * 1.25 + 1
+
+
+@pytest.mark.django_db
+def test_plan_groups_and_packs(setup_data):
+    receipt = setup_data["receipt"]
+    big = [receipt("600", "10") for _ in range(3)]
+    small = receipt("300", "10")
+    typed = receipt("100", "10", receipt_type="COURIER")
+    other = receipt("100", "10", agency=setup_data["other_agency"])
+    air = receipt("50", "1", method="air")
+    oversized = receipt("1500", "10")
+    receipt("100", "10", status=WRStatus.INACTIVE)
+    receipt("100", "10", consumed_by=ConsumedBy.SHIPMENT)
+    receipt("100", "10", agency=None)
+
+    proposals = plan_consolidations(setup_data["company"], max_weight=Decimal("1000"), max_volume_cf=Decimal("100"))
+
+    by_ids = {tuple(p["warehouse_receipt_ids"]): p for p in proposals}
+    planned = sorted(wr_id for p in proposals for wr_id in p["warehouse_receipt_ids"])
+    assert planned == sorted(wr.id for wr in [*big, small, typed, other, air, oversized])
+    # Three 600 lb receipts need three bins; the 300 lb one fills the first.
+    sea_plain = [
+        p for p in proposals
+        if p["associate_company"] == setup_data["agency"].id and p["ship_type"] == "SEA"
+        and p["consolidation_type"] is None and not p["oversized"]
+    ]
+    assert sorted(p["item_count"] for p in sea_plain) == [1, 1, 2]
+    assert all(p["total_weight"] <= Decimal("1000") for p in sea_plain)
+    assert by_ids[(oversized.id,)]["oversized"] is True
+    assert by_ids[(typed.id,)]["consolidation_type"] == "COURIER"
+    assert by_ids[(air.id,)]["ship_type"] == "AIR"
+    assert by_ids[(other.id,)]["associate_company"] == setup_data["other_agency"].id
+
+
+@pytest.mark.django_db
+def test_plan_endpoint_filters_and_defaults(setup_data):
+    setup_data["receipt"]("100", "10")
+    air = setup_data["receipt"]("50", "1", method="air")
+
+    resp = setup_data["api"].get('/api/v1/consolidations/plan/', {"ship_type": "AIR"})
+
+    assert resp.status_code == 200, resp.data
+    assert resp.data["proposal_count"] == 1
+    proposal = resp.data["proposals"][0]
+    assert proposal["warehouse_receipt_ids"] == [air.id]
+    assert Decimal(proposal["max_weight"]) == Decimal("3500")
+
+    resp = setup_data["api"].get('/api/v1/consolidations/plan/', {"max_weight": "0"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_commit_plan(setup_data):
+    receipt = setup_data["receipt"]
+    for _ in range(3):
+        receipt("600", "10")
+    plan = setup_data["api"].get('/api/v1/consolidations/plan/', {"max_weight": "1000"}).data
+
+    resp = setup_data["api"].post('/api/v1/consolidations/plan/commit/', {
+        "sending_office": setup_data["office_a"].id,
+        "receiving_office": setup_data["office_b"].id,
+        "proposals": plan["proposals"],
+    }, format='json')
+
+    assert resp.status_code == 201, resp.data
+    assert resp.data["created"] == 3
+    consolidations = Consolidation.objects.filter(company=setup_data["company"])
+    assert consolidations.count() == 3
+    assert set(consolidations.values_list('status', flat=True)) == {ConsolidationStatus.OPEN}
+    assert len(set(consolidations.values_list('reference_code', flat=True))) == 3
+    assert ConsolidationReceipt.objects.filter(consolidation__in=consolidations).count() == 3
+    for created in resp.data["consolidations"]:
+        wr = WarehouseReceipt.objects.get(id=created["warehouse_receipt_ids"][0])
+        assert wr.consumed_by == ConsumedBy.CONSOLIDATION
+        assert wr.consolidation_id == created["id"]
+
+    # Everything is planned now.
+    assert setup_data["api"].get('/api/v1/consolidations/plan/').data["proposal_count"] == 0
+
+
+@pytest.mark.django_db
+def test_commit_stale_plan_creates_nothing(setup_data):
+    first = setup_data["receipt"]("100", "10")
+    second = setup_data["receipt"]("100", "10")
+    plan = setup_data["api"].get('/api/v1/consolidations/plan/').data
+    WarehouseReceipt.objects.filter(id=second.id).update(status=WRStatus.INACTIVE)
+
+    resp = setup_data["api"].post('/api/v1/consolidations/plan/commit/', {
+        "sending_office": setup_data["office_a"].id,
+        "receiving_office": setup_data["office_b"].id,
+        "proposals": plan["proposals"] + [{**plan["proposals"][0], "warehouse_receipt_ids": [first.id]}],
+    }, format='json')
+
+    assert resp.status_code == 400
+    codes = {(int(r["warehouse_receipt_id"]), r["code"]) for r in resp.data["rejected"]}
+    assert codes == {(second.id, "not_active"), (first.id, "duplicate")}
+    assert not Consolidation.objects.filter(company=setup_data["company"]).exists()
+
+
+@pytest.mark.django_db
+def test_commit_rejects_foreign_office(setup_data):
+    setup_data["receipt"]("100", "10")
+    plan = setup_data["api"].get('/api/v1/consolidations/plan/').data
+    foreign = Office.objects.create(company=Company.objects.create(name="Elsewhere"), name="Foreign")
+
+    resp = setup_data["api"].post('/api/v1/consolidations/plan/commit/', {
+        "sending_office": foreign.id,
+        "receiving_office": setup_data["office_b"].id,
+        "proposals": plan["proposals"],
+    }, format='json')
+
+    assert resp.status_code == 400
+    assert "sending_office" in resp.data
+
+
+@pytest.mark.django_db
+def test_plan_fills_bins_exactly_with_a_fixed_query_count(setup_data):
+    receipt = setup_data["receipt"]
+    limits = {"max_weight": Decimal("1000"), "max_volume_cf": Decimal("100")}
+    for weight in ("700", "700", "500", "500", "300", "300"):
+        receipt(weight, "10")
+
+    with CaptureQueriesContext(connection) as small:
+        proposals = plan_consolidations(setup_data["company"], **limits)
+    # Decreasing first fit: 700+300, 700+300, 500+500.
+    assert sorted(p["item_count"] for p in proposals) == [2, 2, 2]
+    assert all(p["total_weight"] == Decimal("1000") for p in proposals)
+
+    for n in range(40):
+        receipt("100", "1", method=["sea", "air"][n % 2], receipt_type=[None, "COURIER"][n % 3 == 0])
+    with CaptureQueriesContext(connection) as large:
+        proposals = plan_consolidations(setup_data["company"], **limits)
+    assert sum(p["item_count"] for p in proposals) == 46
+    assert len(large) == len(small)
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_plan_benchmark_50k(setup_data):
+    company = setup_data["company"]
+    template = WarehouseReceipt.objects.create(
+        company=company, client=Client.objects.get(company=company), wr_number="WR-PL-T",
+    )
+    random.seed(3)
+    methods = ["sea", "air", "ground"]
+    WarehouseReceipt.objects.bulk_create(
+        [
+            WarehouseReceipt(
+                company=company, client_id=template.client_id, wr_number=f"WR-PL-B{n}",
+                status=WRStatus.ACTIVE, associate_company=setup_data["agency"], shipping_method=methods[n % 3],
+                receipt_type=["", "COURIER"][n % 2],
+                total_weight=Decimal(random.randint(1, 20000)) / 100,
+                total_volume_cf=Decimal(random.randint(1, 300000)) / 10000,
+            )
+            for n in range(50000)
+        ],
+        batch_size=2000,
+    )
+
+    proposals = plan_consolidations(company)
+
+    assert sum(p["item_count"] for p in proposals) == 50000
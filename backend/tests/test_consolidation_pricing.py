@@ -0,0 +1,173 @@
+"""
+Tests for GET /api/v1/consolidations/{id}/pricing/ (server-side volumetric,
+actual and chargeable weight).
+"""
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanyMember, Office
+from consolidation.models import Consolidation
+from inventory.models import InventoryBalance
+from receiving.models import WarehouseReceipt, WarehouseReceiptLine, WRStatus
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Pricing Co")
+    client = Client.objects.create(company=company, client_code="PR-1", name="Pricing Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-PR", name="Pricing Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="PR-LOC")
+    agency = AssociateCompany.objects.create(company=company, name="Agency")
+    office_a = Office.objects.create(company=company, name="Office A")
+    office_b = Office.objects.create(company=company, name="Office B")
+
+    def receipt(*lines, method="air"):
+        wr = WarehouseReceipt.objects.create(
+            company=company, client=client, received_warehouse=warehouse,
+            status=WRStatus.ACTIVE, associate_company=agency, shipping_method=method,
+        )
+        for weight, dims in lines:
+            length, width, height = dims
+            WarehouseReceiptLine.objects.create(
+                receipt=wr, company=company, weight=Decimal(weight),
+                length=length, width=width, height=height,
+            )
+        InventoryBalance.objects.create(
+            company=company, client=client, warehouse=warehouse, location=location, wr=wr, on_hand_qty=1,
+        )
+        return wr
+
+    def consolidation(ship_type="AIR"):
+        return Consolidation.objects.create(
+            company=company, associate_company=agency, ship_type=ship_type,
+            sending_office=office_a, receiving_office=office_b,
+        )
+
+    return {"company": company, "receipt": receipt, "consolidation": consolidation}
+
+
+@pytest.fixture
+def auth_client(setup_data):
+    user = User.objects.create_user(username="pricing_user", password="password")
+    CompanyMember.objects.create(company=setup_data["company"], user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+def _add(api, consolidation, wr):
+    resp = api.post(f'/api/v1/consolidations/{consolidation.id}/add_item/', {"warehouse_receipt_id": wr.id}, format='json')
+    assert resp.status_code == 200, resp.data
+
+
+@pytest.mark.django_db
+def test_air_pricing_per_item_and_totals(auth_client, setup_data):
+    con = setup_data["consolidation"]("AIR")
+    # 20x10x10 = 2000 in³ / 166 = 12.05 lb volumetric vs 5 lb actual.
+    bulky = setup_data["receipt"](("5.00", ("20", "10", "10")))
+    # 10x10x10 = 1000 in³ / 166 = 6.02 lb volumetric vs 30 lb actual.
+    dense = setup_data["receipt"](("20.00", ("10", "10", "10")), ("10.00", (None, None, None)))
+    _add(auth_client, con, bulky)
+    _add(auth_client, con, dense)
+
+    resp = auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/')
+    assert resp.status_code == 200, resp.data
+    data = resp.data
+    assert data["pricing_available"] is True
+    assert data["pvol_divisor"] == "166"
+    assert data["total_actual_weight"] == "35.00"
+    assert data["total_volumetric_weight"] == "18.07"
+    assert data["chargeable_weight"] == "35.00"
+    assert data["billed_weight"] == "42.05"
+
+    items = {item["warehouse_receipt_id"]: item for item in data["items"]}
+    assert items[bulky.id]["billed_by"] == "volume"
+    assert items[bulky.id]["chargeable_weight"] == "12.05"
+    assert items[dense.id]["billed_by"] == "weight"
+    assert items[dense.id]["line_count"] == 2
+
+
+@pytest.mark.django_db
+def test_bill_by_override_and_validation(auth_client, setup_data):
+    con = setup_data["consolidation"]("SEA")
+    wr = setup_data["receipt"](("10.00", ("24", "24", "12")), method="sea")  # 6912 in³ / 1728 = 4 lb
+    _add(auth_client, con, wr)
+
+    resp = auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/')
+    assert resp.data["items"][0]["billed_by"] == "weight"
+    assert resp.data["billed_weight"] == "10.00"
+
+    resp = auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/', {"bill_by": f"{wr.id}:volume"})
+    assert resp.data["items"][0]["billed_by"] == "volume"
+    assert resp.data["billed_weight"] == "4.00"
+
+    resp = auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/', {"bill_by": f"{wr.id}:cubes"})
+    assert resp.status_code == 400
+    assert "bill_by" in resp.data
+
+
+@pytest.mark.django_db
+def test_ground_has_no_volumetric_pricing(auth_client, setup_data):
+    con = setup_data["consolidation"]("GROUND")
+    _add(auth_client, con, setup_data["receipt"](("3.00", ("10", "10", "10")), method="ground"))
+
+    resp = auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/')
+    assert resp.data["pricing_available"] is False
+    assert resp.data["total_actual_weight"] == "3.00"
+    assert resp.data["chargeable_weight"] is None
+    assert resp.data["items"][0]["billed_weight"] is None
+
+
+@pytest.mark.django_db
+def test_cached_figures_follow_membership(auth_client, setup_data):
+    con = setup_data["consolidation"]("AIR")
+    first = setup_data["receipt"](("4.00", ("1", "1", "1")))
+    second = setup_data["receipt"](("6.00", ("1", "1", "1")))
+    _add(auth_client, con, first)
+    assert auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/').data["total_actual_weight"] == "4.00"
+
+    _add(auth_client, con, second)
+    assert auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/').data["total_actual_weight"] == "10.00"
+
+    resp = auth_client.post(f'/api/v1/consolidations/{con.id}/remove_item/', {"warehouse_receipt_id": first.id}, format='json')
+    assert resp.status_code == 200, resp.data
+    data = auth_client.get(f'/api/v1/consolidations/{con.id}/pricing/').data
+    assert data["total_actual_weight"] == "6.00"
+    assert [item["warehouse_receipt_id"] for item in data["items"]] == [second.id]
+
+
+@pytest.mark.django_db
+def test_query_count_does_not_grow_with_items(auth_client, setup_data):
+    small = setup_data["consolidation"]("AIR")
+    large = setup_data["consolidation"]("AIR")
+    _add(auth_client, small, setup_data["receipt"](("1.00", ("1", "1", "1"))))
+    for _ in range(6):
+        _add(auth_client, large, setup_data["receipt"](("1.00", ("1", "1", "1")), ("2.00", ("2", "2", "2"))))
+
+    with CaptureQueriesContext(connection) as small_ctx:
+        assert auth_client.get(f'/api/v1/consolidations/{small.id}/pricing/').status_code == 200
+    with CaptureQueriesContext(connection) as large_ctx:
+        resp = auth_client.get(f'/api/v1/consolidations/{large.id}/pricing/')
+    assert resp.data["item_count"] == 6
+    assert len(large_ctx) == len(small_ctx)
+
+    # A warm cache skips the per-item aggregate.
+    with CaptureQueriesContext(connection) as warm_ctx:
+        auth_client.get(f'/api/v1/consolidations/{large.id}/pricing/')
+    assert len(warm_ctx) == len(large_ctx) - 1
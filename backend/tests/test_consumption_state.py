@@ -0,0 +1,160 @@
+"""
+Tests for the materialized consumption state on WarehouseReceipt
+(consumed_by / consolidation) and the pickers that filter on it.
+"""
+import pytest
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanyMember, Office
+from consolidation.models import Consolidation
+from inventory.models import InventoryBalance
+from receiving.models import ConsumedBy, WarehouseReceipt, WRStatus
+from shipping.models import Shipment
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Consumption Co")
+    client = Client.objects.create(company=company, client_code="CS-1", name="Consumption Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-CS", name="Consumption Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="CS-LOC")
+    agency = AssociateCompany.objects.create(company=company, name="Agency")
+    office_a = Office.objects.create(company=company, name="Office A")
+    office_b = Office.objects.create(company=company, name="Office B")
+
+    wrs = []
+    for n in range(4):
+        wr = WarehouseReceipt.objects.create(
+            company=company, client=client, received_warehouse=warehouse,
+            status=WRStatus.ACTIVE, allow_repacking=True,
+            associate_company=agency, shipping_method="air",
+        )
+        InventoryBalance.objects.create(
+            company=company, client=client, warehouse=warehouse, location=location, wr=wr, on_hand_qty=1,
+        )
+        wrs.append(wr)
+
+    def consolidation():
+        return Consolidation.objects.create(
+            company=company, associate_company=agency, ship_type="AIR",
+            sending_office=office_a, receiving_office=office_b,
+        )
+
+    return {
+        "company": company, "client": client, "location": location,
+        "wrs": wrs, "consolidation": consolidation,
+    }
+
+
+@pytest.fixture
+def auth_client(setup_data):
+    user = User.objects.create_user(username="consumption_user", password="password")
+    CompanyMember.objects.create(company=setup_data["company"], user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+def _picker_ids(auth_client, **params):
+    resp = auth_client.get('/api/v1/wrs/', params)
+    assert resp.status_code == 200
+    rows = resp.data['results'] if isinstance(resp.data, dict) else resp.data
+    return {row['id'] for row in rows}
+
+
+@pytest.mark.django_db
+def test_repack_marks_inputs_and_hides_them_from_picker(auth_client, setup_data):
+    wr1, wr2, wr3, _ = setup_data["wrs"]
+    resp = auth_client.post('/api/v1/repack/consolidate/', {
+        "client": setup_data["client"].id,
+        "input_wrs": [wr1.id, wr2.id],
+        "output": {},
+        "to_location": setup_data["location"].id,
+    }, format='json')
+    assert resp.status_code == 201, resp.data
+
+    wr1.refresh_from_db()
+    assert wr1.consumed_by == ConsumedBy.REPACK
+    ids = _picker_ids(auth_client, eligible_for='repack')
+    assert wr1.id not in ids and wr2.id not in ids
+    assert wr3.id in ids
+
+    detail = auth_client.get(f'/api/v1/wrs/{wr1.id}/')
+    assert detail.data['wr_status_display']['type'] == 'repacked'
+
+
+@pytest.mark.django_db
+def test_shipment_marks_receipts_and_delete_releases_them(auth_client, setup_data):
+    wr1 = setup_data["wrs"][0]
+    shipment = Shipment.objects.create(
+        company=setup_data["company"], client=setup_data["client"], shipment_number="SHP-CS-1",
+    )
+    resp = auth_client.post(f'/api/v1/shipments/{shipment.id}/items/', {"wr_ids": [wr1.id]}, format='json')
+    assert resp.status_code == 200, resp.data
+
+    wr1.refresh_from_db()
+    assert wr1.consumed_by == ConsumedBy.SHIPMENT
+    assert wr1.id not in _picker_ids(auth_client, eligible_for='repack')
+    detail = auth_client.get(f'/api/v1/wrs/{wr1.id}/')
+    assert detail.data['wr_status_display'] == {'type': 'processed', 'reference': "SHP-CS-1"}
+
+    assert auth_client.delete(f'/api/v1/shipments/{shipment.id}/').status_code == 204
+    wr1.refresh_from_db()
+    assert wr1.consumed_by == ConsumedBy.NONE
+    assert wr1.id in _picker_ids(auth_client, eligible_for='repack')
+
+
+@pytest.mark.django_db
+def test_consolidation_add_remove_and_picker(auth_client, setup_data):
+    wr1, wr2, _, _ = setup_data["wrs"]
+    first = setup_data["consolidation"]()
+    second = setup_data["consolidation"]()
+
+    resp = auth_client.post(f'/api/v1/consolidations/{first.id}/add_item/', {"warehouse_receipt_id": wr1.id}, format='json')
+    assert resp.status_code == 200, resp.data
+    wr1.refresh_from_db()
+    assert wr1.consumed_by == ConsumedBy.CONSOLIDATION
+    assert wr1.consolidation_id == first.id
+
+    # Linked items stay visible in their own consolidation's picker only.
+    assert wr1.id in _picker_ids(auth_client, eligible_for='consolidation', consolidation_id=first.id)
+    second_ids = _picker_ids(auth_client, eligible_for='consolidation', consolidation_id=second.id)
+    assert wr1.id not in second_ids and wr2.id in second_ids
+    assert wr1.id not in _picker_ids(auth_client, eligible_for='repack')
+
+    resp = auth_client.post(f'/api/v1/consolidations/{first.id}/remove_item/', {"warehouse_receipt_id": wr1.id}, format='json')
+    assert resp.status_code == 200, resp.data
+    wr1.refresh_from_db()
+    assert wr1.consumed_by == ConsumedBy.NONE
+    assert wr1.consolidation_id is None
+    assert wr1.id in _picker_ids(auth_client, eligible_for='consolidation', consolidation_id=second.id)
+
+
+@pytest.mark.django_db
+def test_consolidation_serializer_links_and_delete(auth_client, setup_data):
+    wr1, wr2, _, _ = setup_data["wrs"]
+    consolidation = setup_data["consolidation"]()
+
+    resp = auth_client.patch(
+        f'/api/v1/consolidations/{consolidation.id}/', {"warehouse_receipts": [wr1.id, wr2.id]}, format='json',
+    )
+    assert resp.status_code == 200, resp.data
+    assert set(
+        WarehouseReceipt.objects.filter(consolidation=consolidation, consumed_by=ConsumedBy.CONSOLIDATION)
+        .values_list('id', flat=True)
+    ) == {wr1.id, wr2.id}
+
+    resp = auth_client.patch(
+        f'/api/v1/consolidations/{consolidation.id}/', {"warehouse_receipts": [wr2.id]}, format='json',
+    )
+    assert resp.status_code == 200, resp.data
+    wr1.refresh_from_db()
+    assert wr1.consumed_by == ConsumedBy.NONE
+
+    assert auth_client.delete(f'/api/v1/consolidations/{consolidation.id}/').status_code == 204
+    wr2.refresh_from_db()
+    assert (wr2.consumed_by, wr2.consolidation_id) == (ConsumedBy.NONE, None)
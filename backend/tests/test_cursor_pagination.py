@@ -0,0 +1,149 @@
+"""
+Tests for the opt-in keyset pagination (?cursor=) on the high-volume lists.
+"""
+import base64
+import json
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from core.pagination import KeysetCursorPagination
+from inventory.models import InventoryBalance
+from receiving.models import WarehouseReceipt
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Cursor Co")
+
+
+@pytest.fixture
+def auth_client(company):
+    user = User.objects.create_user(username="cursor_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def receipts(company):
+    client = Client.objects.create(company=company, name="Cursor Client", client_code="CU-1")
+    now = timezone.now()
+    # Pairs share a received_at so the id tie-breaker is exercised.
+    return [
+        WarehouseReceipt.objects.create(company=company, client=client, received_at=now - timedelta(hours=n // 2))
+        for n in range(7)
+    ]
+
+
+@pytest.fixture
+def page_size(monkeypatch):
+    def set_size(size):
+        monkeypatch.setattr(KeysetCursorPagination, 'page_size', size)
+    return set_size
+
+
+def _walk(api, url, params):
+    ids, pages = [], []
+    resp = api.get(url, params)
+    while True:
+        assert resp.status_code == 200, resp.data
+        pages.append(resp.data)
+        ids.extend(row["id"] for row in resp.data["results"])
+        if not resp.data["next"]:
+            return ids, pages
+        resp = api.get(resp.data["next"])
+
+
+@pytest.mark.django_db
+def test_cursor_walk_matches_default_ordering(auth_client, receipts, page_size):
+    expected = list(
+        WarehouseReceipt.objects.filter(id__in=[wr.id for wr in receipts])
+        .order_by('-received_at', '-id').values_list('id', flat=True)
+    )
+    page_size(3)
+    ids, pages = _walk(auth_client, '/api/v1/wrs/', {"cursor": ""})
+    assert ids == expected
+    assert [len(page["results"]) for page in pages] == [3, 3, 1]
+    assert pages[0]["previous"] is None and pages[0]["count"] is None
+
+    # Stepping back from the last page returns the middle one.
+    back = auth_client.get(pages[-1]["previous"])
+    assert [row["id"] for row in back.data["results"]] == expected[3:6]
+    assert back.data["next"]
+
+
+@pytest.mark.django_db
+def test_cursor_pages_skip_count_and_offset(auth_client, receipts, page_size):
+    first = auth_client.get('/api/v1/wrs/', {"cursor": ""})
+    page_size(2)
+    with CaptureQueriesContext(connection) as ctx:
+        resp = auth_client.get('/api/v1/wrs/', {"cursor": ""})
+    assert resp.status_code == 200
+    sql = " ".join(q["sql"].upper() for q in ctx.captured_queries)
+    assert "COUNT(" not in sql
+    assert "OFFSET" not in sql
+    assert first.data["next"] is None
+
+    counted = auth_client.get('/api/v1/wrs/', {"cursor": "", "count": "exact"})
+    assert counted.data["count"] == 7
+    assert auth_client.get('/api/v1/wrs/', {"cursor": "", "count": "estimate"}).data["count"] == 7
+
+    # Without ?cursor the list keeps its page-number shape.
+    paged = auth_client.get('/api/v1/wrs/')
+    assert paged.data["count"] == 7
+
+
+@pytest.mark.django_db
+def test_cursor_honours_ordering_param_and_rejects_garbage(auth_client, receipts, page_size):
+    expected = sorted(wr.id for wr in receipts)
+    page_size(2)
+    ids, _ = _walk(auth_client, '/api/v1/wrs/', {"cursor": "", "ordering": "created_at"})
+    assert ids == expected
+    assert auth_client.get('/api/v1/wrs/', {"cursor": "not-a-cursor"}).status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("values", [["not-a-date", 1], ["2026-01-01T00:00:00+00:00", "x"], [{}, []]])
+def test_tampered_cursor_is_not_found(auth_client, receipts, values):
+    payload = json.dumps({"v": values, "r": 0}).encode()
+    cursor = base64.urlsafe_b64encode(payload).decode()
+    resp = auth_client.get('/api/v1/wrs/', {"cursor": cursor})
+    assert resp.status_code == 404, resp.data
+
+
+@pytest.mark.django_db
+def test_page_size_is_not_client_controlled(auth_client, receipts):
+    resp = auth_client.get('/api/v1/wrs/', {"cursor": "", "page_size": 2})
+    assert len(resp.data["results"]) == 7
+
+
+@pytest.mark.django_db
+def test_balance_cursor_handles_null_locations(auth_client, company, receipts, page_size):
+    warehouse = Warehouse.objects.create(company=company, code="WH-CU", name="Cursor Warehouse")
+    locations = [
+        StorageLocation.objects.create(company=company, warehouse=warehouse, code=code)
+        for code in ("A-01", "B-01")
+    ]
+    for n, wr in enumerate(receipts):
+        InventoryBalance.objects.create(
+            company=company, client=wr.client, warehouse=warehouse,
+            location=locations[n % 2] if n < 5 else None, wr=wr, on_hand_qty=1,
+        )
+
+    page_size(2)
+    ids, _ = _walk(auth_client, '/api/v1/inventory/balances/', {"cursor": ""})
+    balances = InventoryBalance.objects.in_bulk(ids)
+    codes = [balances[i].location.code if balances[i].location else None for i in ids]
+    assert len(ids) == 7 and len(set(ids)) == 7
+    assert codes == ["A-01"] * 3 + ["B-01"] * 2 + [None] * 2
@@ -0,0 +1,119 @@
+"""
+Tests for Idempotency-Key handling on the mutating warehouse endpoints.
+"""
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from core.models import IdempotencyKey, ShipmentStatus
+from inventory.models import InventoryBalance, InventoryTransaction, TxnType
+from receiving.models import WarehouseReceipt, WRStatus
+from shipping.models import Shipment, ShipmentItem
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Idempotency Co")
+    client = Client.objects.create(company=company, client_code="ID-1", name="Idempotency Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-ID", name="Idempotency Warehouse")
+    loc_a = StorageLocation.objects.create(company=company, warehouse=warehouse, code="ID-A")
+    loc_b = StorageLocation.objects.create(company=company, warehouse=warehouse, code="ID-B")
+    wr = WarehouseReceipt.objects.create(company=company, client=client, received_warehouse=warehouse, status=WRStatus.ACTIVE)
+    InventoryBalance.objects.create(company=company, client=client, warehouse=warehouse, location=loc_a, wr=wr, on_hand_qty=1)
+    shipment = Shipment.objects.create(company=company, shipment_number="SHP-ID-1", client=client, from_warehouse=warehouse)
+    return {
+        "company": company, "client": client, "warehouse": warehouse,
+        "loc_a": loc_a, "loc_b": loc_b, "wr": wr, "shipment": shipment,
+    }
+
+
+@pytest.fixture
+def auth_client(setup_data):
+    user = User.objects.create_user(username="idempotency_user", password="password")
+    CompanyMember.objects.create(company=setup_data["company"], user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.mark.django_db
+def test_retried_receipt_create_is_replayed(auth_client, setup_data):
+    payload = {"client": setup_data["client"].id, "received_warehouse": setup_data["warehouse"].id}
+    first = auth_client.post('/api/v1/wrs/', payload, format='json', HTTP_IDEMPOTENCY_KEY="scan-1")
+    assert first.status_code == 201, first.data
+    count = WarehouseReceipt.objects.count()
+
+    retry = auth_client.post('/api/v1/wrs/', payload, format='json', HTTP_IDEMPOTENCY_KEY="scan-1")
+    assert retry.status_code == 201
+    assert retry["Idempotent-Replayed"] == "true"
+    assert retry.data["id"] == first.data["id"]
+    assert WarehouseReceipt.objects.count() == count
+
+    # Same key, different body: rejected rather than replayed.
+    other = auth_client.post('/api/v1/wrs/', {**payload, "notes": "x"}, format='json', HTTP_IDEMPOTENCY_KEY="scan-1")
+    assert other.status_code == 422
+
+    # No key: every POST creates.
+    auth_client.post('/api/v1/wrs/', payload, format='json')
+    assert WarehouseReceipt.objects.count() == count + 1
+
+
+@pytest.mark.django_db
+def test_retried_move_and_ship_run_once(auth_client, setup_data):
+    move = {"wr": setup_data["wr"].id, "to_location": setup_data["loc_b"].id}
+    for _ in range(2):
+        resp = auth_client.post('/api/v1/inventory/move/', move, format='json', HTTP_IDEMPOTENCY_KEY="move-1")
+        assert resp.status_code in (200, 201), resp.data
+    assert InventoryTransaction.objects.filter(txn_type=TxnType.MOVE).count() == 1
+
+    shipment = setup_data["shipment"]
+    for _ in range(2):
+        resp = auth_client.post(
+            f'/api/v1/shipments/{shipment.id}/items/', {"wr_ids": [setup_data["wr"].id]},
+            format='json', HTTP_IDEMPOTENCY_KEY="items-1",
+        )
+        assert resp.data["count"] == 1
+    assert ShipmentItem.objects.filter(shipment=shipment).count() == 1
+
+    first = auth_client.post(f'/api/v1/shipments/{shipment.id}/ship/', {}, format='json', HTTP_IDEMPOTENCY_KEY="ship-1")
+    assert first.status_code == 200, first.data
+    # Without the key the repeat would fail: the shipment is already SHIPPED.
+    retry = auth_client.post(f'/api/v1/shipments/{shipment.id}/ship/', {}, format='json', HTTP_IDEMPOTENCY_KEY="ship-1")
+    assert retry.status_code == 200
+    assert retry.data["status"] == ShipmentStatus.SHIPPED
+    assert InventoryTransaction.objects.filter(txn_type=TxnType.SHIP).count() == 1
+
+
+@pytest.mark.django_db
+def test_failed_requests_release_the_key(auth_client, setup_data):
+    url = f'/api/v1/shipments/{setup_data["shipment"].id}/items/'
+    bad = auth_client.post(url, {"wr_ids": [999999]}, format='json', HTTP_IDEMPOTENCY_KEY="items-2")
+    assert bad.status_code == 400
+    assert not IdempotencyKey.objects.filter(key="items-2").exists()
+
+
+@pytest.mark.django_db
+def test_in_flight_and_expired_keys(auth_client, setup_data):
+    payload = {"client": setup_data["client"].id}
+    first = auth_client.post('/api/v1/wrs/', payload, format='json', HTTP_IDEMPOTENCY_KEY="k-1")
+    record = IdempotencyKey.objects.get(key="k-1")
+
+    # Still running elsewhere: 409 until it finishes or is abandoned.
+    IdempotencyKey.objects.filter(pk=record.pk).update(status_code=None, created_at=timezone.now())
+    assert auth_client.post('/api/v1/wrs/', payload, format='json', HTTP_IDEMPOTENCY_KEY="k-1").status_code == 409
+
+    # Expired: purged by the command, and the key runs afresh.
+    IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+    call_command("purge_idempotency_keys")
+    assert not IdempotencyKey.objects.filter(pk=record.pk).exists()
+    again = auth_client.post('/api/v1/wrs/', payload, format='json', HTTP_IDEMPOTENCY_KEY="k-1")
+    assert again.status_code == 201
+    assert again.data["id"] != first.data["id"]
@@ -0,0 +1,163 @@
+"""
+Tests for point-in-time balances (GET /inventory/balances/?as_of=).
+"""
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from inventory.models import InventorySnapshot, InventorySnapshotBalance, InventoryTransaction, InventoryTransactionLine
+from inventory.services import move_wr
+from inventory.services_history import take_inventory_snapshot
+from receiving.models import WarehouseReceipt, WRStatus
+from shipping.models import Shipment
+from shipping.services import add_items_to_shipment, ship_shipment
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+URL = '/api/v1/inventory/balances/'
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="As Of Co")
+    user = User.objects.create_user(username="as_of_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    client = Client.objects.create(company=company, client_code="AO-1", name="As Of Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-AO", name="As Of Warehouse")
+    loc_a = StorageLocation.objects.create(company=company, warehouse=warehouse, code="AO-A")
+    loc_b = StorageLocation.objects.create(company=company, warehouse=warehouse, code="AO-B")
+    wrs = [
+        WarehouseReceipt.objects.create(company=company, client=client, received_warehouse=warehouse, status=WRStatus.ACTIVE)
+        for _ in range(3)
+    ]
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {
+        "company": company, "user": user, "client": client, "warehouse": warehouse,
+        "loc_a": loc_a, "loc_b": loc_b, "wrs": wrs, "api": api,
+    }
+
+
+def _backdate(since, when):
+    # Ledger rows written after ``since`` are moved to ``when``.
+    InventoryTransaction.objects.filter(performed_at__gte=since).update(performed_at=when)
+
+
+def _history(setup_data):
+    """
+    Day 1: all three WRs put away at A. Day 2: WR0 moves to B.
+    Day 3: WR1 ships. Returns the day boundaries.
+    """
+    user, (wr0, wr1, wr2) = setup_data["user"], setup_data["wrs"]
+    loc_a, loc_b = setup_data["loc_a"], setup_data["loc_b"]
+    base = timezone.now() - timedelta(days=10)
+    days = [base + timedelta(days=n) for n in range(4)]
+
+    mark = timezone.now()
+    for wr in (wr0, wr1, wr2):
+        move_wr(wr, loc_a, performed_by=user)
+    _backdate(mark, days[1])
+
+    mark = timezone.now()
+    move_wr(wr0, loc_b, performed_by=user)
+    _backdate(mark, days[2])
+
+    mark = timezone.now()
+    shipment = Shipment.objects.create(
+        company=setup_data["company"], shipment_number="SHP-AO-1",
+        client=setup_data["client"], from_warehouse=setup_data["warehouse"],
+    )
+    add_items_to_shipment(shipment, [wr1.id], performed_by=user)
+    ship_shipment(shipment, performed_by=user)
+    _backdate(mark, days[3])
+    return days
+
+
+def _rows(resp):
+    assert resp.status_code == 200, resp.data
+    return {(row["wr"], row["location"]) for row in resp.data["results"]}
+
+
+@pytest.mark.django_db
+def test_as_of_replays_ledger(setup_data):
+    days = _history(setup_data)
+    api, (wr0, wr1, wr2) = setup_data["api"], setup_data["wrs"]
+    a, b = setup_data["loc_a"].id, setup_data["loc_b"].id
+
+    assert _rows(api.get(URL, {"as_of": (days[0]).isoformat()})) == set()
+    assert _rows(api.get(URL, {"as_of": (days[1] + timedelta(hours=1)).isoformat()})) == {
+        (wr0.id, a), (wr1.id, a), (wr2.id, a),
+    }
+    assert _rows(api.get(URL, {"as_of": (days[2] + timedelta(hours=1)).isoformat()})) == {
+        (wr0.id, b), (wr1.id, a), (wr2.id, a),
+    }
+    # WR1 shipped: its balance row is gone, and so is it from the as-of view.
+    now = _rows(api.get(URL, {"as_of": timezone.now().isoformat()}))
+    assert now == {(wr0.id, b), (wr2.id, a)}
+    assert now == {(row["wr"], row["location"]) for row in api.get(URL).data["results"]}
+
+    # Filters apply to the reconstructed rows.
+    at_a = api.get(URL, {"as_of": (days[2] + timedelta(hours=1)).isoformat(), "location": a})
+    assert _rows(at_a) == {(wr1.id, a), (wr2.id, a)}
+    row = at_a.data["results"][0]
+    assert row["location_details"]["code"] == "AO-A" and "id" not in row
+
+
+@pytest.mark.django_db
+def test_snapshot_bounds_the_replay(setup_data):
+    days = _history(setup_data)
+    api = setup_data["api"]
+    before = _rows(api.get(URL, {"as_of": (days[2] + timedelta(hours=1)).isoformat()}))
+
+    call_command("snapshot_inventory", company=setup_data["company"].id)
+    snapshot = InventorySnapshot.objects.get(company=setup_data["company"])
+    assert snapshot.balance_count == 2
+    # Pretend it was taken at the end of day 2: the day-3 ship is replayed on top.
+    InventorySnapshot.objects.filter(pk=snapshot.pk).update(taken_at=days[2] + timedelta(hours=12))
+    snapshot.balances.create(
+        client=setup_data["client"], warehouse=setup_data["warehouse"],
+        location=setup_data["loc_a"], wr=setup_data["wrs"][1],
+    )
+
+    assert _rows(api.get(URL, {"as_of": (days[2] + timedelta(hours=1)).isoformat()})) == before
+    with CaptureQueriesContext(connection) as ctx:
+        after = api.get(URL, {"as_of": timezone.now().isoformat()})
+    # The ledger read starts at the snapshot, not at the beginning.
+    ledger = [q["sql"] for q in ctx.captured_queries if '"inventory_inventorytransactionline"' in q["sql"]]
+    assert len(ledger) == 1 and '"performed_at" >' in ledger[0]
+    assert _rows(after) == {(row["wr"], row["location"]) for row in api.get(URL).data["results"]}
+    assert InventoryTransactionLine.objects.count() == 5
+
+
+@pytest.mark.django_db
+def test_snapshot_replays_lines_committed_after_it(setup_data):
+    _history(setup_data)
+    api, wr0 = setup_data["api"], setup_data["wrs"][0]
+    snapshot = take_inventory_snapshot(setup_data["company"], batch_size=1)
+    assert snapshot.balance_count == InventorySnapshotBalance.objects.filter(snapshot=snapshot).count() == 2
+
+    # A move stamped before the snapshot whose transaction only committed after it.
+    mark = timezone.now()
+    move_wr(wr0, setup_data["loc_a"], performed_by=setup_data["user"])
+    _backdate(mark, snapshot.taken_at - timedelta(seconds=30))
+
+    after = _rows(api.get(URL, {"as_of": timezone.now().isoformat()}))
+    assert (wr0.id, setup_data["loc_a"].id) in after
+    assert after == {(row["wr"], row["location"]) for row in api.get(URL).data["results"]}
+
+
+@pytest.mark.django_db
+def test_as_of_rejects_bad_input(setup_data):
+    api = setup_data["api"]
+    assert api.get(URL, {"as_of": "yesterday"}).status_code == 400
+    assert api.get(URL, {"as_of": "2025-01-31", "location": "x"}).status_code == 400
+    assert api.get(URL, {"as_of": "2025-01-31", "cursor": ""}).status_code == 400
+    assert api.get(URL, {"as_of": "2025-01-31"}).data["results"] == []
@@ -0,0 +1,125 @@
+"""
+Tests for POST /inventory/move/bulk/.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from inventory.models import InventoryBalance, InventoryTransaction, InventoryTransactionLine, TxnType
+from receiving.models import WarehouseReceipt, WRStatus
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+URL = '/api/v1/inventory/move/bulk/'
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Bulk Move Co")
+    client = Client.objects.create(company=company, client_code="BM-1", name="Bulk Move Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-BM", name="Bulk Move Warehouse")
+    loc_a = StorageLocation.objects.create(company=company, warehouse=warehouse, code="BM-A")
+    loc_b = StorageLocation.objects.create(company=company, warehouse=warehouse, code="BM-B")
+    return {"company": company, "client": client, "warehouse": warehouse, "loc_a": loc_a, "loc_b": loc_b}
+
+
+@pytest.fixture
+def auth_client(setup_data):
+    user = User.objects.create_user(username="bulk_move_user", password="password")
+    CompanyMember.objects.create(company=setup_data["company"], user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+def _stored_wrs(setup_data, count, location="loc_a"):
+    wrs = []
+    for _ in range(count):
+        wr = WarehouseReceipt.objects.create(
+            company=setup_data["company"], client=setup_data["client"],
+            received_warehouse=setup_data["warehouse"], status=WRStatus.ACTIVE,
+        )
+        InventoryBalance.objects.create(
+            company=setup_data["company"], client=setup_data["client"], warehouse=setup_data["warehouse"],
+            location=setup_data[location], wr=wr, on_hand_qty=1,
+        )
+        wrs.append(wr)
+    return wrs
+
+
+@pytest.mark.django_db
+def test_mixed_batch_moves_good_items_and_reports_bad(auth_client, setup_data):
+    good, wrong_from, shipped = _stored_wrs(setup_data, 3)
+    WarehouseReceipt.objects.filter(pk=shipped.pk).update(status=WRStatus.SHIPPED)
+    loc_a, loc_b = setup_data["loc_a"], setup_data["loc_b"]
+
+    resp = auth_client.post(URL, {"items": [
+        {"wr": good.id, "to_location": loc_b.id},
+        {"wr": wrong_from.id, "to_location": loc_b.id, "from_location": loc_b.id},
+        {"wr": shipped.id, "to_location": loc_b.id},
+        {"wr": 999999, "to_location": loc_b.id},
+    ]}, format='json')
+
+    assert resp.status_code == 207, resp.data
+    assert resp.data["moved"] == 1 and resp.data["failed"] == 3
+    ok, bad_from, bad_status, missing = resp.data["results"]
+    assert ok["status"] == "moved" and ok["from_location"] == loc_a.id and ok["to_location"] == loc_b.id
+    assert "does not match" in bad_from["errors"]["detail"]
+    assert "ACTIVE" in bad_status["errors"]["detail"]
+    assert "wr" in missing["errors"]
+
+    assert InventoryBalance.objects.get(wr=good).location == loc_b
+    assert InventoryBalance.objects.get(wr=wrong_from).location == loc_a
+    line = InventoryTransactionLine.objects.get(wr=good)
+    assert line.from_location == loc_a and line.transaction.txn_type == TxnType.MOVE
+
+
+@pytest.mark.django_db
+def test_strict_batch_rolls_back_on_any_failure(auth_client, setup_data):
+    first, second = _stored_wrs(setup_data, 2)
+    items = [
+        {"wr": first.id, "to_location": setup_data["loc_b"].id},
+        {"wr": second.id, "to_location": setup_data["loc_a"].id},  # already there
+    ]
+    resp = auth_client.post(URL, {"items": items, "strict": True}, format='json')
+    assert resp.status_code == 400
+    assert InventoryBalance.objects.filter(location=setup_data["loc_b"]).count() == 0
+    assert not InventoryTransaction.objects.exists()
+
+    resp = auth_client.post(URL, {"items": items[:1] + [{"wr": 999999, "to_location": 1}], "strict": True}, format='json')
+    assert resp.status_code == 400
+    assert not InventoryTransaction.objects.exists()
+
+
+@pytest.mark.django_db
+def test_putaway_creates_balances(auth_client, setup_data):
+    wr = WarehouseReceipt.objects.create(
+        company=setup_data["company"], client=setup_data["client"],
+        received_warehouse=setup_data["warehouse"], status=WRStatus.ACTIVE,
+    )
+    resp = auth_client.post(URL, {"items": [{"wr": wr.id, "to_location": setup_data["loc_b"].id}]}, format='json')
+    assert resp.status_code == 200, resp.data
+    balance = InventoryBalance.objects.get(wr=wr)
+    assert resp.data["results"][0]["balance_id"] == balance.id
+    assert resp.data["results"][0]["from_location"] is None
+    assert balance.location == setup_data["loc_b"] and balance.on_hand_qty == 1
+
+
+@pytest.mark.django_db
+def test_query_count_does_not_grow_with_batch(auth_client, setup_data):
+    def run(count):
+        wrs = _stored_wrs(setup_data, count)
+        items = [{"wr": wr.id, "to_location": setup_data["loc_b"].id} for wr in wrs]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = auth_client.post(URL, {"items": items}, format='json')
+        assert resp.status_code == 200, resp.data
+        assert resp.data["moved"] == count
+        return len(ctx.captured_queries)
+
+    assert run(2) == run(40)
+    # One MOVE transaction for the single client in each batch.
+    assert InventoryTransaction.objects.filter(reference_type="WR_MOVE_BULK").count() == 2
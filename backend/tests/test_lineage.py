@@ -0,0 +1,128 @@
+"""
+Tests for the recursive lineage walk behind GET /api/v1/wrs/{id}/trace/?depth=all.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from core.models import ShipmentStatus, TxnType, WRStatus
+from inventory.models import InventoryBalance, InventoryTransaction, InventoryTransactionLine
+from receiving.models import OperationType, RepackLink, RepackOperation, WarehouseReceipt
+from receiving.services_lineage import lineage_node_ids
+from shipping.models import Shipment, ShipmentItem
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Lineage Co")
+
+
+@pytest.fixture
+def user(company):
+    user = User.objects.create_user(username="lineage_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    return user
+
+
+@pytest.fixture
+def auth_client(user):
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def chain(company, user):
+    """
+    Build a repack chain: leaf_0 + extra_1 -> level_1, level_1 + extra_2 -> level_2, ...
+    Returns a function taking the number of levels.
+    """
+    client = Client.objects.create(company=company, name="Lineage Client", client_code="LN-1")
+    warehouse = Warehouse.objects.create(company=company, code="WH-LN", name="Lineage Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="LN-LOC")
+
+    def build(levels):
+        leaf = WarehouseReceipt.objects.create(company=company, client=client, status=WRStatus.INACTIVE)
+        current = leaf
+        outputs = []
+        for level in range(levels):
+            extra = WarehouseReceipt.objects.create(company=company, client=client, status=WRStatus.INACTIVE)
+            output = WarehouseReceipt.objects.create(company=company, client=client, is_repack=True)
+            op = RepackOperation.objects.create(
+                company=company, client=client, performed_by=user, operation_type=OperationType.CONSOLIDATE,
+            )
+            for wr in (current, extra):
+                RepackLink.objects.create(company=company, repack_operation=op, input_wr=wr, output_wr=output)
+                WarehouseReceipt.objects.filter(pk=wr.pk).update(parent_wr=output)
+            txn = InventoryTransaction.objects.create(
+                company=company, client=client, txn_type=TxnType.REPACK_PRODUCE,
+                reference_type="REPACK_OP", reference_id=str(op.id), performed_by=user,
+            )
+            InventoryTransactionLine.objects.create(company=company, transaction=txn, wr=output, to_location=location, qty=1)
+            outputs.append(output)
+            current = output
+        InventoryBalance.objects.create(
+            company=company, client=client, warehouse=warehouse, location=location, wr=current, on_hand_qty=1,
+        )
+        shipment = Shipment.objects.create(
+            company=company, client=client, shipment_number=f"SHP-LN-{leaf.id}", status=ShipmentStatus.PLANNED,
+        )
+        ShipmentItem.objects.create(company=company, shipment=shipment, wr=current)
+        return leaf, outputs
+
+    return build
+
+
+@pytest.mark.django_db
+def test_lineage_walks_full_chain_both_ways(chain):
+    leaf, outputs = chain(3)
+
+    nodes = lineage_node_ids(leaf)
+    assert nodes[leaf.id] == ('self', 0)
+    assert [nodes[o.id] for o in outputs] == [('descendant', 1), ('descendant', 2), ('descendant', 3)]
+    assert len(nodes) == 4
+
+    top = lineage_node_ids(outputs[-1])
+    assert top[leaf.id] == ('ancestor', 3)
+    # leaf, 3 extras and the two intermediate outputs sit upstream of the top.
+    assert sum(1 for relation, _ in top.values() if relation == 'ancestor') == 6
+
+
+@pytest.mark.django_db
+def test_trace_depth_all_returns_graph(auth_client, chain):
+    leaf, outputs = chain(2)
+    resp = auth_client.get(f'/api/v1/wrs/{leaf.id}/trace/', {'depth': 'all'})
+    assert resp.status_code == 200, resp.data
+
+    lineage = resp.data["lineage"]
+    by_id = {node["id"]: node for node in lineage["nodes"]}
+    assert by_id[leaf.id]["relation"] == "self"
+    top = by_id[outputs[-1].id]
+    assert top["relation"] == "descendant" and top["depth"] == 2
+    assert top["current_balance"]["on_hand_qty"] == 1
+    assert top["shipment_linkage"]["shipment_number"] == f"SHP-LN-{leaf.id}"
+    assert top["inventory_history"][0]["txn_type"] == TxnType.REPACK_PRODUCE
+    assert {(e["input_wr"], e["output_wr"]) for e in lineage["edges"]} == {
+        (leaf.id, outputs[0].id), (outputs[0].id, outputs[1].id),
+    }
+    # The one-hop sections stay populated for existing consumers.
+    assert resp.data["repack_lineage"]["consolidated_into"]["id"] == outputs[0].id
+
+
+@pytest.mark.django_db
+def test_trace_depth_all_query_count_is_independent_of_chain_length(auth_client, chain):
+    short_leaf, _ = chain(1)
+    long_leaf, _ = chain(5)
+    with CaptureQueriesContext(connection) as short:
+        assert auth_client.get(f'/api/v1/wrs/{short_leaf.id}/trace/', {'depth': 'all'}).status_code == 200
+    with CaptureQueriesContext(connection) as long:
+        resp = auth_client.get(f'/api/v1/wrs/{long_leaf.id}/trace/', {'depth': 'all'})
+    assert resp.status_code == 200
+    assert len(resp.data["lineage"]["nodes"]) == 6
+    assert len(long) == len(short)
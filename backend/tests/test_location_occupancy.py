@@ -0,0 +1,131 @@
+"""
+Tests for location capacity, the incremental occupancy table and
+GET /locations/suggest/.
+"""
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from inventory.models import InventoryBalance
+from inventory.services import move_wr, move_wrs
+from receiving.models import WarehouseReceipt, WRStatus
+from receiving.services_repack import consolidate_wrs
+from shipping.models import Shipment
+from shipping.services import add_items_to_shipment, ship_shipment
+from warehouse.models import LocationOccupancy, LocationType, Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Occupancy Co")
+    user = User.objects.create_user(username="occupancy_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    client = Client.objects.create(company=company, client_code="OC-1", name="Occupancy Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-OC", name="Occupancy Warehouse")
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {"company": company, "user": user, "client": client, "warehouse": warehouse, "api": api}
+
+
+def _location(setup_data, code, **capacity):
+    return StorageLocation.objects.create(
+        company=setup_data["company"], warehouse=setup_data["warehouse"], code=code, **capacity,
+    )
+
+
+def _wr(setup_data, volume="2.0000", weight="10.00"):
+    return WarehouseReceipt.objects.create(
+        company=setup_data["company"], client=setup_data["client"], received_warehouse=setup_data["warehouse"],
+        status=WRStatus.ACTIVE, total_volume_cf=Decimal(volume), total_weight=Decimal(weight),
+    )
+
+
+def _occupancy(location):
+    row = LocationOccupancy.objects.filter(location=location).first()
+    if row is None:
+        return (0, Decimal("0"), Decimal("0"))
+    return (row.wr_count, row.total_volume_cf, row.total_weight)
+
+
+@pytest.mark.django_db
+def test_occupancy_follows_every_balance_write(setup_data):
+    user = setup_data["user"]
+    loc_a, loc_b = _location(setup_data, "OC-A"), _location(setup_data, "OC-B")
+    wr1, wr2, wr3 = _wr(setup_data), _wr(setup_data, "3.0000", "5.00"), _wr(setup_data)
+
+    move_wr(wr1, loc_a, performed_by=user)
+    move_wrs([(0, wr2, loc_a, None), (1, wr3, loc_a, None)], performed_by=user, company=setup_data["company"])
+    assert _occupancy(loc_a) == (3, Decimal("7.0000"), Decimal("25.00"))
+
+    move_wr(wr1, loc_b, performed_by=user)
+    assert _occupancy(loc_a) == (2, Decimal("5.0000"), Decimal("15.00"))
+    assert _occupancy(loc_b) == (1, Decimal("2.0000"), Decimal("10.00"))
+
+    shipment = Shipment.objects.create(
+        company=setup_data["company"], shipment_number="SHP-OC-1",
+        client=setup_data["client"], from_warehouse=setup_data["warehouse"],
+    )
+    add_items_to_shipment(shipment, [wr1.id], performed_by=user)
+    ship_shipment(shipment, performed_by=user)
+    assert _occupancy(loc_b) == (0, Decimal("0"), Decimal("0"))
+
+    result = consolidate_wrs(
+        setup_data["client"], [wr2, wr3], loc_b,
+        {"lines": [{"weight": "12.00", "length": 12, "width": 12, "height": 12}]}, performed_by=user,
+    )
+    assert _occupancy(loc_a) == (0, Decimal("0"), Decimal("0"))
+    output = WarehouseReceipt.objects.get(pk=result["output_wr"].pk)
+    assert _occupancy(loc_b) == (1, output.total_volume_cf or Decimal("0"), output.total_weight)
+
+    # The incremental rows match a full rebuild.
+    before = {row.location_id: (row.wr_count, row.total_volume_cf, row.total_weight) for row in LocationOccupancy.objects.all()}
+    call_command("rebuild_location_occupancy", company=setup_data["company"].id)
+    after = {row.location_id: (row.wr_count, row.total_volume_cf, row.total_weight) for row in LocationOccupancy.objects.all()}
+    assert {k: v for k, v in after.items() if v[0]} == {k: v for k, v in before.items() if v[0]}
+
+
+@pytest.mark.django_db
+def test_suggest_ranks_by_fit_and_skips_full_locations(setup_data):
+    user, api = setup_data["user"], setup_data["api"]
+    tight = _location(setup_data, "OC-TIGHT", max_volume_cf=Decimal("5"))
+    roomy = _location(setup_data, "OC-ROOMY", max_volume_cf=Decimal("50"))
+    _location(setup_data, "OC-OPEN")
+    full = _location(setup_data, "OC-FULL", max_wr_count=1)
+    light = _location(setup_data, "OC-LIGHT", max_weight=Decimal("5"))
+    _location(setup_data, "OC-DOCK", location_type=LocationType.SHIPPING)
+    move_wr(_wr(setup_data), full, performed_by=user)
+    move_wr(_wr(setup_data, "2.5000"), tight, performed_by=user)
+
+    wr = _wr(setup_data)
+    resp = api.get('/api/v1/locations/suggest/', {"wr": wr.id})
+    assert resp.status_code == 200, resp.data
+    codes = [row["code"] for row in resp.data["results"]]
+    # 5 - 2.5 - 2 leaves 0.5 in TIGHT; ROOMY leaves 48; OPEN has no limit.
+    assert codes == ["OC-TIGHT", "OC-ROOMY", "OC-OPEN"]
+    first = resp.data["results"][0]
+    assert Decimal(first["remaining_volume_cf"]) == Decimal("0.5")
+    assert first["occupied_count"] == 1
+    assert full.code not in codes and light.code not in codes
+
+    # Once TIGHT holds the WR it is excluded, and the next WR no longer fits there.
+    move_wr(wr, tight, performed_by=user)
+    codes = [row["code"] for row in api.get('/api/v1/locations/suggest/', {"wr": _wr(setup_data).id}).data["results"]]
+    assert codes == ["OC-ROOMY", "OC-OPEN"]
+    codes = [row["code"] for row in api.get('/api/v1/locations/suggest/', {"wr": wr.id, "limit": 1}).data["results"]]
+    assert codes == ["OC-ROOMY"]
+
+
+@pytest.mark.django_db
+def test_suggest_validates_input(setup_data):
+    api = setup_data["api"]
+    assert api.get('/api/v1/locations/suggest/').status_code == 400
+    assert api.get('/api/v1/locations/suggest/', {"wr": 999999}).status_code == 400
+    other = Company.objects.create(name="Other Occupancy Co")
+    other_wr = WarehouseReceipt.objects.create(company=other, client=Client.objects.create(company=other, client_code="OO", name="o"))
+    assert api.get('/api/v1/locations/suggest/', {"wr": other_wr.id}).status_code == 400
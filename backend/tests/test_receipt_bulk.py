@@ -0,0 +1,162 @@
+"""
+Tests for POST /api/v1/wrs/bulk/ (set-based receipt ingestion).
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from warehouse.models import Warehouse
+from receiving.models import WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking
+from receiving.services_receipts import BULK_RECEIPT_ERROR, bulk_create_receipts
+from company.models import Company, CompanyMember
+
+User = get_user_model()
+
+URL = '/api/v1/wrs/bulk/'
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Bulk Test Co")
+
+
+@pytest.fixture
+def auth_client(company):
+    user = User.objects.create_user(username="bulk_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def setup_data(company):
+    client = Client.objects.create(company=company, name="Bulk Client", client_code="BC-001")
+    warehouse = Warehouse.objects.create(company=company, code="WH-B1", name="Bulk Warehouse")
+    other_company = Company.objects.create(name="Other Co")
+    other_client = Client.objects.create(company=other_company, name="Other Client", client_code="OC-001")
+    return {"client": client, "warehouse": warehouse, "other_client": other_client}
+
+
+def _receipt(setup_data, n, lines=2):
+    return {
+        "client": setup_data["client"].id,
+        "received_warehouse": setup_data["warehouse"].id,
+        "shipping_method": "air",
+        "lines": [
+            {
+                "carrier": "ups",
+                "weight": "1.50",
+                "pieces": 1,
+                "tracking_numbers": [
+                    {"tracking_number": f"1Z-{n}-{i}-A", "order": 0},
+                    {"tracking_number": f"1Z-{n}-{i}-B", "order": 1},
+                ],
+            }
+            for i in range(lines)
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_bulk_creates_receipts_lines_and_tracking(auth_client, setup_data, company):
+    payload = [_receipt(setup_data, n) for n in range(3)]
+    resp = auth_client.post(URL, payload, format='json')
+    assert resp.status_code == 201, resp.data
+    assert resp.data["created"] == 3
+    assert resp.data["failed"] == 0
+
+    ids = [r["id"] for r in resp.data["results"]]
+    receipts = WarehouseReceipt.objects.filter(id__in=ids).order_by('id')
+    assert [wr.wr_number for wr in receipts] == [f"WR-{company.id}-{n:06d}" for n in (1, 2, 3)]
+    assert WarehouseReceiptLine.objects.filter(receipt_id__in=ids).count() == 6
+    assert WarehouseReceiptLineTracking.objects.filter(line__receipt_id__in=ids).count() == 12
+
+    line = WarehouseReceiptLine.objects.filter(receipt_id=ids[0]).first()
+    assert line.tracking_number == "1Z-0-0-A, 1Z-0-0-B"
+
+
+@pytest.mark.django_db
+def test_bulk_reports_per_item_errors(auth_client, setup_data):
+    bad_client = _receipt(setup_data, 1)
+    bad_client["client"] = setup_data["other_client"].id
+    negative = _receipt(setup_data, 2)
+    negative["weight_value"] = "-1"
+    payload = [_receipt(setup_data, 0), bad_client, negative]
+
+    resp = auth_client.post(URL, payload, format='json')
+    assert resp.status_code == 207, resp.data
+    results = resp.data["results"]
+    assert results[0]["status"] == "created"
+    assert results[1]["status"] == "error"
+    assert "client" in results[1]["errors"]
+    assert results[2]["status"] == "error"
+    assert results[2]["errors"]["weight_value"] == ["weight_value cannot be negative."]
+    assert all(isinstance(messages, list) for messages in results[1]["errors"].values())
+    assert WarehouseReceipt.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_bulk_rejects_duplicate_tracking(auth_client, setup_data):
+    WarehouseReceipt.objects.create(
+        company=setup_data["client"].company, client=setup_data["client"], tracking_number="DUP-1",
+    )
+    first = _receipt(setup_data, 0)
+    first["tracking_number"] = "DUP-1"
+    second = _receipt(setup_data, 1)
+    second["tracking_number"] = "DUP-2"
+    third = _receipt(setup_data, 2)
+    third["tracking_number"] = "DUP-2"
+
+    resp = auth_client.post(URL, [first, second, third], format='json')
+    assert resp.status_code == 207, resp.data
+    statuses = [r["status"] for r in resp.data["results"]]
+    assert statuses == ["error", "created", "error"]
+
+
+@pytest.mark.django_db
+def test_bulk_service_fails_only_the_conflicting_receipt(setup_data, company):
+    client, warehouse = setup_data["client"], setup_data["warehouse"]
+    WarehouseReceipt.objects.create(company=company, client=client, tracking_number="TAKEN")
+    receipts = [
+        (n, {"client": client, "received_warehouse": warehouse, "tracking_number": tracking})
+        for n, tracking in enumerate(["OK-0", "OK-1", "TAKEN", "OK-3", "OK-4"])
+    ]
+
+    results = bulk_create_receipts(company, receipts, chunk_size=5)
+
+    assert results[2] == BULK_RECEIPT_ERROR
+    assert all(isinstance(results[n], WarehouseReceipt) for n in (0, 1, 3, 4))
+    assert WarehouseReceipt.objects.filter(company=company).count() == 5
+
+
+@pytest.mark.django_db
+def test_bulk_reports_save_failures_as_error_lists(auth_client, setup_data, monkeypatch):
+    monkeypatch.setattr(
+        'receiving.api.bulk_create_receipts',
+        lambda company, receipts, chunk_size: {key: BULK_RECEIPT_ERROR for key, _ in receipts},
+    )
+    resp = auth_client.post(URL, [_receipt(setup_data, 0)], format='json')
+    assert resp.status_code == 400
+    assert resp.data["results"][0]["errors"] == {"non_field_errors": [BULK_RECEIPT_ERROR]}
+
+
+@pytest.mark.django_db
+def test_bulk_query_count_is_independent_of_batch_size(auth_client, setup_data):
+    # The first allocation seeds the company's WR sequence; keep it out of the comparison.
+    assert auth_client.post(URL, [_receipt(setup_data, 99)], format='json').status_code == 201
+    with CaptureQueriesContext(connection) as small:
+        resp = auth_client.post(URL, [_receipt(setup_data, n) for n in range(2)], format='json')
+    assert resp.status_code == 201
+    with CaptureQueriesContext(connection) as large:
+        resp = auth_client.post(URL, [_receipt(setup_data, n) for n in range(100, 120)], format='json')
+    assert resp.status_code == 201
+    assert len(large) == len(small)
+
+
+@pytest.mark.django_db
+def test_bulk_requires_list(auth_client):
+    resp = auth_client.post(URL, {"client": 1}, format='json')
+    assert resp.status_code == 400
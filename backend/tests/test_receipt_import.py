@@ -0,0 +1,127 @@
+"""
+Tests for the streaming receipt import (manage.py import_receipts and
+POST /api/v1/wrs/import/).
+"""
+import csv
+import json
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanyMember
+from receiving.models import WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+CSV_HEADER = "receipt_ref,client_code,warehouse_code,associate_company,tracking_number,shipping_method,line_carrier,line_weight,line_tracking_numbers\n"
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Import Test Co")
+
+
+@pytest.fixture
+def setup_data(company):
+    client = Client.objects.create(company=company, name="Import Client", client_code="IMP-001")
+    warehouse = Warehouse.objects.create(company=company, code="WH-I1", name="Import Warehouse")
+    # Leave WH-I1 as the only active warehouse (the company signal adds a default one).
+    Warehouse.objects.filter(company=company).exclude(pk=warehouse.pk).update(is_active=False)
+    agency = AssociateCompany.objects.create(company=company, name="Agency One")
+    return {"client": client, "warehouse": warehouse, "agency": agency}
+
+
+@pytest.fixture
+def auth_client(company):
+    user = User.objects.create_user(username="import_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.mark.django_db
+def test_command_imports_csv_and_writes_rejects(tmp_path, company, setup_data):
+    source = tmp_path / "manifest.csv"
+    source.write_text(
+        CSV_HEADER
+        + "R1,IMP-001,WH-I1,agency one,TRK-1,AIR,ups,2.5,1Z-A;1Z-B\n"
+        + "R1,IMP-001,WH-I1,agency one,TRK-1,AIR,fedex,1.0,FX-1\n"
+        + ",IMP-001,WH-I1,,TRK-2,sea,dhl,3,\n"
+        + ",NOPE,WH-I1,,TRK-3,air,ups,1,\n"
+        + ",IMP-001,WH-I1,,TRK-2,air,ups,1,\n"
+    )
+    reject_path = tmp_path / "rejects.csv"
+
+    call_command(
+        "import_receipts", str(source),
+        company=company.id, chunk_size=1, reject_file=str(reject_path),
+    )
+
+    receipts = WarehouseReceipt.objects.filter(company=company).order_by('id')
+    assert receipts.count() == 2
+    grouped = receipts.get(tracking_number="TRK-1")
+    assert grouped.associate_company == setup_data["agency"]
+    assert grouped.shipping_method == "air"
+    assert grouped.received_warehouse == setup_data["warehouse"]
+    assert WarehouseReceiptLine.objects.filter(receipt=grouped).count() == 2
+    assert WarehouseReceiptLineTracking.objects.filter(line__receipt=grouped).count() == 3
+
+    rejects = reject_path.read_text().splitlines()
+    assert len(rejects) == 3  # header + unknown client + duplicate tracking
+    assert "Unknown client_code 'NOPE'" in rejects[1]
+    assert "already exists" in rejects[2]
+
+
+@pytest.mark.django_db
+def test_reject_file_keeps_every_input_column(tmp_path, company, setup_data):
+    source = tmp_path / "manifest.csv"
+    source.write_text(
+        CSV_HEADER
+        + ",NOPE,WH-I1,,,,,,\n"
+        + ",NOPE,WH-I1,,TRK-9,air,ups,7.5,\n"
+    )
+    reject_path = tmp_path / "rejects.csv"
+
+    call_command("import_receipts", str(source), company=company.id, reject_file=str(reject_path))
+
+    with reject_path.open(newline='') as fh:
+        reader = csv.DictReader(fh)
+        rejected = list(reader)
+    assert reader.fieldnames == ["row", "error"] + CSV_HEADER.strip().split(",")
+    assert rejected[1]["tracking_number"] == "TRK-9"
+    assert rejected[1]["line_weight"] == "7.5"
+    assert rejected[0]["tracking_number"] == ""
+
+
+@pytest.mark.django_db
+def test_upload_endpoint_imports_ndjson(auth_client, company, setup_data):
+    rows = [
+        {"client_code": "IMP-001", "tracking_number": "N-1", "line_weight": 4, "line_pieces": 2},
+        {"client_code": "IMP-001", "tracking_number": "N-2", "shipping_method": "boat"},
+    ]
+    body = "\n".join(json.dumps(r) for r in rows) + "\n{not json\n"
+    upload = SimpleUploadedFile("legacy.ndjson", body.encode(), content_type="application/x-ndjson")
+
+    resp = auth_client.post('/api/v1/wrs/import/', {"file": upload}, format='multipart')
+    assert resp.status_code == 200, resp.data
+    assert resp.data["rows"] == 3
+    assert resp.data["receipts_created"] == 1
+    assert resp.data["rows_rejected"] == 2
+    assert [r["row"] for r in resp.data["rejects"]] == [2, 3]
+    assert "Invalid JSON" in resp.data["rejects"][1]["error"]
+
+    wr = WarehouseReceipt.objects.get(company=company, tracking_number="N-1")
+    # A single active warehouse is used when the file does not name one.
+    assert wr.received_warehouse == setup_data["warehouse"]
+    assert wr.lines.get().pieces == 2
+
+
+@pytest.mark.django_db
+def test_upload_endpoint_requires_file(auth_client):
+    resp = auth_client.post('/api/v1/wrs/import/', {}, format='multipart')
+    assert resp.status_code == 400
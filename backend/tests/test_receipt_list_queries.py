@@ -0,0 +1,91 @@
+"""
+Query-count regression tests for GET /api/v1/wrs/: the list must cost the
+same number of queries whatever the page size, including wr_status_display.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanyMember
+from receiving.models import (
+    ConsumedBy, OperationType, RepackLink, RepackOperation,
+    WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking,
+)
+from shipping.models import Shipment, ShipmentItem
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="List Queries Co")
+
+
+@pytest.fixture
+def user(company):
+    user = User.objects.create_user(username="list_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    return user
+
+
+@pytest.fixture
+def auth_client(user):
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def make_receipts(company, user):
+    client = Client.objects.create(company=company, name="List Client", client_code="LQ-1")
+    warehouse = Warehouse.objects.create(company=company, code="WH-LQ", name="List Warehouse")
+    agency = AssociateCompany.objects.create(company=company, name="List Agency")
+    shipment = Shipment.objects.create(company=company, client=client, shipment_number="SHP-LQ-1")
+    operation = RepackOperation.objects.create(
+        company=company, client=client, performed_by=user, operation_type=OperationType.CONSOLIDATE,
+    )
+    output = WarehouseReceipt.objects.create(company=company, client=client, is_repack=True)
+
+    def make(count):
+        for n in range(count):
+            wr = WarehouseReceipt.objects.create(
+                company=company, client=client, received_warehouse=warehouse, associate_company=agency,
+            )
+            line = WarehouseReceiptLine.objects.create(receipt=wr, company=company, pieces=1)
+            WarehouseReceiptLineTracking.objects.create(line=line, company=company, tracking_number=f"LQ-{wr.id}")
+            if n % 3 == 1:
+                ShipmentItem.objects.create(company=company, shipment=shipment, wr=wr)
+                WarehouseReceipt.objects.filter(pk=wr.pk).update(consumed_by=ConsumedBy.SHIPMENT)
+            elif n % 3 == 2:
+                RepackLink.objects.create(company=company, repack_operation=operation, input_wr=wr, output_wr=output)
+                WarehouseReceipt.objects.filter(pk=wr.pk).update(consumed_by=ConsumedBy.REPACK)
+
+    return make
+
+
+@pytest.mark.django_db
+def test_list_query_count_is_independent_of_page_size(auth_client, make_receipts):
+    make_receipts(3)
+    with CaptureQueriesContext(connection) as small:
+        resp = auth_client.get('/api/v1/wrs/')
+    assert resp.status_code == 200
+    rows = resp.data['results'] if isinstance(resp.data, dict) else resp.data
+    assert len(rows) == 3
+
+    make_receipts(21)
+    with CaptureQueriesContext(connection) as large:
+        resp = auth_client.get('/api/v1/wrs/')
+    assert resp.status_code == 200
+    rows = resp.data['results'] if isinstance(resp.data, dict) else resp.data
+    assert len(rows) >= 20
+    assert len(large) == len(small)
+
+    by_type = {}
+    for row in rows:
+        by_type.setdefault(row['wr_status_display']['type'], row['wr_status_display']['reference'])
+    assert by_type['processed'] == "SHP-LQ-1"
+    assert by_type['repacked'].startswith("REPACK-")
+    assert by_type['not_processed'] is None
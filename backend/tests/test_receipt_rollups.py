@@ -0,0 +1,112 @@
+"""
+Tests for the stored line rollups on WarehouseReceipt and the endpoints that
+read them instead of the line tables.
+"""
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client, UserProfile
+from company.models import Company, CompanyMember
+from receiving.models import WarehouseReceipt, WarehouseReceiptLine, WarehouseReceiptLineTracking
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Rollup Co")
+
+
+@pytest.fixture
+def auth_client(company):
+    user = User.objects.create_user(username="rollup_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def setup_data(company):
+    client = Client.objects.create(company=company, name="Rollup Client", client_code="RU-1")
+    warehouse = Warehouse.objects.create(company=company, code="WH-RU", name="Rollup Warehouse")
+    return {"client": client, "warehouse": warehouse}
+
+
+def _lines():
+    return [
+        {"carrier": "ups", "description": "Shoes", "weight": "2.50", "pieces": 2, "volume_cf": "1.5000",
+         "tracking_numbers": [{"tracking_number": "1Z-A", "order": 0}, {"tracking_number": "1Z-B", "order": 1}]},
+        {"carrier": "fedex", "description": "Shoes", "weight": "1.25", "pieces": 1,
+         "tracking_numbers": [{"tracking_number": "FX-1", "order": 0}]},
+    ]
+
+
+@pytest.mark.django_db
+def test_rollups_follow_line_writes(auth_client, setup_data):
+    resp = auth_client.post('/api/v1/wrs/', {
+        "client": setup_data["client"].id,
+        "received_warehouse": setup_data["warehouse"].id,
+        "lines": _lines(),
+    }, format='json')
+    assert resp.status_code == 201, resp.data
+    assert resp.data["total_weight"] == "3.75"
+    assert resp.data["total_pieces"] == 3
+    assert resp.data["line_count"] == 2
+    assert resp.data["tracking_summary"] == "1Z-A, 1Z-B, FX-1"
+    assert resp.data["carrier_summary"] == "ups, fedex"
+    assert resp.data["description_summary"] == "Shoes"
+
+    wr_id = resp.data["id"]
+    first_line = resp.data["lines"][0]
+    resp = auth_client.patch(f'/api/v1/wrs/{wr_id}/', {"lines": [
+        {"id": first_line["id"], "carrier": "ups", "weight": "4.00", "pieces": 1,
+         "tracking_numbers": [{"tracking_number": "1Z-A", "order": 0}]},
+    ]}, format='json')
+    assert resp.status_code == 200, resp.data
+
+    wr = WarehouseReceipt.objects.get(pk=wr_id)
+    assert wr.total_weight == Decimal("4.00")
+    assert wr.total_volume_cf is None
+    assert (wr.line_count, wr.total_pieces, wr.tracking_summary) == (1, 1, "1Z-A")
+
+
+@pytest.mark.django_db
+def test_rebuild_command_backfills(setup_data, company):
+    wr = WarehouseReceipt.objects.create(company=company, client=setup_data["client"])
+    line = WarehouseReceiptLine.objects.create(receipt=wr, company=company, weight=Decimal("7.00"), pieces=3, carrier="dhl")
+    WarehouseReceiptLineTracking.objects.create(line=line, company=company, tracking_number="DHL-9")
+    assert WarehouseReceipt.objects.get(pk=wr.pk).line_count == 0
+
+    call_command("rebuild_receipt_rollups", company=company.id, batch_size=1)
+    wr.refresh_from_db()
+    assert (wr.total_weight, wr.total_pieces, wr.line_count) == (Decimal("7.00"), 3, 1)
+    assert (wr.tracking_summary, wr.carrier_summary) == ("DHL-9", "dhl")
+
+
+@pytest.mark.django_db
+def test_client_portal_reads_rollups_only(auth_client, setup_data):
+    for _ in range(3):
+        auth_client.post('/api/v1/wrs/', {
+            "client": setup_data["client"].id,
+            "received_warehouse": setup_data["warehouse"].id,
+            "lines": _lines(),
+        }, format='json')
+    portal_user = User.objects.create_user(username="portal_user", password="password")
+    UserProfile.objects.update_or_create(user=portal_user, defaults={"role": "CLIENT", "client": setup_data["client"]})
+    portal = APIClient()
+    portal.force_authenticate(user=portal_user)
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = portal.get('/api/v1/client/packages/')
+    assert resp.status_code == 200, resp.data
+    assert resp.data["count"] == 3
+    assert resp.data["results"][0]["tracking_number"] == "1Z-A, 1Z-B, FX-1"
+    assert resp.data["results"][0]["weight"] == "3.75"
+    assert not [q for q in ctx.captured_queries if 'receiving_warehousereceiptline' in q['sql']]
@@ -171,3 +171,67 @@ def test_new_receipt_header_fields(auth_client, setup_data):
     assert resp.data['allow_repacking'] is True
     assert resp.data['location_note'] == 'BIN-A3'
     assert resp.data['recipient_name'] == 'Carlos Test'
+
+
+@pytest.mark.django_db
+def test_update_receipt_reconciles_lines_by_id(auth_client, setup_data):
+    """PUT with line ids updates in place, inserts new lines and deletes missing ones."""
+    payload = _receipt_payload(setup_data, wr_number="WR-TEST-006", lines=[
+        {"carrier": "ups", "pieces": 1, "tracking_numbers": [{"tracking_number": "T-1"}, {"tracking_number": "T-2"}]},
+        {"carrier": "fedex", "pieces": 2},
+        {"carrier": "dhl", "pieces": 3},
+    ])
+    resp = auth_client.post('/api/v1/wrs/', payload, format='json')
+    assert resp.status_code == 201, resp.data
+    receipt_id = resp.data['id']
+    first, second, third = resp.data['lines']
+    kept_tracking_id = next(t['id'] for t in first['tracking_numbers'] if t['tracking_number'] == 'T-1')
+    untouched_created_at = WarehouseReceiptLine.objects.get(id=third['id']).created_at
+
+    updated = payload.copy()
+    updated['lines'] = [
+        {"id": first['id'], "carrier": "ups", "pieces": 1,
+         "tracking_numbers": [{"tracking_number": "T-1"}, {"tracking_number": "T-3", "order": 1}]},
+        {"id": third['id'], "carrier": "dhl", "pieces": 3},
+        {"carrier": "usps", "pieces": 4},
+    ]
+    put_resp = auth_client.put(f'/api/v1/wrs/{receipt_id}/', updated, format='json')
+    assert put_resp.status_code == 200, put_resp.data
+
+    lines = list(WarehouseReceiptLine.objects.filter(receipt_id=receipt_id).order_by('id'))
+    assert [line.id for line in lines[:2]] == [first['id'], third['id']]
+    assert not WarehouseReceiptLine.objects.filter(id=second['id']).exists()
+    assert lines[2].carrier == 'usps'
+    assert lines[1].created_at == untouched_created_at
+
+    trackings = list(lines[0].tracking_numbers.values_list('id', 'tracking_number'))
+    assert (kept_tracking_id, 'T-1') in trackings
+    assert {number for _, number in trackings} == {'T-1', 'T-3'}
+    assert lines[0].tracking_number == 'T-1, T-3'
+
+
+@pytest.mark.django_db
+def test_update_receipt_query_count_independent_of_line_count(auth_client, setup_data):
+    """Editing one line costs the same number of queries on small and large receipts."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    def edit_one_line(wr_number, line_count):
+        payload = _receipt_payload(setup_data, wr_number=wr_number, lines=[
+            {"carrier": "ups", "pieces": 1, "tracking_numbers": [{"tracking_number": f"{wr_number}-{i}"}]}
+            for i in range(line_count)
+        ])
+        resp = auth_client.post('/api/v1/wrs/', payload, format='json')
+        lines = resp.data['lines']
+        payload['lines'] = [
+            {"id": line['id'], "carrier": line['carrier'], "pieces": line['pieces'],
+             "tracking_numbers": [{"tracking_number": t['tracking_number']} for t in line['tracking_numbers']]}
+            for line in lines
+        ]
+        payload['lines'][0]['pieces'] = 9
+        with CaptureQueriesContext(connection) as ctx:
+            put_resp = auth_client.put(f"/api/v1/wrs/{resp.data['id']}/", payload, format='json')
+        assert put_resp.status_code == 200, put_resp.data
+        return len(ctx)
+
+    assert edit_one_line("WR-SMALL", 2) == edit_one_line("WR-LARGE", 30)
@@ -0,0 +1,107 @@
+"""
+Tests for the reconcile_inventory management command.
+"""
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company
+from inventory.models import InventoryBalance
+from inventory.services import move_wr
+from receiving.models import WarehouseReceipt, WRStatus
+from shipping.models import Shipment
+from shipping.services import add_items_to_shipment, ship_shipment
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Reconcile Co")
+    user = User.objects.create_user(username="reconcile_user", password="password")
+    client = Client.objects.create(company=company, client_code="RC-1", name="Reconcile Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-RC", name="Reconcile Warehouse")
+    loc_a = StorageLocation.objects.create(company=company, warehouse=warehouse, code="RC-A")
+    loc_b = StorageLocation.objects.create(company=company, warehouse=warehouse, code="RC-B")
+    wrs = [
+        WarehouseReceipt.objects.create(company=company, client=client, received_warehouse=warehouse, status=WRStatus.ACTIVE)
+        for _ in range(6)
+    ]
+    for wr in wrs[:5]:
+        move_wr(wr, loc_a, performed_by=user)
+    return {
+        "company": company, "user": user, "client": client, "warehouse": warehouse,
+        "loc_a": loc_a, "loc_b": loc_b, "wrs": wrs,
+    }
+
+
+def _reconcile(**options):
+    out = StringIO()
+    call_command("reconcile_inventory", json=True, workers=1, stdout=out, **options)
+    return json.loads(out.getvalue())
+
+
+@pytest.mark.django_db
+def test_clean_ledger_reports_no_drift(setup_data):
+    summary = _reconcile()
+    assert summary["clean"] is True
+    assert summary["checked"] == 5
+    assert summary["results"] == []
+
+
+@pytest.mark.django_db
+def test_reports_and_repairs_drift(setup_data):
+    company, client, warehouse = setup_data["company"], setup_data["client"], setup_data["warehouse"]
+    loc_a, loc_b = setup_data["loc_a"], setup_data["loc_b"]
+    missing, misplaced, shipped, duplicated, untouched, unledgered = setup_data["wrs"]
+
+    InventoryBalance.objects.filter(wr=missing).delete()
+    InventoryBalance.objects.filter(wr=misplaced).update(location=loc_b)
+    shipment = Shipment.objects.create(company=company, shipment_number="SHP-RC-1", client=client, from_warehouse=warehouse)
+    add_items_to_shipment(shipment, [shipped.id], performed_by=setup_data["user"])
+    ship_shipment(shipment, performed_by=setup_data["user"])
+    InventoryBalance.objects.create(company=company, client=client, warehouse=warehouse, location=loc_a, wr=shipped)
+    InventoryBalance.objects.create(company=company, client=client, warehouse=warehouse, location=loc_b, wr=duplicated)
+    InventoryBalance.objects.create(company=company, client=client, warehouse=warehouse, location=loc_b, wr=unledgered)
+
+    summary = _reconcile()
+    assert summary["clean"] is False
+    assert summary["drift"] == {
+        "missing": 1, "orphaned": 1, "wrong_location": 1, "duplicate": 1, "unledgered": 1,
+    }
+    kinds = {(d["kind"], d["wr"]) for d in summary["results"][0]["details"]}
+    assert kinds == {
+        ("missing", missing.id), ("wrong_location", misplaced.id), ("orphaned", shipped.id),
+        ("duplicate", duplicated.id), ("unledgered", unledgered.id),
+    }
+    # Reporting alone changes nothing.
+    assert not InventoryBalance.objects.filter(wr=missing).exists()
+
+    repaired = _reconcile(repair=True)
+    assert repaired["repaired"] == 4
+    assert InventoryBalance.objects.get(wr=missing).location == loc_a
+    assert InventoryBalance.objects.get(wr=misplaced).location == loc_a
+    assert not InventoryBalance.objects.filter(wr=shipped).exists()
+    assert InventoryBalance.objects.get(wr=duplicated).location == loc_a
+    assert InventoryBalance.objects.get(wr=untouched).location == loc_a
+
+    after = _reconcile()
+    assert after["drift"] == {
+        "missing": 0, "orphaned": 0, "wrong_location": 0, "duplicate": 0, "unledgered": 1,
+    }
+
+
+@pytest.mark.django_db
+def test_text_output_and_company_filter(setup_data):
+    other = Company.objects.create(name="Other Reconcile Co")
+    out = StringIO()
+    call_command("reconcile_inventory", company=other.id, workers=1, stdout=out)
+    assert "Checked 0 receipts" in out.getvalue()
+
+    out = StringIO()
+    call_command("reconcile_inventory", company=setup_data["company"].id, workers=1, stdout=out)
+    assert "Checked 5 receipts in 1 partitions" in out.getvalue()
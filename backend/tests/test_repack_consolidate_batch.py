@@ -0,0 +1,172 @@
+"""
+Tests for POST /api/v1/repack/consolidate/batch/ and the set-based checks
+shared with POST /api/v1/repack/consolidate/.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from inventory.models import InventoryBalance, InventoryTransaction, TxnType
+from receiving.models import ConsumedBy, RepackLink, RepackOperation, WarehouseReceipt, WRStatus
+from shipping.models import Shipment, ShipmentItem
+from warehouse.models import StorageLocation, Warehouse
+
+User = get_user_model()
+
+URL = '/api/v1/repack/consolidate/batch/'
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Batch Repack Co")
+    warehouse = Warehouse.objects.create(company=company, code="WH-BR", name="Batch Repack Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="BR-1")
+
+    def client_with_receipts(code, count=2):
+        client = Client.objects.create(company=company, client_code=code, name=f"Client {code}")
+        wrs = [
+            WarehouseReceipt.objects.create(
+                company=company, client=client, received_warehouse=warehouse, status=WRStatus.ACTIVE,
+            )
+            for _ in range(count)
+        ]
+        InventoryBalance.objects.bulk_create([
+            InventoryBalance(company=company, client=client, warehouse=warehouse, location=location, wr=wr, on_hand_qty=1)
+            for wr in wrs
+        ])
+        return client, wrs
+
+    user = User.objects.create_user(username="batch_repack_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {
+        "company": company, "location": location, "client_with_receipts": client_with_receipts, "api": api,
+    }
+
+
+def _entry(client, wrs, location=None, **extra):
+    entry = {"client": client.id, "input_wrs": [wr.id for wr in wrs], **extra}
+    if location is not None:
+        entry["to_location"] = location.id
+    return entry
+
+
+@pytest.mark.django_db
+def test_batch_consolidates_each_client(setup_data):
+    groups = [setup_data["client_with_receipts"](f"BR-{n}", count=n + 2) for n in range(3)]
+    entries = [_entry(client, wrs, setup_data["location"]) for client, wrs in groups]
+    entries[0]["output"] = {"lines": [{"length": "10", "width": "10", "height": "10", "weight": "4", "pieces": 2}]}
+
+    resp = setup_data["api"].post(URL, {"consolidations": entries}, format='json')
+
+    assert resp.status_code == 201, resp.data
+    assert resp.data["consolidated"] == 3 and resp.data["rejected"] == 0
+    for (client, wrs), result in zip(groups, resp.data["results"]):
+        output = WarehouseReceipt.objects.get(id=result["output_wr_id"])
+        assert output.client_id == client.id and output.is_repack
+        assert output.wr_number.startswith(f"REPACK-{setup_data['company'].id}-")
+        assert InventoryBalance.objects.get(wr=output).location_id == setup_data["location"].id
+        assert sorted(RepackLink.objects.filter(output_wr=output).values_list('input_wr_id', flat=True)) == sorted(
+            wr.id for wr in wrs)
+        for wr in wrs:
+            wr.refresh_from_db()
+            assert (wr.status, wr.consumed_by, wr.parent_wr_id) == (WRStatus.INACTIVE, ConsumedBy.REPACK, output.id)
+        txns = InventoryTransaction.objects.filter(repack_operation_id=result["repack_operation_id"])
+        assert sorted(txns.values_list('txn_type', flat=True)) == sorted([TxnType.REPACK_CONSUME, TxnType.REPACK_PRODUCE])
+    first = WarehouseReceipt.objects.get(id=resp.data["results"][0]["output_wr_id"])
+    assert first.lines.get().volume_cf is not None
+    assert not InventoryBalance.objects.filter(wr__in=[wr for _, wrs in groups for wr in wrs]).exists()
+    assert len({r["output_wr_number"] for r in resp.data["results"]}) == 3
+
+
+@pytest.mark.django_db
+def test_batch_reports_rejections_and_applies_the_rest(setup_data):
+    ok_client, ok_wrs = setup_data["client_with_receipts"]("BR-OK")
+    shipped_client, shipped_wrs = setup_data["client_with_receipts"]("BR-SHIP")
+    shipment = Shipment.objects.create(company=setup_data["company"], client=shipped_client)
+    ShipmentItem.objects.create(company=setup_data["company"], shipment=shipment, wr=shipped_wrs[0])
+    other_client, _ = setup_data["client_with_receipts"]("BR-OTHER")
+    foreign = Client.objects.create(company=Company.objects.create(name="Elsewhere"), client_code="X", name="X")
+
+    resp = setup_data["api"].post(URL, {"consolidations": [
+        _entry(ok_client, ok_wrs),
+        _entry(shipped_client, shipped_wrs),
+        _entry(other_client, ok_wrs),
+        _entry(foreign, ok_wrs),
+        {"client": ok_client.id, "input_wrs": [ok_wrs[0].id]},
+    ]}, format='json')
+
+    assert resp.status_code == 207, resp.data
+    assert resp.data["consolidated"] == 1 and resp.data["rejected"] == 4
+    results = resp.data["results"]
+    assert results[0]["status"] == "consolidated"
+    assert "already in a shipment" in results[1]["detail"]
+    assert "does not belong to the specified client" in results[2]["detail"]
+    assert "does not exist" in results[3]["detail"]
+    assert "at least 2" in results[4]["detail"]
+    assert RepackOperation.objects.filter(company=setup_data["company"]).count() == 1
+
+
+@pytest.mark.django_db
+def test_batch_rejects_inputs_claimed_twice(setup_data):
+    client, wrs = setup_data["client_with_receipts"]("BR-DUP", count=3)
+
+    resp = setup_data["api"].post(URL, {"consolidations": [
+        _entry(client, wrs[:2]),
+        _entry(client, wrs[1:]),
+    ]}, format='json')
+
+    assert resp.status_code == 207
+    assert "another consolidation in this batch" in resp.data["results"][1]["detail"]
+
+
+@pytest.mark.django_db
+def test_batch_strict_applies_nothing(setup_data):
+    ok_client, ok_wrs = setup_data["client_with_receipts"]("BR-S1")
+    bad_client, bad_wrs = setup_data["client_with_receipts"]("BR-S2")
+    WarehouseReceipt.objects.filter(id=bad_wrs[0].id).update(status=WRStatus.INACTIVE)
+
+    resp = setup_data["api"].post(URL, {
+        "consolidations": [_entry(ok_client, ok_wrs), _entry(bad_client, bad_wrs)],
+        "strict": True,
+    }, format='json')
+
+    assert resp.status_code == 400
+    assert [r["status"] for r in resp.data["results"]] == ["not_applied", "rejected"]
+    assert not RepackOperation.objects.filter(company=setup_data["company"]).exists()
+    assert InventoryBalance.objects.filter(wr__in=ok_wrs).count() == 2
+
+
+@pytest.mark.django_db
+def test_batch_query_count_is_fixed(setup_data):
+    def count(n):
+        groups = [setup_data["client_with_receipts"](f"BR-Q{n}-{i}", count=2 + i % 3) for i in range(n)]
+        entries = [_entry(client, wrs, setup_data["location"]) for client, wrs in groups]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = setup_data["api"].post(URL, {"consolidations": entries}, format='json')
+        assert resp.status_code == 201, resp.data
+        return len(ctx.captured_queries)
+
+    count(2)  # seeds the REPACK sequence and the location's occupancy row
+    # Kept under SQLite's bind-parameter limit, past which bulk INSERTs split.
+    assert count(3) == count(12)
+
+
+@pytest.mark.django_db
+def test_single_consolidate_query_count_is_fixed(setup_data):
+    def count(n):
+        client, wrs = setup_data["client_with_receipts"](f"BR-1Q{n}", count=n)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = setup_data["api"].post('/api/v1/repack/consolidate/', {
+                "client": client.id, "input_wrs": [wr.id for wr in wrs], "to_location": setup_data["location"].id,
+            }, format='json')
+        assert resp.status_code == 201, resp.data
+        # The request serializer resolves each input id on its own; count the rest.
+        return len([q for q in ctx.captured_queries if '"receiving_warehousereceipt"."id" = ' not in q['sql']])
+
+    count(2)  # seeds the REPACK sequence and the location's occupancy row
+    assert count(3) == count(30)
@@ -0,0 +1,142 @@
+"""
+Tests for the tracking-number scan index and GET /api/v1/scan/<code>/.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from receiving.models import TrackingCode, TrackingSource
+from receiving.tracking import normalize_tracking
+from shipping.models import Shipment
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Scan Co")
+
+
+@pytest.fixture
+def auth_client(company):
+    user = User.objects.create_user(username="scan_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def setup_data(company):
+    client = Client.objects.create(company=company, name="Scan Client", client_code="SC-1")
+    warehouse = Warehouse.objects.create(company=company, code="WH-SC", name="Scan Warehouse")
+    return {"client": client, "warehouse": warehouse}
+
+
+def test_normalize_tracking():
+    assert normalize_tracking(" 1z 999-aa1 0123456784 ") == "1Z999AA10123456784"
+    assert normalize_tracking("]C1" + "1Z999AA10123456784") == "1Z999AA10123456784"
+    # USPS IMpb: GS1 420 + ZIP5 in front of the printed number.
+    assert normalize_tracking("42033101" + "9400111899223100000000") == "9400111899223100000000"
+    # FedEx 34-digit 1D barcode carries the 12-digit tracking number at the end.
+    assert normalize_tracking("1001901781990001000300617767839437") == "617767839437"
+    # Other 34-digit numbers fail the tracking number's check digit and stay whole.
+    assert normalize_tracking("1001901781990001000300617767839430") == "1001901781990001000300617767839430"
+    assert normalize_tracking("   ") == ""
+
+
+@pytest.mark.django_db
+def test_scan_resolves_receipt_lines_and_shipment(auth_client, setup_data, company):
+    resp = auth_client.post('/api/v1/wrs/', {
+        "client": setup_data["client"].id,
+        "received_warehouse": setup_data["warehouse"].id,
+        "tracking_number": "HDR-100",
+        "lines": [{"carrier": "ups", "tracking_numbers": [
+            {"tracking_number": "1Z999AA10123456784", "order": 0},
+        ]}],
+    }, format='json')
+    assert resp.status_code == 201, resp.data
+    wr_id = resp.data["id"]
+    line_id = resp.data["lines"][0]["id"]
+
+    scan = auth_client.get('/api/v1/scan/1z999aa1-0123456784/')
+    assert scan.status_code == 200, scan.data
+    assert scan.data["normalized"] == "1Z999AA10123456784"
+    [match] = scan.data["matches"]
+    assert match["type"] == TrackingSource.LINE
+    assert match["receipt"]["id"] == wr_id
+    assert match["line"] == line_id
+
+    assert auth_client.get('/api/v1/scan/hdr 100/').data["matches"][0]["type"] == TrackingSource.RECEIPT
+
+    # Replacing the line's tracking numbers reindexes the receipt.
+    resp = auth_client.patch(f'/api/v1/wrs/{wr_id}/', {
+        "lines": [{"id": line_id, "carrier": "ups", "tracking_numbers": [{"tracking_number": "NEW-1", "order": 0}]}],
+    }, format='json')
+    assert resp.status_code == 200, resp.data
+    assert auth_client.get('/api/v1/scan/1Z999AA10123456784/').status_code == 404
+    assert auth_client.get('/api/v1/scan/new-1/').status_code == 200
+
+    resp = auth_client.post('/api/v1/shipments/', {
+        "client": setup_data["client"].id, "shipment_number": "SHP-SCAN", "tracking_number": "FX 7777",
+    }, format='json')
+    assert resp.status_code == 201, resp.data
+    scan = auth_client.get('/api/v1/scan/fx-7777/')
+    assert scan.data["matches"][0]["shipment"]["shipment_number"] == "SHP-SCAN"
+
+
+@pytest.mark.django_db
+def test_scan_prefers_the_exact_code_over_a_fedex_tracking_number(auth_client, setup_data, company):
+    barcode = "1001901781990001000300617767839437"
+    other_code = "2002002002002002002000617767839430"
+
+    def receipt(tracking_number):
+        resp = auth_client.post('/api/v1/wrs/', {
+            "client": setup_data["client"].id, "received_warehouse": setup_data["warehouse"].id,
+            "tracking_number": tracking_number,
+        }, format='json')
+        assert resp.status_code == 201, resp.data
+        return resp.data["id"]
+
+    typed = receipt("617767839437")
+    scanned = receipt(barcode)
+    long_code = receipt(other_code)
+    short_code = receipt("617767839430")
+
+    resp = auth_client.get(f'/api/v1/scan/{barcode}/')
+    assert [m["receipt"]["id"] for m in resp.data["matches"]] == [scanned, typed]
+    resp = auth_client.get('/api/v1/scan/617767839437/')
+    assert sorted(m["receipt"]["id"] for m in resp.data["matches"]) == sorted([typed, scanned])
+
+    resp = auth_client.get(f'/api/v1/scan/{other_code}/')
+    assert resp.data["normalized"] == other_code
+    assert [m["receipt"]["id"] for m in resp.data["matches"]] == [long_code]
+    assert [m["receipt"]["id"] for m in auth_client.get('/api/v1/scan/617767839430/').data["matches"]] == [short_code]
+
+
+@pytest.mark.django_db
+def test_scan_is_company_scoped_and_a_single_lookup(auth_client, setup_data, company):
+    other = Company.objects.create(name="Other Scan Co")
+    shipment = Shipment.objects.create(
+        company=other, client=Client.objects.create(company=other, name="Other", client_code="OT-1"),
+        shipment_number="SHP-OTHER",
+    )
+    TrackingCode.objects.create(
+        company=other, code="SHARED1", raw="SHARED1", source=TrackingSource.SHIPMENT, shipment=shipment,
+    )
+    assert auth_client.get('/api/v1/scan/shared1/').status_code == 404
+
+    auth_client.post('/api/v1/wrs/', {
+        "client": setup_data["client"].id, "received_warehouse": setup_data["warehouse"].id,
+        "tracking_number": "SHARED1",
+    }, format='json')
+    with CaptureQueriesContext(connection) as ctx:
+        resp = auth_client.get('/api/v1/scan/shared1/')
+    assert resp.status_code == 200
+    assert [m["receipt"]["client_code"] for m in resp.data["matches"]] == ["SC-1"]
+    lookups = [q for q in ctx.captured_queries if 'receiving_trackingcode' in q['sql']]
+    assert len(lookups) == 1
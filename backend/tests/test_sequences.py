@@ -0,0 +1,91 @@
+"""
+Tests for the per-company sequence allocator behind wr_number, REPACK numbers,
+client codes and consolidation reference codes.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from clients.models import Client
+from company.models import AssociateCompany, Company, CompanySequence, Office, SequenceKind
+from company.sequences import reserve_sequence
+from consolidation.models import Consolidation, ShipType
+from receiving.models import WarehouseReceipt, allocate_wr_numbers
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Sequence Co")
+
+
+@pytest.fixture
+def client_obj(company):
+    return Client.objects.create(company=company, name="Seq Client", client_code="SQ-1")
+
+
+@pytest.mark.django_db
+def test_reserve_block_is_consecutive(company):
+    assert reserve_sequence(company.id, SequenceKind.WR) == 1
+    assert reserve_sequence(company.id, SequenceKind.WR, count=10) == 2
+    assert reserve_sequence(company.id, SequenceKind.WR) == 12
+    assert CompanySequence.objects.get(company=company, kind=SequenceKind.WR).last_value == 12
+
+
+@pytest.mark.django_db
+def test_sequences_are_per_company_and_kind(company):
+    other = Company.objects.create(name="Other Sequence Co")
+    assert reserve_sequence(company.id, SequenceKind.WR) == 1
+    assert reserve_sequence(other.id, SequenceKind.WR) == 1
+    assert reserve_sequence(company.id, SequenceKind.REPACK) == 1
+
+
+@pytest.mark.django_db
+def test_seed_only_runs_on_first_allocation(company):
+    assert reserve_sequence(company.id, SequenceKind.CLIENT, seed=lambda: 41) == 42
+    assert reserve_sequence(company.id, SequenceKind.CLIENT, seed=lambda: 1000) == 43
+
+
+@pytest.mark.django_db
+def test_wr_number_is_set_by_the_insert(company, client_obj):
+    reserve_sequence(company.id, SequenceKind.WR)  # seed the sequence outside the capture
+    with CaptureQueriesContext(connection) as ctx:
+        wr = WarehouseReceipt.objects.create(company=company, client=client_obj)
+    assert wr.wr_number == f"WR-{company.id}-000002"
+    assert not [q for q in ctx.captured_queries if 'UPDATE "receiving_warehousereceipt"' in q['sql']]
+    wr.refresh_from_db()
+    assert wr.wr_number == f"WR-{company.id}-000002"
+
+
+@pytest.mark.django_db
+def test_wr_sequence_continues_after_legacy_numbers(company, client_obj):
+    legacy = WarehouseReceipt.objects.create(company=company, client=client_obj, wr_number="LEGACY")
+    wr = WarehouseReceipt.objects.create(company=company, client=client_obj)
+    assert wr.wr_number == f"WR-{company.id}-{legacy.pk + 1:06d}"
+
+
+@pytest.mark.django_db
+def test_repack_sequence_continues_after_existing_numbers(company, client_obj):
+    WarehouseReceipt.objects.create(
+        company=company, client=client_obj, is_repack=True, wr_number=f"REPACK-{company.id}-000007",
+    )
+    wr = WarehouseReceipt.objects.create(company=company, client=client_obj, is_repack=True)
+    assert wr.wr_number == f"REPACK-{company.id}-000008"
+    assert allocate_wr_numbers(company.id, count=2, is_repack=True) == [
+        f"REPACK-{company.id}-000009", f"REPACK-{company.id}-000010",
+    ]
+
+
+@pytest.mark.django_db
+def test_consolidation_reference_code(company):
+    agency = AssociateCompany.objects.create(company=company, name="Seq Agency")
+    office_a = Office.objects.create(company=company, name="A")
+    office_b = Office.objects.create(company=company, name="B")
+    consolidations = [
+        Consolidation.objects.create(
+            company=company, associate_company=agency, ship_type=ShipType.AIR,
+            sending_office=office_a, receiving_office=office_b,
+        )
+        for _ in range(2)
+    ]
+    assert [c.reference_code for c in consolidations] == [
+        f"C-{company.id}-000001", f"C-{company.id}-000002",
+    ]
@@ -0,0 +1,211 @@
+"""
+Tests for asynchronous, chunked shipping (POST /shipments/{id}/ship/ with "async": true).
+"""
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from core.models import ShipmentStatus
+from inventory.models import InventoryBalance, InventoryTransactionLine
+from receiving.models import ConsumedBy, WarehouseReceipt, WRStatus
+from shipping.models import Shipment, ShipmentItem, ShipmentShipRun, ShipRunStatus
+from shipping.services_ship_runs import process_ship_chunk, process_ship_run
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Ship Run Co")
+    user = User.objects.create_user(username="ship_run_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    client = Client.objects.create(company=company, client_code="SR-1", name="Ship Run Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-SR", name="Ship Run Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="SR-A")
+    shipment = Shipment.objects.create(company=company, shipment_number="SHP-SR-1", client=client, from_warehouse=warehouse)
+    wrs = []
+    for _ in range(7):
+        wr = WarehouseReceipt.objects.create(company=company, client=client, received_warehouse=warehouse, status=WRStatus.ACTIVE)
+        InventoryBalance.objects.create(company=company, client=client, warehouse=warehouse, location=location, wr=wr)
+        ShipmentItem.objects.create(company=company, shipment=shipment, wr=wr)
+        wrs.append(wr)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {"company": company, "shipment": shipment, "wrs": wrs, "api": api}
+
+
+def _start(setup_data, **extra):
+    shipment = setup_data["shipment"]
+    return setup_data["api"].post(
+        f'/api/v1/shipments/{shipment.id}/ship/',
+        {"async": True, "chunk_size": 3, "carrier": "Maersk", **extra}, format='json',
+    )
+
+
+@pytest.mark.django_db
+def test_async_ship_runs_in_chunks_and_flips_at_the_end(setup_data):
+    api, shipment, wrs = setup_data["api"], setup_data["shipment"], setup_data["wrs"]
+    resp = _start(setup_data)
+    assert resp.status_code == 202, resp.data
+    assert resp.data["status"] == ShipRunStatus.PENDING and resp.data["total_items"] == 7
+    shipment.refresh_from_db()
+    assert shipment.status == ShipmentStatus.SHIPPING
+    run = ShipmentShipRun.objects.get(shipment=shipment)
+
+    # Items cannot be added, and the sync path refuses, while SHIPPING.
+    assert api.post(f'/api/v1/shipments/{shipment.id}/items/', {"wr_ids": [wrs[0].id]}, format='json').status_code == 400
+    assert api.post(f'/api/v1/shipments/{shipment.id}/ship/', {}, format='json').status_code == 400
+
+    run = process_ship_chunk(run.id)
+    assert (run.status, run.processed_items) == (ShipRunStatus.RUNNING, 3)
+    assert InventoryBalance.objects.filter(wr__in=wrs).count() == 4
+    progress = api.get(f'/api/v1/shipments/{shipment.id}/ship-progress/').data
+    assert progress["processed_items"] == 3 and progress["percent"] == 42.9
+    shipment.refresh_from_db()
+    assert shipment.status == ShipmentStatus.SHIPPING
+
+    run = process_ship_run(run.id)
+    assert run.status == ShipRunStatus.DONE and run.processed_items == 7
+    shipment.refresh_from_db()
+    assert shipment.status == ShipmentStatus.SHIPPED and shipment.carrier == "Maersk"
+    assert not InventoryBalance.objects.filter(wr__in=wrs).exists()
+    assert set(WarehouseReceipt.objects.filter(id__in=[wr.id for wr in wrs]).values_list('status', flat=True)) == {WRStatus.SHIPPED}
+
+    trace = api.get(f'/api/v1/shipments/{shipment.id}/trace/').data
+    assert trace["transaction_linkage"]["line_count"] == 7
+
+
+@pytest.mark.django_db
+def test_crashed_run_resumes_from_cursor(setup_data):
+    assert _start(setup_data).status_code == 202
+    run = process_ship_chunk(ShipmentShipRun.objects.get().id)
+    # The worker died after its first chunk: the heartbeat goes stale.
+    ShipmentShipRun.objects.filter(pk=run.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+    call_command("process_ship_runs")
+    run.refresh_from_db()
+    assert run.status == ShipRunStatus.DONE and run.processed_items == 7
+    # Every WR shipped exactly once.
+    assert InventoryTransactionLine.objects.filter(wr__in=setup_data["wrs"]).count() == 7
+
+
+@pytest.mark.django_db
+def test_failed_chunk_rolls_back_and_can_be_retried(setup_data):
+    wrs = setup_data["wrs"]
+    assert _start(setup_data).status_code == 202
+    run = ShipmentShipRun.objects.get()
+    # A WR in the second chunk loses its balance after the run started.
+    balance = InventoryBalance.objects.get(wr=wrs[4])
+    balance.delete()
+
+    run = process_ship_run(run.id)
+    assert run.status == ShipRunStatus.FAILED and run.processed_items == 3
+    assert wrs[4].wr_number in run.error
+    # The failed chunk wrote nothing.
+    assert InventoryBalance.objects.filter(wr=wrs[3]).exists()
+
+    InventoryBalance.objects.create(
+        company=balance.company, client=balance.client, warehouse=balance.warehouse, location=balance.location, wr=wrs[4],
+    )
+    call_command("process_ship_runs", retry_failed=True)
+    run.refresh_from_db()
+    assert run.status == ShipRunStatus.DONE and run.error == ""
+
+
+@pytest.mark.django_db
+def test_async_start_validates_up_front(setup_data):
+    WarehouseReceipt.objects.filter(pk=setup_data["wrs"][6].pk).update(status=WRStatus.INACTIVE)
+    resp = _start(setup_data)
+    assert resp.status_code == 400
+    assert "not ACTIVE" in str(resp.data)
+    setup_data["shipment"].refresh_from_db()
+    assert setup_data["shipment"].status == ShipmentStatus.PLANNED
+    assert not ShipmentShipRun.objects.exists()
+    assert setup_data["api"].get(f'/api/v1/shipments/{setup_data["shipment"].id}/ship-progress/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_shipment_cannot_change_while_shipping(setup_data):
+    api, shipment = setup_data["api"], setup_data["shipment"]
+    url = f'/api/v1/shipments/{shipment.id}/'
+    assert _start(setup_data).status_code == 202
+    assert api.patch(url, {"status": ShipmentStatus.PLANNED, "notes": "x"}, format='json').status_code == 400
+    assert api.delete(url).status_code == 400
+    shipment.refresh_from_db()
+    assert shipment.status == ShipmentStatus.SHIPPING and shipment.notes == ""
+    assert ShipmentItem.objects.filter(shipment=shipment).count() == 7
+
+
+@pytest.mark.django_db
+def test_status_patch_refuses_only_the_ship_statuses(setup_data):
+    api, shipment = setup_data["api"], setup_data["shipment"]
+    url = f'/api/v1/shipments/{shipment.id}/'
+
+    for value in (ShipmentStatus.SHIPPED, ShipmentStatus.SHIPPING):
+        resp = api.patch(url, {"status": value}, format='json')
+        assert resp.status_code == 400 and "status" in resp.data
+    shipment.refresh_from_db()
+    assert shipment.status == ShipmentStatus.PLANNED
+
+    assert api.patch(url, {"status": ShipmentStatus.PACKED}, format='json').status_code == 200
+    assert api.patch(url, {"status": ShipmentStatus.CANCELLED}, format='json').status_code == 200
+    Shipment.objects.filter(pk=shipment.pk).update(status=ShipmentStatus.SHIPPED)
+    resp = api.patch(url, {"status": ShipmentStatus.DELIVERED}, format='json')
+    assert resp.status_code == 200, resp.data
+    shipment.refresh_from_db()
+    assert shipment.status == ShipmentStatus.DELIVERED
+
+
+@pytest.mark.django_db
+def test_cancel_run_before_anything_shipped(setup_data):
+    api, shipment, wrs = setup_data["api"], setup_data["shipment"], setup_data["wrs"]
+    Shipment.objects.filter(pk=shipment.pk).update(status=ShipmentStatus.PACKED)
+    assert _start(setup_data).status_code == 202
+    InventoryBalance.objects.filter(wr=wrs[1]).delete()
+    run = process_ship_run(ShipmentShipRun.objects.get().id)
+    assert run.status == ShipRunStatus.FAILED and run.processed_items == 0
+
+    resp = api.post(f'/api/v1/shipments/{shipment.id}/ship-cancel/', {}, format='json')
+
+    assert resp.status_code == 200, resp.data
+    assert resp.data["status"] == ShipmentStatus.PACKED
+    run.refresh_from_db()
+    assert run.status == ShipRunStatus.CANCELLED
+    # The worker leaves a cancelled run alone, and the shipment is editable again.
+    call_command("process_ship_runs", retry_failed=True)
+    run.refresh_from_db()
+    assert run.status == ShipRunStatus.CANCELLED
+    assert api.patch(f'/api/v1/shipments/{shipment.id}/', {"notes": "x"}, format='json').status_code == 200
+
+
+@pytest.mark.django_db
+def test_drop_failing_item_lets_the_run_finish(setup_data):
+    api, shipment, wrs = setup_data["api"], setup_data["shipment"], setup_data["wrs"]
+    assert _start(setup_data).status_code == 202
+    InventoryBalance.objects.filter(wr=wrs[4]).delete()
+    run = process_ship_run(ShipmentShipRun.objects.get().id)
+    assert run.status == ShipRunStatus.FAILED and run.processed_items == 3
+
+    # Something already shipped: cancelling is refused, and shipped items cannot be dropped.
+    assert api.post(f'/api/v1/shipments/{shipment.id}/ship-cancel/', {}, format='json').status_code == 400
+    drop_url = f'/api/v1/shipments/{shipment.id}/ship-drop-items/'
+    assert api.post(drop_url, {"wr_ids": [wrs[0].id]}, format='json').status_code == 400
+
+    resp = api.post(drop_url, {"wr_ids": [wrs[4].id]}, format='json')
+    assert resp.status_code == 200, resp.data
+    assert resp.data["status"] == ShipRunStatus.PENDING and resp.data["total_items"] == 6
+
+    call_command("process_ship_runs")
+    run.refresh_from_db()
+    assert run.status == ShipRunStatus.DONE and run.processed_items == 6
+    shipment.refresh_from_db()
+    assert shipment.status == ShipmentStatus.SHIPPED
+    assert not ShipmentItem.objects.filter(shipment=shipment, wr=wrs[4]).exists()
+    wrs[4].refresh_from_db()
+    assert wrs[4].status == WRStatus.ACTIVE and wrs[4].consumed_by == ConsumedBy.NONE
@@ -0,0 +1,129 @@
+"""
+Tests for the set-based POST /shipments/{id}/items/. The 10k-item benchmark
+is marked slow and only runs with ``pytest -m slow``.
+"""
+import itertools
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from inventory.models import InventoryBalance
+from receiving.models import ConsumedBy, WarehouseReceipt, WRStatus
+from shipping.models import Shipment, ShipmentItem
+from shipping.services import REJECT_CLIENT_MISMATCH, REJECT_NO_BALANCE, REJECT_NOT_ACTIVE, bulk_add_items_to_shipment
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Bulk Items Co")
+    user = User.objects.create_user(username="bulk_items_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    client = Client.objects.create(company=company, client_code="BI-1", name="Bulk Items Client")
+    other_client = Client.objects.create(company=company, client_code="BI-2", name="Other Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-BI", name="Bulk Items Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="BI-A")
+    shipment = Shipment.objects.create(company=company, shipment_number="SHP-BI-1", client=client, from_warehouse=warehouse)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {
+        "company": company, "user": user, "client": client, "other_client": other_client,
+        "warehouse": warehouse, "location": location, "shipment": shipment, "api": api,
+    }
+
+
+def _stored(setup_data, count, client=None, status=WRStatus.ACTIVE):
+    company, client = setup_data["company"], client or setup_data["client"]
+    wrs = WarehouseReceipt.objects.bulk_create([
+        # bulk_create skips save(), which assigns wr_number.
+        WarehouseReceipt(
+            company=company, client=client, received_warehouse=setup_data["warehouse"],
+            status=status, wr_number=f"WR-BI-{next(_numbers):06d}",
+        )
+        for _ in range(count)
+    ])
+    InventoryBalance.objects.bulk_create([
+        InventoryBalance(
+            company=company, client=client, warehouse=setup_data["warehouse"],
+            location=setup_data["location"], wr=wr, on_hand_qty=1,
+        )
+        for wr in wrs
+    ])
+    return [wr.id for wr in wrs]
+
+
+@pytest.mark.django_db
+def test_rejections_are_listed_per_wr(setup_data):
+    api, shipment = setup_data["api"], setup_data["shipment"]
+    url = f'/api/v1/shipments/{shipment.id}/items/'
+    good = _stored(setup_data, 2)
+    inactive = _stored(setup_data, 1, status=WRStatus.INACTIVE)
+    foreign = _stored(setup_data, 1, client=setup_data["other_client"])
+    unstored = WarehouseReceipt.objects.create(company=setup_data["company"], client=setup_data["client"]).id
+    wr_ids = good + inactive + foreign + [unstored]
+
+    resp = api.post(url, {"wr_ids": wr_ids}, format='json')
+    assert resp.status_code == 400
+    assert [(int(r["wr"]), r["code"]) for r in resp.data["rejected"]] == [
+        (inactive[0], REJECT_NOT_ACTIVE), (foreign[0], REJECT_CLIENT_MISMATCH), (unstored, REJECT_NO_BALANCE),
+    ]
+    assert not ShipmentItem.objects.exists()
+
+    resp = api.post(url, {"wr_ids": wr_ids, "partial": True}, format='json')
+    assert resp.status_code == 207
+    assert resp.data["count"] == 2 and len(resp.data["rejected"]) == 3
+    assert set(ShipmentItem.objects.values_list('wr_id', flat=True)) == set(good)
+    assert set(WarehouseReceipt.objects.filter(id__in=good).values_list('consumed_by', flat=True)) == {ConsumedBy.SHIPMENT}
+
+    # Resending: already-added WRs are skipped, not rejected.
+    resp = api.post(url, {"wr_ids": good}, format='json')
+    assert resp.status_code == 200
+    assert resp.data["count"] == 0 and resp.data["skipped"] == 2
+
+
+@pytest.mark.django_db
+def test_other_company_balances_are_not_visible(setup_data):
+    other = Company.objects.create(name="Other Bulk Items Co")
+    other_client = Client.objects.create(company=other, client_code="OB-1", name="o")
+    other_warehouse = Warehouse.objects.create(company=other, code="WH-OB", name="o")
+    wr = WarehouseReceipt.objects.create(company=other, client=setup_data["client"], status=WRStatus.ACTIVE)
+    InventoryBalance.objects.create(company=other, client=other_client, warehouse=other_warehouse, wr=wr)
+
+    result = bulk_add_items_to_shipment(
+        setup_data["shipment"], [wr.id], performed_by=setup_data["user"], partial=True,
+    )
+    assert result["rejected"][0]["code"] == REJECT_NO_BALANCE
+
+
+def _add_queries(setup_data, count, number):
+    shipment = Shipment.objects.create(
+        company=setup_data["company"], shipment_number=f"SHP-BI-{number}",
+        client=setup_data["client"], from_warehouse=setup_data["warehouse"],
+    )
+    wr_ids = _stored(setup_data, count)
+    with CaptureQueriesContext(connection) as ctx:
+        result = bulk_add_items_to_shipment(shipment, wr_ids, performed_by=setup_data["user"])
+    assert len(result["added"]) == count
+    assert ShipmentItem.objects.filter(shipment=shipment).count() == count
+    # Only the batched INSERT grows with the item count (the batch size is
+    # backend-dependent); everything else is a fixed number of queries.
+    return [q for q in ctx.captured_queries if not q["sql"].startswith('INSERT INTO "shipping_shipmentitem"')]
+
+
+@pytest.mark.django_db
+def test_query_count_is_independent_of_item_count(setup_data):
+    assert len(_add_queries(setup_data, 300, 3)) == len(_add_queries(setup_data, 10, 2))
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_benchmark_10k_items(setup_data):
+    assert len(_add_queries(setup_data, 10_000, 3)) == len(_add_queries(setup_data, 10, 2))
@@ -0,0 +1,132 @@
+"""
+Tests for the typed shipment link on ledger transactions and the batched
+POST /shipments/trace/.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from inventory.models import InventoryBalance, InventoryTransaction, TxnType
+from receiving.models import WarehouseReceipt, WRStatus
+from shipping.models import Shipment, ShipmentItem
+from shipping.services import ship_shipment
+from warehouse.models import Warehouse, StorageLocation
+
+User = get_user_model()
+
+
+@pytest.fixture
+def setup_data():
+    company = Company.objects.create(name="Trace Co")
+    user = User.objects.create_user(username="trace_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True, role='admin')
+    client = Client.objects.create(company=company, client_code="TR-1", name="Trace Client")
+    warehouse = Warehouse.objects.create(company=company, code="WH-TR", name="Trace Warehouse")
+    location = StorageLocation.objects.create(company=company, warehouse=warehouse, code="TR-A")
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return {"company": company, "user": user, "client": client, "warehouse": warehouse, "location": location, "api": api}
+
+
+def _shipped(setup_data, number, items=2):
+    company, client = setup_data["company"], setup_data["client"]
+    shipment = Shipment.objects.create(
+        company=company, shipment_number=number, client=client, from_warehouse=setup_data["warehouse"],
+    )
+    for _ in range(items):
+        wr = WarehouseReceipt.objects.create(
+            company=company, client=client, received_warehouse=setup_data["warehouse"], status=WRStatus.ACTIVE,
+        )
+        InventoryBalance.objects.create(
+            company=company, client=client, warehouse=setup_data["warehouse"], location=setup_data["location"], wr=wr,
+        )
+        ShipmentItem.objects.create(company=company, shipment=shipment, wr=wr)
+    ship_shipment(shipment, performed_by=setup_data["user"], carrier="DHL")
+    return shipment
+
+
+@pytest.mark.django_db
+def test_ship_transaction_links_shipment(setup_data):
+    shipment = _shipped(setup_data, "SHP-TR-1")
+
+    txn = InventoryTransaction.objects.get(txn_type=TxnType.SHIP)
+    assert txn.shipment_id == shipment.id
+    assert list(shipment.inventory_transactions.all()) == [txn]
+
+
+@pytest.mark.django_db
+def test_single_trace_uses_link(setup_data):
+    shipment = _shipped(setup_data, "SHP-TR-1", items=3)
+
+    resp = setup_data["api"].get(f'/api/v1/shipments/{shipment.id}/trace/')
+
+    assert resp.status_code == 200
+    assert len(resp.data["items"]) == 3
+    assert resp.data["transaction_linkage"]["line_count"] == 3
+    assert resp.data["transaction_linkage"]["performed_by"] == "trace_user"
+
+
+@pytest.mark.django_db
+def test_batch_trace(setup_data):
+    first = _shipped(setup_data, "SHP-TR-1", items=2)
+    second = _shipped(setup_data, "SHP-TR-2", items=1)
+    planned = Shipment.objects.create(
+        company=setup_data["company"], shipment_number="SHP-TR-3", client=setup_data["client"],
+    )
+
+    resp = setup_data["api"].post(
+        '/api/v1/shipments/trace/', {"shipment_ids": [second.id, first.id, planned.id]}, format='json',
+    )
+
+    assert resp.status_code == 200
+    assert resp.data["missing"] == []
+    by_id = {trace["id"]: trace for trace in resp.data["results"]}
+    assert by_id[first.id]["transaction_linkage"]["line_count"] == 2
+    assert by_id[second.id]["transaction_linkage"]["line_count"] == 1
+    assert by_id[planned.id]["transaction_linkage"] is None
+    assert by_id[planned.id]["from_warehouse_details"] is None
+    assert len(by_id[first.id]["items"]) == 2
+
+
+@pytest.mark.django_db
+def test_batch_trace_reports_missing_and_foreign(setup_data):
+    shipment = _shipped(setup_data, "SHP-TR-1")
+    other = Company.objects.create(name="Other Co")
+    foreign = Shipment.objects.create(
+        company=other, shipment_number="SHP-OTHER",
+        client=Client.objects.create(company=other, client_code="O-1", name="Other"),
+    )
+
+    resp = setup_data["api"].post(
+        '/api/v1/shipments/trace/', {"shipment_ids": [shipment.id, foreign.id, 999999]}, format='json',
+    )
+
+    assert resp.status_code == 200
+    assert [trace["id"] for trace in resp.data["results"]] == [shipment.id]
+    assert resp.data["missing"] == [foreign.id, 999999]
+
+
+@pytest.mark.django_db
+def test_batch_trace_rejects_empty(setup_data):
+    resp = setup_data["api"].post('/api/v1/shipments/trace/', {"shipment_ids": []}, format='json')
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_batch_trace_query_count_is_fixed(setup_data):
+    shipments = [_shipped(setup_data, f"SHP-TR-{n}", items=2) for n in range(2)]
+
+    def count(ids):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = setup_data["api"].post('/api/v1/shipments/trace/', {"shipment_ids": ids}, format='json')
+        assert resp.status_code == 200
+        return len(ctx.captured_queries)
+
+    small = count([s.id for s in shipments])
+    shipments += [_shipped(setup_data, f"SHP-TR-{n}", items=3) for n in range(2, 8)]
+    large = count([s.id for s in shipments])
+
+    assert small == large
@@ -0,0 +1,103 @@
+"""
+Tests for ?fields= / ?expand= on the company-scoped list endpoints.
+"""
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from clients.models import Client
+from company.models import Company, CompanyMember
+from receiving.models import WarehouseReceipt, WarehouseReceiptLine
+from shipping.models import Shipment
+from warehouse.models import Warehouse
+
+User = get_user_model()
+
+
+@pytest.fixture
+def company():
+    return Company.objects.create(name="Sparse Co")
+
+
+@pytest.fixture
+def auth_client(company):
+    user = User.objects.create_user(username="sparse_user", password="password")
+    CompanyMember.objects.create(company=company, user=user, is_active=True)
+    api = APIClient()
+    api.force_authenticate(user=user)
+    return api
+
+
+@pytest.fixture
+def setup_data(company):
+    client = Client.objects.create(company=company, name="Sparse Client", client_code="SP-1")
+    warehouse = Warehouse.objects.create(company=company, code="WH-SP", name="Sparse Warehouse")
+    for n in range(3):
+        wr = WarehouseReceipt.objects.create(company=company, client=client, received_warehouse=warehouse)
+        WarehouseReceiptLine.objects.create(receipt=wr, company=company, carrier="ups")
+        Shipment.objects.create(company=company, client=client, from_warehouse=warehouse, shipment_number=f"SHP-SP-{n}")
+    return {"client": client, "warehouse": warehouse}
+
+
+def _tables(ctx):
+    return " ".join(q["sql"] for q in ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_fields_limits_output_and_queries(auth_client, setup_data):
+    with CaptureQueriesContext(connection) as ctx:
+        resp = auth_client.get('/api/v1/wrs/', {"fields": "id,wr_number,client"})
+    assert resp.status_code == 200, resp.data
+    row = resp.data["results"][0]
+    assert set(row) == {"id", "wr_number", "client"}
+    assert row["client"] == setup_data["client"].id
+
+    sql = _tables(ctx)
+    assert "receiving_warehousereceiptline" not in sql
+    assert "clients_client" not in sql
+    assert "receiving_repacklink" not in sql
+    # only() keeps the wide text columns out of the SELECT.
+    assert '"description_summary"' not in sql
+
+
+@pytest.mark.django_db
+def test_expand_adds_nested_fields_to_slim_row(auth_client, setup_data):
+    slim = auth_client.get('/api/v1/wrs/', {"expand": ""}).data["results"][0]
+    assert "lines" not in slim and "client_details" not in slim
+    assert "wr_status_display" in slim and "tracking_summary" in slim
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = auth_client.get('/api/v1/wrs/', {"fields": "id", "expand": "lines,client_details"})
+    row = resp.data["results"][0]
+    assert set(row) == {"id", "lines", "client_details"}
+    assert row["lines"][0]["carrier"] == "ups"
+    assert row["client_details"]["client_code"] == "SP-1"
+    # One query per prefetch, not per row.
+    assert sum('"receiving_warehousereceiptline"' in q["sql"] for q in ctx.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_full_response_unchanged_without_params(auth_client, setup_data):
+    row = auth_client.get('/api/v1/wrs/').data["results"][0]
+    assert {"lines", "client_details", "warehouse_details", "wr_status_display"} <= set(row)
+
+    shipment = auth_client.get('/api/v1/shipments/').data["results"][0]
+    assert shipment["client_details"]["client_code"] == "SP-1"
+
+
+@pytest.mark.django_db
+def test_shipments_skip_client_join_and_reject_unknown(auth_client, setup_data):
+    with CaptureQueriesContext(connection) as ctx:
+        resp = auth_client.get('/api/v1/shipments/', {"fields": "id,shipment_number,status"})
+    assert resp.status_code == 200
+    assert set(resp.data["results"][0]) == {"id", "shipment_number", "status"}
+    assert "clients_client" not in _tables(ctx)
+
+    resp = auth_client.get('/api/v1/shipments/', {"fields": "id,bogus"})
+    assert resp.status_code == 400
+    assert "bogus" in str(resp.data["fields"])
+
+    shipment = Shipment.objects.get(shipment_number="SHP-SP-0")
+    detail = auth_client.get(f'/api/v1/shipments/{shipment.id}/', {"fields": "shipment_number"})
+    assert detail.data == {"shipment_number": "SHP-SP-0"}
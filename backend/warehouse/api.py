@@ -1,7 +1,11 @@
 from rest_framework import serializers, viewsets, filters
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from core.mixins import CompanyScopedViewSetMixin
-from .models import Warehouse, StorageLocation
+from inventory.services_occupancy import suggest_locations
+from receiving.models import WarehouseReceipt
+from .models import Warehouse, StorageLocation, LocationType
 
 class WarehouseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,6 +26,32 @@ class StorageLocationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['company']
 
+class LocationSuggestionSerializer(serializers.ModelSerializer):
+    """A candidate location with its occupancy and what is left after placing the WR."""
+    occupied_count = serializers.IntegerField()
+    occupied_volume_cf = serializers.DecimalField(max_digits=16, decimal_places=4)
+    occupied_weight = serializers.DecimalField(max_digits=14, decimal_places=2)
+    remaining_count = serializers.IntegerField(allow_null=True)
+    remaining_volume_cf = serializers.DecimalField(max_digits=16, decimal_places=4, allow_null=True)
+    remaining_weight = serializers.DecimalField(max_digits=14, decimal_places=2, allow_null=True)
+
+    class Meta:
+        model = StorageLocation
+        fields = [
+            'id', 'code', 'warehouse', 'location_type',
+            'max_wr_count', 'max_volume_cf', 'max_weight',
+            'occupied_count', 'occupied_volume_cf', 'occupied_weight',
+            'remaining_count', 'remaining_volume_cf', 'remaining_weight',
+        ]
+
+
+class LocationSuggestQuerySerializer(serializers.Serializer):
+    wr = serializers.IntegerField()
+    warehouse = serializers.IntegerField(required=False)
+    location_type = serializers.ChoiceField(choices=LocationType.choices, required=False, default=LocationType.STORAGE)
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+
+
 class WarehouseViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = Warehouse.objects.all()
     serializer_class = WarehouseSerializer
@@ -39,3 +69,34 @@ class StorageLocationViewSet(CompanyScopedViewSetMixin, viewsets.ModelViewSet):
     search_fields = ['code', 'description', 'warehouse__code', 'warehouse__name']
     ordering_fields = ['code', 'location_type', 'created_at']
     ordering = ['warehouse__code', 'code']
+
+    @action(detail=False, methods=['get'], url_path='suggest')
+    def suggest(self, request):
+        """
+        GET /locations/suggest/?wr=<id>[&warehouse=<id>][&location_type=STORAGE][&limit=10]
+
+        Putaway candidates for a WR, best fit first, read from the location
+        occupancy table (see inventory/services_occupancy.py).
+        """
+        params = LocationSuggestQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        company = self.get_company()
+        wr = WarehouseReceipt.objects.filter(company=company, id=params.validated_data['wr']).first()
+        if wr is None:
+            raise serializers.ValidationError({"wr": "Warehouse receipt not found."})
+        warehouse = params.validated_data.get('warehouse')
+        if warehouse is not None and not Warehouse.objects.filter(company=company, id=warehouse).exists():
+            raise serializers.ValidationError({"warehouse": "Warehouse not found."})
+
+        locations = suggest_locations(
+            wr,
+            warehouse=warehouse,
+            location_type=params.validated_data['location_type'],
+            limit=params.validated_data['limit'],
+        )
+        return Response({
+            "wr": wr.id,
+            "volume_cf": wr.total_volume_cf,
+            "weight": wr.total_weight,
+            "results": LocationSuggestionSerializer(locations, many=True).data,
+        })
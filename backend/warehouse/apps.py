@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class WarehouseConfig(AppConfig):
     name = "warehouse"
+
+    def ready(self):
+        from company.versions import track_data_version
+        track_data_version(
+            self.get_model('Warehouse'),
+            self.get_model('StorageLocation'),
+            self.get_model('LocationOccupancy'),
+        )
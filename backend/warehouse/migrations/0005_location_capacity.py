@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0008_companydataversion'),
+        ('warehouse', '0004_backfill_default_warehouses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storagelocation',
+            name='max_volume_cf',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='storagelocation',
+            name='max_weight',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='storagelocation',
+            name='max_wr_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='LocationOccupancy',
+            fields=[
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='occupancy', serialize=False, to='warehouse.storagelocation')),
+                ('wr_count', models.IntegerField(default=0)),
+                ('total_volume_cf', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('total_weight', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='company.company')),
+            ],
+        ),
+    ]
@@ -38,6 +38,12 @@ class StorageLocation(TimeStampedModel):
     )
     is_active = models.BooleanField(default=True)
 
+    # Capacity limits; NULL means unlimited. Volume and weight use the same
+    # units as the receipt rollups (WarehouseReceipt.total_volume_cf / total_weight).
+    max_volume_cf = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    max_weight = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    max_wr_count = models.PositiveIntegerField(null=True, blank=True)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["warehouse", "code"], name="unique_warehouse_location_code")
@@ -48,3 +54,22 @@ class StorageLocation(TimeStampedModel):
 
     def __str__(self):
         return f"{self.warehouse.code} / {self.code}"
+
+
+class LocationOccupancy(models.Model):
+    """
+    What a location currently holds: receipt count plus summed volume and
+    weight of the WRs with a balance there. Kept current incrementally by
+    the inventory services on every balance write
+    (inventory/services_occupancy.py), so capacity checks never aggregate
+    InventoryBalance.
+    """
+    location = models.OneToOneField(StorageLocation, on_delete=models.CASCADE, primary_key=True, related_name="occupancy")
+    company = models.ForeignKey('company.Company', on_delete=models.CASCADE, related_name="+")
+    wr_count = models.IntegerField(default=0)
+    total_volume_cf = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    total_weight = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.location_id}: {self.wr_count} WRs"